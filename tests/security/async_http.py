@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Async HTTP Client
+Minimal asyncio HTTP/1.1 client with keep-alive pooling for the load/stress tools.
+Uses only the standard library so the harness runs wherever python3 does.
+Also holds the server-side HTTP/1.1 framing shared by the stand-in servers.
+"""
+
+import asyncio
+import json as jsonlib
+import ssl
+import time
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_TIMEOUT = 30.0
+STREAM_CHUNK_SIZE = 64 * 1024
+USER_AGENT = "worksphere-harness/1.0"
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "upgrade",
+               "proxy-connection", "te", "trailer"}
+
+
+class HttpError(Exception):
+    """Raised when a request cannot be completed (connect, protocol or timeout)."""
+
+
+class HttpResponse:
+    """A fully-read HTTP response with timing information."""
+
+    __slots__ = ("method", "url", "status", "reason", "headers", "raw_headers",
+                 "body", "elapsed", "ttfb")
+
+    def __init__(self, method, url, status, reason, raw_headers, body, elapsed, ttfb):
+        self.method = method
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.raw_headers = raw_headers
+        self.headers = {name.lower(): value for name, value in raw_headers}
+        self.body = body
+        self.elapsed = elapsed  # seconds, request start -> body complete
+        self.ttfb = ttfb        # seconds, request start -> status line
+
+    @property
+    def text(self):
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self):
+        return jsonlib.loads(self.body) if self.body else None
+
+    def header(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def __repr__(self):
+        return f"<HttpResponse {self.method} {self.url} {self.status}>"
+
+
+def _encode_body(json=None, data=None):
+    """Return (body, content-type) for the given payload; body is bytes or a seekable stream."""
+    if json is not None:
+        return jsonlib.dumps(json, separators=(",", ":")).encode(), "application/json"
+    if data is None:
+        return b"", None
+    if hasattr(data, "read"):
+        # Streamed body (e.g. multipart_stream.MultipartStream); must know its length
+        return data, getattr(data, "content_type", None)
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data), None
+    if isinstance(data, str):
+        return data.encode(), None
+    return urlencode(data, doseq=True).encode(), "application/x-www-form-urlencoded"
+
+
+async def _read_head(reader):
+    """Read a status line and headers. Returns (status, reason, raw_headers, version)."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError("connection closed before response")
+    parts = line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise HttpError(f"malformed status line: {line[:80]!r}")
+    version, status = parts[0], int(parts[1])
+    reason = parts[2] if len(parts) > 2 else ""
+
+    raw_headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        raw_headers.append((name.strip(), value.strip()))
+    return status, reason, raw_headers, version
+
+
+async def read_body(reader, method, status, headers, sink=None):
+    """
+    Read the response body. Returns (body, reusable).
+
+    With `sink`, each chunk is passed to sink(chunk) as it arrives and body is b"",
+    so large downloads are measured without being held in memory.
+    """
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        return b"", True
+
+    chunks = []
+    emit = sink or chunks.append
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                # Trailer section ends with an empty line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks), True
+            while size > 0:
+                chunk = await reader.readexactly(min(size, STREAM_CHUNK_SIZE))
+                emit(chunk)
+                size -= len(chunk)
+            await reader.readexactly(2)
+
+    length = headers.get("content-length")
+    if length is not None:
+        remaining = int(length)
+        while remaining > 0:
+            chunk = await reader.readexactly(min(remaining, STREAM_CHUNK_SIZE))
+            emit(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks), True
+
+    while True:
+        chunk = await reader.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return b"".join(chunks), False
+        emit(chunk)
+
+
+# --- Server side ----------------------------------------------------------------
+
+async def read_request(reader):
+    """Read one request. Returns (method, target, raw head lines, headers dict, body) or None at EOF."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = lines[0].split(" ", 2)
+    raw_headers = []
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            raw_headers.append((name.strip(), value.strip()))
+    headers = {name.lower(): value for name, value in raw_headers}
+    body = b""
+    if "content-length" in headers or "chunked" in headers.get("transfer-encoding", "").lower():
+        body, _ = await read_body(reader, method, 200, headers)
+    return method, target, head, raw_headers, headers, body
+
+
+def write_response(writer, status, reason, raw_headers, body, extra=(), head=False):
+    """
+    Write one keep-alive response. Hop-by-hop headers in `raw_headers` are dropped and
+    Content-Length is set from `body`; with `head` the given Content-Length is passed
+    through and no body is sent. `extra` headers are appended as they are.
+    """
+    lines = [f"HTTP/1.1 {status} {reason}"]
+    lines += [f"{name}: {value}" for name, value in raw_headers if name.lower() not in HOP_HEADERS]
+    length = len(body)
+    if head:
+        length = next((value for name, value in raw_headers if name.lower() == "content-length"), None)
+        body = b""
+    if length is not None:
+        lines.append(f"Content-Length: {length}")
+    lines.append("Connection: keep-alive")
+    lines += [f"{name}: {value}" for name, value in extra]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+
+class AsyncHttpClient:
+    """
+    Keep-alive HTTP/1.1 client bound to one origin.
+
+    `limit` caps concurrent connections; requests beyond it wait for a free slot.
+    `local_addr` binds outgoing connections to a source address (e.g. one of
+    127.0.0.0/8 to appear as a distinct client IP to a local server).
+    """
+
+    def __init__(self, base_url, headers=None, limit=100, timeout=DEFAULT_TIMEOUT, local_addr=None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.limit = limit
+        self.local_addr = local_addr
+        self._idle = []
+        self._slots = asyncio.Semaphore(limit)
+        self._ssl = ssl.create_default_context() if self.scheme == "https" else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    def url_for(self, path, params=None):
+        if path.startswith("http://") or path.startswith("https://"):
+            target = path
+        else:
+            target = self.base_path + (path if path.startswith("/") else "/" + path)
+        if params:
+            target += ("&" if "?" in target else "?") + urlencode(params, doseq=True)
+        return target
+
+    async def _connect(self):
+        return await asyncio.open_connection(self.host, self.port, ssl=self._ssl,
+                                             local_addr=(self.local_addr, 0) if self.local_addr else None)
+
+    def _build_head(self, method, target, headers, body_length):
+        merged = {"Host": f"{self.host}:{self.port}", "User-Agent": USER_AGENT,
+                  "Connection": "keep-alive"}
+        merged.update(self.headers)
+        merged.update(headers)
+        if body_length or method in ("POST", "PUT", "PATCH"):
+            merged["Content-Length"] = str(body_length)
+        lines = [f"{method} {target} HTTP/1.1"]
+        lines.extend(f"{name}: {value}" for name, value in merged.items() if value is not None)
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _exchange(self, conn, method, head, body, sink=None):
+        reader, writer = conn
+        if hasattr(body, "read"):
+            writer.write(head)
+            body.seek(0)
+            while True:
+                chunk = body.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+        else:
+            writer.write(head + body if len(body) < 65536 else head)
+            if len(body) >= 65536:
+                writer.write(body)
+            await writer.drain()
+        status, reason, raw_headers, version = await _read_head(reader)
+        ttfb = time.perf_counter()
+        lowered = {name.lower(): value for name, value in raw_headers}
+        payload, reusable = await read_body(reader, method, status, lowered, sink)
+        if version == "HTTP/1.0" or lowered.get("connection", "").lower() == "close":
+            reusable = False
+        return status, reason, raw_headers, payload, reusable, ttfb
+
+    async def request(self, method, path, params=None, json=None, data=None,
+                      headers=None, timeout=None, sink=None):
+        method = method.upper()
+        target = self.url_for(path, params)
+        body, content_type = _encode_body(json=json, data=data)
+        extra = dict(headers or {})
+        if content_type and not any(k.lower() == "content-type" for k in extra):
+            extra["Content-Type"] = content_type
+        head = self._build_head(method, target, extra, len(body))
+
+        async with self._slots:
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    self._request_on_pool(method, head, body, sink), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                raise HttpError(f"{method} {target} timed out") from None
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                raise HttpError(f"{method} {target} failed: {e}") from e
+
+        status, reason, raw_headers, payload, ttfb = result
+        end = time.perf_counter()
+        return HttpResponse(method, target, status, reason, raw_headers, payload,
+                            end - start, ttfb - start)
+
+    async def _request_on_pool(self, method, head, body, sink=None):
+        # A pooled connection may have been closed by the server since its
+        # last use; retry once on a fresh connection in that case.
+        while self._idle:
+            conn = self._idle.pop()
+            try:
+                return self._finish(conn, *await self._exchange(conn, method, head, body, sink))
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                conn[1].close()
+        conn = await self._connect()
+        try:
+            return self._finish(conn, *await self._exchange(conn, method, head, body, sink))
+        except BaseException:
+            conn[1].close()
+            raise
+
+    def _finish(self, conn, status, reason, raw_headers, payload, reusable, ttfb):
+        if reusable and len(self._idle) < self.limit:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+        return status, reason, raw_headers, payload, ttfb
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request("PUT", path, **kwargs)
+
+    async def patch(self, path, **kwargs):
+        return await self.request("PATCH", path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request("DELETE", path, **kwargs)
+
+
+class LimiterPacer:
+    """
+    Client-side mirror of one Laravel rate limiter, fed from X-RateLimit-Limit /
+    X-RateLimit-Remaining and Retry-After. Laravel limiters are fixed windows that
+    start at the first hit, so once the budget is spent acquire() waits for the
+    window to roll over instead of collecting 429s. Without rate limit headers it
+    never waits.
+    """
+
+    def __init__(self, reserve=0, window=60.0):
+        self.reserve = reserve
+        self.window = window
+        self.limit = None
+        self.remaining = None
+        self.window_start = None
+        self.pause_until = 0.0
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = self.pause_until - now
+                if wait <= 0 and (self.remaining is None or self.remaining > self.reserve):
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+                if wait <= 0:
+                    # Budget spent: sleep until the window rolls over, then trust the next response
+                    start = self.window_start if self.window_start is not None else now
+                    wait = max(0.25, start + self.window - now)
+                    self.pause_until = now + wait
+                    self.remaining = self.limit
+                    self.window_start = None
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+    def update(self, response):
+        """Record a response. Returns True if it was a 429 (the caller should retry)."""
+        limit = response.header("x-ratelimit-limit")
+        remaining = response.header("x-ratelimit-remaining")
+        now = time.monotonic()
+        if response.status == 429:
+            retry = float(response.header("retry-after", "5") or 5)
+            self.pause_until = max(self.pause_until, now + retry)
+            self.remaining = 0
+            self.window_start = now + retry - self.window
+            return True
+        if limit is None or remaining is None:
+            return False
+        self.limit, remaining = int(limit), int(remaining)
+        if remaining == self.limit - 1 or self.remaining is None:
+            # First hit of a fresh window; the arrival time errs on the late side
+            self.window_start = now
+            self.remaining = remaining
+        else:
+            self.remaining = min(self.remaining, remaining)
+        return False
+
+
+def throttles(route):
+    """throttle:* middleware of a route_index route, outermost first."""
+    return [m for m in route["middleware"] if m.startswith("throttle:")]
+
+
+def pacer_for(spec):
+    # throttle:60,1 -> 60 per 1 minute; named limiters (throttle:api) are per minute here
+    parts = spec.split(":", 1)[1].split(",")
+    minutes = float(parts[1]) if len(parts) > 1 and parts[0].isdigit() else 1
+    return LimiterPacer(window=60 * minutes)
+
+
+def update_pacers(pacers, response):
+    """Feed a response to the pacers of a route's throttles. Returns True on 429."""
+    if not pacers:
+        return response.status == 429
+    if response.status != 429:
+        # Rate limit headers come from the outermost throttle middleware
+        return pacers[0].update(response)
+    # Only the limiter that refused the request is spent; X-RateLimit-Limit names it
+    limit = response.header("x-ratelimit-limit")
+    matching = [p for p in pacers if limit and p.limit == int(limit)] or pacers
+    for pacer in matching:
+        pacer.update(response)
+    return True
@@ -0,0 +1,942 @@
+#!/usr/bin/env python3
+"""
+Emulation Server
+Lightweight asyncio stand-in for the Laravel API and Reverb, so the harness's
+own engines, schedulers and analyzers can be validated and benchmarked without
+PHP, MySQL, Redis or Reverb - and without server cost mixed into the numbers.
+
+Emulated:
+  - The endpoints the suites use (/api/user, /api/login, /api/broadcasting/auth,
+    /api/dashboard, /api/chat, /api/tickets, /api/presence/*, /sanctum/csrf-cookie...)
+    with the seeded harness tokens and the SecurityHeaders middleware headers.
+  - Throttle windows: fixed per-minute windows like Laravel's limiters (api,
+    guest, login, sensitive, csrf, announcements), X-RateLimit-* headers, 429
+    with Retry-After, and the LoginRequest lockout after 5 failures per email|IP.
+  - Latency distributions per route (constant, uniform, exponential, lognormal).
+  - Memory-leak simulation: retain N bytes per request so RSS trend checks
+    (stability_memory.py, dashboards, regression gates) have something to find.
+  - Reverb: Pusher protocol handshake, signed private/presence subscriptions,
+    pings, and broadcasts for chat messages, ticket updates and comments.
+  - Queue: jobs pushed by ticket status changes (TicketNotification per
+    recipient) and chat sends (ProcessChatMessage on "chats"), drained by
+    --queue-workers consumers taking --job-time each, failing at --job-fail;
+    /api/maintenance/queue/{stats,pending,failed,completed,flush,retry/all}
+    answer in the QueueController/Horizon shapes. Announcements enqueue nothing.
+  - Cache: a TTL cache standing in for Cache::remember() in front of the app
+    settings (read on every API request, like AppSettingsService::applyToConfig()),
+    the dashboard, /api/holidays* and /api/maintenance/analytics/*; a miss costs
+    --cache-miss extra. /api/maintenance/cache/clear empties it and
+    /api/maintenance/system-info reports its hit/miss/key counters.
+  - The monitoring streams: SystemMetricsUpdated on system-metrics (host CPU and
+    memory every 5s) and CacheStatsUpdated on cache-stats (every 3s) with the
+    cache's hit and miss counters.
+
+With --workers N the API is served by N forked processes sharing the listening
+socket (SO_REUSEPORT-style accept balancing); broadcasts are relayed to the
+Reverb process. Throttle, lockout, cache and queue state is per worker; cache
+counters are summed for the cache-stats stream (system-info and cache/clear only
+see the worker that answers them).
+
+GET /__emulator/stats returns per-worker counters, leaked bytes and RSS.
+
+Usage:
+  python3 emulator_server.py [--workers 4] [--latency 2ms] [--latency '/api/dashboard*=lognormal:25,0.6']
+                             [--leak-bytes 4096] [--no-throttle] [--api-limit 160] [--no-monitor]
+                             [--queue-workers 2] [--job-time exp:20] [--job-fail 0.01] [--cache-miss 15ms]
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import re
+import signal
+import socket
+import sys
+import time
+import uuid
+from collections import defaultdict, deque
+from urllib.parse import parse_qsl, urlsplit
+
+from async_http import read_request, write_response
+from reverb_client import OP_CLOSE, OP_PING, OP_PONG, OP_TEXT, accept_websocket, encode_frame, read_frame
+
+# Configuration
+API_HOST = "127.0.0.1"
+API_PORT = 8000
+REVERB_PORT = 9000
+REVERB_APP_KEY = "worksphere-key"
+REVERB_APP_SECRET = "worksphere-secret"
+
+# Same seeded users/tokens the harness uses; the password matches the seeders
+USERS = [
+    {"id": 1, "public_id": "emu-admin", "name": "Admin", "email": "admin@example.com", "role": "admin",
+     "token": "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"},
+    {"id": 2, "public_id": "emu-member", "name": "Member", "email": "member@example.com", "role": "user",
+     "token": "2|cDRfKOIDQJGJR5ULTUsrmT8oPW3y88M4tWECa4HUef8ea5ef"},
+]
+PASSWORD = "password"
+
+# Test settings
+LIMITS = {"api": 160, "guest": 25, "login": 10, "sensitive": 10, "csrf": 10,   # Requests per window
+          "announcements": 10}
+WINDOW_SECONDS = 60
+LOGIN_MAX_ATTEMPTS = 5        # LoginRequest lockout per email|IP
+SECURITY_HEADERS = [
+    ("X-Content-Type-Options", "nosniff"),
+    ("X-Frame-Options", "SAMEORIGIN"),
+    ("X-XSS-Protection", "1; mode=block"),
+    ("Referrer-Policy", "strict-origin-when-cross-origin"),
+    ("Permissions-Policy", "geolocation=(), microphone=(), camera=()"),
+]
+CHATS = [{"public_id": "emu-dm-1", "type": "dm"}, {"public_id": "emu-group-1", "type": "group"}]
+TICKETS = [{"id": 1, "public_id": "emu-ticket-1", "title": "Emulated ticket", "status": "open"}]
+CACHE_TTL = 30                # Seconds the dashboard responses stay cached
+# Longer-lived keys, as in the services (AppSettingsService 1h, AnalyticsService 5-10min, HolidayService 30d)
+CACHE_TTLS = {"app_settings": 3600, "analytics": 300, "holidays": 30 * 86400}
+TICKET_RECIPIENTS = 2         # TicketNotification jobs per status change (reporter, assignee)
+RECENT_JOBS = 1000            # Horizon recent-jobs list kept for /queue/completed
+SYSTEM_METRICS_INTERVAL = 5   # monitor:stream
+CACHE_STATS_INTERVAL = 3      # maintenance:stream-cache-stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="asyncio stand-in for the API and Reverb")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--reverb-port", type=int, default=REVERB_PORT, help="0 disables the Reverb emulation")
+    parser.add_argument("--workers", type=int, default=1, help="Forked API worker processes")
+    parser.add_argument("--latency", action="append", default=[], metavar="[PATTERN=]SPEC",
+                        help="Latency for routes matching PATTERN (default all): 0, 5ms, uniform:1,5, "
+                             "exp:MEAN, lognormal:MEDIAN,SIGMA (milliseconds; repeatable, first match wins)")
+    parser.add_argument("--leak-bytes", type=int, default=0, help="Bytes retained per request")
+    parser.add_argument("--leak-paths", default="*", help="Only leak on paths matching this pattern")
+    parser.add_argument("--no-throttle", action="store_true", help="Disable all rate limiters")
+    parser.add_argument("--window", type=float, default=WINDOW_SECONDS, help="Throttle window in seconds")
+    for name, limit in LIMITS.items():
+        parser.add_argument(f"--{name}-limit", type=int, default=limit)
+    parser.add_argument("--no-monitor", action="store_true", help="Do not stream system/cache metrics")
+    parser.add_argument("--queue-workers", type=int, default=1, help="Concurrent queue consumers")
+    parser.add_argument("--job-time", default="20ms", metavar="SPEC", help="Time per job (latency spec)")
+    parser.add_argument("--job-fail", type=float, default=0.0, help="Fraction of jobs that fail")
+    parser.add_argument("--cache-miss", default="15ms", metavar="SPEC",
+                        help="Extra time of a cache miss, i.e. rebuilding the value (latency spec)")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+def parse_latency(spec):
+    """Return a function giving one delay in seconds for a latency spec (milliseconds)."""
+    kind, _, params = spec.strip().partition(":")
+    if not params:
+        value = float(kind[:-2] if kind.endswith("ms") else kind) / 1000
+        return lambda: value
+    values = [float(v) for v in params.split(",")]
+    if kind == "uniform":
+        low, high = values[0] / 1000, values[1] / 1000
+        return lambda: random.uniform(low, high)
+    if kind == "exp":
+        rate = 1000 / values[0]
+        return lambda: random.expovariate(rate)
+    if kind == "lognormal":
+        mu, sigma = math.log(values[0] / 1000), values[1]
+        return lambda: random.lognormvariate(mu, sigma)
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+def latency_rules(specs):
+    rules = []
+    for spec in specs:
+        pattern, _, distribution = spec.rpartition("=")
+        rules.append((pattern or "*", parse_latency(distribution)))
+    return rules
+
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class FixedWindow:
+    """Laravel-style fixed window limiter: `limit` hits per key per window."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.windows = {}
+
+    def hit(self, key):
+        """Count a hit; returns (allowed, remaining, retry_after seconds)."""
+        now = time.monotonic()
+        started, count = self.windows.get(key, (now, 0))
+        if now - started >= self.window:
+            started, count = now, 0
+        if count >= self.limit:
+            return False, 0, max(1, int(started + self.window - now + 0.999))
+        self.windows[key] = (started, count + 1)
+        return True, self.limit - count - 1, 0
+
+    def attempts(self, key):
+        started, count = self.windows.get(key, (0, 0))
+        return count if time.monotonic() - started < self.window else 0
+
+    def clear(self, key):
+        self.windows.pop(key, None)
+
+
+class Reply(Exception):
+    """Raised by handlers to short-circuit with an error response."""
+
+    def __init__(self, status, body, headers=()):
+        super().__init__(status)
+        self.status = status
+        self.body = body
+        self.headers = list(headers)
+
+
+def paginated(items, params):
+    per_page = int(params.get("per_page", 15) or 15)
+    return {"data": items[:per_page], "meta": {"current_page": 1, "per_page": per_page, "total": len(items)}}
+
+
+class JobQueue:
+    """Horizon stand-in: FIFO of pushed jobs drained by `workers` consumers."""
+
+    def __init__(self, workers, job_time, fail_ratio):
+        self.workers = workers
+        self.job_time = parse_latency(job_time)
+        self.fail_ratio = fail_ratio
+        self.pending = deque()
+        self.reserved = []
+        self.recent = deque(maxlen=RECENT_JOBS)   # newest first, every status (Horizon "recent")
+        self.failed = deque(maxlen=RECENT_JOBS)   # newest first
+        self._ready = None
+        self._tasks = []
+
+    def push(self, name, queue="default"):
+        if not self._tasks:
+            self._ready = asyncio.Event()
+            self._tasks = [asyncio.create_task(self.work()) for _ in range(max(1, self.workers))]
+        job_id = str(uuid.uuid4())
+        payload = {"uuid": job_id, "displayName": name, "pushedAt": f"{time.time():.4f}", "attempts": 0}
+        job = {"id": job_id, "connection": "redis", "queue": queue, "name": name, "status": "pending",
+               "payload": json.dumps(payload), "exception": None, "failed_at": None, "completed_at": None,
+               "reserved_at": None}
+        self.pending.append(job)
+        self.recent.appendleft(job)
+        self._ready.set()
+
+    async def work(self):
+        while True:
+            while not self.pending:
+                self._ready.clear()
+                await self._ready.wait()
+            job = self.pending.popleft()
+            job.update(status="reserved", reserved_at=f"{time.time():.4f}")
+            self.reserved.append(job)
+            await asyncio.sleep(self.job_time())
+            self.reserved.remove(job)
+            if random.random() < self.fail_ratio:
+                job.update(status="failed", failed_at=f"{time.time():.4f}", exception="RuntimeException: emulated")
+                self.failed.appendleft(job)
+            else:
+                job.update(status="completed", completed_at=f"{time.time():.4f}")
+
+    def size(self, queue=None):
+        """Waiting plus reserved jobs, like RedisQueue::size()."""
+        return sum(1 for job in list(self.pending) + self.reserved if queue is None or job["queue"] == queue)
+
+    def retry_failed(self):
+        for job in list(self.failed):
+            self.push(job["name"], job["queue"])
+        self.failed.clear()
+
+
+class Emulator:
+    """The API side. Broadcasts go through `publish(channel, event, data)`."""
+
+    def __init__(self, args, publish):
+        self.args = args
+        self.publish = publish
+        self.limiters = {name: FixedWindow(getattr(args, f"{name}_limit"), args.window) for name in LIMITS}
+        self.login_failures = FixedWindow(LOGIN_MAX_ATTEMPTS, args.window)
+        self.latency = latency_rules(args.latency)
+        self.tokens = {user["token"]: user for user in USERS}
+        self.emails = {user["email"]: user for user in USERS}
+        self.leaked = []
+        self.leaked_bytes = 0
+        self.cache = {}               # key -> (expires monotonic, value)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_miss = parse_latency(args.cache_miss)
+        self.jobs = JobQueue(args.queue_workers, args.job_time, args.job_fail)
+        self.announcements = {}
+        self.counts = defaultdict(int)
+        self.started = time.monotonic()
+        # (method, regex, handler, middleware) - checked in order
+        self.routes = [(method, re.compile(f"^{path}$"), handler, middleware)
+                       for method, path, handler, middleware in self.route_table()]
+
+    def route_table(self):
+        return [
+            ("GET", "/api/auth/config", self.auth_config, ("guest",)),
+            ("POST", "/api/login", self.login, ("guest", "login")),
+            ("POST", "/api/register", self.validation_error, ("guest", "sensitive")),
+            ("POST", "/api/forgot-password", self.validation_error, ("guest", "sensitive")),
+            ("GET", "/sanctum/csrf-cookie", self.csrf_cookie, ("web", "csrf")),
+            ("GET", "/api/user", self.user, ("auth",)),
+            ("POST", "/api/logout", self.ok, ("auth",)),
+            ("POST", "/api/broadcasting/auth", self.broadcasting_auth, ("auth",)),
+            ("GET", "/api/dashboard", self.dashboard, ("auth",)),
+            ("GET", "/api/dashboard/stats", self.dashboard_stats, ("auth",)),
+            ("GET", "/api/chat", self.chats, ("auth",)),
+            ("POST", r"/api/chat/(?P<chat>[^/]+)/send", self.chat_send, ("auth",)),
+            ("POST", r"/api/chat/(?P<chat>[^/]+)/heartbeat", self.ok, ("auth",)),
+            ("GET", "/api/tickets", self.tickets, ("auth",)),
+            ("GET", r"/api/tickets/(?P<ticket>[^/]+)", self.ticket, ("auth",)),
+            ("PUT", r"/api/tickets/(?P<ticket>[^/]+)", self.ticket_update, ("auth",)),
+            ("PUT", r"/api/tickets/(?P<ticket>[^/]+)/status", self.ticket_status, ("auth",)),
+            ("POST", r"/api/tickets/(?P<ticket>[^/]+)/comments", self.ticket_comment, ("auth",)),
+            ("POST", "/api/presence/(?P<action>connect|heartbeat|offline)", self.presence, ("auth",)),
+            ("GET", "/api/(notifications|projects|announcements/active|users|teams|search)", self.empty_list,
+             ("auth",)),
+            ("POST", "/api/admin/announcements", self.announcement_create, ("auth", "admin", "announcements")),
+            ("DELETE", r"/api/admin/announcements/(?P<announcement>\d+)", self.announcement_delete,
+             ("auth", "admin")),
+            ("GET", "/api/holidays", self.holidays, ("auth",)),
+            ("GET", "/api/holidays/countries", self.holiday_countries, ("auth",)),
+            ("GET", "/api/maintenance/analytics/(?P<report>overview|chart|pages|sources)", self.analytics,
+             ("auth", "admin")),
+            ("GET", "/api/maintenance/system-info", self.system_info, ("auth", "admin")),
+            ("POST", "/api/maintenance/cache/clear", self.cache_clear, ("auth", "admin")),
+            ("GET", "/api/maintenance/queue/stats", self.queue_stats, ("auth", "admin")),
+            ("GET", "/api/maintenance/queue/pending", self.queue_pending, ("auth", "admin")),
+            ("GET", "/api/maintenance/queue/failed", self.queue_failed, ("auth", "admin")),
+            ("GET", "/api/maintenance/queue/completed", self.queue_completed, ("auth", "admin")),
+            ("POST", "/api/maintenance/queue/flush", self.queue_flush, ("auth", "admin")),
+            ("POST", "/api/maintenance/queue/retry/all", self.queue_retry_all, ("auth", "admin")),
+            ("GET", "/__emulator/stats", self.stats, ()),
+        ]
+
+    # --- Middleware ---------------------------------------------------------
+
+    def authenticate(self, headers):
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        user = self.tokens.get(token) if scheme.lower() == "bearer" else None
+        if user is None:
+            raise Reply(401, {"message": "Unauthenticated."})
+        return user
+
+    def throttle(self, name, key, headers_out):
+        if self.args.no_throttle:
+            return
+        limiter = self.limiters[name]
+        allowed, remaining, retry_after = limiter.hit(key)
+        headers_out += [("X-RateLimit-Limit", str(limiter.limit)), ("X-RateLimit-Remaining", str(remaining))]
+        if not allowed:
+            raise Reply(429, {"message": "Too Many Attempts."},
+                        headers_out + [("Retry-After", str(retry_after))])
+
+    async def dispatch(self, method, target, headers, body, peer):
+        """Return (status, reason, headers, body bytes) for one request."""
+        parts = urlsplit(target)
+        path = parts.path.rstrip("/") or "/"
+        self.counts[f"{method} {path}"] += 1
+        response_headers = list(SECURITY_HEADERS)
+        for pattern, delay in self.latency:
+            if fnmatch.fnmatchcase(path, pattern):
+                seconds = delay()
+                if seconds > 0:
+                    await asyncio.sleep(seconds)
+                break
+        if self.args.leak_bytes and fnmatch.fnmatchcase(path, self.args.leak_paths):
+            self.leaked.append(bytearray(self.args.leak_bytes))
+            self.leaked_bytes += self.args.leak_bytes
+
+        try:
+            handler, middleware, match, allowed = None, (), None, []
+            for route_method, regex, route_handler, route_middleware in self.routes:
+                found = regex.match(path)
+                if found:
+                    allowed.append(route_method)
+                    if route_method == method:
+                        handler, middleware, match = route_handler, route_middleware, found
+                        break
+            if handler is None:
+                if allowed:
+                    raise Reply(405, {"message": f"The {method} method is not supported for route {path}."})
+                raise Reply(404, {"message": f"The route {path.lstrip('/')} could not be found."})
+
+            if path.startswith("/api/"):
+                # AppServiceProvider::boot() applies the cached settings on every request
+                await self.remember("app_settings", lambda: {"app_name": "WorkSphere"}, CACHE_TTLS["app_settings"])
+            user = None
+            if "auth" in middleware:
+                user = self.authenticate(headers)
+                self.throttle("api", f"user:{user['id']}", response_headers)
+            elif "guest" in middleware:
+                self.throttle("guest", f"ip:{peer}", response_headers)
+            for name in ("sensitive", "login", "csrf"):
+                if name in middleware:
+                    self.throttle(name, f"ip:{peer}", response_headers)
+            if "announcements" in middleware:
+                self.throttle("announcements", f"user:{user['id']}", response_headers)
+            if "admin" in middleware and user["role"] != "admin":
+                raise Reply(403, {"message": "User does not have the right permissions."})
+
+            request = {"method": method, "path": path, "params": dict(parse_qsl(parts.query)),
+                       "headers": headers, "body": body, "peer": peer, "user": user,
+                       "match": match.groupdict()}
+            status, payload = await handler(request)
+        except Reply as reply:
+            status, payload = reply.status, reply.body
+            response_headers = reply.headers or response_headers
+        if isinstance(payload, bytes):
+            return status, response_headers, payload
+        response_headers.append(("Content-Type", "application/json"))
+        return status, response_headers, json.dumps(payload, separators=(",", ":")).encode()
+
+    # --- Handlers -----------------------------------------------------------
+
+    @staticmethod
+    def json_body(request):
+        try:
+            return json.loads(request["body"] or b"{}")
+        except ValueError:
+            raise Reply(400, {"message": "Malformed JSON."})
+
+    async def ok(self, request):
+        return 200, {"success": True}
+
+    async def validation_error(self, request):
+        return 422, {"message": "The given data was invalid.", "errors": {"email": ["The email field is required."]}}
+
+    async def auth_config(self, request):
+        return 200, {"data": {"registration_enabled": True, "social_providers": [], "two_factor_enforced": False}}
+
+    async def csrf_cookie(self, request):
+        return 204, b""
+
+    async def login(self, request):
+        body = self.json_body(request)
+        email, password = str(body.get("email", "")), str(body.get("password", ""))
+        key = f"{email.lower()}|{request['peer']}"
+        if self.login_failures.attempts(key) >= LOGIN_MAX_ATTEMPTS:
+            raise Reply(422, {"message": "Too many login attempts. Please try again in 60 seconds.",
+                              "errors": {"email": ["Too many login attempts. Please try again in 60 seconds."]}})
+        user = self.emails.get(email)
+        if user is None or password != PASSWORD:
+            self.login_failures.hit(key)
+            raise Reply(422, {"message": "auth.failed", "errors": {"email": ["auth.failed"]}})
+        self.login_failures.clear(key)
+        return 200, {"user": self.public(user), "token": user["token"]}
+
+    @staticmethod
+    def public(user):
+        return {k: v for k, v in user.items() if k != "token"}
+
+    async def user(self, request):
+        return 200, {"data": self.public(request["user"])}
+
+    async def broadcasting_auth(self, request):
+        body = self.json_body(request) if request["body"][:1] == b"{" else dict(
+            parse_qsl(request["body"].decode("latin-1")))
+        socket_id, channel = body.get("socket_id", ""), body.get("channel_name", "")
+        if not socket_id or not channel.startswith(("private-", "presence-")):
+            raise Reply(403, {"message": "Forbidden"})
+        subject = f"{socket_id}:{channel}"
+        result = {}
+        if channel.startswith("presence-"):
+            user = request["user"]
+            result["channel_data"] = json.dumps({"user_id": user["id"], "user_info": {"name": user["name"]}})
+            subject += f":{result['channel_data']}"
+        result["auth"] = f"{REVERB_APP_KEY}:{sign(subject)}"
+        return 200, result
+
+    async def remember(self, key, build, ttl=CACHE_TTL):
+        now = time.monotonic()
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] > now:
+            self.cache_hits += 1
+            return entry[1]
+        self.cache_misses += 1
+        seconds = self.cache_miss()
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+        value = build()
+        self.cache[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def cache_stats(self):
+        now = time.monotonic()
+        return self.cache_hits, self.cache_misses, sum(1 for expires, _ in self.cache.values() if expires > now)
+
+    async def dashboard(self, request):
+        return 200, await self.remember(f"dashboard:{request['user']['id']}", lambda: {
+            "data": {"stats": {"projects": 3, "tasks": 12, "tickets": len(TICKETS)},
+                     "recent_activity": [], "announcements": []}})
+
+    async def dashboard_stats(self, request):
+        return 200, await self.remember(f"dashboard-stats:{request['user']['id']}", lambda: {
+            "data": {"projects": 3, "tasks": 12, "open_tickets": len(TICKETS)}})
+
+    async def chats(self, request):
+        return 200, paginated(CHATS, request["params"])
+
+    async def chat_send(self, request):
+        chat = next((c for c in CHATS if c["public_id"] == request["match"]["chat"]), None)
+        if chat is None:
+            raise Reply(404, {"message": "Chat not found."})
+        body = self.json_body(request)
+        message = {"public_id": uuid.uuid4().hex, "content": body.get("content", ""), "temp_id": body.get("temp_id"),
+                   "user_public_id": request["user"]["public_id"], "created_at": time.time()}
+        prefix = "dm" if chat["type"] == "dm" else "group"
+        self.publish(f"private-{prefix}.{chat['public_id']}", "MessageCreated", {"message": message})
+        self.jobs.push("App\\Jobs\\ProcessChatMessage", "chats")
+        return 201, {"data": message}
+
+    async def tickets(self, request):
+        return 200, paginated(TICKETS, request["params"])
+
+    def find_ticket(self, request):
+        ticket = next((t for t in TICKETS if t["public_id"] == request["match"]["ticket"]), None)
+        if ticket is None:
+            raise Reply(404, {"message": "Ticket not found."})
+        return ticket
+
+    async def ticket(self, request):
+        return 200, {"data": self.find_ticket(request)}
+
+    async def ticket_update(self, request):
+        ticket = dict(self.find_ticket(request))
+        ticket.update({k: v for k, v in self.json_body(request).items() if k in ("title", "status")})
+        self.publish(f"private-tickets.{ticket['public_id']}", "ticket.updated", ticket)
+        return 200, {"data": ticket}
+
+    async def ticket_status(self, request):
+        ticket = self.find_ticket(request)
+        status = self.json_body(request).get("status")
+        if status not in ("open", "in_progress", "resolved", "closed"):
+            raise Reply(422, {"message": "The selected status is invalid.", "errors": {"status": ["invalid"]}})
+        ticket["status"] = status
+        self.publish(f"private-tickets.{ticket['public_id']}", "ticket.updated", ticket)
+        for _ in range(TICKET_RECIPIENTS):
+            self.jobs.push("App\\Notifications\\TicketNotification")
+        return 200, {"message": "Ticket status updated successfully.", "data": ticket}
+
+    async def ticket_comment(self, request):
+        ticket = self.find_ticket(request)
+        comment = {"id": uuid.uuid4().hex, "content": self.json_body(request).get("content", "")}
+        self.publish(f"private-tickets.{ticket['public_id']}", "comment.added", {"comment": comment})
+        return 201, {"data": comment}
+
+    async def presence(self, request):
+        status = "offline" if request["match"]["action"] == "offline" else "online"
+        self.publish("presence-online-users", "presence.changed",
+                     {"user_public_id": request["user"]["public_id"], "status": status})
+        return 200, {"success": True}
+
+    async def empty_list(self, request):
+        return 200, paginated([], request["params"])
+
+    async def announcement_create(self, request):
+        body = self.json_body(request)
+        missing = [field for field in ("title", "message", "type") if not body.get(field)]
+        if missing:
+            raise Reply(422, {"message": "The given data was invalid.", "errors": {f: ["required"] for f in missing}})
+        announcement = dict(body, id=len(self.announcements) + 1, created_by=request["user"]["id"])
+        self.announcements[announcement["id"]] = announcement
+        return 201, {"message": "Announcement created successfully.", "data": announcement}
+
+    async def announcement_delete(self, request):
+        if self.announcements.pop(int(request["match"]["announcement"]), None) is None:
+            raise Reply(404, {"message": "Not found."})
+        return 200, {"message": "Announcement deleted successfully."}
+
+    def queue_summary(self):
+        # Like QueueController: pending counts the default queue only
+        return {"failed": len(self.jobs.failed), "pending": self.jobs.size("default"), "connection": "redis",
+                "queue": "default"}
+
+    async def holidays(self, request):
+        params = request["params"]
+        country, start, end = params.get("country", ""), params.get("start", ""), params.get("end", "")
+        if len(country) != 2 or not start[:4].isdigit() or not end[:4].isdigit():
+            raise Reply(422, {"message": "The country, start and end fields are required.",
+                              "errors": {"country": ["The country field is required."]}})
+        holidays = []
+        for year in range(int(start[:4]), int(end[:4]) + 1):
+            holidays += await self.remember(f"holidays_{country.upper()}_{year}", lambda year=year: [
+                {"date": f"{year}-01-01", "name": "New Year's Day"}, {"date": f"{year}-12-25", "name": "Christmas"}],
+                CACHE_TTLS["holidays"])
+        return 200, {"success": True, "data": [h for h in holidays if start <= h["date"] <= end]}
+
+    async def holiday_countries(self, request):
+        return 200, {"success": True, "data": await self.remember("holiday_countries", lambda: [
+            {"code": "US", "name": "United States"}, {"code": "GB", "name": "United Kingdom"}], CACHE_TTLS["holidays"])}
+
+    async def analytics(self, request):
+        report, period = request["match"]["report"], request["params"].get("period", "7d")
+        return 200, {"data": await self.remember(f"analytics_{report}_{period}", lambda: {
+            "period": period, "page_views": 1200, "unique_visitors": 310}, CACHE_TTLS["analytics"])}
+
+    async def system_info(self, request):
+        hits, misses, keys = self.cache_stats()
+        return 200, {"data": {"cache_driver": "Emulator", "cache_status": "Connected", "cache_keys": keys,
+                              "cache_memory_used": f"{len(json.dumps([v for _, v in self.cache.values()]))} B",
+                              "cache_hits": f"{hits:,}", "cache_misses": f"{misses:,}",
+                              "reverb_connections": 0, "health": {"status": "healthy"}}}
+
+    async def cache_clear(self, request):
+        self.cache.clear()
+        return 200, {"success": True, "message": "Application cache cleared successfully"}
+
+    async def queue_stats(self, request):
+        return 200, {"success": True, "data": self.queue_summary()}
+
+    async def queue_pending(self, request):
+        per_page = int(request["params"].get("per_page", 10) or 10)
+        page = int(request["params"].get("page", 1) or 1)
+        jobs = [{"id": job["id"], "queue": job["queue"], "command": job["name"], "attempts": 0,
+                 "available_at": "Now", "created_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+                for job in list(self.jobs.pending)[(page - 1) * per_page:page * per_page]]
+        total = self.jobs.size()
+        return 200, {"success": True, "data": {"current_page": page, "data": jobs, "total": total,
+                                               "last_page": max(1, math.ceil(total / per_page))}}
+
+    async def queue_failed(self, request):
+        jobs = [{"id": job["id"], "uuid": job["id"], "connection": job["connection"], "queue": job["queue"],
+                 "payload": {"displayName": job["name"]}, "exception": job["exception"],
+                 "failed_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(float(job["failed_at"])))}
+                for job in list(self.jobs.failed)[:50]]
+        return 200, {"success": True, "data": {"current_page": 1, "data": jobs, "total": len(jobs), "last_page": 1}}
+
+    async def queue_completed(self, request):
+        # QueueController::completed maps Horizon's recent jobs to these six fields only
+        limit = int(request["params"].get("limit", 50) or 50)
+        jobs = []
+        for job in list(self.jobs.recent)[:min(limit, 50)]:
+            runtime = "N/A"
+            if job["completed_at"] and job["reserved_at"]:
+                runtime = f"{(float(job['completed_at']) - float(job['reserved_at'])) * 1000:,.2f}ms"
+            jobs.append({"id": job["id"], "name": job["name"], "queue": job["queue"], "status": job["status"],
+                         "completed_at": job["completed_at"], "runtime": runtime})
+        return 200, {"success": True, "data": jobs}
+
+    async def queue_flush(self, request):
+        self.jobs.failed.clear()
+        self.publish("queue-stats", "App\\Events\\QueueStatsUpdated", {"stats": self.queue_summary()})
+        return 200, {"success": True, "message": "All failed jobs flushed"}
+
+    async def queue_retry_all(self, request):
+        self.jobs.retry_failed()
+        self.publish("queue-stats", "App\\Events\\QueueStatsUpdated", {"stats": self.queue_summary()})
+        return 200, {"success": True, "message": "All failed jobs retry initiated"}
+
+    async def stats(self, request):
+        return 200, {"pid": os.getpid(), "uptime_seconds": round(time.monotonic() - self.started, 1),
+                     "requests": sum(self.counts.values()), "leaked_bytes": self.leaked_bytes,
+                     "rss_kb": rss_kb(), "routes": dict(self.counts)}
+
+    # --- Connection ---------------------------------------------------------
+
+    async def handle(self, reader, writer):
+        peer = (writer.get_extra_info("peername") or ("unknown",))[0]
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, _, _, headers, body = request
+                status, response_headers, payload = await self.dispatch(method, target, headers, body, peer)
+                write_response(writer, status, REASONS.get(status, "OK"), response_headers, payload)
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 401: "Unauthorized",
+           403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 422: "Unprocessable Content",
+           429: "Too Many Requests"}
+
+
+def sign(subject):
+    return hmac.new(REVERB_APP_SECRET.encode(), subject.encode(), hashlib.sha256).hexdigest()
+
+
+class Reverb:
+    """Pusher-protocol side: subscriptions per channel and broadcast fan-out."""
+
+    def __init__(self):
+        self.channels = defaultdict(set)
+        self.connections = 0
+
+    def publish(self, channel, event, data):
+        frame = encode_frame(OP_TEXT, json.dumps({"event": event, "channel": channel,
+                                                   "data": json.dumps(data)}).encode(), mask=False)
+        for writer in list(self.channels.get(channel, ())):
+            if writer.is_closing():
+                self.channels[channel].discard(writer)
+            else:
+                writer.write(frame)
+
+    def send(self, writer, message):
+        writer.write(encode_frame(OP_TEXT, json.dumps(message).encode(), mask=False))
+
+    async def handle(self, reader, writer):
+        request = await read_request(reader)
+        if request is None or not request[1].startswith(f"/app/{REVERB_APP_KEY}"):
+            writer.close()
+            return
+        accept_websocket(writer, request[4])
+        socket_id = f"{random.randint(1, 10 ** 9)}.{random.randint(1, 10 ** 9)}"
+        self.send(writer, {"event": "pusher:connection_established",
+                           "data": json.dumps({"socket_id": socket_id, "activity_timeout": 30})})
+        self.connections += 1
+        subscribed = set()
+        try:
+            while True:
+                _, opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    writer.write(encode_frame(OP_CLOSE, payload, mask=False))
+                    break
+                if opcode == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload, mask=False))
+                    continue
+                self.on_message(writer, socket_id, json.loads(payload), subscribed)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            for channel in subscribed:
+                self.channels[channel].discard(writer)
+            writer.close()
+
+    def on_message(self, writer, socket_id, message, subscribed):
+        event, data = message.get("event"), message.get("data") or {}
+        if event == "pusher:ping":
+            self.send(writer, {"event": "pusher:pong", "data": {}})
+        elif event == "pusher:subscribe":
+            channel = data.get("channel", "")
+            if channel.startswith(("private-", "presence-")):
+                subject = f"{socket_id}:{channel}" + (f":{data['channel_data']}" if data.get("channel_data") else "")
+                if data.get("auth") != f"{REVERB_APP_KEY}:{sign(subject)}":
+                    self.send(writer, {"event": "pusher:subscription_error", "channel": channel,
+                                       "data": {"type": "AuthError", "error": "Invalid signature", "status": 401}})
+                    return
+            self.channels[channel].add(writer)
+            subscribed.add(channel)
+            self.send(writer, {"event": "pusher_internal:subscription_succeeded", "channel": channel,
+                               "data": "{}"})
+        elif event == "pusher:unsubscribe":
+            channel = data.get("channel", "")
+            self.channels[channel].discard(writer)
+            subscribed.discard(channel)
+
+
+class Monitor:
+    """The scheduled stream commands: system metrics and cache stats broadcasts."""
+
+    CACHE_CHANNEL = "__emulator.cache"   # Relay channel for worker cache counters
+
+    def __init__(self, reverb):
+        self.reverb = reverb
+        self.local = None                # Emulator of this process, if it serves the API
+        self.workers = {}                # pid -> (hits, misses, keys)
+        self._cpu = None
+
+    def cpu_percent(self):
+        try:
+            with open("/proc/stat") as f:
+                fields = [int(v) for v in f.readline().split()[1:9]]
+        except (OSError, ValueError):
+            return 0
+        total, idle = sum(fields), fields[3] + fields[4]
+        previous, self._cpu = self._cpu, (total, idle)
+        if previous is None or total <= previous[0]:
+            return 0
+        return round(100 * (1 - (idle - previous[1]) / (total - previous[0])))
+
+    @staticmethod
+    def memory():
+        info = {}
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    info[name] = int(value.split()[0]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        total = info.get("MemTotal", 0)
+        used = total - info.get("MemAvailable", 0)
+        return {"used": f"{used / 1073741824:.2f} GB", "total": f"{total / 1073741824:.2f} GB",
+                "percent": round(used / total * 100) if total else 0, "raw_used": used}
+
+    def cache_stats(self):
+        counters = list(self.workers.values()) + ([self.local.cache_stats()] if self.local else [])
+        hits, misses, keys = (sum(c[i] for c in counters) for i in range(3))
+        return {"cache_driver": "emulator", "cache_status": "connected", "cache_keys": keys,
+                "cache_memory_used": "0 B", "cache_memory_peak": "0 B", "cache_memory_limit": "Unlimited",
+                "cache_hits": f"{hits:,}", "cache_misses": f"{misses:,}",
+                "reverb_connections": self.reverb.connections}
+
+    async def run(self):
+        self.cpu_percent()
+        tick = 0
+        while True:
+            await asyncio.sleep(1)
+            tick += 1
+            if tick % SYSTEM_METRICS_INTERVAL == 0:
+                self.reverb.publish("system-metrics", "App\\Events\\SystemMetricsUpdated", {"metrics": {
+                    "cpu_load": self.cpu_percent(), "cpu_cores": [], "memory": self.memory(),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")}})
+            if tick % CACHE_STATS_INTERVAL == 0:
+                self.reverb.publish("cache-stats", "App\\Events\\CacheStatsUpdated", {"stats": self.cache_stats()})
+
+
+def listen(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(4096)
+    sock.setblocking(False)
+    return sock
+
+
+async def wait_for_signal():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+
+async def run_worker(args, api_sock, relay):
+    """Forked API worker: broadcasts are written to `relay` as JSON lines."""
+    _, relay_writer = await asyncio.open_connection(sock=relay)
+
+    def publish(channel, event, data):
+        relay_writer.write(json.dumps([channel, event, data]).encode() + b"\n")
+
+    async def report_cache():
+        while True:
+            await asyncio.sleep(1)
+            publish(Monitor.CACHE_CHANNEL, os.getpid(), emulator.cache_stats())
+
+    emulator = Emulator(args, publish)
+    server = await asyncio.start_server(emulator.handle, sock=api_sock, limit=1 << 20)
+    reporter = asyncio.create_task(report_cache())
+    await wait_for_signal()
+    reporter.cancel()
+    server.close()
+
+
+async def run_main(args, api_sock, relays):
+    reverb = Reverb()
+    monitor = Monitor(reverb)
+    servers = []
+    if api_sock is not None:
+        monitor.local = Emulator(args, reverb.publish)
+        servers.append(await asyncio.start_server(monitor.local.handle, sock=api_sock, limit=1 << 20))
+    if args.reverb_port:
+        servers.append(await asyncio.start_server(reverb.handle, args.host, args.reverb_port))
+
+    async def relay_broadcasts(sock):
+        reader, _ = await asyncio.open_connection(sock=sock)
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            channel, event, data = json.loads(line)
+            if channel == Monitor.CACHE_CHANNEL:
+                monitor.workers[event] = data
+            else:
+                reverb.publish(channel, event, data)
+
+    relay_tasks = [asyncio.create_task(relay_broadcasts(sock)) for sock in relays]
+    if args.reverb_port and not args.no_monitor:
+        relay_tasks.append(asyncio.create_task(monitor.run()))
+    await wait_for_signal()
+    for task in relay_tasks:
+        task.cancel()
+    for server in servers:
+        server.close()
+
+
+def main():
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    latency_rules(args.latency)  # fail fast on bad specs
+    parse_latency(args.job_time)
+    parse_latency(args.cache_miss)
+
+    print("=" * 60)
+    print("Emulation Server")
+    print("=" * 60)
+    print(f"\nAPI:     http://{args.host}:{args.port} ({args.workers} worker{'s' if args.workers != 1 else ''})")
+    print(f"Reverb:  {f'ws://{args.host}:{args.reverb_port}' if args.reverb_port else 'disabled'}")
+    print(f"Latency: {', '.join(args.latency) or 'none'}")
+    if args.no_throttle:
+        print("Throttle: off")
+    else:
+        limits = ", ".join(f"{name} {getattr(args, name + '_limit')}" for name in LIMITS)
+        print(f"Throttle: {limits} per {args.window:g}s")
+    if args.leak_bytes:
+        print(f"Leak:    {args.leak_bytes} bytes/request on {args.leak_paths}")
+    print(f"Queue:   {args.queue_workers} consumer{'s' if args.queue_workers != 1 else ''}, "
+          f"{args.job_time} per job, {args.job_fail * 100:g}% failing")
+    print(f"Cache:   {args.cache_miss} per miss, dashboard entries live {CACHE_TTL}s")
+    if args.reverb_port and not args.no_monitor:
+        print(f"Monitor: system-metrics every {SYSTEM_METRICS_INTERVAL}s, cache-stats every {CACHE_STATS_INTERVAL}s")
+    print("\nPress Ctrl+C to stop")
+
+    api_sock = listen(args.host, args.port)
+    if args.workers <= 1:
+        asyncio.run(run_main(args, api_sock, []))
+        return
+
+    children, relays = [], []
+    for _ in range(args.workers):
+        parent_end, child_end = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            parent_end.close()
+            for other in relays:
+                other.close()
+            if args.seed is not None:
+                random.seed(args.seed + len(children) + 1)
+            asyncio.run(run_worker(args, api_sock, child_end))
+            os._exit(0)
+        child_end.close()
+        children.append(pid)
+        relays.append(parent_end)
+    api_sock.close()
+    try:
+        asyncio.run(run_main(args, None, relays))
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Concurrent Parameter Fuzzer
+Sweeps every query, body and file parameter in the route index with payloads
+from the shared corpus (SQLi, XSS, traversal for fields, polyglots for file
+inputs) at high concurrency, and flags anomalies against per-endpoint
+baselines:
+
+  server_error  5xx where the baseline was not
+  status        unexpected status change (not validation/auth/throttle)
+  size          response size far outside the baseline distribution
+  timing        latency far above baseline, confirmed by a re-send
+  reflected     payload echoed back unescaped (high severity for HTML)
+
+Baselines (benign requests per endpoint) are cached in the temp directory
+(HARNESS_FUZZ_BASELINES overrides the path).
+Findings are merged by signature (kind, endpoint, parameter, category, status)
+so a full sweep reports each distinct issue once with a hit count.
+
+Destructive routes (DELETE, logout, password, 2FA, maintenance, tokens...) are
+skipped unless --include-destructive is given. Point it at a disposable
+environment: it creates records through every POST route it fuzzes.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError
+from identities import auth_headers, load_identities
+from multipart_stream import MemoryFile, MultipartStream
+from payload_corpus import DEFAULT_PATH as CORPUS_PATH, open_corpus
+from perf_stats import raise_fd_limit
+from route_index import EXCLUDE, PathResolver, benign_value, fill_path, filter_routes, load_routes
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+TOKEN = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"
+BASELINE_PATH = (os.environ.get("HARNESS_FUZZ_BASELINES")
+                 or os.path.join(tempfile.gettempdir(), "harness-fuzz-baselines.json"))
+
+# Test settings
+CONCURRENCY = 64
+PAYLOADS_PER_PARAM = 100      # Sampled from the corpus per parameter
+BASELINE_SAMPLES = 5
+BASELINE_CONCURRENCY = 8
+BASELINE_TTL = 24 * 3600      # Reuse cached baselines for a day
+FIELD_CATEGORIES = ["sqli", "xss", "traversal"]
+FILE_CATEGORIES = ["polyglot"]
+EXPECTED_STATUSES = {400, 401, 403, 404, 405, 409, 413, 415, 419, 422, 429}
+SIZE_SIGMA = 6                # Size outlier: this many std devs from the baseline mean...
+SIZE_MIN_DELTA = 512          # ...and at least this many bytes / 50% different
+TIMING_FACTOR = 5             # Timing outlier: above median + factor * spread...
+TIMING_MIN_MS = 1500          # ...and at least this slow (catches SLEEP(2) style payloads)
+MAX_EXAMPLES = 3
+MAX_RETRY_AFTER = 60
+SEVERITY = {"server_error": "high", "timing": "high", "status": "medium", "size": "medium", "reflected": "low"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent parameter fuzzer")
+    parser.add_argument("--grep", help="Regex on route uri")
+    parser.add_argument("--method", action="append", help="Only these HTTP methods")
+    parser.add_argument("--payloads", type=int, default=PAYLOADS_PER_PARAM, help="Payloads per parameter")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--token", default=TOKEN)
+    parser.add_argument("--tokens-file", help="Use the first identity from this file")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="Path parameter value, e.g. chat=01HX... (repeatable)")
+    parser.add_argument("--rebaseline", action="store_true", help="Ignore cached baselines")
+    parser.add_argument("--include-destructive", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+class Baselines:
+    """Per-endpoint benign response statistics, cached on disk."""
+
+    def __init__(self, path, identity, refresh=False):
+        self.path = path
+        self.identity = identity
+        self.data, self.others = {}, {}
+        try:
+            with open(path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+        now = time.time()
+        for key, value in cached.items():
+            if not key.startswith(identity + " "):
+                self.others[key] = value
+            elif not refresh and now - value["at"] < BASELINE_TTL:
+                self.data[key] = value
+
+    def key(self, route):
+        return f"{self.identity} {route['method']} {route['uri']}"
+
+    def get(self, route):
+        return self.data.get(self.key(route))
+
+    def record(self, route, responses):
+        statuses = [r.status for r in responses]
+        sizes = [len(r.body) for r in responses]
+        latencies = [r.elapsed * 1000 for r in responses]
+        median = statistics.median(latencies)
+        self.data[self.key(route)] = {
+            "at": time.time(),
+            "status": max(set(statuses), key=statuses.count),
+            "statuses": sorted(set(statuses)),
+            "size_mean": statistics.fmean(sizes),
+            "size_std": statistics.pstdev(sizes),
+            "latency_median": median,
+            "latency_spread": statistics.median(abs(l - median) for l in latencies) or median * 0.1,
+        }
+        return self.data[self.key(route)]
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump({**self.others, **self.data}, f, indent=1)
+
+
+class Findings:
+    def __init__(self):
+        self.merged = {}
+
+    def add(self, kind, route, param, category, mutator, status, payload, detail, severity=None):
+        signature = f"{kind}|{route['method']} {route['uri']}|{param}|{category}|{status}"
+        finding = self.merged.get(signature)
+        if finding is None:
+            finding = self.merged[signature] = {
+                "signature": signature, "kind": kind, "severity": severity or SEVERITY[kind],
+                "method": route["method"], "uri": route["uri"], "param": param,
+                "category": category, "status": status, "hits": 0,
+                "mutators": set(), "examples": [], "detail": detail,
+            }
+        finding["hits"] += 1
+        finding["mutators"].add(mutator)
+        if len(finding["examples"]) < MAX_EXAMPLES:
+            finding["examples"].append(payload[:300])
+
+    def as_list(self):
+        order = {"high": 0, "medium": 1, "low": 2}
+        items = sorted(self.merged.values(), key=lambda f: (order[f["severity"]], -f["hits"]))
+        return [{**f, "mutators": sorted(f["mutators"])} for f in items]
+
+
+def reflected(payload, body, content_type):
+    """Payload echoed back verbatim (HTML) or only JSON-escaped (JSON)."""
+    if len(payload) < 6 or not any(c in payload for c in "<>\"'"):
+        return None
+    text = body.decode("utf-8", errors="replace")
+    if payload in text:
+        return "html" if "html" in content_type else "raw"
+    escaped = json.dumps(payload)[1:-1]
+    if escaped in text or escaped.replace("/", "\\/") in text:
+        return "json"
+    return None
+
+
+def timing_threshold(base):
+    return max(TIMING_MIN_MS, base["latency_median"] + TIMING_FACTOR * base["latency_spread"])
+
+
+class Fuzzer:
+    def __init__(self, http, corpus, baselines, args):
+        self.http = http
+        self.corpus = corpus
+        self.baselines = baselines
+        self.args = args
+        self.findings = Findings()
+        self.requests = 0
+        self.statuses = defaultdict(int)
+        self.throttled = 0
+        self.pause_until = 0.0
+        self.per_endpoint = defaultdict(int)
+
+    async def send(self, route, path, param=None, value=None, filename=None):
+        """Send one request with `param` set to `value` (others benign). Waits out 429s once."""
+        query, body, files = {}, {}, []
+        for p in route["params"]:
+            is_target = p["name"] == (param and param["name"])
+            if p["location"] == "file":
+                if is_target:
+                    files.append((p["name"], MemoryFile(filename, value, "application/octet-stream")))
+                continue
+            target = query if p["location"] == "query" else body
+            target[p["name"]] = value if is_target else benign_value(p)
+
+        for _ in range(2):
+            wait = self.pause_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if files:
+                response = await self.http.request(
+                    route["method"], path, params=query,
+                    data=MultipartStream(fields={k: int(v) if isinstance(v, bool) else v
+                                                 for k, v in body.items() if not isinstance(v, list)},
+                                         files=files))
+            else:
+                response = await self.http.request(route["method"], path, params=query,
+                                                   json=body if route["method"] not in ("GET", "DELETE") else None)
+            self.requests += 1
+            self.statuses[response.status] += 1
+            if response.status != 429:
+                return response
+            self.throttled += 1
+            retry = min(MAX_RETRY_AFTER, int(response.header("retry-after", "5") or 5))
+            self.pause_until = max(self.pause_until, time.monotonic() + retry)
+        return response
+
+    async def baseline(self, route, path):
+        cached = self.baselines.get(route)
+        if cached:
+            return cached
+        responses = []
+        for _ in range(BASELINE_SAMPLES):
+            try:
+                responses.append(await self.send(route, path))
+            except HttpError:
+                pass
+        return self.baselines.record(route, responses) if responses else None
+
+    def judge(self, route, base, param, category, mutator, payload, response):
+        status = response.status
+        size = len(response.body)
+        latency = response.elapsed * 1000
+        name = param["name"]
+        if status >= 500 and base["status"] < 500:
+            self.findings.add("server_error", route, name, category, mutator, status, payload,
+                              response.text[:200])
+            return None
+        if status not in base["statuses"] and status not in EXPECTED_STATUSES and status != 429:
+            self.findings.add("status", route, name, category, mutator, status, payload,
+                              f"baseline {base['status']}")
+        if status == base["status"]:
+            delta = abs(size - base["size_mean"])
+            if (delta > SIZE_SIGMA * base["size_std"] and delta > SIZE_MIN_DELTA
+                    and delta > 0.5 * max(base["size_mean"], 1)):
+                self.findings.add("size", route, name, category, mutator, status, payload,
+                                  f"{size} bytes vs baseline {base['size_mean']:.0f}")
+        where = reflected(payload, response.body, response.header("content-type", ""))
+        if where:
+            self.findings.add("reflected", route, name, category, mutator, status, payload, where,
+                              severity="high" if where == "html" else None)
+        return latency if latency > timing_threshold(base) else None
+
+    async def fuzz_route(self, route, path, base, rng, gate):
+        jobs = []
+        for param in route["params"]:
+            categories = FILE_CATEGORIES if param["location"] == "file" else FIELD_CATEGORIES
+            per_category = max(1, self.args.payloads // len(categories))
+            for category in categories:
+                for index, _ in self.corpus.sample(per_category, rng, category):
+                    jobs.append((param, category, index))
+
+        async def one(param, category, index):
+            async with gate:
+                _, _, _, mutator = self.corpus.entry(index)
+                raw = bytes(self.corpus[index])
+                is_file = param["location"] == "file"
+                value = raw if is_file else raw.decode("utf-8", errors="replace")
+                payload = raw.decode("latin-1") if is_file else value
+                filename = f"fuzz{index}.php.png" if is_file else None
+                try:
+                    response = await self.send(route, path, param, value, filename)
+                except HttpError:
+                    return
+                self.per_endpoint[f"{route['method']} {route['uri']}"] += 1
+                slow = self.judge(route, base, param, category, mutator, payload, response)
+                if slow:
+                    # Re-send once so a load spike is not reported as time-based injection
+                    try:
+                        again = await self.send(route, path, param, value, filename)
+                    except HttpError:
+                        return
+                    if again.elapsed * 1000 > timing_threshold(base):
+                        self.findings.add("timing", route, param["name"], category, mutator, again.status,
+                                          payload, f"{slow:.0f}ms / {again.elapsed * 1000:.0f}ms vs "
+                                                   f"baseline {base['latency_median']:.0f}ms")
+
+        await asyncio.gather(*(one(*job) for job in jobs))
+
+
+async def run(args):
+    token = load_identities(args.tokens_file)[0].token if args.tokens_file else args.token
+    identity = token.split("|", 1)[0]
+    routes = load_routes()
+    exclude = None if args.include_destructive else EXCLUDE
+    targets = [r for r in filter_routes(routes, [m.upper() for m in args.method or []], args.grep, exclude=exclude)
+               if r["params"]]
+    overrides = dict(p.split("=", 1) for p in args.param)
+    rng = random.Random(args.seed)
+
+    corpus = open_corpus(args.corpus)
+    http = AsyncHttpClient(API_BASE, headers=auth_headers(token), limit=args.concurrency)
+    baselines = Baselines(BASELINE_PATH, identity, refresh=args.rebaseline)
+    fuzzer = Fuzzer(http, corpus, baselines, args)
+    resolver = PathResolver(routes, http, overrides)
+    skipped = []
+    start = time.monotonic()
+    try:
+        resolved = []
+        for route in targets:
+            values = await resolver.resolve(route)
+            path = fill_path(route, values) if values is not None else None
+            if path is None:
+                skipped.append(f"{route['method']} {route['uri']}")
+            else:
+                resolved.append((route, path))
+        print(f"  {len(resolved)} endpoints with parameters, {len(skipped)} skipped (unresolved path params)")
+
+        # Baselines first, at low concurrency, so they are not measured under fuzzing load
+        quiet = asyncio.Semaphore(BASELINE_CONCURRENCY)
+
+        async def baseline(route, path):
+            async with quiet:
+                return await fuzzer.baseline(route, path)
+
+        bases = await asyncio.gather(*(baseline(route, path) for route, path in resolved))
+
+        gate = asyncio.Semaphore(args.concurrency)
+        # Endpoints run concurrently; the gate bounds total in-flight requests
+        await asyncio.gather(*(fuzzer.fuzz_route(route, path, base, random.Random(rng.random()), gate)
+                               for (route, path), base in zip(resolved, bases) if base))
+    finally:
+        baselines.save()
+        await http.close()
+    duration = time.monotonic() - start
+    return fuzzer, resolved, skipped, duration
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Concurrent Parameter Fuzzer")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:  {API_BASE}")
+    print(f"Corpus:  {args.corpus}, {args.payloads} payloads per parameter\n")
+    raise_fd_limit()
+
+    fuzzer, resolved, skipped, duration = asyncio.run(run(args))
+    findings = fuzzer.findings.as_list()
+
+    print(f"\n  Requests: {fuzzer.requests} in {duration:.1f}s "
+          f"({fuzzer.requests / duration if duration else 0:.0f}/s)")
+    print(f"  Status:   {dict(sorted((str(k), v) for k, v in fuzzer.statuses.items()))}")
+    if fuzzer.throttled:
+        print(f"  ℹ️  {fuzzer.throttled} requests throttled (429) and retried after Retry-After")
+
+    print("\n--- Findings (merged by signature) ---")
+    for finding in findings[:40]:
+        icon = "❌" if finding["severity"] == "high" else "⚠️ " if finding["severity"] == "medium" else "ℹ️ "
+        print(f"  {icon} [{finding['kind']}] {finding['method']} {finding['uri']} "
+              f"param={finding['param']} ({finding['category']}, {finding['status']}) x{finding['hits']}")
+        print(f"      e.g. {finding['examples'][0][:100]!r} - {finding['detail'][:100]}")
+    if len(findings) > 40:
+        print(f"  ... {len(findings) - 40} more in the report")
+
+    high = sum(1 for f in findings if f["severity"] == "high")
+    print("\n" + "=" * 60)
+    if high:
+        print(f"❌ FAILED: {high} high-severity findings ({len(findings)} total)")
+    elif findings:
+        print(f"⚠️  {len(findings)} findings to review, none high severity")
+    else:
+        print("✅ PASSED: No anomalies detected")
+    print("=" * 60)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": API_BASE,
+        "corpus": args.corpus,
+        "payloads_per_param": args.payloads,
+        "endpoints": len(resolved),
+        "skipped_endpoints": skipped,
+        "requests": fuzzer.requests,
+        "duration_seconds": round(duration, 1),
+        "status": {str(k): v for k, v in fuzzer.statuses.items()},
+        "requests_per_endpoint": dict(fuzzer.per_endpoint),
+        "findings": findings,
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fuzz_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(1 if high else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Live Harness Dashboard
+Curses view of a running harness: per-endpoint RPS, p50/p99, error rate and
+in-flight requests, plus client CPU and server RSS slope, refreshed at a fixed
+rate. Run it in a second terminal next to stability_runner.py or any suite
+started with `harness_metrics.py run`.
+
+It reads the snapshot files the suites already publish (harness_metrics.py),
+so the load loop pays nothing for it: each refresh merges the latest
+snapshots and diffs them against the one from WINDOW_SECONDS ago.
+Percentiles are interpolated from the latency histogram buckets.
+
+Usage:
+  python3 harness_dashboard.py [--refresh 1] [--window 10] [--plain]
+  q quits; --plain prints a text table per refresh instead (logs, CI, no tty)
+"""
+
+import argparse
+import curses
+import glob
+import os
+import sys
+import time
+from collections import defaultdict, deque
+
+from harness_metrics import LATENCY_BUCKETS, METRICS_DIR, collect
+from perf_stats import histogram_quantile, linear_fit, total_rss
+
+# Configuration
+SERVER_PROCESSES = ["php-fpm", "artisan serve", "php -S", "octane", "reverb:start", "queue:work",
+                    "emulator_server.py"]
+
+# Test settings
+REFRESH_SECONDS = 1.0
+WINDOW_SECONDS = 10.0         # Rates and percentiles cover this trailing window
+RSS_WINDOW_SECONDS = 300.0    # Server RSS slope is fitted over this window
+MAX_ROWS = 40
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Live terminal dashboard for harness runs")
+    parser.add_argument("--dir", default=METRICS_DIR, help="Snapshot directory (HARNESS_METRICS_DIR)")
+    parser.add_argument("--refresh", type=float, default=REFRESH_SECONDS)
+    parser.add_argument("--window", type=float, default=WINDOW_SECONDS)
+    parser.add_argument("--server-process", action="append", help="Server command line pattern (repeatable)")
+    parser.add_argument("--plain", action="store_true", help="Print text tables instead of curses")
+    parser.add_argument("--count", type=int, default=0, help="Stop after this many refreshes (0 = until q)")
+    return parser.parse_args()
+
+
+def cpu_seconds(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rpartition(")")[2].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def suite_pids(directory):
+    pids = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        pid = os.path.basename(path).rsplit("-", 1)[-1][:-5]
+        if pid.isdigit():
+            pids.append(int(pid))
+    return pids
+
+
+class Dashboard:
+    """Keeps a short history of merged snapshots and derives the view from deltas."""
+
+    def __init__(self, directory, window, server_processes):
+        self.directory = directory
+        self.window = window
+        self.server_processes = server_processes
+        self.history = deque()            # (monotonic, merged snapshot)
+        self.rss = deque()                # (monotonic, bytes)
+        self.cpu = {}                     # pid -> (monotonic, cpu seconds)
+        self.started = time.monotonic()
+
+    def sample(self):
+        now = time.monotonic()
+        self.history.append((now, collect(self.directory)))
+        while len(self.history) > 2 and now - self.history[1][0] >= self.window:
+            self.history.popleft()
+        rss = total_rss(self.server_processes)
+        if rss:
+            self.rss.append((now, rss))
+            while self.rss and now - self.rss[0][0] > RSS_WINDOW_SECONDS:
+                self.rss.popleft()
+        return now
+
+    def client_cpu(self, now):
+        """CPU % of the suite processes since the previous refresh."""
+        used, seen = 0.0, {}
+        for pid in suite_pids(self.directory):
+            seconds = cpu_seconds(pid)
+            if seconds is None:
+                continue
+            seen[pid] = (now, seconds)
+            if pid in self.cpu and now > self.cpu[pid][0]:
+                used += (seconds - self.cpu[pid][1]) / (now - self.cpu[pid][0])
+        self.cpu = seen
+        return used * 100
+
+    def view(self):
+        now = self.sample()
+        (start, old), (_, new) = self.history[0], self.history[-1]
+        elapsed = max(now - start, 1e-9)
+        rows = defaultdict(lambda: {"requests": 0, "errors": 0, "in_flight": 0, "buckets": defaultdict(float),
+                                    "total": 0})
+        totals = {"requests": 0, "errors": 0, "in_flight": 0, "buckets": defaultdict(float)}
+        for key, value in new.items():
+            name, labels, bucket = key
+            labels = dict(labels)
+            if "endpoint" not in labels:
+                continue
+            row = rows[(labels["suite"], labels["endpoint"])]
+            delta = value - old.get(key, 0)
+            if name == "harness_requests":
+                row["requests"] += delta
+                row["total"] += value
+                totals["requests"] += delta
+            elif name == "harness_request_errors":
+                row["errors"] += delta
+                totals["errors"] += delta
+            elif name == "harness_requests_in_flight":
+                row["in_flight"] += value
+                totals["in_flight"] += value
+            elif name == "harness_request_duration_seconds" and isinstance(bucket, int):
+                row["buckets"][bucket] += delta
+                totals["buckets"][bucket] += delta
+
+        endpoints = []
+        for (suite, endpoint), row in rows.items():
+            endpoints.append({
+                "suite": suite, "endpoint": endpoint, "rps": row["requests"] / elapsed,
+                "p50": histogram_quantile(row["buckets"], 0.50, LATENCY_BUCKETS),
+                "p99": histogram_quantile(row["buckets"], 0.99, LATENCY_BUCKETS),
+                "error_rate": row["errors"] / row["requests"] if row["requests"] else 0.0,
+                "in_flight": row["in_flight"], "total": row["total"],
+            })
+        endpoints.sort(key=lambda e: (-e["rps"], -e["total"]))
+
+        slope = None
+        if len(self.rss) >= 3:
+            slope, _, _ = linear_fit([t - self.rss[0][0] for t, _ in self.rss], [b for _, b in self.rss])
+        return {
+            "uptime": now - self.started, "window": elapsed, "endpoints": endpoints,
+            "rps": totals["requests"] / elapsed,
+            "p50": histogram_quantile(totals["buckets"], 0.50, LATENCY_BUCKETS),
+            "p99": histogram_quantile(totals["buckets"], 0.99, LATENCY_BUCKETS),
+            "error_rate": totals["errors"] / totals["requests"] if totals["requests"] else 0.0,
+            "in_flight": totals["in_flight"], "client_cpu": self.client_cpu(now),
+            "server_rss": self.rss[-1][1] if self.rss else None,
+            "rss_slope": slope * 60 if slope is not None else None,   # bytes/minute
+        }
+
+
+def ms(value):
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def render_lines(view, width):
+    rss = "n/a" if view["server_rss"] is None else f"{view['server_rss'] / 1048576:.1f} MB"
+    slope = "" if view["rss_slope"] is None else f" ({view['rss_slope'] / 1048576:+.2f} MB/min)"
+    lines = [
+        f"Harness dashboard  up {view['uptime']:.0f}s  window {view['window']:.1f}s",
+        f"RPS {view['rps']:.1f}  p50 {ms(view['p50'])}ms  p99 {ms(view['p99'])}ms  "
+        f"errors {view['error_rate'] * 100:.1f}%  in-flight {view['in_flight']:.0f}  "
+        f"client CPU {view['client_cpu']:.0f}%  server RSS {rss}{slope}",
+        "",
+        f"{'SUITE':<24} {'ENDPOINT':<44} {'RPS':>8} {'P50ms':>8} {'P99ms':>8} {'ERR%':>6} {'INFL':>5} {'TOTAL':>8}",
+    ]
+    for e in view["endpoints"][:MAX_ROWS]:
+        lines.append(f"{e['suite'][:24]:<24} {e['endpoint'][:44]:<44} {e['rps']:>8.1f} {ms(e['p50']):>8} "
+                     f"{ms(e['p99']):>8} {e['error_rate'] * 100:>6.1f} {e['in_flight']:>5.0f} {e['total']:>8.0f}")
+    if not view["endpoints"]:
+        lines.append("(no suite is publishing metrics yet)")
+    return [line[:width] for line in lines]
+
+
+def run_curses(screen, dashboard, args):
+    curses.curs_set(0)
+    screen.nodelay(True)
+    refreshes = 0
+    while True:
+        started = time.monotonic()
+        height, width = screen.getmaxyx()
+        lines = render_lines(dashboard.view(), width - 1)
+        screen.erase()
+        for row, line in enumerate(lines[:height - 1]):
+            screen.addstr(row, 0, line, curses.A_BOLD if row in (0, 3) else curses.A_NORMAL)
+        screen.refresh()
+        refreshes += 1
+        if args.count and refreshes >= args.count:
+            return
+        while time.monotonic() - started < args.refresh:
+            if screen.getch() in (ord("q"), ord("Q")):
+                return
+            time.sleep(0.05)
+
+
+def main():
+    args = parse_args()
+    dashboard = Dashboard(args.dir, args.window, args.server_process or SERVER_PROCESSES)
+    if args.plain or not sys.stdout.isatty():
+        refreshes = 0
+        try:
+            while True:
+                started = time.monotonic()
+                print("\n".join(render_lines(dashboard.view(), 200)) + "\n", flush=True)
+                refreshes += 1
+                if args.count and refreshes >= args.count:
+                    break
+                time.sleep(max(0.0, args.refresh - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        return
+    curses.wrapper(run_curses, dashboard, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+"""
+Harness Telemetry (OpenMetrics)
+Live request metrics for harness runs, exposed as an OpenMetrics/Prometheus
+text endpoint and/or pushed to a file (node_exporter textfile format).
+
+Every suite process records into a flat in-process Registry; `run` installs
+the instrumentation into AsyncHttpClient and, when installed, requests, then
+executes the suite unchanged. Each process writes its snapshot to
+HARNESS_METRICS_DIR once a second, and the exporter merges the snapshots of
+all processes (stability_runner.py runs it when metrics are requested).
+Per-second request bins and completion counts are not part of the snapshot:
+finished seconds are appended to a per-process .jsonl log and dropped from
+memory, so the cost of a write does not grow with the length of the run.
+Readers accumulate the logs.
+
+Series (labels suite, endpoint, identity):
+  harness_requests_total{status}          requests by final status ("error" = transport failure)
+  harness_request_errors_total{status}    status >= 400 or transport failure
+  harness_requests_in_flight              requests currently awaiting a response
+  harness_request_duration_seconds        latency histogram
+  harness_received_bytes_total            response body bytes
+
+Endpoints are route templates from the route index (GET /api/tickets/{ticket})
+so IDs do not explode the label cardinality.
+
+Usage:
+  python3 harness_metrics.py run stress_test_websocket.py --connections 500   # instrumented suite
+  python3 harness_metrics.py serve [--port 9464] [--file harness.prom]        # exporter for ad-hoc runs
+"""
+
+import argparse
+import atexit
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import runpy
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from identities import DEFAULT_IDENTITIES
+
+# Configuration
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+METRICS_DIR = os.environ.get("HARNESS_METRICS_DIR") or os.path.join(tempfile.gettempdir(), "harness-metrics")
+
+# Test settings
+PUSH_INTERVAL = 1.0           # Seconds between snapshot writes per process
+RESERVOIR_SIZE = 2000         # Raw latency samples kept per suite/endpoint and process (perf_gate.py)
+THROUGHPUT_WINDOW = 600       # Trailing seconds of per-second completions handed to perf_gate.py
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    "harness_requests": ("counter", "Requests sent by the harness, by final status"),
+    "harness_request_errors": ("counter", "Requests that failed (status >= 400 or transport error)"),
+    "harness_requests_in_flight": ("gauge", "Requests awaiting a response"),
+    "harness_request_duration_seconds": ("histogram", "Request latency"),
+    "harness_received_bytes": ("counter", "Response body bytes received"),
+    "harness_suite_runs": ("counter", "Suites finished by stability_runner.py, by status"),
+    "harness_suite_duration_seconds": ("gauge", "Duration of the last run of a suite"),
+}
+_TOKEN_LABELS = {token: label for label, token in DEFAULT_IDENTITIES}
+
+
+class Registry:
+    """
+    Flat map of (name, labels, bucket) -> value. Writers serialize on a lock;
+    snapshot() is a single dict copy, so readers never block the load loop.
+    Histogram buckets are stored per bucket (not cumulative) and summed on render.
+
+    Successful requests are also kept per (suite, endpoint) as a uniform reservoir
+    of raw latencies and per-second completion counts, for perf_gate.py. Every
+    request is binned per suite and time.monotonic() second (requests, errors,
+    latency buckets) so server_feed.py can line the run up with server metrics.
+    drain() hands finished seconds of both to the Publisher's log.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.latency = {}             # (suite, endpoint) -> [seen, reservoir]
+        self.throughput = {}          # (suite, endpoint) -> {unix second: completions}, unlogged
+        self.seconds = {}             # suite -> {monotonic second: [requests, errors, *bucket counts]}, unlogged
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+    def add(self, name, labels, value=1.0, bucket=None):
+        key = (name, labels, bucket)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, labels, value):
+        self.values[(name, labels, None)] = value
+
+    def observe(self, name, labels, value):
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if value <= bound), len(LATENCY_BUCKETS))
+        with self._lock:
+            for key, amount in (((name, labels, index), 1), ((name, labels, "sum"), value),
+                                ((name, labels, "count"), 1)):
+                self.values[key] = self.values.get(key, 0) + amount
+
+    def tick(self, suite, seconds, failed):
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        second = int(time.monotonic())
+        with self._lock:
+            bins = self.seconds.setdefault(suite, {})
+            row = bins.get(second)
+            if row is None:
+                row = bins[second] = [0] * (len(LATENCY_BUCKETS) + 3)
+            row[0] += 1
+            row[1] += failed
+            row[index + 2] += 1
+
+    def keep(self, key, seconds):
+        with self._lock:
+            entry = self.latency.setdefault(key, [0, []])
+            entry[0] += 1
+            if len(entry[1]) < RESERVOIR_SIZE:
+                entry[1].append(seconds)
+            else:
+                slot = self._rng.randrange(entry[0])
+                if slot < RESERVOIR_SIZE:
+                    entry[1][slot] = seconds
+            second = int(time.time())
+            counts = self.throughput.setdefault(key, {})
+            counts[second] = counts.get(second, 0) + 1
+
+    def snapshot(self):
+        return self.values.copy()
+
+    def samples(self):
+        """Copies of the latency reservoirs."""
+        with self._lock:
+            return {key: list(entry[1]) for key, entry in self.latency.items()}
+
+    def drain(self, final=False):
+        """
+        Remove and return the finished seconds (all of them when `final`):
+        ([[suite, endpoint, {unix second: completions}]], {suite: {monotonic second: row}}).
+        """
+        now, current = int(time.time()), int(time.monotonic())
+        throughput, timeline = [], {}
+        with self._lock:
+            for (suite, endpoint), counts in self.throughput.items():
+                done = [second for second in counts if final or second < now]
+                if done:
+                    throughput.append([suite, endpoint, {second: counts.pop(second) for second in done}])
+            for suite, bins in self.seconds.items():
+                done = [second for second in bins if final or second < current]
+                if done:
+                    timeline[suite] = {second: bins.pop(second) for second in done}
+        return throughput, timeline
+
+
+REGISTRY = Registry()
+
+
+def dump(snapshot, path, samples=None):
+    """Atomically write a snapshot (and optionally Registry.samples()) as JSON."""
+    data = {"values": [[name, list(labels), bucket, value] for (name, labels, bucket), value in snapshot.items()],
+            "latency": [[suite, endpoint, values] for (suite, endpoint), values in (samples or {}).items()]}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def append(path, record):
+    """Append one JSON line to a Publisher log."""
+    with open(path, "a") as f:
+        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def read_log(path):
+    """Records of a Publisher log; a line still being written is skipped."""
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except OSError:
+        return
+
+
+def load(path):
+    with open(path) as f:
+        return {(name, tuple(tuple(pair) for pair in labels), bucket): value
+                for name, labels, bucket, value in json.load(f)["values"]}
+
+
+def collect_samples(directory, window=THROUGHPUT_WINDOW):
+    """
+    Merged ({(suite, endpoint): latencies}, {(suite, endpoint): {second: count}}) of all
+    processes. Counts cover the last `window` seconds each endpoint was active.
+    """
+    latency, throughput = defaultdict(list), defaultdict(lambda: defaultdict(int))
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for suite, endpoint, values in data.get("latency", []):
+            latency[(suite, endpoint)].extend(values)
+    for path in glob.glob(os.path.join(directory, "*.jsonl")):
+        for record in read_log(path):
+            for suite, endpoint, counts in record.get("throughput", []):
+                for second, count in counts.items():
+                    throughput[(suite, endpoint)][int(second)] += count
+    bounded = {}
+    for key, counts in throughput.items():
+        last = max(counts)
+        bounded[key] = {second: count for second, count in counts.items() if second > last - window}
+    return dict(latency), bounded
+
+
+def collect_timeline(directory):
+    """Merged {suite: {monotonic second: [requests, errors, *bucket counts]}} of all processes."""
+    merged = defaultdict(dict)
+    for path in glob.glob(os.path.join(directory, "*.jsonl")):
+        for record in read_log(path):
+            for suite, bins in record.get("timeline", {}).items():
+                for second, row in bins.items():
+                    current = merged[suite].get(int(second))
+                    merged[suite][int(second)] = row if current is None else [a + b for a, b in zip(current, row)]
+    return dict(merged)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect(directory, local=None):
+    """Merge the snapshots in `directory` (and `local`). Gauges of exited processes are dropped."""
+    merged = defaultdict(float)
+    snapshots = [local] if local else []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            snapshot = load(path)
+        except (OSError, ValueError):
+            continue
+        pid = os.path.basename(path).rsplit("-", 1)[-1][:-5]
+        if pid.isdigit() and not pid_alive(int(pid)):
+            snapshot = {k: v for k, v in snapshot.items() if METRICS.get(k[0], ("",))[0] != "gauge"}
+        snapshots.append(snapshot)
+    for snapshot in snapshots:
+        for key, value in snapshot.items():
+            merged[key] += value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(snapshot, openmetrics=True):
+    """Text exposition of a merged snapshot (OpenMetrics 1.0, or Prometheus 0.0.4)."""
+    by_metric = defaultdict(lambda: defaultdict(dict))
+    for (name, labels, bucket), value in snapshot.items():
+        by_metric[name][labels][bucket] = value
+    lines = []
+    for name in sorted(by_metric):
+        kind, help_text = METRICS.get(name, ("unknown", ""))
+        family = name if openmetrics or kind != "counter" else f"{name}_total"
+        lines += [f"# TYPE {family} {kind}", f"# HELP {family} {help_text}"]
+        for labels, values in sorted(by_metric[name].items()):
+            if kind == "histogram":
+                cumulative = 0
+                for index, bound in enumerate(LATENCY_BUCKETS + (float("inf"),)):
+                    cumulative += values.get(index, 0)
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {_number(cumulative)}")
+                lines.append(f"{name}_count{_labels(labels)} {_number(values.get('count', 0))}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(values.get('sum', 0))}")
+            else:
+                suffix = "_total" if kind == "counter" else ""
+                lines.append(f"{name}{suffix}{_labels(labels)} {_number(values.get(None, 0))}")
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Label helpers
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=1)
+def _route_patterns():
+    """[(method, regex, uri)] from the route index, static routes first; empty when unavailable."""
+    try:
+        from route_index import load_routes
+        routes = load_routes()
+    except (OSError, ValueError, ImportError):
+        return []
+    patterns = []
+    for route in sorted(routes, key=lambda r: ("{" in r["uri"], r["uri"].count("{"))):
+        regex = re.compile("^" + re.sub(r"\\\{\w+(\\\?)?\\\}", "[^/]+", re.escape(route["uri"].rstrip("/"))) + "/?$")
+        patterns.append((route["method"], regex, route["uri"]))
+    return patterns
+
+
+@lru_cache(maxsize=8192)
+def endpoint_label(method, path):
+    """'METHOD /route/{template}' for a concrete path; unknown paths get numeric/long ids collapsed."""
+    path = urlsplit(path).path or "/"
+    for route_method, regex, uri in _route_patterns():
+        if route_method == method and regex.match(path):
+            return f"{method} {uri}"
+    segments = ["{id}" if re.fullmatch(r"\d+|[0-9a-fA-F-]{16,}|[0-9A-Za-z]{20,}", s) else s
+                for s in path.split("/")]
+    return f"{method} {'/'.join(segments)}"
+
+
+def identity_label(headers):
+    """Seeded identity label for the bearer token, 'guest' without one."""
+    authorization = ""
+    for name, value in (headers or {}).items():
+        if name.lower() == "authorization":
+            authorization = value
+    token = authorization.partition(" ")[2]
+    if not token:
+        return "guest"
+    return _TOKEN_LABELS.get(token) or "token-" + hashlib.sha1(token.encode()).hexdigest()[:8]
+
+
+def record(suite, method, path, headers, started, status, received):
+    labels = (("suite", suite), ("endpoint", endpoint_label(method, path)), ("identity", identity_label(headers)))
+    REGISTRY.add("harness_requests", labels + (("status", str(status)),))
+    failed = status == "error" or status >= 400
+    if failed:
+        REGISTRY.add("harness_request_errors", labels + (("status", str(status)),))
+    elapsed = time.monotonic() - started
+    REGISTRY.observe("harness_request_duration_seconds", labels, elapsed)
+    REGISTRY.tick(suite, elapsed, failed)
+    if not failed:
+        REGISTRY.keep((suite, labels[1][1]), elapsed)
+    if received:
+        REGISTRY.add("harness_received_bytes", labels, received)
+
+
+def in_flight(suite, method, path, headers, delta):
+    labels = (("suite", suite), ("endpoint", endpoint_label(method, path)), ("identity", identity_label(headers)))
+    REGISTRY.add("harness_requests_in_flight", labels, delta)
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+
+def instrument(suite):
+    """Wrap AsyncHttpClient.request and requests.Session.send to record into REGISTRY."""
+    from async_http import AsyncHttpClient
+
+    # Build the route index now, not inside the first request's timing (and event loop)
+    _route_patterns()
+    original_request = AsyncHttpClient.request
+
+    async def request(self, method, path, params=None, json=None, data=None, headers=None, timeout=None,
+                      sink=None):
+        merged = dict(self.headers)
+        merged.update(headers or {})
+        target = self.url_for(path)
+        received = [0]
+        if sink is not None:
+            downstream = sink
+
+            def sink(chunk):
+                received[0] += len(chunk)
+                downstream(chunk)
+
+        in_flight(suite, method, target, merged, 1)
+        started = time.monotonic()
+        status = "error"
+        try:
+            response = await original_request(self, method, path, params, json, data, headers, timeout, sink)
+            status = response.status
+            received[0] += len(response.body)
+            return response
+        finally:
+            in_flight(suite, method, target, merged, -1)
+            record(suite, method, target, merged, started, status, received[0])
+
+    AsyncHttpClient.request = request
+
+    try:
+        import requests
+    except ImportError:
+        return
+    original_send = requests.Session.send
+
+    def send(self, prepared, **kwargs):
+        in_flight(suite, prepared.method, prepared.url, prepared.headers, 1)
+        started = time.monotonic()
+        status, received = "error", 0
+        try:
+            response = original_send(self, prepared, **kwargs)
+            status = response.status_code
+            received = (int(response.headers.get("Content-Length") or 0) if kwargs.get("stream")
+                        else len(response.content))
+            return response
+        finally:
+            in_flight(suite, prepared.method, prepared.url, prepared.headers, -1)
+            record(suite, prepared.method, prepared.url, prepared.headers, started, status, received)
+
+    requests.Session.send = send
+
+
+class Publisher(threading.Thread):
+    """
+    Writes this process's snapshot to the metrics directory every PUSH_INTERVAL
+    seconds and appends the seconds that finished since to its .jsonl log.
+    """
+
+    def __init__(self, directory, suite):
+        super().__init__(daemon=True)
+        os.makedirs(directory, exist_ok=True)
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", suite)
+        self.path = os.path.join(directory, f"{safe}-{os.getpid()}.json")
+        self.log_path = os.path.join(directory, f"{safe}-{os.getpid()}.jsonl")
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        atexit.register(self.flush, final=True)
+
+    def flush(self, final=False):
+        with self._lock:
+            try:
+                dump(REGISTRY.snapshot(), self.path, REGISTRY.samples())
+                throughput, timeline = REGISTRY.drain(final)
+                if throughput or timeline:
+                    append(self.log_path, {"throughput": throughput, "timeline": timeline})
+            except OSError:
+                pass
+
+    def run(self):
+        self.flush()
+        while not self.stopped.wait(PUSH_INTERVAL):
+            self.flush()
+
+
+# ---------------------------------------------------------------------------
+# Exporter
+# ---------------------------------------------------------------------------
+
+class Exporter:
+    """Serves /metrics from the merged snapshots and optionally pushes the text to a file."""
+
+    def __init__(self, directory=METRICS_DIR, host=METRICS_HOST, port=METRICS_PORT, path=None,
+                 interval=PUSH_INTERVAL):
+        self.directory = directory
+        self.path = path
+        self.interval = interval
+        self.server = None
+        self._stop = threading.Event()
+        self._threads = []
+        os.makedirs(directory, exist_ok=True)
+        if port:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if urlsplit(self.path).path != "/metrics":
+                        self.send_error(404)
+                        return
+                    openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+                    body = exporter.text(openmetrics).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8"
+                                     if openmetrics else "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self.server = ThreadingHTTPServer((host, port), Handler)
+            self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://{self.server.server_address[0]}:{self.server.server_address[1]}/metrics" if self.server else None
+
+    def text(self, openmetrics=True):
+        return render(collect(self.directory, REGISTRY.snapshot()), openmetrics)
+
+    def push(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.text(openmetrics=False))
+        os.replace(tmp, self.path)
+
+    def _push_loop(self):
+        while not self._stop.wait(self.interval):
+            self.push()
+
+    def start(self):
+        if self.server:
+            self._threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+        if self.path:
+            self._threads.append(threading.Thread(target=self._push_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.path:
+            self.push()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def clear(directory=METRICS_DIR):
+    """Remove the snapshots and logs of a previous run."""
+    for path in glob.glob(os.path.join(directory, "*.json")) + glob.glob(os.path.join(directory, "*.jsonl")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def start_publisher(suite):
+    publisher = Publisher(METRICS_DIR, suite)
+    publisher.start()
+    return publisher
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="OpenMetrics telemetry for harness runs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Run a suite with request instrumentation")
+    run.add_argument("--suite", default=os.environ.get("HARNESS_SUITE"), help="Suite label (default: script name)")
+    run.add_argument("script")
+    run.add_argument("script_args", nargs=argparse.REMAINDER)
+    serve = sub.add_parser("serve", help="Serve the merged metrics of running suites")
+    serve.add_argument("--host", default=METRICS_HOST)
+    serve.add_argument("--port", type=int, default=METRICS_PORT, help="0 disables the HTTP endpoint")
+    serve.add_argument("--file", help="Also push the text exposition to this file")
+    serve.add_argument("--clear", action="store_true", help="Remove snapshots of earlier runs first")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "run":
+        script = os.path.abspath(args.script)
+        suite = args.suite or os.path.splitext(os.path.basename(script))[0]
+        instrument(suite)
+        start_publisher(suite)
+        sys.argv = [script] + args.script_args
+        sys.path[0] = os.path.dirname(script)
+        runpy.run_path(script, run_name="__main__")
+        return
+
+    if args.clear:
+        clear()
+    exporter = Exporter(METRICS_DIR, args.host, args.port, args.file).start()
+    print(f"Serving harness metrics from {METRICS_DIR}")
+    if exporter.url:
+        print(f"  Endpoint: {exporter.url}")
+    if args.file:
+        print(f"  File:     {args.file} (every {PUSH_INTERVAL:g}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        exporter.stop()
+
+
+if __name__ == "__main__":
+    main()
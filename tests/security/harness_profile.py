@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Harness Profiler
+Runs a suite under a profiler so slow runs can be split into harness time
+(JSON parsing, payload generation, scheduling) and time spent waiting on the
+server.
+
+Modes:
+  sample    (default) a background thread snapshots every thread's stack each
+            SAMPLE_INTERVAL seconds via sys._current_frames(); overhead is well
+            under a few percent. Writes <suite>.collapsed (one "frame;frame;... count"
+            line per stack, the input of flamegraph.pl / speedscope / inferno).
+  cprofile  deterministic cProfile; exact call counts but higher overhead on
+            call-heavy code. Writes <suite>.prof (pstats) plus a one-level
+            caller->callee <suite>.collapsed.
+
+A sampled thread whose CPU clock (time.pthread_getcpuclockid) advanced by less
+than half of the interval since its previous sample was blocked - in
+time.sleep, a socket read, a lock or waiting for the GIL - and its stack is
+tagged [idle]. Where per-thread CPU clocks are unavailable, stacks whose
+innermost frame is a selector, lock, queue or socket read are tagged instead.
+Idle stacks appear in the flame graph but are excluded from the self-time
+summary, which therefore shows where the harness burns CPU. The summary is
+written to <suite>.summary.json for stability_runner.py.
+
+Output goes to $HARNESS_PROFILE_DIR, or harness-profiles in the temp dir.
+
+Usage:
+  python3 harness_profile.py run [--mode sample|cprofile] [--output DIR] [--suite NAME] script.py [args...]
+"""
+
+import argparse
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import runpy
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# Configuration
+PROFILE_DIR = os.environ.get("HARNESS_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "harness-profiles")
+
+# Test settings
+SAMPLE_INTERVAL = 0.005       # Seconds between stack samples (200 Hz)
+TOP_FUNCTIONS = 15            # Self-time entries kept in the summary
+MAX_DEPTH = 128
+BUSY_CPU_SHARE = 0.5          # CPU time / wall time since the thread's last sample that counts as busy
+# (file suffix, function) of frames that mean "waiting, not working"
+IDLE_FRAMES = {
+    ("selectors.py", "select"), ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("socket.py", "readinto"), ("ssl.py", "read"), ("ssl.py", "recv_into"),
+    ("subprocess.py", "_communicate"), ("subprocess.py", "_wait"), ("concurrent/futures/_base.py", "result"),
+    ("concurrent/futures/thread.py", "_worker"),
+}
+# cProfile builtins that are waits rather than work
+IDLE_BUILTINS = ("of 'select.", "acquire' of '_thread", "time.sleep", "_overlapped")
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def is_idle(code):
+    return any(code.co_filename.endswith(suffix) and code.co_name == name for suffix, name in IDLE_FRAMES)
+
+
+class Sampler(threading.Thread):
+    """Wall-clock stack sampler for every thread of this process; CPU clocks decide busy vs idle."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True, name="harness-profile-sampler")
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.overhead = 0.0
+        self._halt = threading.Event()
+        self._labels = {}
+        self._clocks = {}             # thread ident -> (cpu clock id, cpu seconds, wall seconds) at last sample
+
+    def cpu_idle(self, ident, now):
+        """True/False from the thread's CPU clock since its last sample; None when it cannot tell."""
+        try:
+            clock = self._clocks[ident][0] if ident in self._clocks else time.pthread_getcpuclockid(ident)
+            cpu = time.clock_gettime(clock)
+        except (AttributeError, OSError):
+            return None
+        previous = self._clocks.get(ident)
+        self._clocks[ident] = (clock, cpu, now)
+        if previous is None or now <= previous[2]:
+            return None
+        return (cpu - previous[1]) < BUSY_CPU_SHARE * (now - previous[2])
+
+    def label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = frame_label(code)
+        return label
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._halt.wait(self.interval):
+            started = time.perf_counter()
+            frames = sys._current_frames()
+            for ident in set(self._clocks) - set(frames):
+                del self._clocks[ident]
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                idle = self.cpu_idle(ident, time.perf_counter())
+                if idle is None:
+                    idle = is_idle(frame.f_code)
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                self.stacks[(tuple(reversed(stack)), idle)] += 1
+            self.samples += 1
+            self.overhead += time.perf_counter() - started
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+    def collapsed(self):
+        lines = Counter()
+        for (stack, idle), count in self.stacks.items():
+            frames = [self.label(code) for code in stack] + (["[idle]"] if idle else [])
+            lines[";".join(frames)] += count
+        return lines
+
+    def self_time(self):
+        """{label: samples} of the innermost frame of non-idle stacks."""
+        counts = Counter()
+        for (stack, idle), count in self.stacks.items():
+            if not idle and stack:
+                counts[self.label(stack[-1])] += count
+        return counts
+
+
+def cprofile_tables(profile):
+    """(collapsed caller->callee lines, {label: self seconds}) from a cProfile run."""
+    stats = pstats.Stats(profile)
+    collapsed, self_time = Counter(), Counter()
+
+    def label(func):
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+    for func, (_, _, tottime, _, callers) in stats.stats.items():
+        if not any(marker in func[2] for marker in IDLE_BUILTINS):
+            self_time[label(func)] += tottime
+        microseconds = int(tottime * 1_000_000)
+        if not callers:
+            collapsed[label(func)] += microseconds
+            continue
+        total_from_callers = sum(c[2] for c in callers.values()) or 1
+        for caller, (_, _, caller_tottime, _) in callers.items():
+            share = int(microseconds * caller_tottime / total_from_callers)
+            if share:
+                collapsed[f"{label(caller)};{label(func)}"] += share
+    return collapsed, self_time
+
+
+def write_collapsed(lines, path):
+    with open(path, "w") as f:
+        for stack, count in sorted(lines.items()):
+            f.write(f"{stack} {count}\n")
+
+
+def summarize(self_time, total, unit):
+    """Top self-time entries as a list of {function, self, share}."""
+    top = []
+    for label, value in self_time.most_common(TOP_FUNCTIONS):
+        top.append({"function": label, f"self_{unit}": round(value, 4) if unit == "seconds" else value,
+                    "share": round(value / total, 4) if total else 0.0})
+    return top
+
+
+class Profile:
+    """Start/stop wrapper writing <output>/<suite>.collapsed and <suite>.summary.json."""
+
+    def __init__(self, suite, mode="sample", output=PROFILE_DIR):
+        self.suite = suite
+        self.mode = mode
+        self.output = output
+        self.started = None
+        self._sampler = None
+        self._profile = None
+        self._done = False
+
+    @property
+    def base(self):
+        return os.path.join(self.output, self.suite)
+
+    def start(self):
+        os.makedirs(self.output, exist_ok=True)
+        if os.path.exists(self.base + ".summary.json"):
+            os.remove(self.base + ".summary.json")
+        self.started = time.monotonic()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = Sampler()
+            self._sampler.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        if self._done:
+            return None
+        self._done = True
+        wall = time.monotonic() - self.started
+        summary = {"suite": self.suite, "mode": self.mode, "wall_seconds": round(wall, 3),
+                   "collapsed": self.base + ".collapsed"}
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.base + ".prof")
+            collapsed, self_time = cprofile_tables(self._profile)
+            busy = sum(self_time.values())
+            summary.update({"pstats": self.base + ".prof", "busy_seconds": round(busy, 3),
+                            "top_self_time": summarize(self_time, busy, "seconds")})
+        else:
+            self._sampler.stop()
+            collapsed, self_time = self._sampler.collapsed(), self._sampler.self_time()
+            busy = sum(self_time.values())
+            total = sum(self._sampler.stacks.values())
+            summary.update({"samples": self._sampler.samples, "interval_seconds": self._sampler.interval,
+                            "busy_share": round(busy / total, 4) if total else 0.0,
+                            "sampler_overhead": round(self._sampler.overhead / wall, 4) if wall else 0.0,
+                            "top_self_time": summarize(self_time, busy, "samples")})
+        write_collapsed(collapsed, self.base + ".collapsed")
+        with open(self.base + ".summary.json", "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+def load_summary(output, suite):
+    try:
+        with open(os.path.join(output, f"{suite}.summary.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Profile a harness suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Run a script under the profiler")
+    run.add_argument("--mode", choices=["sample", "cprofile"], default="sample")
+    run.add_argument("--output", default=PROFILE_DIR)
+    run.add_argument("--suite", help="Output name (default: script name)")
+    run.add_argument("script")
+    run.add_argument("script_args", nargs=argparse.REMAINDER)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    script = os.path.abspath(args.script)
+    suite = args.suite or os.path.splitext(os.path.basename(script))[0]
+    Profile(suite, args.mode, args.output).start()
+    sys.argv = [script] + args.script_args
+    sys.path[0] = os.path.dirname(script)
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
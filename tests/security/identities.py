@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Harness Identities
+Loads the API tokens used by multi-identity tools.
+
+Tokens file format: one identity per line, either `<token>` or `<label> <token>`.
+Blank lines and lines starting with # are ignored.
+"""
+
+from collections import namedtuple
+
+# Same seeded tokens the pentest scripts use (admin, non-admin member)
+DEFAULT_IDENTITIES = [
+    ("admin", "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"),
+    ("member", "2|cDRfKOIDQJGJR5ULTUsrmT8oPW3y88M4tWECa4HUef8ea5ef"),
+]
+
+Identity = namedtuple("Identity", ["label", "token"])
+
+
+def load_identities(path=None):
+    """Return a list of Identity from `path`, or the default seeded identities."""
+    if not path:
+        return [Identity(label, token) for label, token in DEFAULT_IDENTITIES]
+
+    identities = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split()
+            if len(parts) == 1:
+                identities.append(Identity(f"identity-{number}", parts[0]))
+            else:
+                identities.append(Identity(parts[0], parts[1]))
+    if not identities:
+        raise ValueError(f"No identities found in {path}")
+    return identities
+
+
+def auth_headers(token):
+    return {"Authorization": f"Bearer {token}", "Accept": "application/json"}
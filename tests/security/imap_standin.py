@@ -0,0 +1,1008 @@
+#!/usr/bin/env python3
+"""
+IMAP Stand-in Server
+IMAP4rev1 server over generated mail fixtures, so the email sync jobs
+(SeedEmailAccountJob, SyncEmailFolderJob, FetchNewEmailsJob through
+webklex/php-imap) can be driven and measured without a real mail provider.
+A minimal SMTP responder answers the EHLO/AUTH handshake of
+POST /api/email-accounts/{id}/test, which is what marks an account verified.
+
+Fixtures come from mailbox_generator.py (--folder NAME=COUNT, --attachments,
+--seed; generated with one worker per CPU when the directory is missing or
+empty). A generated mailbox is served through its index: the mbox files and
+.idx records are memory-mapped and a message is only read when a command
+touches it, so 100k+ message folders load in well under a second. Any other
+directory of Maildir folders (<dir>/<Folder>/{cur,new}) or <Folder>.mbox files
+is read into memory as is.
+
+Supported: CAPABILITY, ID, NAMESPACE, ENABLE, NOOP, LOGIN, AUTHENTICATE PLAIN,
+LOGOUT, LIST/LSUB, STATUS, SELECT/EXAMINE, [UID] SEARCH, [UID] FETCH (UID, FLAGS,
+INTERNALDATE, RFC822.SIZE, RFC822[.HEADER|.TEXT], BODY[.PEEK][HEADER|TEXT|
+HEADER.FIELDS (..)]<partial>; no ENVELOPE/BODYSTRUCTURE or MIME part sections),
+[UID] STORE, [UID] COPY, APPEND, EXPUNGE, CLOSE/UNSELECT, IDLE, CREATE.
+Every login sees the same store, and appended messages (APPEND or
+MailStore.append()) are visible to every account at once - that is how the sync
+harness feeds incremental sync. Appends and flag changes live in memory only.
+
+--latency delays every command response; --fetch-latency is added per message
+returned by a FETCH (latency specs as in emulator_server.py).
+
+Usage:
+  python3 imap_standin.py [--port 1143] [--smtp-port 1025] [--folder INBOX=100000 --folder Sent=300]
+                          [--attachments none=60,large=40] [--fixtures ./mail] [--format maildir]
+                          [--latency 5ms] [--fetch-latency exp:2]
+"""
+
+import argparse
+import asyncio
+import base64
+import fnmatch
+import mailbox
+import os
+import re
+import shutil
+import signal
+import tempfile
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from emulator_server import parse_latency
+from mailbox_generator import (ATTACHMENT_MIX, DOMAIN, MAILDIR_FLAGS, MBOX_FLAGS, SEED, FolderIndex, bits_flags,
+                               format_mix, generate_mailbox, load_manifest, parse_folders, parse_mix, uidvalidity)
+
+# Configuration
+HOST = "127.0.0.1"
+IMAP_PORT = 1143
+SMTP_PORT = 1025
+PASSWORD = "standin-secret"   # Any username is accepted with this password
+
+SYSTEM_FLAGS = ["\\Answered", "\\Flagged", "\\Deleted", "\\Seen", "\\Draft"]
+SPECIAL_USE = {"Sent": "\\Sent", "Drafts": "\\Drafts", "Trash": "\\Trash", "Spam": "\\Junk", "Archive": "\\Archive"}
+LITERAL_RE = re.compile(rb"\{(\d+)(\+?)\}$")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="IMAP4 stand-in server over generated mail fixtures")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=IMAP_PORT)
+    parser.add_argument("--smtp-port", type=int, default=SMTP_PORT, help="0 disables the SMTP responder")
+    parser.add_argument("--password", default=PASSWORD)
+    parser.add_argument("--fixtures", help="Fixtures directory (generated if missing or empty; default: temporary)")
+    parser.add_argument("--format", choices=["maildir", "mbox"], default="mbox")
+    parser.add_argument("--folder", action="append", metavar="NAME=COUNT", help="Folder size (repeatable)")
+    parser.add_argument("--attachments", default=format_mix(ATTACHMENT_MIX), metavar="KIND=WEIGHT,...")
+    parser.add_argument("--latency", default="0", metavar="SPEC", help="Delay per command (latency spec)")
+    parser.add_argument("--fetch-latency", default="0", metavar="SPEC", help="Extra delay per fetched message")
+    parser.add_argument("--seed", type=int, default=SEED)
+    return parser.parse_args()
+
+
+# --- Store ------------------------------------------------------------------
+
+
+def crlf(data):
+    return re.sub(rb"\r?\n", b"\r\n", data)
+
+
+def message_time(data, fallback):
+    header = data.split(b"\r\n\r\n", 1)[0].decode("ascii", "replace")
+    found = re.search(r"^Date:\s*(.+)$", header, re.M | re.I)
+    try:
+        return parsedate_to_datetime(found.group(1).strip()).timestamp() if found else fallback
+    except (TypeError, ValueError):
+        return fallback
+
+
+class Message:
+    __slots__ = ("uid", "flags", "internaldate", "_data")
+
+    def __init__(self, uid, data, flags=(), internaldate=None):
+        self.uid = uid
+        self._data = crlf(data)
+        self.flags = set(flags)
+        self.internaldate = internaldate or message_time(self._data, time.time())
+
+    @property
+    def data(self):
+        return self._data
+
+    @property
+    def size(self):
+        return len(self._data)
+
+    @property
+    def header(self):
+        end = self.data.find(b"\r\n\r\n")
+        return self.data if end < 0 else self.data[:end + 4]
+
+    @property
+    def text(self):
+        end = self.data.find(b"\r\n\r\n")
+        return b"" if end < 0 else self.data[end + 4:]
+
+
+class MappedMessage(Message):
+    """A message of a generated mailbox; its bytes stay in the mmap (mbox) or file (Maildir) until read."""
+
+    __slots__ = ("_source", "_offset", "_length")
+
+    def __init__(self, index, position):
+        offset, self._length, self.uid, self.internaldate, self.flags = index.record(position)
+        self._source, self._offset = index.source(position)
+        self._data = None
+
+    def _window(self):
+        if isinstance(self._source, str):
+            with open(self._source, "rb") as f:
+                return f.read(), 0
+        return self._source, self._offset
+
+    @property
+    def data(self):
+        buffer, start = self._window()
+        return buffer[start:start + self._length]
+
+    @property
+    def size(self):
+        return self._length
+
+    @property
+    def header(self):
+        buffer, start = self._window()
+        end = buffer.find(b"\r\n\r\n", start, start + self._length)
+        return buffer[start:start + self._length] if end < 0 else buffer[start:end + 4]
+
+    @property
+    def text(self):
+        buffer, start = self._window()
+        end = buffer.find(b"\r\n\r\n", start, start + self._length)
+        return b"" if end < 0 else buffer[end + 4:start + self._length]
+
+
+class IndexEntry:
+    """
+    An unbuilt message as its index record: uid, flags, size and date for scans
+    (STATUS, SELECT, SEARCH). The bytes are read through a throwaway MappedMessage.
+    """
+
+    __slots__ = ("uid", "flags", "size", "internaldate", "_index", "_position")
+
+    def __init__(self, index, position, record):
+        _, self.size, self.uid, self.internaldate, bits = record
+        self.flags = bits_flags(bits)
+        self._index, self._position = index, position
+
+    @property
+    def data(self):
+        return MappedMessage(self._index, self._position).data
+
+    @property
+    def header(self):
+        return MappedMessage(self._index, self._position).header
+
+    @property
+    def text(self):
+        return MappedMessage(self._index, self._position).text
+
+
+class MappedMessages:
+    """Message list over a FolderIndex; MappedMessages are built on first access and kept (flags change)."""
+
+    def __init__(self, index):
+        self.index = index
+        self.built = {}
+        self.extra = []           # Appended after loading
+
+    def __len__(self):
+        return len(self.index) + len(self.extra)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if position >= len(self.index):
+            return self.extra[position - len(self.index)]
+        message = self.built.get(position)
+        if message is None:
+            message = self.built[position] = MappedMessage(self.index, position)
+        return message
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def entries(self):
+        """Messages in sequence order, with IndexEntry records in place of the unbuilt ones."""
+        for position, record in enumerate(self.index.records()):
+            yield self.built.get(position) or IndexEntry(self.index, position, record)
+        yield from self.extra
+
+    @property
+    def size(self):
+        return self.index.size + sum(m.size for m in self.extra)
+
+    def append(self, message):
+        self.extra.append(message)
+
+
+class Folder:
+    def __init__(self, name, uid_validity=None):
+        self.name = name
+        self.uidvalidity = uid_validity or uidvalidity(name)
+        self.messages = []
+        self.uids = array("I")    # Sorted, parallel to messages
+        self.uidnext = 1
+
+    @classmethod
+    def mapped(cls, index):
+        folder = cls(index.name, index.uidvalidity)
+        folder.messages = MappedMessages(index)
+        folder.uids = array("I", index.uids)
+        folder.uidnext = (index.uids[-1] + 1) if len(index) else 1
+        return folder
+
+    def append(self, data, flags=(), internaldate=None):
+        message = Message(self.uidnext, data, flags, internaldate)
+        self.messages.append(message)
+        self.uids.append(message.uid)
+        self.uidnext += 1
+        return message
+
+    def expunge(self):
+        """Drop \\Deleted messages. Returns their sequence numbers, highest first."""
+        removed = [n for n, m in enumerate(self.entries(), 1) if "\\Deleted" in m.flags]
+        if removed:
+            self.messages = [m for m in self.messages if "\\Deleted" not in m.flags]
+            self.uids = array("I", (m.uid for m in self.messages))
+        return removed[::-1]
+
+    def entries(self):
+        """Messages for scans that only need uid, flags, size and date; mapped ones stay unbuilt."""
+        if isinstance(self.messages, MappedMessages):
+            return self.messages.entries()
+        return iter(self.messages)
+
+    @property
+    def size(self):
+        if isinstance(self.messages, MappedMessages):
+            return self.messages.size
+        return sum(m.size for m in self.messages)
+
+
+class MailStore:
+    """All folders the stand-in serves, from a generated mailbox (indexed) or a Maildir/mbox directory."""
+
+    def __init__(self):
+        self.folders = {}
+        self.listeners = set()     # Sessions to notify of appends (IDLE / NOOP)
+
+    def folder(self, name):
+        if name.upper() == "INBOX":
+            name = "INBOX"
+        return self.folders.get(name)
+
+    def create(self, name):
+        return self.folders.setdefault("INBOX" if name.upper() == "INBOX" else name, Folder(name))
+
+    def append(self, name, data, flags=(), internaldate=None):
+        message = (self.folder(name) or self.create(name)).append(data, flags, internaldate)
+        for session in list(self.listeners):
+            session.notify(name)
+        return message
+
+    def total(self):
+        return sum(len(folder.messages) for folder in self.folders.values())
+
+    @classmethod
+    def load(cls, directory):
+        store = cls()
+        manifest = load_manifest(directory)
+        if manifest:
+            for entry in manifest["folders"]:
+                store.folders[entry["name"]] = Folder.mapped(FolderIndex(directory, entry, manifest["format"]))
+            return store
+        for entry in sorted(os.listdir(directory)):
+            path = os.path.join(directory, entry)
+            if entry.endswith(".mbox") and os.path.isfile(path):
+                folder = store.create(entry[:-5])
+                box = mailbox.mbox(path, create=False)
+                for key in box.iterkeys():
+                    message = box.get_message(key)
+                    flags = {flag for code, flag in MBOX_FLAGS.items() if code in message.get_flags()}
+                    folder.append(box.get_bytes(key), flags)
+            elif os.path.isdir(os.path.join(path, "cur")):
+                folder = store.create(entry)
+                files = []
+                for sub in ("cur", "new"):
+                    files += [(name, os.path.join(path, sub, name)) for name in os.listdir(os.path.join(path, sub))]
+                for name, file_path in sorted(files):
+                    info = name.rpartition(":2,")[2] if ":2," in name else ""
+                    with open(file_path, "rb") as f:
+                        data = crlf(f.read())
+                    folder.append(data, {flag for code, flag in MAILDIR_FLAGS.items() if code in info},
+                                  message_time(data, os.path.getmtime(file_path)))
+        return store
+
+
+# --- IMAP protocol ----------------------------------------------------------
+
+
+class Bad(Exception):
+    """Command is malformed or not allowed in this state (tagged BAD/NO)."""
+
+    def __init__(self, message, status="BAD"):
+        super().__init__(message)
+        self.status = status
+
+
+def tokenize(parts):
+    """Parse a command (str fragments and literal bytes) into nested lists of atoms/strings/bytes."""
+    tokens = []
+    stack = [tokens]
+    for part in parts:
+        if isinstance(part, bytes):
+            stack[-1].append(part)
+            continue
+        i = 0
+        while i < len(part):
+            c = part[i]
+            if c == " ":
+                i += 1
+            elif c == "(":
+                nested = []
+                stack[-1].append(nested)
+                stack.append(nested)
+                i += 1
+            elif c == ")":
+                if len(stack) > 1:
+                    stack.pop()
+                i += 1
+            elif c == '"':
+                j, buf = i + 1, []
+                while j < len(part) and part[j] != '"':
+                    if part[j] == "\\" and j + 1 < len(part):
+                        j += 1
+                    buf.append(part[j])
+                    j += 1
+                stack[-1].append("".join(buf))
+                i = j + 1
+            else:
+                j, depth = i, 0
+                while j < len(part) and (depth or part[j] not in " ()"):
+                    depth += {"[": 1, "]": -1}.get(part[j], 0)
+                    j += 1
+                stack[-1].append(part[i:j])
+                i = j
+    return tokens
+
+
+def text(token):
+    return token.decode("utf-8", "replace") if isinstance(token, bytes) else token
+
+
+def quote(value):
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def sequence_ranges(spec, largest):
+    """[(low, high)] of an IMAP sequence set like "1:5,7,9:*" ("*" is `largest`)."""
+    ranges = []
+    for item in str(spec).split(","):
+        low, _, high = item.partition(":")
+        low = largest if low == "*" else int(low)
+        high = low if not high else (largest if high == "*" else int(high))
+        ranges.append((min(low, high), max(low, high)))
+    return ranges
+
+
+def in_ranges(value, ranges):
+    return any(low <= value <= high for low, high in ranges)
+
+
+def imap_date(timestamp):
+    return time.strftime("%d-%b-%Y %H:%M:%S +0000", time.gmtime(timestamp))
+
+
+def search_date(value):
+    return datetime.strptime(text(value), "%d-%b-%Y").replace(tzinfo=timezone.utc).timestamp()
+
+
+def header_value(message, name):
+    found = re.search(rf"^{re.escape(name)}:\s*(.*(?:\r\n[ \t].*)*)", message.header.decode("utf-8", "replace"),
+                      re.M | re.I)
+    return found.group(1) if found else ""
+
+
+def header_fields(message, names, exclude=False):
+    """Header lines restricted to (or without) `names`, plus the blank line."""
+    wanted = {name.upper() for name in names}
+    lines, keep = [], False
+    for line in message.header.split(b"\r\n"):
+        if line[:1] in (b" ", b"\t"):
+            if keep:
+                lines.append(line)
+            continue
+        keep = bool(line) and ((line.split(b":", 1)[0].decode("ascii", "replace").upper() in wanted) != exclude)
+        if keep:
+            lines.append(line)
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+class Session:
+    """One IMAP connection."""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.store = server.store
+        self.reader = reader
+        self.writer = writer
+        self.user = None
+        self.folder = None
+        self.readonly = False
+        self.known = 0            # EXISTS count the client has been told about
+        self.pending = False
+
+    def send(self, line):
+        data = line if isinstance(line, bytes) else line.encode()
+        self.server.stats["bytes_sent"] += len(data) + 2
+        self.writer.write(data + b"\r\n")
+
+    def notify(self, name):
+        if self.folder is not None and self.folder.name == name:
+            self.pending = True
+
+    def flush_updates(self):
+        if self.folder is not None and len(self.folder.messages) != self.known:
+            self.known = len(self.folder.messages)
+            self.send(f"* {self.known} EXISTS")
+        self.pending = False
+
+    async def read_command(self):
+        """Read one command line with its literals. Returns a list of str/bytes parts, or None on EOF."""
+        parts = []
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return None
+            line = line.rstrip(b"\r\n")
+            found = LITERAL_RE.search(line)
+            if not found:
+                parts.append(line.decode("utf-8", "replace"))
+                return parts
+            parts.append(line[:found.start()].decode("utf-8", "replace"))
+            if not found.group(2):
+                self.send(b"+ Ready for literal data")
+                await self.writer.drain()
+            parts.append(await self.reader.readexactly(int(found.group(1))))
+
+    async def run(self):
+        self.server.stats["connections"] += 1
+        self.send(b"* OK [CAPABILITY " + self.server.capabilities.encode() + b"] IMAP stand-in ready")
+        try:
+            while True:
+                await self.writer.drain()
+                parts = await self.read_command()
+                if parts is None:
+                    break
+                tokens = tokenize(parts)
+                if len(tokens) < 2:
+                    self.send(f"{text(tokens[0]) if tokens else '*'} BAD Missing command")
+                    continue
+                tag, command, args = text(tokens[0]), text(tokens[1]).upper(), tokens[2:]
+                uid = command == "UID"
+                if uid:
+                    if not args:
+                        self.send(f"{tag} BAD Missing UID command")
+                        continue
+                    command, args = text(args[0]).upper(), args[1:]
+                self.server.stats[f"cmd_{command.lower()}"] += 1
+                delay = self.server.latency()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    result = await self.dispatch(command, args, uid, tag)
+                except Bad as e:
+                    self.send(f"{tag} {e.status} {e}")
+                    continue
+                except (ValueError, IndexError, TypeError) as e:
+                    self.send(f"{tag} BAD {command} arguments invalid: {e}")
+                    continue
+                if result is False:
+                    break
+                self.send(f"{tag} OK {result or command + ' completed'}")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.store.listeners.discard(self)
+            self.writer.close()
+
+    def require(self, selected=False):
+        if self.user is None:
+            raise Bad("Not authenticated", "NO")
+        if selected and self.folder is None:
+            raise Bad("No mailbox selected", "NO")
+
+    def resolve(self, name):
+        folder = self.store.folder(text(name))
+        if folder is None:
+            raise Bad(f"Mailbox does not exist: {text(name)}", "NO")
+        return folder
+
+    async def dispatch(self, command, args, uid, tag):
+        handler = getattr(self, f"do_{command.lower()}", None)
+        if handler is None:
+            raise Bad(f"Unknown command {command}")
+        if uid and command not in ("FETCH", "SEARCH", "STORE", "COPY", "MOVE", "EXPUNGE"):
+            raise Bad(f"UID {command} is not supported")
+        return await handler(args, uid, tag)
+
+    # Any state
+
+    async def do_capability(self, args, uid, tag):
+        self.send(f"* CAPABILITY {self.server.capabilities}")
+
+    async def do_noop(self, args, uid, tag):
+        self.flush_updates()
+
+    do_check = do_noop
+
+    async def do_id(self, args, uid, tag):
+        self.send('* ID ("name" "imap-standin" "vendor" "worksphere-harness")')
+
+    async def do_logout(self, args, uid, tag):
+        self.send("* BYE IMAP stand-in logging out")
+        self.send(f"{tag} OK LOGOUT completed")
+        await self.writer.drain()
+        return False
+
+    # Not authenticated
+
+    async def do_login(self, args, uid, tag):
+        user, password = text(args[0]), text(args[1])
+        if password != self.server.password:
+            self.server.stats["login_failures"] += 1
+            raise Bad("[AUTHENTICATIONFAILED] Invalid credentials", "NO")
+        self.user = user
+        self.server.stats["logins"] += 1
+        return f"[CAPABILITY {self.server.capabilities}] LOGIN completed"
+
+    async def do_authenticate(self, args, uid, tag):
+        if text(args[0]).upper() != "PLAIN":
+            raise Bad("Only AUTHENTICATE PLAIN is supported", "NO")
+        if len(args) > 1:
+            response = text(args[1])
+        else:
+            self.send(b"+ ")
+            await self.writer.drain()
+            response = (await self.reader.readline()).strip().decode()
+        fields = base64.b64decode(response).split(b"\x00")
+        return await self.do_login([fields[1].decode(), fields[2].decode()], False, tag)
+
+    # Authenticated
+
+    async def do_namespace(self, args, uid, tag):
+        self.require()
+        self.send('* NAMESPACE (("" "/")) NIL NIL')
+
+    async def do_enable(self, args, uid, tag):
+        self.require()
+        self.send("* ENABLED")
+
+    async def do_list(self, args, uid, tag, verb="LIST"):
+        self.require()
+        reference, pattern = text(args[0]), text(args[1])
+        if pattern == "":
+            self.send(f'* {verb} (\\Noselect) "/" ""')
+            return
+        pattern = (reference + pattern).replace("%", "*")
+        for name in self.store.folders:
+            if fnmatch.fnmatchcase(name, pattern) or (name == "INBOX" and fnmatch.fnmatchcase("INBOX", pattern.upper())):
+                attributes = " ".join(a for a in ("\\HasNoChildren", SPECIAL_USE.get(name)) if a)
+                self.send(f"* {verb} ({attributes}) \"/\" {quote(name)}")
+
+    async def do_lsub(self, args, uid, tag):
+        return await self.do_list(args, uid, tag, "LSUB")
+
+    async def do_subscribe(self, args, uid, tag):
+        self.require()
+
+    do_unsubscribe = do_subscribe
+
+    async def do_create(self, args, uid, tag):
+        self.require()
+        self.store.create(text(args[0]))
+
+    async def do_status(self, args, uid, tag):
+        self.require()
+        folder = self.resolve(args[0])
+        values = {"MESSAGES": len(folder.messages), "RECENT": 0, "UIDNEXT": folder.uidnext,
+                  "UIDVALIDITY": folder.uidvalidity,
+                  "UNSEEN": sum(1 for m in folder.entries() if "\\Seen" not in m.flags)}
+        items = " ".join(f"{name} {values[name]}" for name in (text(i).upper() for i in args[1]) if name in values)
+        self.send(f"* STATUS {quote(folder.name)} ({items})")
+
+    async def do_select(self, args, uid, tag, readonly=False):
+        self.require()
+        self.folder = None
+        folder = self.resolve(args[0])
+        self.folder, self.readonly, self.known = folder, readonly, len(folder.messages)
+        self.store.listeners.add(self)
+        unseen = next((i for i, m in enumerate(folder.entries(), 1) if "\\Seen" not in m.flags), None)
+        self.send(f"* FLAGS ({' '.join(SYSTEM_FLAGS)})")
+        self.send(f"* OK [PERMANENTFLAGS ({' '.join(SYSTEM_FLAGS)} \\*)] Flags permitted")
+        self.send(f"* {self.known} EXISTS")
+        self.send("* 0 RECENT")
+        if unseen:
+            self.send(f"* OK [UNSEEN {unseen}] First unseen")
+        self.send(f"* OK [UIDVALIDITY {folder.uidvalidity}] UIDs valid")
+        self.send(f"* OK [UIDNEXT {folder.uidnext}] Predicted next UID")
+        return f"[{'READ-ONLY' if readonly else 'READ-WRITE'}] {'EXAMINE' if readonly else 'SELECT'} completed"
+
+    async def do_examine(self, args, uid, tag):
+        return await self.do_select(args, uid, tag, readonly=True)
+
+    async def do_append(self, args, uid, tag):
+        self.require()
+        name, data = text(args[0]), args[-1]
+        if not isinstance(data, bytes):
+            raise Bad("APPEND needs a message literal")
+        flags = next((set(map(text, a)) for a in args[1:-1] if isinstance(a, list)), set())
+        date = next((a for a in args[1:-1] if isinstance(a, str)), None)
+        internaldate = datetime.strptime(date, "%d-%b-%Y %H:%M:%S %z").timestamp() if date else None
+        if self.store.folder(name) is None:
+            raise Bad("[TRYCREATE] Mailbox does not exist", "NO")
+        message = self.store.append(name, data, flags, internaldate)
+        self.server.stats["appended"] += 1
+        return f"[APPENDUID {self.store.folder(name).uidvalidity} {message.uid}] APPEND completed"
+
+    async def do_idle(self, args, uid, tag):
+        self.require()
+        self.send(b"+ idling")
+        await self.writer.drain()
+        done = asyncio.ensure_future(self.reader.readline())
+        while not done.done():
+            if self.pending:
+                self.flush_updates()
+                await self.writer.drain()
+            await asyncio.wait([done], timeout=0.2)
+        return "IDLE terminated"
+
+    # Selected
+
+    async def do_close(self, args, uid, tag):
+        self.require(selected=True)
+        self.store.listeners.discard(self)
+        self.folder = None
+
+    do_unselect = do_close
+
+    async def do_expunge(self, args, uid, tag):
+        self.require(selected=True)
+        if self.readonly:
+            raise Bad("Mailbox is read-only", "NO")
+        for number in self.folder.expunge():
+            self.send(f"* {number} EXPUNGE")
+        self.known = len(self.folder.messages)
+
+    def matched(self, spec, uid):
+        """[(sequence number, message)] selected by a sequence set (UIDs if `uid`), found by bisecting the UIDs."""
+        messages, uids = self.folder.messages, self.folder.uids
+        if not len(messages):
+            return []
+        positions = set()
+        for low, high in sequence_ranges(spec, uids[-1] if uid else len(messages)):
+            if uid:
+                positions.update(range(bisect_left(uids, low), bisect_right(uids, high)))
+            else:
+                positions.update(range(max(low, 1) - 1, min(high, len(messages))))
+        return [(position + 1, messages[position]) for position in sorted(positions)]
+
+    async def do_search(self, args, uid, tag):
+        self.require(selected=True)
+        criteria = list(args)
+        if criteria and text(criteria[0]).upper() == "CHARSET":
+            criteria = criteria[2:]
+        messages = enumerate(self.folder.entries(), 1)
+        keys = iter(criteria or ["ALL"])
+        tests = []
+        for key in keys:
+            tests.append(self.criterion(key, keys))
+        found = [m.uid if uid else number for number, m in messages if all(test(number, m) for test in tests)]
+        self.send("* SEARCH" + "".join(f" {value}" for value in found))
+
+    def criterion(self, key, keys):
+        """Compile one search key (consuming its arguments from `keys`) into a test(number, message)."""
+        if isinstance(key, list):
+            nested = iter(key)
+            tests = [self.criterion(k, nested) for k in nested]
+            return lambda n, m: all(t(n, m) for t in tests)
+        name = text(key).upper()
+        flags = {"SEEN": "\\Seen", "FLAGGED": "\\Flagged", "ANSWERED": "\\Answered", "DELETED": "\\Deleted",
+                 "DRAFT": "\\Draft"}
+        if name in ("ALL", "NEW", "OLD", "RECENT"):
+            return (lambda n, m: False) if name == "RECENT" else (lambda n, m: True)
+        if name in flags:
+            return lambda n, m: flags[name] in m.flags
+        if name.startswith("UN") and name[2:] in flags:
+            return lambda n, m: flags[name[2:]] not in m.flags
+        if name == "NOT":
+            test = self.criterion(next(keys), keys)
+            return lambda n, m: not test(n, m)
+        if name == "OR":
+            first, second = self.criterion(next(keys), keys), self.criterion(next(keys), keys)
+            return lambda n, m: first(n, m) or second(n, m)
+        if name == "UID":
+            uids = self.folder.uids
+            ranges = sequence_ranges(text(next(keys)), uids[-1] if len(uids) else 0)
+            return lambda n, m: in_ranges(m.uid, ranges)
+        if name in ("SINCE", "SENTSINCE", "BEFORE", "SENTBEFORE", "ON", "SENTON"):
+            day = search_date(next(keys))
+            if name.endswith("SINCE"):
+                return lambda n, m: m.internaldate >= day
+            if name.endswith("BEFORE"):
+                return lambda n, m: m.internaldate < day
+            return lambda n, m: day <= m.internaldate < day + 86400
+        if name in ("LARGER", "SMALLER"):
+            size = int(text(next(keys)))
+            return (lambda n, m: m.size > size) if name == "LARGER" else (lambda n, m: m.size < size)
+        if name in ("FROM", "TO", "CC", "BCC", "SUBJECT"):
+            needle = text(next(keys)).lower()
+            return lambda n, m: needle in header_value(m, name.capitalize()).lower()
+        if name == "HEADER":
+            field, needle = text(next(keys)), text(next(keys)).lower()
+            return lambda n, m: needle in header_value(m, field).lower()
+        if name in ("BODY", "TEXT"):
+            needle = text(next(keys)).lower().encode()
+            return lambda n, m: needle in (m.text if name == "BODY" else m.data).lower()
+        if re.fullmatch(r"[\d*:,]+", name):
+            ranges = sequence_ranges(name, len(self.folder.messages))
+            return lambda n, m: in_ranges(n, ranges)
+        raise Bad(f"Unsupported search key {name}")
+
+    def fetch_item(self, item, message):
+        """(response name, value bytes) for one FETCH data item; value is pre-rendered."""
+        name = text(item).upper() if not isinstance(item, list) else ""
+        if name == "UID":
+            return "UID", str(message.uid).encode()
+        if name == "FLAGS":
+            return "FLAGS", f"({' '.join(sorted(message.flags))})".encode()
+        if name == "INTERNALDATE":
+            return "INTERNALDATE", quote(imap_date(message.internaldate)).encode()
+        if name == "RFC822.SIZE":
+            return "RFC822.SIZE", str(message.size).encode()
+        if name in ("RFC822", "RFC822.HEADER", "RFC822.TEXT"):
+            data = {"RFC822": message.data, "RFC822.HEADER": message.header, "RFC822.TEXT": message.text}[name]
+            return name, data
+        found = re.fullmatch(r"BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)(?:\.(\d+))?>)?", text(item), re.I)
+        if not found:
+            raise Bad(f"Unsupported FETCH item {text(item)}")
+        section, start, length = found.group(1), found.group(2), found.group(3)
+        upper = section.upper()
+        if upper == "":
+            data = message.data
+        elif upper == "HEADER":
+            data = message.header
+        elif upper == "TEXT":
+            data = message.text
+        elif upper.startswith("HEADER.FIELDS"):
+            names = section[section.index("(") + 1:section.rindex(")")].split()
+            data = header_fields(message, names, exclude=upper.startswith("HEADER.FIELDS.NOT"))
+        else:
+            data = None   # MIME part sections are not supported
+        label = f"BODY[{section}]"
+        if start is not None and data is not None:
+            data = data[int(start):int(start) + int(length)] if length else data[int(start):]
+            label += f"<{start}>"
+        return label, data
+
+    async def do_fetch(self, args, uid, tag):
+        self.require(selected=True)
+        spec, items = text(args[0]), args[1] if isinstance(args[1], list) else args[1:]
+        macros = {"ALL": ["FLAGS", "INTERNALDATE", "RFC822.SIZE"], "FAST": ["FLAGS", "INTERNALDATE", "RFC822.SIZE"],
+                  "FULL": ["FLAGS", "INTERNALDATE", "RFC822.SIZE"]}
+        if len(items) == 1 and text(items[0]).upper() in macros:
+            items = macros[text(items[0]).upper()]
+        names = [text(i).upper() for i in items]
+        if uid and "UID" not in names:
+            items, names = ["UID"] + list(items), ["UID"] + names
+        marks_seen = not self.readonly and any(n in ("RFC822", "RFC822.TEXT") or n.startswith("BODY[") for n in names)
+        for number, message in self.matched(spec, uid):
+            fetch_delay = self.server.fetch_latency()
+            if fetch_delay > 0:
+                await asyncio.sleep(fetch_delay)
+            if marks_seen:
+                message.flags.add("\\Seen")
+            chunks = []
+            for item in items:
+                label, value = self.fetch_item(item, message)
+                if value is None:
+                    chunks.append(f"{label} NIL".encode())
+                elif label.startswith(("BODY[", "RFC822")) and label != "RFC822.SIZE":
+                    chunks.append(f"{label} {{{len(value)}}}\r\n".encode() + value)
+                    self.server.stats["bytes_served"] += len(value)
+                else:
+                    chunks.append(label.encode() + b" " + value)
+            self.send(f"* {number} FETCH (".encode() + b" ".join(chunks) + b")")
+            self.server.stats["messages_fetched"] += 1
+            await self.writer.drain()
+
+    async def do_store(self, args, uid, tag):
+        self.require(selected=True)
+        if self.readonly:
+            raise Bad("Mailbox is read-only", "NO")
+        spec, action = text(args[0]), text(args[1]).upper()
+        flags = set(map(text, args[2] if isinstance(args[2], list) else args[2:]))
+        for number, message in self.matched(spec, uid):
+            if action.startswith("+"):
+                message.flags |= flags
+            elif action.startswith("-"):
+                message.flags -= flags
+            else:
+                message.flags = set(flags)
+            if not action.endswith(".SILENT"):
+                uid_part = f"UID {message.uid} " if uid else ""
+                self.send(f"* {number} FETCH ({uid_part}FLAGS ({' '.join(sorted(message.flags))}))")
+
+    async def do_copy(self, args, uid, tag):
+        self.require(selected=True)
+        target = self.resolve(args[1])
+        for _, message in self.matched(text(args[0]), uid):
+            self.store.append(target.name, message.data, message.flags, message.internaldate)
+
+    do_move = do_copy
+
+
+# --- SMTP -------------------------------------------------------------------
+
+
+class SmtpResponder:
+    """Just enough ESMTP for Symfony's EsmtpTransport start()/stop() and plain sends."""
+
+    def __init__(self, server):
+        self.server = server
+
+    async def handle(self, reader, writer):
+        stats = self.server.stats
+        stats["smtp_connections"] += 1
+
+        def reply(line):
+            writer.write(line.encode() + b"\r\n")
+
+        reply(f"220 {DOMAIN} ESMTP stand-in")
+        try:
+            while True:
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    reply(f"250-{DOMAIN}\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n250 SIZE 52428800")
+                elif verb == "HELO":
+                    reply(f"250 {DOMAIN}")
+                elif verb == "AUTH":
+                    parts = command.split()
+                    mechanism = parts[1].upper() if len(parts) > 1 else ""
+                    if mechanism == "PLAIN":
+                        if len(parts) > 2:
+                            response = parts[2]
+                        else:
+                            reply("334 ")
+                            await writer.drain()
+                            response = (await reader.readline()).strip().decode()
+                        password = base64.b64decode(response).split(b"\x00")[-1].decode()
+                    elif mechanism == "LOGIN":
+                        reply("334 VXNlcm5hbWU6")
+                        await writer.drain()
+                        await reader.readline()
+                        reply("334 UGFzc3dvcmQ6")
+                        await writer.drain()
+                        password = base64.b64decode((await reader.readline()).strip()).decode()
+                    else:
+                        reply("504 Unrecognized authentication type")
+                        continue
+                    if password == self.server.password:
+                        stats["smtp_logins"] += 1
+                        reply("235 Authentication successful")
+                    else:
+                        reply("535 Authentication credentials invalid")
+                elif verb == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        pass
+                    stats["smtp_messages"] += 1
+                    reply("250 Queued")
+                elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                    reply("250 OK")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("502 Command not implemented")
+        except (ConnectionError, UnicodeDecodeError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+class ImapStandIn:
+    """IMAP (and optional SMTP) listeners over a MailStore, for use from a harness's event loop."""
+
+    capabilities = "IMAP4rev1 AUTH=PLAIN LITERAL+ UIDPLUS ID IDLE NAMESPACE ENABLE UNSELECT"
+
+    def __init__(self, store, password=PASSWORD, latency="0", fetch_latency="0"):
+        self.store = store
+        self.password = password
+        self.latency = parse_latency(latency)
+        self.fetch_latency = parse_latency(fetch_latency)
+        self.stats = Counter()
+        self._servers = []
+
+    async def start(self, host=HOST, port=IMAP_PORT, smtp_port=SMTP_PORT):
+        self._servers.append(await asyncio.start_server(
+            lambda r, w: Session(self, r, w).run(), host, port, limit=1 << 24))
+        if smtp_port:
+            self._servers.append(await asyncio.start_server(SmtpResponder(self).handle, host, smtp_port))
+        return self
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+
+
+async def serve(args, store):
+    standin = await ImapStandIn(store, args.password, args.latency, args.fetch_latency).start(
+        args.host, args.port, args.smtp_port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    await standin.close()
+    return standin.stats
+
+
+def main():
+    args = parse_args()
+    parse_latency(args.latency)
+    parse_latency(args.fetch_latency)
+
+    print("=" * 60)
+    print("IMAP Stand-in Server")
+    print("=" * 60)
+
+    directory = args.fixtures or tempfile.mkdtemp(prefix="imap-standin-")
+    started = time.monotonic()
+    if not os.path.isdir(directory) or not os.listdir(directory):
+        folders = parse_folders(args.folder)
+        generate_mailbox(directory, folders, parse_mix(args.attachments), args.seed, args.format)
+        print(f"\nGenerated {sum(folders.values()):,} messages ({args.format}) in {time.monotonic() - started:.1f}s")
+    started = time.monotonic()
+    store = MailStore.load(directory)
+
+    print(f"\nFixtures: {directory} (loaded in {time.monotonic() - started:.2f}s)")
+    for name, folder in store.folders.items():
+        print(f"  {name:<16} {len(folder.messages):>9,} messages {folder.size / 1048576:>9.1f} MB")
+    print(f"IMAP:     {args.host}:{args.port} (any user, password {args.password!r})")
+    print(f"SMTP:     {f'{args.host}:{args.smtp_port}' if args.smtp_port else 'disabled'}")
+    print(f"Latency:  {args.latency} per command, {args.fetch_latency} per fetched message")
+    print("\nPress Ctrl+C to stop")
+
+    try:
+        stats = asyncio.run(serve(args, store))
+    finally:
+        if not args.fixtures:
+            shutil.rmtree(directory, ignore_errors=True)
+    print("\n" + ", ".join(f"{name} {value}" for name, value in sorted(stats.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Synthetic Mailbox Generator
+Writes large, realistic mailboxes (100k+ messages) for the IMAP stand-in and the
+email sync/search benchmarks, deterministically from a seed:
+
+  - folders: the six standard folders (sizes via --folder NAME=COUNT) plus
+    --folders N custom "Projects/<n>" folders of CUSTOM_FOLDER_SIZE
+  - threads: every THREAD_EVERY-th message replies to an earlier one of its
+    folder (In-Reply-To/References, "Re:" + the thread root's subject)
+  - attachments: none / small / inline (HTML body with a CID image) / large,
+    mixed by --attachments weights
+  - flags: UNREAD_RATIO of INBOX unread, FLAGGED_RATIO flagged, Drafts \\Draft
+
+Each message depends only on (seed, folder, index) and --end-date, so folders
+are split into SHARD_SIZE shards that worker processes build in parallel, and
+the output is byte-identical whatever the worker count. mbox shards are
+concatenated into one <folder>.mbox (messages keep CRLF line endings so they
+can be served as stored); Maildir shards write their files directly.
+
+Next to the mail it writes index.json (folders, counts, sizes, UIDVALIDITY) and
+one <folder>.idx per folder: fixed-size RECORD entries (offset, length, UID,
+internal date, flags) in UID order. A reader mmaps the mbox and the index and
+serves any UID range without parsing the mailbox (imap_standin.MailStore.load).
+
+Usage:
+  python3 mailbox_generator.py --out ./mail [--folder INBOX=100000 --folder Sent=20000] [--folders 20]
+                               [--attachments none=80,small=12,inline=5,large=3] [--format mbox]
+                               [--workers 8] [--seed 1] [--end-date 2026-01-31] [--verify 100]
+"""
+
+import argparse
+import base64
+import json
+import mmap
+import os
+import random
+import re
+import shutil
+import struct
+import sys
+import time
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from email.utils import format_datetime
+
+# Configuration
+DOMAIN = "standin.test"
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+
+# Test settings
+MAILBOX = {"INBOX": 500, "Sent": 120, "Drafts": 10, "Trash": 40, "Spam": 20, "Archive": 200}
+ATTACHMENT_MIX = {"none": 70, "small": 20, "inline": 5, "large": 5}
+ATTACHMENT_SIZES = {"small": 20 * 1024, "inline": 8 * 1024, "large": 1024 * 1024}
+CUSTOM_FOLDER_SIZE = 200
+THREAD_EVERY = 4              # Every 4th message is a reply
+THREAD_WINDOW = 50            # ... to one of the 50 messages before it
+UNREAD_RATIO = 0.3            # Share of INBOX messages without \Seen
+FLAGGED_RATIO = 0.05
+MESSAGE_SPACING = 900         # Mean seconds between messages of a folder (newest = --end-date)
+SHARD_SIZE = 2000
+SEED = 1
+
+# offset, length, uid, internal date (epoch seconds), flag bits
+RECORD = struct.Struct("<QIIdB3x")
+FLAG_BITS = {"\\Seen": 1, "\\Flagged": 2, "\\Answered": 4, "\\Deleted": 8, "\\Draft": 16}
+MAILDIR_FLAGS = {"S": "\\Seen", "F": "\\Flagged", "R": "\\Answered", "T": "\\Deleted", "D": "\\Draft"}
+MBOX_FLAGS = {"R": "\\Seen", "F": "\\Flagged", "A": "\\Answered", "D": "\\Deleted"}
+WORDS = ("project update meeting invoice schedule review draft report budget release customer ticket "
+         "deadline proposal contract feedback agenda summary quarterly support onboarding roadmap").split()
+FROM_LINE = re.compile(rb"^(>*From )", re.M)
+# Attachments are added as this placeholder and their base64 spliced in afterwards:
+# email.generator writes encoded bodies line by line, which dominates large messages
+PLACEHOLDER = b"\x00standin-attachment\x00"
+# 1x1 PNG; inline images are padded with random trailing bytes up to ATTACHMENT_SIZES["inline"]
+PNG_PIXEL = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic mailbox generator (mbox/Maildir + UID index)")
+    parser.add_argument("--out", required=True, help="Output directory (must be empty or missing)")
+    parser.add_argument("--folder", action="append", metavar="NAME=COUNT", help="Folder size (repeatable)")
+    parser.add_argument("--folders", type=int, default=0, help="Extra Projects/<n> folders")
+    parser.add_argument("--attachments", default=format_mix(ATTACHMENT_MIX), metavar="KIND=WEIGHT,...")
+    parser.add_argument("--format", choices=["maildir", "mbox"], default="mbox")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--end-date", help="Date of the newest messages, YYYY-MM-DD (default: today)")
+    parser.add_argument("--verify", type=int, default=20, metavar="N", help="Re-read N random messages via the index")
+    return parser.parse_args()
+
+
+def parse_mix(spec):
+    """"none=70,large=30" -> {"none": 70.0, "large": 30.0}."""
+    mix = {}
+    for item in spec.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in ("none",) + tuple(ATTACHMENT_SIZES):
+            raise ValueError(f"Unknown attachment kind: {kind}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def format_mix(mix):
+    return ",".join(f"{kind}={weight:g}" for kind, weight in mix.items())
+
+
+def parse_folders(specs, custom=0):
+    """{folder: size} from NAME=COUNT specs (default MAILBOX) plus `custom` Projects/<n> folders."""
+    folders = dict(MAILBOX)
+    if specs:
+        folders = {}
+        for spec in specs:
+            name, _, size = spec.partition("=")
+            folders[name] = int(size)
+    for n in range(1, custom + 1):
+        folders.setdefault(f"Projects/{n:03d}", CUSTOM_FOLDER_SIZE)
+    return folders
+
+
+def end_of_day(date=None):
+    """Epoch seconds of the end of `date` (YYYY-MM-DD, default today) in UTC."""
+    day = datetime.strptime(date, "%Y-%m-%d") if date else datetime.now(timezone.utc)
+    return datetime(day.year, day.month, day.day, 23, 59, 59, tzinfo=timezone.utc).timestamp()
+
+
+def folder_slug(name):
+    """File name for a folder ("Projects/001" -> "Projects.001")."""
+    return name.replace("/", ".")
+
+
+def uidvalidity(name):
+    return zlib.crc32(name.encode()) & 0x7FFFFFFF or 1
+
+
+def flag_bits(flags):
+    return sum(bit for flag, bit in FLAG_BITS.items() if flag in flags)
+
+
+def bits_flags(bits):
+    return {flag for flag, bit in FLAG_BITS.items() if bits & bit}
+
+
+def maildir_name(index, flags):
+    return f"{index:09d}.standin:2,{''.join(sorted(c for c, f in MAILDIR_FLAGS.items() if f in flags))}"
+
+
+# --- Messages ---------------------------------------------------------------
+
+
+def message_rng(seed, folder, index, purpose=""):
+    return random.Random(f"{seed}:{folder}:{index}{purpose}")
+
+
+def message_id(seed, folder, index):
+    return f"<{folder_slug(folder).lower()}-{index}.{seed}@{DOMAIN}>"
+
+
+def thread_parent(seed, folder, index):
+    """Index of the message `index` replies to, or None."""
+    if index <= 1 or index % THREAD_EVERY:
+        return None
+    return index - message_rng(seed, folder, index, ":thread").randint(1, min(index - 1, THREAD_WINDOW))
+
+
+def thread_subject(seed, folder, index):
+    """Subject of the thread root of `index` (without "Re:")."""
+    root = index
+    while (parent := thread_parent(seed, folder, root)) is not None:
+        root = parent
+    rng = message_rng(seed, folder, root, ":subject")
+    return f"{' '.join(rng.choice(WORDS) for _ in range(3)).capitalize()} #{root}"
+
+
+def build_message(folder, index, seed=SEED, mix=None, sent_at=None):
+    """(RFC 5322 bytes with CRLF, flags) of message `index` of `folder`; a pure function of its arguments."""
+    mix = mix or ATTACHMENT_MIX
+    rng = message_rng(seed, folder, index)
+    kind = rng.choices(list(mix), list(mix.values()))[0]
+    sent_at = time.time() if sent_at is None else sent_at
+    outgoing = folder in ("Sent", "Drafts")
+    person = f"user{rng.randrange(200)}@example.com"
+    parent = thread_parent(seed, folder, index)
+
+    msg = EmailMessage(policy=policy.SMTP)
+    msg["From"] = f"Stand-in User <owner@{DOMAIN}>" if outgoing else f"Sender {person.split('@')[0]} <{person}>"
+    msg["To"] = person if outgoing else f"owner@{DOMAIN}"
+    msg["Subject"] = ("Re: " if parent else "") + thread_subject(seed, folder, index)
+    msg["Date"] = format_datetime(datetime.fromtimestamp(sent_at, timezone.utc))
+    msg["Message-ID"] = message_id(seed, folder, index)
+    if parent:
+        msg["In-Reply-To"] = message_id(seed, folder, parent)
+        msg["References"] = message_id(seed, folder, parent)
+    text = "\n\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))) for _ in range(3))
+    msg.set_content(text)
+    if kind == "inline":
+        cid = f"img{index}.{seed}@{DOMAIN}"
+        msg.add_alternative(f"<html><body><p>{text[:200]}</p><img src=\"cid:{cid}\"></body></html>", subtype="html")
+        payload = PNG_PIXEL + rng.randbytes(max(0, ATTACHMENT_SIZES["inline"] - len(PNG_PIXEL)))
+        msg.get_payload()[1].add_related(PLACEHOLDER, maintype="image", subtype="png", cid=f"<{cid}>",
+                                         filename=f"image{index}.png")
+    elif kind in ("small", "large"):
+        payload = rng.randbytes(ATTACHMENT_SIZES[kind])
+        msg.add_attachment(PLACEHOLDER, maintype="application", subtype="octet-stream",
+                           filename=f"{kind}-{index}.bin")
+    for n, part in enumerate(msg.walk()):
+        if part.is_multipart():
+            part.set_boundary(f"=_standin_{seed}_{index}_{n}")
+
+    flags = set()
+    if folder != "INBOX" or rng.random() >= UNREAD_RATIO:
+        flags.add("\\Seen")
+    if rng.random() < FLAGGED_RATIO:
+        flags.add("\\Flagged")
+    if folder == "Drafts":
+        flags.add("\\Draft")
+    data = msg.as_bytes()
+    if kind != "none":
+        data = data.replace(base64_crlf(PLACEHOLDER), base64_crlf(payload), 1)
+    return data, flags
+
+
+def base64_crlf(data):
+    """Base64 body as email.generator writes it under policy.SMTP (76-character CRLF lines)."""
+    return base64.encodebytes(data).replace(b"\n", b"\r\n")
+
+
+def sent_time(seed, folder, index, count, end_time):
+    """Internal date of message `index`: MESSAGE_SPACING apart on average, oldest first."""
+    jitter = message_rng(seed, folder, index, ":date").uniform(-0.4, 0.4)
+    return end_time - (count - index + jitter) * MESSAGE_SPACING
+
+
+# --- Writing ----------------------------------------------------------------
+
+
+def write_shard(job):
+    """
+    Build messages start..end-1 (1-based) of one folder. mbox shards go to a part
+    file and return offsets relative to it; Maildir shards write their files.
+    Returns (packed RECORDs, bytes written).
+    """
+    directory, fmt, folder, start, end, count, seed, mix, end_time, part = job
+    records, written = bytearray(), 0
+    if fmt == "mbox":
+        out = open(part, "wb")
+    else:
+        target = os.path.join(directory, folder_slug(folder), "cur")
+    try:
+        for index in range(start, end):
+            sent_at = sent_time(seed, folder, index, count, end_time)
+            data, flags = build_message(folder, index, seed, mix, sent_at)
+            if fmt == "mbox":
+                data = FROM_LINE.sub(rb">\1", data)
+                separator = f"From MAILER-DAEMON {time.asctime(time.gmtime(sent_at))}\n".encode()
+                records += RECORD.pack(written + len(separator), len(data), index, sent_at, flag_bits(flags))
+                out.write(separator + data + b"\n")
+                written += len(separator) + len(data) + 1
+            else:
+                with open(os.path.join(target, maildir_name(index, flags)), "wb") as f:
+                    f.write(data)
+                records += RECORD.pack(0, len(data), index, sent_at, flag_bits(flags))
+                written += len(data)
+    finally:
+        if fmt == "mbox":
+            out.close()
+    return bytes(records), written
+
+
+def shift_records(records, base):
+    """Packed RECORDs with `base` added to every offset."""
+    if not base:
+        return records
+    return b"".join(RECORD.pack(offset + base, length, uid, date, bits)
+                    for offset, length, uid, date, bits in RECORD.iter_unpack(records))
+
+
+def generate_mailbox(directory, folders=None, mix=None, seed=SEED, fmt="mbox", workers=None, end_time=None):
+    """Write the folders, their .idx files and index.json into `directory`. Returns the index manifest."""
+    folders = folders or MAILBOX
+    mix = mix or ATTACHMENT_MIX
+    end_time = end_of_day() if end_time is None else end_time
+    workers = workers or os.cpu_count() or 1
+    parts = os.path.join(directory, ".parts")
+    os.makedirs(parts, exist_ok=True)
+
+    jobs, manifest = [], {"version": INDEX_VERSION, "format": fmt, "seed": seed, "attachments": format_mix(mix),
+                          "end_time": end_time, "record": RECORD.format, "folders": []}
+    for name, count in folders.items():
+        slug = folder_slug(name)
+        if fmt == "maildir":
+            for sub in ("cur", "new", "tmp"):
+                os.makedirs(os.path.join(directory, slug, sub), exist_ok=True)
+        for start in range(1, count + 1, SHARD_SIZE):
+            part = os.path.join(parts, f"{slug}.{start:09d}")
+            jobs.append((directory, fmt, name, start, min(start + SHARD_SIZE, count + 1), count, seed, mix,
+                         end_time, part))
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(write_shard, jobs))
+    else:
+        results = [write_shard(job) for job in jobs]
+
+    for name, count in folders.items():
+        slug = folder_slug(name)
+        shards = [(job, result) for job, result in zip(jobs, results) if job[2] == name]
+        entry = {"name": name, "count": count, "uidvalidity": uidvalidity(name), "index": f"{slug}.idx",
+                 "path": f"{slug}.mbox" if fmt == "mbox" else slug, "bytes": 0}
+        with open(os.path.join(directory, entry["index"]), "wb") as index:
+            if fmt == "mbox":
+                with open(os.path.join(directory, entry["path"]), "wb") as out:
+                    for job, (records, written) in shards:
+                        index.write(shift_records(records, out.tell()))
+                        with open(job[-1], "rb") as part:
+                            shutil.copyfileobj(part, out, 1 << 20)
+                        os.unlink(job[-1])
+            else:
+                for _, (records, _) in shards:
+                    index.write(records)
+        entry["bytes"] = sum(written for _, (_, written) in shards)
+        manifest["folders"].append(entry)
+    shutil.rmtree(parts, ignore_errors=True)
+
+    with open(os.path.join(directory, INDEX_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# --- Reading ----------------------------------------------------------------
+
+
+def load_manifest(directory):
+    """The index.json manifest of a generated mailbox, or None."""
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != INDEX_VERSION or manifest.get("record") != RECORD.format:
+        raise ValueError(f"{path}: unsupported index version/layout")
+    return manifest
+
+
+class FolderIndex:
+    """Memory-mapped .idx (and mbox) of one generated folder; record i is the i-th message in UID order."""
+
+    def __init__(self, directory, entry, fmt):
+        self.name = entry["name"]
+        self.uidvalidity = entry["uidvalidity"]
+        self.fmt = fmt
+        self.path = os.path.join(directory, entry["path"])
+        self._index = self._map(os.path.join(directory, entry["index"]))
+        self.mailbox = self._map(self.path) if fmt == "mbox" else None
+        self.uids = array("I", (uid for _, _, uid, _, _ in RECORD.iter_unpack(self._index)))
+        self.size = sum(length for _, length, _, _, _ in RECORD.iter_unpack(self._index))
+
+    @staticmethod
+    def _map(path):
+        with open(path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.uids)
+
+    def record(self, position):
+        """(offset, length, uid, internal date, flags) of the message at `position`."""
+        offset, length, uid, date, bits = RECORD.unpack_from(self._index, position * RECORD.size)
+        return offset, length, uid, date, bits_flags(bits)
+
+    def records(self):
+        """Raw (offset, length, uid, internal date, flag bits) of every message, in UID order."""
+        return RECORD.iter_unpack(self._index)
+
+    def source(self, position):
+        """Where the message bytes live: (mmap, offset) for mbox, (file path, 0) for Maildir."""
+        offset, _, uid, _, flags = self.record(position)
+        if self.fmt == "mbox":
+            return self.mailbox, offset
+        return os.path.join(self.path, "cur", maildir_name(uid, flags)), 0
+
+    def read(self, position):
+        offset, length = self.record(position)[:2]
+        source, start = self.source(position)
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                return f.read()
+        return source[start:start + length]
+
+
+def verify(directory, samples, rng=None):
+    """Re-read `samples` random messages through the index. Returns a list of problems."""
+    manifest = load_manifest(directory)
+    rng = rng or random.Random(0)
+    indexes = [FolderIndex(directory, entry, manifest["format"]) for entry in manifest["folders"] if entry["count"]]
+    problems = []
+    for _ in range(samples if indexes else 0):
+        folder = rng.choice(indexes)
+        position = rng.randrange(len(folder))
+        uid = folder.uids[position]
+        message = BytesParser(policy=policy.default).parsebytes(folder.read(position), headersonly=True)
+        expected = message_id(manifest["seed"], folder.name, uid)
+        if message["Message-ID"] != expected:
+            problems.append(f"{folder.name} UID {uid}: Message-ID {message['Message-ID']!r}, expected {expected!r}")
+    return problems
+
+
+def main():
+    args = parse_args()
+    folders = parse_folders(args.folder, args.folders)
+    mix = parse_mix(args.attachments)
+
+    print("=" * 60)
+    print("Synthetic Mailbox Generator")
+    print("=" * 60)
+    if os.path.isdir(args.out) and os.listdir(args.out):
+        print(f"\n❌ {args.out} is not empty")
+        sys.exit(1)
+    print(f"\nOutput:      {args.out} ({args.format})")
+    print(f"Messages:    {sum(folders.values()):,} in {len(folders)} folders")
+    print(f"Attachments: {format_mix(mix)}")
+    print(f"Workers:     {args.workers}, seed {args.seed}\n")
+
+    started = time.monotonic()
+    manifest = generate_mailbox(args.out, folders, mix, args.seed, args.format, args.workers,
+                                end_of_day(args.end_date))
+    elapsed = time.monotonic() - started
+
+    for entry in manifest["folders"]:
+        print(f"  {entry['name']:<16} {entry['count']:>9,} messages {entry['bytes'] / 1048576:>10.1f} MB")
+    total = sum(entry["count"] for entry in manifest["folders"])
+    size = sum(entry["bytes"] for entry in manifest["folders"])
+    print(f"\n  {total:,} messages, {size / 1048576:.1f} MB in {elapsed:.1f}s "
+          f"({total / max(elapsed, 1e-6):,.0f} msg/s, {size / 1048576 / max(elapsed, 1e-6):.1f} MB/s)")
+
+    problems = verify(args.out, args.verify, random.Random(args.seed))
+    print("\n" + "=" * 60)
+    if problems:
+        print(f"❌ {len(problems)} of {args.verify} sampled messages do not match the index")
+        for problem in problems[:5]:
+            print(f"   {problem}")
+    else:
+        print(f"✅ Index verified on {args.verify} random messages")
+    print("=" * 60)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Streaming Multipart Bodies
+Constant-memory multipart/form-data bodies for large-file upload tests.
+
+File parts are generated lazily (magic-byte header + patterned or sparse fill), the
+total length is known up front so Content-Length is sent, and the body is read in
+chunks. Works as `data=` for requests and for AsyncHttpClient.
+"""
+
+import os
+import random
+import struct
+import uuid
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+BLOCK_SIZE = 64 * 1024
+
+# Leading bytes that make servers/finfo detect a file type
+MAGIC_BYTES = {
+    "png": b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR",
+    "jpeg": b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00",
+    "gif": b"GIF89a\x01\x00\x01\x00\x80\x00\x00",
+    "webp": b"RIFF\x00\x00\x00\x00WEBPVP8 ",
+    "pdf": b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n",
+    "zip": b"PK\x03\x04\x14\x00\x00\x00\x08\x00",
+    "mp4": b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom",
+    "exe": b"MZ\x90\x00\x03\x00\x00\x00\x04\x00\x00\x00\xff\xff",
+    "php": b"<?php echo 'pwned'; ?>\n",
+}
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "pdf": "application/pdf",
+    "zip": "application/zip",
+    "mp4": "video/mp4",
+    "exe": "application/x-msdownload",
+    "php": "application/x-php",
+}
+
+
+class PatternedFile:
+    """
+    A virtual file of `size` bytes that is never materialized.
+
+    fill: "pattern" (repeating pseudo-random block, defeats compression),
+          "sparse" (zeros) or a bytes pattern to repeat.
+    """
+
+    def __init__(self, filename, size, magic=None, content_type=None, fill="pattern", seed=0):
+        self.filename = filename
+        self.size = size
+        header = MAGIC_BYTES.get(magic, magic) if magic else b""
+        self.header = (header or b"")[:size]
+        self.content_type = content_type or MIME_TYPES.get(magic, "application/octet-stream")
+
+        if fill == "sparse":
+            block = bytes(BLOCK_SIZE)
+        elif fill == "pattern":
+            block = random.Random(seed).randbytes(BLOCK_SIZE)
+        else:
+            block = (fill * (BLOCK_SIZE // len(fill) + 1))[:BLOCK_SIZE]
+        # Doubled so any BLOCK_SIZE window is a single slice
+        self._block2 = block + block
+
+    def __len__(self):
+        return self.size
+
+    def read_at(self, offset, n):
+        end = min(self.size, offset + n)
+        out = []
+        header_len = len(self.header)
+        if offset < header_len:
+            out.append(self.header[offset:min(end, header_len)])
+            offset = header_len
+        while offset < end:
+            rel = (offset - header_len) % BLOCK_SIZE
+            take = min(end - offset, BLOCK_SIZE)
+            out.append(self._block2[rel:rel + take])
+            offset += take
+        return b"".join(out)
+
+
+class MemoryFile:
+    """An in-memory file part (e.g. a real, decodable image from make_png)."""
+
+    def __init__(self, filename, data, content_type="application/octet-stream"):
+        self.filename = filename
+        self.data = data
+        self.content_type = content_type
+
+    def __len__(self):
+        return len(self.data)
+
+    def read_at(self, offset, n):
+        return self.data[offset:offset + n]
+
+
+def parse_size(text):
+    """'64k' -> 65536, '2m' -> 2097152, '100' -> 100"""
+    text = text.strip().lower()
+    scale = {"k": 1024, "m": 1024 * 1024}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def make_png(size, seed=0):
+    """
+    A valid RGB PNG of roughly `size` bytes. Pixels are random so the encoded size
+    tracks the pixel count, and image libraries can decode it (conversions run).
+    """
+    side = max(1, int((max(size, 64) / 3) ** 0.5))
+    rng = random.Random(seed)
+    row = side * 3
+    raw = b"".join(b"\x00" + rng.randbytes(row) for _ in range(side))
+
+    def chunk(kind, payload):
+        return (struct.pack(">I", len(payload)) + kind + payload
+                + struct.pack(">I", zlib.crc32(kind + payload) & 0xFFFFFFFF))
+
+    return (MAGIC_BYTES["png"][:8]
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 1))
+            + chunk(b"IEND", b""))
+
+
+class MultipartStream:
+    """
+    A multipart/form-data body assembled from small byte segments and PatternedFile
+    (or MemoryFile) parts. File-like (read/seek/tell) with a known __len__, so requests sends it with
+    Content-Length instead of buffering it.
+    """
+
+    def __init__(self, fields=None, files=None, boundary=None, chunk_size=CHUNK_SIZE):
+        self.boundary = boundary or f"----worksphere{uuid.uuid4().hex}"
+        self.chunk_size = chunk_size
+        segments = []
+        for name, value in (fields or {}).items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for item in values:
+                segments.append(
+                    f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n".encode()
+                    + (item if isinstance(item, bytes) else str(item).encode()) + b"\r\n")
+        files = files.items() if isinstance(files, dict) else (files or [])
+        for name, part in files:
+            filename = part.filename.replace('"', "%22").replace("\r", "").replace("\n", "")
+            segments.append(
+                f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; "
+                f"filename=\"{filename}\"\r\nContent-Type: {part.content_type}\r\n\r\n".encode())
+            segments.append(part)
+            segments.append(b"\r\n")
+        segments.append(f"--{self.boundary}--\r\n".encode())
+
+        self._segments = segments
+        self.length = sum(len(s) for s in segments)
+        self._position = 0
+        self._index = 0
+        self._offset = 0
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self.length
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.length
+        offset = max(0, min(offset, self.length))
+        self._position = offset
+        self._index = 0
+        for segment in self._segments:
+            if offset < len(segment):
+                break
+            offset -= len(segment)
+            self._index += 1
+        self._offset = offset
+        return self._position
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.length - self._position
+        out = []
+        while n > 0 and self._index < len(self._segments):
+            segment = self._segments[self._index]
+            if isinstance(segment, bytes):
+                data = segment[self._offset:self._offset + n]
+            else:
+                data = segment.read_at(self._offset, n)
+            out.append(data)
+            n -= len(data)
+            self._offset += len(data)
+            self._position += len(data)
+            if self._offset >= len(segment):
+                self._index += 1
+                self._offset = 0
+        return b"".join(out)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
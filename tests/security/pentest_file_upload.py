@@ -9,9 +9,14 @@ import sys
 import os
 import io
 
+from multipart_stream import MultipartStream, PatternedFile
+
 base_url = "http://localhost:8000/api"
 token = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"
 
+# Oversized upload for Test 5 - streamed, so any size costs no client memory
+large_file_size = 10 * 1024 * 1024
+
 headers = {
     "Authorization": f"Bearer {token}",
     "Accept": "application/json"
@@ -161,14 +166,12 @@ print(f"✅ {traversal_blocked}/{len(traversal_names)} path traversal attempts h
 # Test 5: File Size Limits
 print("\n--- Test 5: File Size Limits ---")
 try:
-    # Create oversized file (10MB)
-    large_content = b'\x89PNG\r\n\x1a\n' + (b'\x00' * (10 * 1024 * 1024))
-    
-    files = {"file": ("large_image.png", io.BytesIO(large_content), "image/png")}
+    # Oversized PNG generated lazily and streamed with a known Content-Length
+    body = MultipartStream(files={"file": PatternedFile("large_image.png", large_file_size, magic="png", fill="sparse")})
     response = requests.post(
         f"{base_url}/user/avatar",
-        headers=headers,
-        files=files
+        headers={**headers, "Content-Type": body.content_type},
+        data=body
     )
     
     if response.status_code in [422, 413, 400]:
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Whole-API Security Header Audit
+pentest_headers.py and pentest_session.py (Test 4) only look at /api/user and
+/api/auth/config. Headers can differ per middleware group and per response
+type, so this audit fires one request at a representative route of every
+middleware group in the route index (guest, auth:sanctum, throttle:sensitive,
+permission-gated...), the web routes, a file download, error responses and
+provoked 429s - all at once, so the audit takes about as long as the slowest
+request.
+
+Responses are deduplicated by their security-header set and each probe is
+checked for X-Frame-Options, Content-Security-Policy and, on authenticated or
+sensitive responses, Cache-Control: no-store.
+
+429s are provoked by a concurrent burst at a guest route and at
+/sanctum/csrf-cookie. On a loopback target the burst comes from a separate
+source address so it does not use up the harness's own guest budget.
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from async_http import AsyncHttpClient, HttpError
+from identities import auth_headers
+from route_index import EXCLUDE, load_routes
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+TOKEN = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"
+
+# Test settings
+WEB_PROBES = [("web: SPA", "/"), ("web: SPA deep link", "/auth/login"), ("web: csrf-cookie", "/sanctum/csrf-cookie")]
+DOWNLOAD_PROBES = ["/calendar/events/export", "/audit-logs/export"]
+BURST_ROUTES = [("429: guest", "/api/auth/config"), ("429: web", "/sanctum/csrf-cookie")]
+BURST_SIZE = 40               # Above throttle:guest (25/min) and throttle:10,1
+BURST_SOURCE = "127.0.0.250"  # Loopback source for the bursts
+AUDITED = ["x-frame-options", "content-security-policy", "cache-control", "x-content-type-options",
+           "referrer-policy", "permissions-policy", "strict-transport-security", "x-xss-protection",
+           "x-powered-by", "server"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Whole-API security header audit")
+    parser.add_argument("--token", default=TOKEN)
+    parser.add_argument("--download", action="append", help="Download path under /api (repeatable)")
+    parser.add_argument("--no-burst", action="store_true", help="Do not provoke 429 responses")
+    return parser.parse_args()
+
+
+def group_key(route):
+    """Middleware group of a route, with permission:* and numeric throttles collapsed."""
+    parts = set()
+    for middleware in route["middleware"]:
+        if middleware == "api":
+            continue
+        if middleware.startswith("permission:"):
+            middleware = "permission:*"
+        elif re.fullmatch(r"throttle:\d+,\d+", middleware):
+            middleware = "throttle:N,M"
+        parts.add(middleware)
+    if "auth:sanctum" not in parts:
+        parts.add("guest")
+    return " ".join(sorted(parts))
+
+
+def representatives(routes):
+    """One safe route per middleware group: a parameterless GET, else a POST that will fail validation."""
+    groups = defaultdict(list)
+    for route in routes:
+        if re.search(EXCLUDE, f"{route['method']} {route['uri']} {route['function']}") or "{" in route["uri"]:
+            continue
+        groups[group_key(route)].append(route)
+    chosen = {}
+    for key, candidates in groups.items():
+        gets = [r for r in candidates if r["method"] == "GET"]
+        posts = [r for r in candidates if r["method"] == "POST" and r["params"]]
+        if gets or posts:
+            chosen[key] = (gets or posts)[0]
+    return chosen
+
+
+def origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def is_loopback(url):
+    host = urlsplit(url).hostname or "localhost"
+    try:
+        return host == "localhost" or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def header_set(response):
+    """Audited headers with per-request noise (CSP nonces) normalized."""
+    values = {}
+    for name in AUDITED:
+        value = response.header(name)
+        if value is not None:
+            values[name] = re.sub(r"'nonce-[^']+'", "'nonce-*'", value)
+    return values
+
+
+def missing_headers(headers, sensitive):
+    missing = []
+    frame = headers.get("x-frame-options", "").upper()
+    if frame not in ("DENY", "SAMEORIGIN") and "frame-ancestors" not in headers.get("content-security-policy", ""):
+        missing.append("X-Frame-Options")
+    if "content-security-policy" not in headers:
+        missing.append("Content-Security-Policy")
+    if sensitive and "no-store" not in headers.get("cache-control", "").lower():
+        missing.append("Cache-Control: no-store")
+    return missing
+
+
+def build_probes(routes, args):
+    """(name, kind, client key, method, path, json body, sensitive) for every probe."""
+    probes = []
+    for key, route in sorted(representatives(routes).items()):
+        authed = "auth:sanctum" in route["middleware"]
+        sensitive = authed or "throttle:sensitive" in route["middleware"]
+        body = {} if route["method"] != "GET" else None
+        probes.append((f"api: {key}", "json", "auth" if authed else "guest",
+                       route["method"], route["uri"], body, sensitive))
+    for path in args.download or DOWNLOAD_PROBES:
+        probes.append((f"download: {path}", "download", "auth", "GET", "/api" + path, None, True))
+    probes += [
+        ("error: 401 unauthenticated", "error", "guest", "GET", "/api/user", None, True),
+        ("error: 404 api", "error", "auth", "GET", "/api/__header_audit_missing__", None, True),
+        ("error: 405 api", "error", "auth", "DELETE", "/api/user", None, True),
+        ("error: 404 web", "error", "browser", "GET", "/__header_audit_missing__", None, False),
+    ]
+    probes += [(name, "web", "browser", "GET", path, None, False) for name, path in WEB_PROBES]
+    return probes
+
+
+async def fetch(client, method, path, body):
+    try:
+        return await client.request(method, path, json=body)
+    except HttpError:
+        return None
+
+
+async def burst(client, path, size):
+    """Fire `size` requests at once; returns the first 429 (or None) and the status counts."""
+    responses = await asyncio.gather(*(fetch(client, "GET", path, None) for _ in range(size)))
+    counts = defaultdict(int)
+    for response in responses:
+        counts[response.status if response else "error"] += 1
+    limited = next((r for r in responses if r and r.status == 429), None)
+    return limited, dict(counts)
+
+
+async def run(args):
+    routes = load_routes()
+    base = origin(API_BASE)
+    clients = {
+        "auth": AsyncHttpClient(base, headers=auth_headers(args.token), limit=64),
+        "guest": AsyncHttpClient(base, headers={"Accept": "application/json"}, limit=64),
+        "browser": AsyncHttpClient(base, headers={"Accept": "text/html,application/xhtml+xml"}, limit=16),
+        "burst": AsyncHttpClient(base, headers={"Accept": "application/json"}, limit=BURST_SIZE,
+                                 local_addr=BURST_SOURCE if is_loopback(API_BASE) else None),
+    }
+    probes = build_probes(routes, args)
+    start = time.monotonic()
+    try:
+        jobs = [fetch(clients[client], method, path, body) for _, _, client, method, path, body, _ in probes]
+        if not args.no_burst:
+            jobs += [burst(clients["burst"], path, BURST_SIZE) for _, path in BURST_ROUTES]
+        outcomes = await asyncio.gather(*jobs)
+    finally:
+        for client in clients.values():
+            await client.close()
+    duration = time.monotonic() - start
+
+    results = []
+    for probe, response in zip(probes, outcomes):
+        name, kind, _, method, path, _, sensitive = probe
+        results.append({"probe": name, "kind": kind, "method": method, "path": path,
+                        "sensitive": sensitive, "response": response})
+    for (name, path), (response, counts) in zip(BURST_ROUTES, outcomes[len(probes):]):
+        results.append({"probe": name, "kind": "429", "method": "GET", "path": path,
+                        "sensitive": False, "response": response, "burst": counts})
+    return results, duration
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Whole-API Security Header Audit")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:  {origin(API_BASE)}\n")
+
+    results, duration = asyncio.run(run(args))
+
+    header_sets = {}
+    probes_report = []
+    failures = 0
+    for result in results:
+        response = result.pop("response")
+        entry = dict(result)
+        if response is None:
+            entry.update({"status": None, "missing": [], "note": "no response"
+                          if "burst" not in result else f"no 429 provoked {result['burst']}"})
+            probes_report.append(entry)
+            continue
+        headers = header_set(response)
+        signature = json.dumps(headers, sort_keys=True)
+        if signature not in header_sets:
+            header_sets[signature] = {"id": len(header_sets) + 1, "headers": headers, "probes": []}
+        header_sets[signature]["probes"].append(result["probe"])
+        missing = missing_headers(headers, result["sensitive"])
+        failures += bool(missing)
+        entry.update({"status": response.status, "content_type": response.header("content-type", ""),
+                      "header_set": header_sets[signature]["id"], "missing": missing})
+        probes_report.append(entry)
+
+    print(f"--- {len(header_sets)} distinct header sets across {len(results)} probes ({duration * 1000:.0f}ms) ---")
+    for header_set_info in header_sets.values():
+        print(f"\n  [{header_set_info['id']}] {', '.join(header_set_info['probes'])}")
+        for name in AUDITED:
+            value = header_set_info["headers"].get(name)
+            if value:
+                print(f"      {name}: {value[:90]}{'...' if len(value) > 90 else ''}")
+
+    print("\n--- Missing headers by group ---")
+    for entry in probes_report:
+        status = entry["status"] if entry["status"] is not None else "-"
+        if entry.get("note"):
+            print(f"  ⏭️  {entry['probe']}: {entry['note']}")
+        elif entry["missing"]:
+            print(f"  ❌ {entry['probe']} ({entry['method']} {entry['path']} -> {status}): "
+                  f"missing {', '.join(entry['missing'])}")
+        else:
+            print(f"  ✅ {entry['probe']} ({entry['method']} {entry['path']} -> {status})")
+
+    print("\n" + "=" * 60)
+    if failures:
+        print(f"❌ FAILED: {failures} of {len(probes_report)} probes lack required security headers")
+    else:
+        print("✅ PASSED: Every probed group sends the required security headers")
+    print("=" * 60)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": origin(API_BASE),
+        "duration_ms": round(duration * 1000, 1),
+        "header_sets": list(header_sets.values()),
+        "probes": probes_report,
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "header_audit_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
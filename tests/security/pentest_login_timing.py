@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Login Timing Attack Detector (User Enumeration)
+pentest_auth.py Test 5 only compares status codes. This test looks for a timing
+side channel on /api/login: Auth::attempt only runs bcrypt when the user exists,
+so failed logins for real accounts can be measurably slower than for unknown ones.
+
+Sends thousands of failed logins per class (existing vs. non-existing email) in
+interleaved, shuffled batches, spread over a pool of source addresses
+(127.0.0.x when the API is on loopback) and paced below throttle:guest
+(25/min per IP) and the LoginRequest lockout (5 failures per email|IP).
+The latency distributions are compared with a two-sample Kolmogorov-Smirnov
+test on trimmed samples; the report gives the median difference, a bootstrap
+confidence interval and the test's confidence.
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from async_http import AsyncHttpClient, HttpError
+from identities import auth_headers
+from perf_stats import bootstrap_ci, ks_2samp, percentile, summarize, trimmed
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+TOKEN = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"  # Admin, used to list real emails
+KNOWN_EMAILS = ["admin@example.com", "member@example.com"]
+
+# Test settings
+ATTEMPTS_PER_CLASS = 2000
+BATCH_SIZE = 50               # Attempts per class per shuffled batch
+SOURCES = 64                  # Source addresses in the pool (loopback only)
+GUEST_PER_MINUTE = 20         # throttle:guest allows 25/min per IP; keep a margin
+LOCKOUT_ATTEMPTS = 4          # LoginRequest locks an email|IP after 5 failures per minute
+CONCURRENCY = 8               # Low, so server-side queueing does not swamp the signal
+TRIM = 0.05                   # Fraction trimmed from each tail before testing
+ALPHA = 0.001                 # Significance level for the KS test
+MIN_EFFECT_MS = 1.0           # Smallest median difference reported as a side channel
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Login timing side-channel detector")
+    parser.add_argument("--attempts", type=int, default=ATTEMPTS_PER_CLASS, help="Attempts per class")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--sources", type=int, default=SOURCES, help="Loopback source addresses to use")
+    parser.add_argument("--rate", type=float, default=GUEST_PER_MINUTE, help="Attempts per minute per source")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--existing", action="append", help="Existing account email (repeatable)")
+    parser.add_argument("--token", default=TOKEN, help="Token used to discover existing emails")
+    parser.add_argument("--xff", action="store_true",
+                        help="Also send X-Forwarded-For per source (only if the app trusts the proxy)")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+class Source:
+    """One client address with its own connection pool and guest-limit pacing."""
+
+    def __init__(self, address, rate, xff):
+        headers = {"Accept": "application/json"}
+        if xff and address:
+            headers["X-Forwarded-For"] = address
+        loopback = address and not xff
+        self.address = address or "default"
+        self.http = AsyncHttpClient(API_BASE, headers=headers, limit=2,
+                                    local_addr=address if loopback else None)
+        self.interval = 60.0 / rate
+        self.next_at = 0.0
+        self.recent = defaultdict(deque)   # email -> attempt times (lockout window)
+
+    def email_ready(self, email, now):
+        window = self.recent[email]
+        while window and now - window[0] > 60:
+            window.popleft()
+        return len(window) < LOCKOUT_ATTEMPTS
+
+
+async def discover_emails(token):
+    emails = set()
+    async with AsyncHttpClient(API_BASE, headers=auth_headers(token)) as http:
+        try:
+            response = await http.get("/users", params={"per_page": 100})
+            if response.status == 200:
+                users = (response.json() or {}).get("data", [])
+                for user in users if isinstance(users, list) else []:
+                    if isinstance(user, dict) and user.get("email"):
+                        emails.add(user["email"])
+        except (HttpError, ValueError):
+            pass
+    return sorted(emails)
+
+
+def source_addresses(count, xff):
+    host = urlsplit(API_BASE).hostname or "localhost"
+    if xff:
+        return [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(1, count + 1)]
+    try:
+        loopback = host == "localhost" or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        return [None]
+    return [f"127.0.{i // 250}.{i % 250 + 2}" for i in range(count)]
+
+
+class Scheduler:
+    """Hands out (source, email) pairs that respect the guest limit and the lockout window."""
+
+    def __init__(self, sources, existing):
+        self.sources = sources
+        self.existing = existing
+        self.cursor = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, kind):
+        while True:
+            async with self.lock:
+                now = time.monotonic()
+                source = min(self.sources, key=lambda s: s.next_at)
+                wait = source.next_at - now
+                if wait <= 0:
+                    email = self.pick_email(kind, source, now)
+                    if email:
+                        source.next_at = now + source.interval
+                        if kind == "existing":
+                            source.recent[email].append(now)
+                        return source, email
+                    # Every existing email is in its lockout window for this source
+                    source.next_at = now + 1
+                    wait = 0.05
+            await asyncio.sleep(wait)
+
+    def pick_email(self, kind, source, now):
+        if kind == "missing":
+            return f"nouser-{uuid.uuid4().hex[:16]}@example.com"
+        for _ in range(len(self.existing)):
+            email = self.existing[self.cursor % len(self.existing)]
+            self.cursor += 1
+            if source.email_ready(email, now):
+                return email
+        return None
+
+
+async def run(args, rng):
+    existing = sorted(set((args.existing or []) + await discover_emails(args.token))) or KNOWN_EMAILS
+    sources = [Source(a, args.rate, args.xff) for a in source_addresses(args.sources, args.xff)]
+    # Half the guest budget goes to each class; existing emails are further capped by the lockout
+    per_class = min(len(sources) * args.rate / 2, len(sources) * len(existing) * LOCKOUT_ATTEMPTS)
+    print(f"  Existing emails: {len(existing)}, sources: {len(sources)} ({sources[0].address}...)")
+    print(f"  Paced at {args.rate:g}/min per source -> ~{per_class:.0f} attempts/min per class, "
+          f"expected duration ~{args.attempts / per_class:.1f} min\n")
+
+    scheduler = Scheduler(sources, existing)
+    samples = {"existing": [], "missing": []}
+    batch_medians = []
+    rejected = defaultdict(int)
+
+    async def attempt(kind, batch_samples):
+        source, email = await scheduler.acquire(kind)
+        try:
+            response = await source.http.post("/login", json={"email": email,
+                                                              "password": f"wrong-{uuid.uuid4().hex[:12]}"})
+        except HttpError:
+            rejected["error"] += 1
+            return
+        if response.status == 429:
+            retry = int(response.header("retry-after", "60") or 60)
+            source.next_at = time.monotonic() + retry
+            rejected["429"] += 1
+            return
+        if response.status != 422 or "Too many" in response.text:
+            # Lockout / success / other responses skip bcrypt differently; not comparable
+            rejected[str(response.status) if response.status != 422 else "lockout"] += 1
+            return
+        batch_samples[kind].append(response.elapsed * 1000)
+
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def gated(kind, batch_samples):
+        async with gate:
+            await attempt(kind, batch_samples)
+
+    batches = (args.attempts + args.batch - 1) // args.batch
+    start = time.monotonic()
+    try:
+        for index in range(batches):
+            size = min(args.batch, args.attempts - index * args.batch)
+            order = ["existing"] * size + ["missing"] * size
+            rng.shuffle(order)
+            batch_samples = {"existing": [], "missing": []}
+            # Launch in shuffled order; the gate keeps them interleaved in time
+            await asyncio.gather(*(gated(kind, batch_samples) for kind in order))
+            for kind in samples:
+                samples[kind].extend(batch_samples[kind])
+            if batch_samples["existing"] and batch_samples["missing"]:
+                batch_medians.append(percentile(batch_samples["existing"], 50)
+                                     - percentile(batch_samples["missing"], 50))
+            done = len(samples["existing"]) + len(samples["missing"])
+            print(f"  Batch {index + 1}/{batches}: {done} samples, "
+                  f"median diff so far {percentile(samples['existing'], 50) - percentile(samples['missing'], 50):+.2f}ms")
+    finally:
+        for source in sources:
+            await source.http.close()
+    return samples, batch_medians, dict(rejected), time.monotonic() - start, len(existing), len(sources)
+
+
+def analyze(samples, batch_medians, rng):
+    existing = trimmed(samples["existing"], TRIM)
+    missing = trimmed(samples["missing"], TRIM)
+    d, p = ks_2samp(existing, missing)
+    median_diff = percentile(existing, 50) - percentile(missing, 50) if existing and missing else 0.0
+    low, high = bootstrap_ci(existing, missing, rng=rng)
+    consistent = (sum(1 for m in batch_medians if (m > 0) == (median_diff > 0)) / len(batch_medians)
+                  if batch_medians else 0)
+    detected = p < ALPHA and abs(median_diff) >= MIN_EFFECT_MS
+    return {
+        "samples": {k: len(v) for k, v in samples.items()},
+        "trim": TRIM,
+        "existing_ms": summarize(existing),
+        "missing_ms": summarize(missing),
+        "median_difference_ms": round(median_diff, 3),
+        "median_difference_ci95_ms": [round(low, 3), round(high, 3)] if low is not None else None,
+        "ks_statistic": round(d, 4),
+        "p_value": p,
+        "confidence": round(1 - p, 6),
+        "batches_with_same_sign": round(consistent, 3),
+        "detected": detected,
+    }
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    print("=" * 60)
+    print("Login Timing Attack Detector")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:  {API_BASE}/login")
+    print(f"Attempts: {args.attempts} per class, batches of {args.batch} per class\n")
+
+    samples, batch_medians, rejected, duration, emails, sources = asyncio.run(run(args, rng))
+    result = analyze(samples, batch_medians, rng)
+
+    print("\n--- Latency (trimmed) ---")
+    print(f"  existing:     n={result['existing_ms']['count']} p50={result['existing_ms']['p50']}ms "
+          f"mean={result['existing_ms']['mean']}ms")
+    print(f"  non-existing: n={result['missing_ms']['count']} p50={result['missing_ms']['p50']}ms "
+          f"mean={result['missing_ms']['mean']}ms")
+    ci = result["median_difference_ci95_ms"]
+    print(f"  Median difference: {result['median_difference_ms']:+.3f}ms "
+          f"(95% CI {ci[0]:+.3f} .. {ci[1]:+.3f})" if ci else "  Median difference: n/a")
+    print(f"  KS D={result['ks_statistic']} p={result['p_value']:.3g} (confidence {result['confidence']:.4%})")
+    print(f"  Batches agreeing on the sign: {result['batches_with_same_sign']:.0%}")
+    if rejected:
+        print(f"  ℹ️  Discarded responses: {rejected}")
+
+    print("\n" + "=" * 60)
+    if min(result["samples"].values()) < 30:
+        print("⚠️  Too few valid samples for a conclusion")
+    elif result["detected"]:
+        print(f"❌ FAILED: Login timing reveals existing accounts "
+              f"({result['median_difference_ms']:+.2f}ms, confidence {result['confidence']:.4%})")
+    else:
+        print("✅ PASSED: No significant timing difference between existing and unknown users")
+    print("=" * 60)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": f"{API_BASE}/login",
+        "duration_seconds": round(duration, 1),
+        "existing_emails": emails,
+        "sources": sources,
+        "alpha": ALPHA,
+        "min_effect_ms": MIN_EFFECT_MS,
+        "discarded": rejected,
+        **result,
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "login_timing_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(1 if result["detected"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Performance Regression Gate
+Compares this run's per-endpoint latency and throughput with a stored baseline
+and fails only on statistically significant slowdowns larger than a
+configurable effect size, so noise does not fail runs but real regressions do.
+
+Samples come from the suites' metrics snapshots (harness_metrics.py keeps a
+reservoir of successful-request latencies and logs per-second completion counts
+per suite/endpoint; the gate uses the last THROUGHPUT_WINDOW seconds of each).
+For every endpoint with enough samples on both sides:
+
+  latency     regression when the median grew by at least --effect (relative) and
+              the shift is significant: one-sided Mann-Whitney U p < --alpha, or
+              with --method bootstrap the whole bootstrap CI of the median
+              difference lies above --effect x baseline median.
+  throughput  same test on per-second completions, in the other direction.
+
+Baselines live in perf_baseline.json; --update replaces the entries of every
+endpoint measured in this run (others are kept).
+
+Usage:
+  python3 perf_gate.py [--baseline perf_baseline.json] [--effect 0.10] [--alpha 0.01] [--method mwu|bootstrap]
+  python3 perf_gate.py --update        # accept the current run as the new baseline
+  (stability_runner.py --gate / --update-baseline run the same checks after the suites)
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime
+
+from harness_metrics import METRICS_DIR, collect_samples
+from perf_stats import bootstrap_ci, mann_whitney_u, percentile
+
+# Configuration
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+
+# Test settings
+EFFECT_SIZE = 0.10            # Minimum relative slowdown that can fail the gate
+ALPHA = 0.01
+MIN_SAMPLES = 30              # Per side, for latency (throughput needs MIN_SECONDS)
+MIN_SECONDS = 10
+BASELINE_SAMPLES = 1000       # Latencies stored per endpoint in the baseline
+BOOTSTRAP_SAMPLES = 400       # Subsample size per side for --method bootstrap
+BOOTSTRAP_ITERATIONS = 1000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Statistical performance regression gate")
+    parser.add_argument("--dir", default=METRICS_DIR, help="Metrics snapshot directory of the run")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--effect", type=float, default=EFFECT_SIZE, help="Relative effect size (0.10 = 10%%)")
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    parser.add_argument("--method", choices=["mwu", "bootstrap"], default="mwu")
+    parser.add_argument("--update", action="store_true", help="Store this run as the baseline")
+    return parser.parse_args()
+
+
+def per_second(counts):
+    """Completions per second over the active span, without the partial first/last second."""
+    if not counts:
+        return []
+    first, last = min(counts), max(counts)
+    return [counts.get(second, 0) for second in range(first + 1, last)]
+
+
+def current_run(directory):
+    """{"suite|endpoint": {"latency": [...], "throughput": [...]}} from the run's snapshots."""
+    latency, throughput = collect_samples(directory)
+    run = {}
+    for key in set(latency) | set(throughput):
+        run["|".join(key)] = {"latency": latency.get(key, []), "throughput": per_second(throughput.get(key, {}))}
+    return run
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"endpoints": {}}
+
+
+def update_baseline(path, run, rng=None):
+    rng = rng or random.Random(0)
+    baseline = load_baseline(path)
+    for key, data in run.items():
+        latency = data["latency"]
+        if len(latency) > BASELINE_SAMPLES:
+            latency = rng.sample(latency, BASELINE_SAMPLES)
+        baseline["endpoints"][key] = {"latency": [round(v, 6) for v in latency],
+                                      "throughput": data["throughput"], "updated": datetime.now().isoformat()}
+    baseline["updated"] = datetime.now().isoformat()
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=1)
+    return baseline
+
+
+def slowdown(base, current, effect, alpha, method, rng):
+    """
+    Test whether `current` is larger than `base` by at least `effect`.
+    Returns (regressed, relative change of the median, p-value or CI).
+    """
+    base_median, current_median = percentile(base, 50), percentile(current, 50)
+    scale = abs(base_median)
+    change = (current_median - base_median) / scale if scale else 0.0
+    if method == "bootstrap":
+        a = rng.sample(current, min(len(current), BOOTSTRAP_SAMPLES))
+        b = rng.sample(base, min(len(base), BOOTSTRAP_SAMPLES))
+        low, high = bootstrap_ci(a, b, iterations=BOOTSTRAP_ITERATIONS, confidence=1 - alpha, rng=rng)
+        relative = (low / scale, high / scale) if scale else (0.0, 0.0)
+        return relative[0] >= effect, change, [round(relative[0], 4), round(relative[1], 4)]
+    _, p = mann_whitney_u(current, base)
+    return p < alpha and change >= effect, change, p
+
+
+def evaluate(run, baseline, effect=EFFECT_SIZE, alpha=ALPHA, method="mwu"):
+    """Compare `run` with `baseline`. Returns a list of per-endpoint/metric results."""
+    rng = random.Random(0)
+    results = []
+    for key in sorted(run):
+        base = baseline.get("endpoints", {}).get(key)
+        suite, _, endpoint = key.partition("|")
+        if base is None:
+            results.append({"suite": suite, "endpoint": endpoint, "metric": "latency", "status": "new"})
+            continue
+        for metric, minimum in (("latency", MIN_SAMPLES), ("throughput", MIN_SECONDS)):
+            current, reference = run[key][metric], base.get(metric, [])
+            entry = {"suite": suite, "endpoint": endpoint, "metric": metric,
+                     "samples": [len(reference), len(current)]}
+            if len(current) < minimum or len(reference) < minimum:
+                entry["status"] = "insufficient"
+                results.append(entry)
+                continue
+            if metric == "latency":
+                regressed, change, evidence = slowdown(reference, current, effect, alpha, method, rng)
+                entry.update({"baseline_p50_ms": round(percentile(reference, 50) * 1000, 2),
+                              "current_p50_ms": round(percentile(current, 50) * 1000, 2)})
+            else:
+                # Negated so a throughput drop is tested like a latency increase
+                regressed, change, evidence = slowdown([-v for v in reference], [-v for v in current],
+                                                       effect, alpha, method, rng)
+                change = -change
+                if isinstance(evidence, list):
+                    evidence = [-evidence[1], -evidence[0]]
+                entry.update({"baseline_rps": round(percentile(reference, 50), 2),
+                              "current_rps": round(percentile(current, 50), 2)})
+            entry.update({"change": round(change, 4), "evidence": evidence,
+                          "status": "regression" if regressed else "ok"})
+            results.append(entry)
+    return results
+
+
+def print_results(results, effect, method):
+    regressions = [r for r in results if r["status"] == "regression"]
+    compared = [r for r in results if r["status"] in ("ok", "regression")]
+    print(f"  Compared {len(compared)} endpoint metrics ({method}, effect >= {effect * 100:.0f}%)")
+    for r in regressions:
+        if r["metric"] == "latency":
+            detail = f"p50 {r['baseline_p50_ms']}ms -> {r['current_p50_ms']}ms"
+        else:
+            detail = f"{r['baseline_rps']} -> {r['current_rps']} req/s"
+        evidence = (f"CI [{r['evidence'][0] * 100:+.0f}%, {r['evidence'][1] * 100:+.0f}%]"
+                    if isinstance(r["evidence"], list) else f"p={r['evidence']:.2g}")
+        print(f"  ❌ {r['suite']}: {r['endpoint']} {r['metric']} {detail} ({r['change'] * 100:+.0f}%, {evidence})")
+    new = sum(1 for r in results if r["status"] == "new")
+    insufficient = sum(1 for r in results if r["status"] == "insufficient")
+    if new:
+        print(f"  ℹ️  {new} endpoints have no baseline yet (store one with --update)")
+    if insufficient:
+        print(f"  ⏭️  {insufficient} endpoint metrics skipped: too few samples")
+    return regressions
+
+
+def gate(directory=METRICS_DIR, baseline_path=BASELINE_PATH, effect=EFFECT_SIZE, alpha=ALPHA, method="mwu",
+         update=False):
+    """Run the gate for a finished run. Returns a report dict with a "passed" flag."""
+    run = current_run(directory)
+    if update:
+        update_baseline(baseline_path, run)
+        print(f"  ✅ Baseline updated for {len(run)} endpoints: {baseline_path}")
+        return {"passed": True, "updated": True, "endpoints": len(run)}
+    results = evaluate(run, load_baseline(baseline_path), effect, alpha, method)
+    regressions = print_results(results, effect, method)
+    return {"passed": not regressions, "method": method, "effect": effect, "alpha": alpha,
+            "baseline": baseline_path, "regressions": regressions, "results": results}
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Performance Regression Gate")
+    print("=" * 60)
+    print(f"\nRun:      {args.dir}")
+    print(f"Baseline: {args.baseline}\n")
+
+    report = gate(args.dir, args.baseline, args.effect, args.alpha, args.method, args.update)
+
+    print("\n" + "=" * 60)
+    if report["passed"]:
+        print("✅ PASSED: No significant performance regression")
+    else:
+        print(f"❌ FAILED: {len(report['regressions'])} significant regressions")
+    print("=" * 60)
+
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_gate_report.json")
+    with open(report_path, "w") as f:
+        json.dump(dict(report, timestamp=datetime.now().isoformat()), f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Performance Statistics Helpers
+Percentiles, latency summaries and process memory readings shared by the load tools
+"""
+
+import asyncio
+import math
+import os
+import random
+import time
+
+
+def percentile(values, p):
+    """Return the p-th percentile (0-100) using linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return float(ordered[0])
+    rank = (p / 100.0) * (len(ordered) - 1)
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return float(ordered[low])
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values, scale=1.0):
+    """
+    Summarize a list of samples (count, min, mean, p50/p90/p95/p99, max).
+    `scale` converts units, e.g. 1000 turns seconds into milliseconds.
+    """
+    if not values:
+        return {"count": 0, "min": 0, "mean": 0, "p50": 0, "p90": 0, "p95": 0, "p99": 0, "max": 0}
+    ordered = sorted(v * scale for v in values)
+    return {
+        "count": len(ordered),
+        "min": round(ordered[0], 2),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": round(percentile(ordered, 50), 2),
+        "p90": round(percentile(ordered, 90), 2),
+        "p95": round(percentile(ordered, 95), 2),
+        "p99": round(percentile(ordered, 99), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def format_summary(summary, unit="ms"):
+    """One-line rendering of a summarize() result."""
+    if not summary["count"]:
+        return "no samples"
+    return (f"n={summary['count']} p50={summary['p50']}{unit} p95={summary['p95']}{unit} "
+            f"p99={summary['p99']}{unit} max={summary['max']}{unit}")
+
+
+def histogram_quantile(buckets, q, bounds):
+    """
+    Quantile from per-bucket counts (index -> count) of a histogram with upper
+    `bounds` (plus a final +Inf bucket), interpolated linearly like PromQL.
+    """
+    total = sum(buckets.values())
+    if total <= 0:
+        return None
+    rank = q * total
+    seen, lower = 0.0, 0.0
+    for index, upper in enumerate(tuple(bounds) + (float("inf"),)):
+        count = buckets.get(index, 0)
+        if count > 0 and seen + count >= rank:
+            if upper == float("inf"):
+                return lower
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+        lower = upper
+    return lower
+
+
+def linear_fit(xs, ys):
+    """Least-squares fit y = slope * x + intercept. Returns (slope, intercept, r)."""
+    n = len(xs)
+    if n < 2:
+        return 0.0, (ys[0] if ys else 0.0), 0.0
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    syy = sum((y - mean_y) ** 2 for y in ys)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    slope = sxy / sxx if sxx else 0.0
+    r = sxy / math.sqrt(sxx * syy) if sxx and syy else 0.0
+    return slope, mean_y - slope * mean_x, r
+
+
+def lag_correlation(leader, follower, max_lag, min_pairs=10):
+    """
+    Pearson r between leader[t] and follower[t + lag] for lag in -max_lag..max_lag,
+    over two equally spaced series (None marks a gap). A strong positive lag means
+    changes in `leader` show up in `follower` `lag` steps later.
+    Returns [(lag, r, pairs)] for lags with at least `min_pairs` pairs and
+    variation on both sides (r is undefined for a flat series).
+    """
+    results = []
+    for lag in range(-max_lag, max_lag + 1):
+        pairs = [(leader[i], follower[i + lag]) for i in range(max(0, -lag), min(len(leader), len(follower) - lag))
+                 if leader[i] is not None and follower[i + lag] is not None]
+        if len(pairs) >= min_pairs and len({a for a, _ in pairs}) > 1 and len({b for _, b in pairs}) > 1:
+            _, _, r = linear_fit([a for a, _ in pairs], [b for _, b in pairs])
+            results.append((lag, r, len(pairs)))
+    return results
+
+
+def trimmed(values, fraction=0.05):
+    """Sorted copy without the lowest and highest `fraction` of values."""
+    ordered = sorted(values)
+    cut = int(len(ordered) * fraction)
+    return ordered[cut:len(ordered) - cut] if cut else ordered
+
+
+def ks_2samp(a, b):
+    """
+    Two-sample Kolmogorov-Smirnov test. Returns (D, p-value) using the asymptotic
+    Kolmogorov distribution (accurate for the sample sizes the harness collects).
+    """
+    a, b = sorted(a), sorted(b)
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return 0.0, 1.0
+    i = j = 0
+    d = 0.0
+    while i < n1 and j < n2:
+        x = min(a[i], b[j])
+        while i < n1 and a[i] <= x:
+            i += 1
+        while j < n2 and b[j] <= x:
+            j += 1
+        d = max(d, abs(i / n1 - j / n2))
+    ne = n1 * n2 / (n1 + n2)
+    lam = (math.sqrt(ne) + 0.12 + 0.11 / math.sqrt(ne)) * d
+    if lam < 1e-3:
+        return d, 1.0
+    p = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * lam * lam) for k in range(1, 101))
+    return d, min(1.0, max(0.0, p))
+
+
+def mann_whitney_u(a, b):
+    """
+    One-sided Mann-Whitney U test that values in `a` tend to be larger than in `b`.
+    Returns (U of a, p-value) using the normal approximation with tie and continuity
+    corrections (fine for the 30+ samples per side perf_gate.MIN_SAMPLES requires).
+    """
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return 0.0, 1.0
+    pooled = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    rank_sum_a, ties, i = 0.0, 0.0, 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        rank_sum_a += rank * sum(1 for k in range(i, j + 1) if pooled[k][1] == 0)
+        size = j - i + 1
+        ties += size ** 3 - size
+        i = j + 1
+    u = rank_sum_a - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def bootstrap_ci(a, b, statistic=None, iterations=2000, confidence=0.95, rng=None):
+    """Bootstrap CI for statistic(a) - statistic(b) (default: median). Returns (low, high)."""
+    rng = rng or random.Random(0)
+    statistic = statistic or (lambda values: percentile(values, 50))
+    if not a or not b:
+        return None, None
+    diffs = sorted(
+        statistic([rng.choice(a) for _ in a]) - statistic([rng.choice(b) for _ in b])
+        for _ in range(iterations)
+    )
+    tail = (1 - confidence) / 2
+    return percentile(diffs, tail * 100), percentile(diffs, (1 - tail) * 100)
+
+
+def rss_bytes(pid="self"):
+    """Resident set size of a process from /proc (Linux). Returns None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def find_pids(pattern):
+    """PIDs whose command line contains `pattern` (e.g. 'reverb:start'), via /proc."""
+    pids = []
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\x00", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        if pattern in cmdline:
+            pids.append(int(entry))
+    return pids
+
+
+def total_rss(patterns):
+    """Summed RSS of every process matching any of `patterns` (worker pools come and go)."""
+    pids = {pid for pattern in patterns for pid in find_pids(pattern)}
+    return sum(rss_bytes(pid) or 0 for pid in pids)
+
+
+class RssSampler:
+    """Samples total_rss(patterns) every `interval` seconds until `stop` is set (asyncio)."""
+
+    def __init__(self, patterns, interval=0.5):
+        self.patterns = patterns
+        self.interval = interval
+        self.samples = []  # (monotonic, bytes)
+
+    async def run(self, stop):
+        while not stop.is_set():
+            self.samples.append((time.monotonic(), total_rss(self.patterns)))
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def summary(self):
+        values = [rss for _, rss in self.samples if rss]
+        if not values:
+            return None
+        return {
+            "before_mb": round(values[0] / 1048576, 1),
+            "peak_mb": round(max(values) / 1048576, 1),
+            "after_mb": round(values[-1] / 1048576, 1),
+            "growth_mb": round((values[-1] - values[0]) / 1048576, 1),
+        }
+
+
+def raise_fd_limit():
+    """Raise the soft open-files limit to the hard limit. Returns the new soft limit."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        target = hard if hard != resource.RLIM_INFINITY else 1048576
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            return target
+        except (ValueError, OSError):
+            pass
+    return soft
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Reverb (Pusher Protocol) Client
+Minimal asyncio WebSocket client speaking the Pusher protocol that Laravel Reverb uses.
+Standard library only; private/presence channels are authorized via /api/broadcasting/auth.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import struct
+import time
+
+# Defaults match .env.example (REVERB_HOST / REVERB_PORT / REVERB_APP_KEY)
+REVERB_HOST = "localhost"
+REVERB_PORT = 9000
+REVERB_APP_KEY = "worksphere-key"
+PROTOCOL_VERSION = 7
+
+# Channel definitions from routes/channels.php (order matters: tickets.queue
+# must match before tickets.{ticketId}, same as in the routes file)
+CHANNEL_PATTERNS = [
+    "App.Models.User.{publicId}",
+    "presence.{publicId}",
+    "user.{publicId}",
+    "online-users",
+    "tickets.queue",
+    "tickets.{ticketId}",
+    "dm.{chatPublicId}",
+    "group.{chatPublicId}",
+    "email-account.{publicId}",
+    "personal-notes.{publicId}",
+    "teams.{teamId}.projects",
+    "projects.{projectId}.tasks",
+]
+
+_PATTERN_REGEXES = [
+    (pattern, re.compile("^" + re.sub(r"\\\{\w+\\\}", r"[^.]+", re.escape(pattern)) + "$"))
+    for pattern in CHANNEL_PATTERNS
+]
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+class ReverbError(Exception):
+    """Raised on WebSocket handshake or protocol failures."""
+
+
+class SubscriptionError(ReverbError):
+    """Raised when Reverb rejects a subscription (pusher:subscription_error)."""
+
+
+class ChannelAuthError(ReverbError):
+    """Raised when /api/broadcasting/auth denies a channel."""
+
+    def __init__(self, channel, status, body=""):
+        super().__init__(f"auth for {channel} denied ({status})")
+        self.channel = channel
+        self.status = status
+        self.body = body
+
+
+def channel_requires_auth(channel):
+    return channel.startswith("private-") or channel.startswith("presence-")
+
+
+def channel_pattern(channel):
+    """Map a concrete channel name (e.g. 'private-dm.abc') to its routes/channels.php pattern."""
+    name = channel
+    for prefix in ("private-", "presence-"):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+            break
+    for pattern, regex in _PATTERN_REGEXES:
+        if regex.match(name):
+            return pattern
+    return "unknown"
+
+
+def _mask(payload, key):
+    """XOR-mask a client frame payload (RFC 6455 5.3) without a per-byte loop."""
+    n = len(payload)
+    if not n:
+        return payload
+    stream = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(stream, "big")).to_bytes(n, "big")
+
+
+def websocket_accept(key):
+    """Sec-WebSocket-Accept value for a client's Sec-WebSocket-Key."""
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+
+
+def accept_websocket(writer, headers, extra=()):
+    """Server side of the handshake: answer an upgrade request (lowercased headers) with 101."""
+    lines = ["HTTP/1.1 101 Switching Protocols", "Upgrade: websocket", "Connection: Upgrade",
+             f"Sec-WebSocket-Accept: {websocket_accept(headers.get('sec-websocket-key', ''))}"]
+    lines += [f"{name}: {value}" for name, value in extra]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+
+def encode_frame(opcode, payload, mask=True):
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    n = len(payload)
+    if n < 126:
+        header.append(mask_bit | n)
+    elif n < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", n)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", n)
+    if not mask:
+        return bytes(header) + payload
+    key = os.urandom(4)
+    return bytes(header) + key + _mask(payload, key)
+
+
+async def read_frame(reader):
+    """Read one frame. Returns (fin, opcode, payload)."""
+    b1, b2 = await reader.readexactly(2)
+    fin = bool(b1 & 0x80)
+    opcode = b1 & 0x0F
+    n = b2 & 0x7F
+    if n == 126:
+        n = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif n == 127:
+        n = struct.unpack("!Q", await reader.readexactly(8))[0]
+    key = await reader.readexactly(4) if b2 & 0x80 else None
+    payload = await reader.readexactly(n) if n else b""
+    if key:
+        payload = _mask(payload, key)
+    return fin, opcode, payload
+
+
+async def authorize(http, socket_id, channel):
+    """
+    Authorize a private/presence channel through /api/broadcasting/auth.
+    `http` is an AsyncHttpClient bound to the API base. Returns (auth dict, latency s).
+    """
+    response = await http.post("/broadcasting/auth",
+                               json={"socket_id": socket_id, "channel_name": channel})
+    if response.status != 200:
+        raise ChannelAuthError(channel, response.status, response.text[:200])
+    return response.json(), response.elapsed
+
+
+class PusherConnection:
+    """
+    One WebSocket connection to Reverb.
+
+    Listeners registered with on(event, callback) are called as
+    callback(channel, event, data, received_at) where received_at is time.monotonic().
+    Use event "*" to receive every non-internal event.
+    """
+
+    def __init__(self, host=REVERB_HOST, port=REVERB_PORT, app_key=REVERB_APP_KEY, tls=False):
+        self.host = host
+        self.port = port
+        self.app_key = app_key
+        self.tls = tls
+        self.socket_id = None
+        self.activity_timeout = None
+        self.closed = asyncio.Event()
+        self.errors = []
+        self._reader = None
+        self._writer = None
+        self._task = None
+        self._established = None
+        self._pending = {}
+        self._listeners = {}
+        self._send_lock = asyncio.Lock()
+
+    async def connect(self, timeout=10.0):
+        """Open the socket, complete the handshake and wait for the socket_id."""
+        self._established = asyncio.get_running_loop().create_future()
+        await asyncio.wait_for(self._handshake(), timeout)
+        self._task = asyncio.create_task(self._read_loop())
+        try:
+            await asyncio.wait_for(asyncio.shield(self._established), timeout)
+        except BaseException:
+            await self.close()
+            raise
+        return self.socket_id
+
+    async def _handshake(self):
+        ssl_ctx = None
+        if self.tls:
+            import ssl
+            ssl_ctx = ssl.create_default_context()
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port, ssl=ssl_ctx)
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = f"/app/{self.app_key}?protocol={PROTOCOL_VERSION}&client=python-harness&version=1.0&flash=false"
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        self._writer.write(request.encode())
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if b" 101 " not in status_line:
+            raise ReverbError(f"handshake rejected: {status_line.decode(errors='replace').strip()}")
+        if headers.get("sec-websocket-accept") != websocket_accept(key):
+            raise ReverbError("handshake returned an invalid Sec-WebSocket-Accept")
+
+    async def _send_frame(self, opcode, payload):
+        if self._writer is None or self._writer.is_closing():
+            raise ReverbError("connection is closed")
+        async with self._send_lock:
+            self._writer.write(encode_frame(opcode, payload))
+            await self._writer.drain()
+
+    async def send(self, message):
+        await self._send_frame(OP_TEXT, json.dumps(message, separators=(",", ":")).encode())
+
+    async def _read_loop(self):
+        fragments = []
+        try:
+            while True:
+                fin, opcode, payload = await read_frame(self._reader)
+                if opcode == OP_PING:
+                    await self._send_frame(OP_PONG, payload)
+                    continue
+                if opcode == OP_CLOSE:
+                    break
+                if opcode in (OP_TEXT, OP_BINARY, OP_CONT):
+                    fragments.append(payload)
+                    if fin:
+                        self._dispatch(b"".join(fragments))
+                        fragments = []
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        except asyncio.CancelledError:
+            raise
+        finally:
+            self._fail_pending(ReverbError("connection closed"))
+            self.closed.set()
+
+    def _dispatch(self, raw):
+        received_at = time.monotonic()
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            self.errors.append(f"non-JSON frame: {raw[:80]!r}")
+            return
+        event = message.get("event", "")
+        channel = message.get("channel")
+        data = message.get("data")
+
+        if event == "pusher:connection_established":
+            info = json.loads(data) if isinstance(data, str) else (data or {})
+            self.socket_id = info.get("socket_id")
+            self.activity_timeout = info.get("activity_timeout")
+            if self._established and not self._established.done():
+                self._established.set_result(self.socket_id)
+            return
+        if event == "pusher:ping":
+            asyncio.ensure_future(self._safe_send({"event": "pusher:pong", "data": {}}))
+            return
+        if event == "pusher_internal:subscription_succeeded":
+            future = self._pending.pop(channel, None)
+            if future and not future.done():
+                future.set_result(received_at)
+        elif event == "pusher:subscription_error":
+            future = self._pending.pop(channel, None)
+            if future and not future.done():
+                future.set_exception(SubscriptionError(f"{channel}: {data}"))
+            return
+        elif event == "pusher:error":
+            self.errors.append(str(data))
+            if self._established and not self._established.done():
+                self._established.set_exception(ReverbError(f"pusher:error {data}"))
+            return
+
+        listeners = self._listeners.get(event, ()) + self._listeners.get("*", ())
+        if not listeners:
+            return
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                pass
+        for callback in listeners:
+            callback(channel, event, data, received_at)
+
+    async def _safe_send(self, message):
+        try:
+            await self.send(message)
+        except (ReverbError, ConnectionError, OSError):
+            pass
+
+    def _fail_pending(self, exc):
+        if self._established and not self._established.done():
+            self._established.set_exception(exc)
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def on(self, event, callback):
+        self._listeners[event] = self._listeners.get(event, ()) + (callback,)
+
+    async def subscribe(self, channel, auth=None, channel_data=None, timeout=10.0):
+        """Subscribe and wait for pusher_internal:subscription_succeeded. Returns latency (s)."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending[channel] = future
+        data = {"channel": channel}
+        if auth:
+            data["auth"] = auth
+        if channel_data:
+            data["channel_data"] = channel_data
+        start = time.monotonic()
+        await self.send({"event": "pusher:subscribe", "data": data})
+        try:
+            received_at = await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(channel, None)
+        return received_at - start
+
+    async def subscribe_authorized(self, http, channel, timeout=10.0):
+        """Authorize (if needed) then subscribe. Returns (auth latency s, subscribe latency s)."""
+        auth_latency = 0.0
+        auth = channel_data = None
+        if channel_requires_auth(channel):
+            payload, auth_latency = await authorize(http, self.socket_id, channel)
+            auth = payload.get("auth")
+            channel_data = payload.get("channel_data")
+        subscribe_latency = await self.subscribe(channel, auth, channel_data, timeout)
+        return auth_latency, subscribe_latency
+
+    async def unsubscribe(self, channel):
+        await self.send({"event": "pusher:unsubscribe", "data": {"channel": channel}})
+
+    async def close(self):
+        if self._writer is not None and not self._writer.is_closing():
+            try:
+                self._writer.write(encode_frame(OP_CLOSE, struct.pack("!H", 1000)))
+                self._writer.close()
+            except (ConnectionError, OSError, RuntimeError):
+                pass
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._fail_pending(ReverbError("connection closed"))
+        self.closed.set()
@@ -0,0 +1,716 @@
+#!/usr/bin/env python3
+"""
+API Route Index
+Builds an index of every /api route - method, uri, name, controller action,
+effective middleware, path parameters and the query/body/file parameters the
+action reads - so fuzzers and scanners can sweep the whole API instead of a
+hand-picked list of endpoints.
+
+Routes come from `php artisan route:list --json` when php is available, and
+otherwise from a static parse of routes/api.php (groups, prefixes, middleware,
+apiResource). Parameters are always extracted statically from the controller
+method body and its FormRequest rules(). The result is cached in
+the temp directory (HARNESS_ROUTE_INDEX overrides the path) and rebuilt when
+routes/ or app/Http/ change.
+
+Usage:
+  python3 route_index.py [--refresh] [--method POST] [--grep chat] [--json]
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from urllib.parse import quote
+
+# Configuration
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+ROUTES_FILE = os.path.join(PROJECT_ROOT, "routes", "api.php")
+BOOTSTRAP_FILE = os.path.join(PROJECT_ROOT, "bootstrap", "app.php")
+CACHE_PATH = os.environ.get("HARNESS_ROUTE_INDEX") or os.path.join(tempfile.gettempdir(), "harness-route-index.json")
+API_PREFIX = "api"
+INDEX_VERSION = 2             # Bump when the cached route format changes
+API_MIDDLEWARE = ["api"]
+WATCHED_DIRS = [os.path.join(PROJECT_ROOT, "routes"), os.path.join(PROJECT_ROOT, "app", "Http")]
+
+# Laravel's built-in middleware aliases (Middleware::defaultAliases()); route:list reports the classes
+DEFAULT_MIDDLEWARE_ALIASES = {
+    "auth": "Illuminate\\Auth\\Middleware\\Authenticate",
+    "auth.basic": "Illuminate\\Auth\\Middleware\\AuthenticateWithBasicAuth",
+    "auth.session": "Illuminate\\Session\\Middleware\\AuthenticateSession",
+    "cache.headers": "Illuminate\\Http\\Middleware\\SetCacheHeaders",
+    "can": "Illuminate\\Auth\\Middleware\\Authorize",
+    "guest": "Illuminate\\Auth\\Middleware\\RedirectIfAuthenticated",
+    "password.confirm": "Illuminate\\Auth\\Middleware\\RequirePassword",
+    "precognitive": "Illuminate\\Foundation\\Http\\Middleware\\HandlePrecognitiveRequests",
+    "signed": "Illuminate\\Routing\\Middleware\\ValidateSignature",
+    "throttle": "Illuminate\\Routing\\Middleware\\ThrottleRequests",
+    "verified": "Illuminate\\Auth\\Middleware\\EnsureEmailIsVerified",
+}
+
+VERBS = {"get": ["GET"], "post": ["POST"], "put": ["PUT"], "patch": ["PATCH"],
+         "delete": ["DELETE"], "options": ["OPTIONS"], "any": ["GET", "POST", "PUT", "PATCH", "DELETE"]}
+RESOURCE_ACTIONS = [
+    ("index", ["GET"], False),
+    ("store", ["POST"], False),
+    ("show", ["GET"], True),
+    ("update", ["PUT", "PATCH"], True),
+    ("destroy", ["DELETE"], True),
+]
+REQUEST_READERS = ("input", "query", "get", "post", "boolean", "integer", "float", "string", "str",
+                   "date", "filled", "has", "missing", "file", "hasFile", "enum", "array", "collect")
+ID_FIELDS = ("public_id", "uuid", "id", "slug")
+# "METHOD uri function" of routes the sweeping suites skip unless --include-destructive is given
+EXCLUDE = (r"^DELETE |logout|password|two-factor|2fa|maintenance|backups|tokens|impersonat|"
+           r"/dev/|sessions|/flush|retry|export|webhooks|destroy")
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+|//[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")
+  | (?P<op>::|->|=>|\?->)
+  | (?P<ident>\\?[A-Za-z_][\w\\]*|\$\w+|\d+)
+  | (?P<punct>.)
+""", re.VERBOSE | re.DOTALL)
+_RULE_KEY = re.compile(r"""['"]([\w.*\-]+)['"]\s*=>\s*(\[[^\]]*\]|'[^']*'|"[^"]*"|[^,\]]+)""")
+_PATH_PARAM = re.compile(r"\{(\w+)(\?)?\}")
+
+
+# ---------------------------------------------------------------------------
+# routes/api.php static parser
+# ---------------------------------------------------------------------------
+
+def tokenize(source):
+    tokens = []
+    for match in _TOKEN.finditer(source):
+        kind = match.lastgroup
+        if kind == "ws":
+            continue
+        text = match.group()
+        if kind == "string":
+            text = text[1:-1].replace("\\'", "'").replace('\\"', '"')
+        tokens.append((kind, text))
+    return tokens
+
+
+class _Parser:
+    """Just enough of PHP to follow Route:: chains, groups and closures."""
+
+    def __init__(self, tokens, aliases):
+        self.tokens = tokens
+        self.pos = 0
+        self.aliases = aliases
+        self.routes = []
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def klass(self, name):
+        name = name.lstrip("\\")
+        return self.aliases.get(name, name)
+
+    def block(self, context):
+        """Parse statements until the matching '}' (or EOF)."""
+        while self.pos < len(self.tokens):
+            kind, text = self.peek()
+            if kind == "punct" and text == "}":
+                self.take()
+                return
+            if kind == "punct" and text == "{":
+                self.take()
+                self.block(context)  # if/foreach bodies inherit the group
+            elif kind == "ident" and text.lstrip("\\").endswith("Route") and self.peek(1)[1] == "::":
+                self.chain(context)
+            else:
+                self.take()
+
+    def value(self, context=None):
+        """Parse one argument expression."""
+        kind, text = self.peek()
+        if kind == "string":
+            self.take()
+            return text
+        if kind == "punct" and text == "[":
+            self.take()
+            items, mapping = [], {}
+            while self.peek()[1] not in ("]", None):
+                item = self.value(context)
+                if self.peek()[1] == "=>":
+                    self.take()
+                    mapping[item] = self.value(context)
+                else:
+                    items.append(item)
+                if self.peek()[1] == ",":
+                    self.take()
+            self.take()
+            return mapping if mapping else items
+        if kind == "ident" and text in ("function", "fn", "static"):
+            return self.closure(context)
+        if kind == "ident" and self.peek(1)[1] == "::" and self.peek(2)[1] == "class":
+            self.pos += 3
+            return self.klass(text)
+        # Anything else: skip to the end of this argument
+        depth = 0
+        parts = []
+        while self.pos < len(self.tokens):
+            kind, text = self.peek()
+            if depth == 0 and text in (",", ")", "]", "=>"):
+                break
+            if text in ("(", "["):
+                depth += 1
+            elif text in (")", "]"):
+                depth -= 1
+            parts.append(text)
+            self.take()
+        return " ".join(parts)
+
+    def closure(self, context):
+        if self.peek()[1] == "static":
+            self.take()
+        arrow = self.take()[1] == "fn"
+        self.skip_balanced("(", ")")
+        if self.peek()[1] == "use":
+            self.take()
+            self.skip_balanced("(", ")")
+        while self.peek()[1] not in ("{", "=>", None):
+            self.take()  # return type
+        if arrow:
+            self.take()
+            self.value()
+            return "Closure"
+        self.take()
+        if context is not None:
+            self.block(context)
+        else:
+            self.skip_block()
+        return "Closure"
+
+    def skip_balanced(self, open_, close):
+        if self.peek()[1] != open_:
+            return
+        depth = 0
+        while self.pos < len(self.tokens):
+            text = self.take()[1]
+            if text == open_:
+                depth += 1
+            elif text == close:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def skip_block(self):
+        depth = 1
+        while self.pos < len(self.tokens) and depth:
+            text = self.take()[1]
+            depth += text == "{"
+            depth -= text == "}"
+
+    def args(self, group_context=None):
+        self.take()  # (
+        values = []
+        while self.peek()[1] not in (")", None):
+            values.append(self.value(group_context))
+            if self.peek()[1] == ",":
+                self.take()
+        self.take()
+        return values
+
+    def chain(self, context):
+        self.pos += 2  # Route ::
+        calls = []
+        while True:
+            name = self.take()[1]
+            if name == "group":
+                attrs = self.chain_attributes(calls, context)
+                self.args_group(attrs)
+                break
+            calls.append((name, self.args()))
+            if self.peek()[1] != "->":
+                break
+            self.take()
+        if self.peek()[1] == ";":
+            self.take()
+        if calls and calls[0][0] not in ("prefix", "middleware", "name", "controller", "where",
+                                         "withoutMiddleware", "domain", "scopeBindings"):
+            self.route(calls, context)
+
+    def args_group(self, attrs):
+        # Route::group([...], function () {}) or ->group(function () {})
+        self.take()  # (
+        while self.peek()[1] not in (")", None):
+            kind, text = self.peek()
+            if text == "[":
+                options = self.value()
+                if isinstance(options, dict):
+                    attrs = self.merge(attrs, options)
+            elif kind == "ident" and text in ("function", "fn", "static"):
+                self.closure(attrs)
+            else:
+                self.value()
+            if self.peek()[1] == ",":
+                self.take()
+        self.take()
+
+    @staticmethod
+    def merge(context, options):
+        merged = dict(context)
+        if options.get("prefix"):
+            merged["prefix"] = join_uri(context["prefix"], options["prefix"])
+        middleware = options.get("middleware")
+        if middleware:
+            merged["middleware"] = context["middleware"] + (middleware if isinstance(middleware, list) else [middleware])
+        if options.get("as"):
+            merged["name"] = context["name"] + options["as"]
+        if options.get("controller"):
+            merged["controller"] = options["controller"]
+        return merged
+
+    def chain_attributes(self, calls, context):
+        options = {}
+        for name, args in calls:
+            if not args:
+                continue
+            if name == "prefix":
+                options["prefix"] = args[0]
+            elif name == "middleware":
+                options["middleware"] = args[0]
+            elif name == "name":
+                options["as"] = args[0]
+            elif name == "controller":
+                options["controller"] = args[0]
+        return self.merge(context, options)
+
+    def route(self, calls, context):
+        verb, args = calls[0]
+        modifiers = {name: a for name, a in calls[1:]}
+        middleware = list(context["middleware"])
+        for name, a in calls[1:]:
+            if name == "middleware" and a:
+                middleware += a[0] if isinstance(a[0], list) else [a[0]]
+
+        if verb in ("apiResource", "resource") and len(args) >= 2:
+            self.resource(args[0], args[1], modifiers, context, middleware)
+            return
+        if verb == "match" and len(args) >= 3:
+            methods = [m.upper() for m in (args[0] if isinstance(args[0], list) else [args[0]])]
+            uri, action = args[1], args[2]
+        elif verb in VERBS and len(args) >= 2:
+            methods, uri, action = VERBS[verb], args[0], args[1]
+        else:
+            return
+
+        controller, function = None, None
+        if isinstance(action, list) and len(action) == 2:
+            controller, function = action
+        elif isinstance(action, str) and action != "Closure":
+            if "@" in action:
+                controller, function = action.split("@", 1)
+            elif context.get("controller"):
+                controller, function = context["controller"], action
+            else:
+                controller, function = action, "__invoke"
+        name = context["name"] + modifiers["name"][0] if modifiers.get("name") else None
+        for method in methods:
+            self.routes.append(make_route(method, join_uri(context["prefix"], uri), name,
+                                          controller, function, middleware))
+
+    def resource(self, name, controller, modifiers, context, middleware):
+        only = modifiers.get("only", [None])[0]
+        except_ = modifiers.get("except", [None])[0] or []
+        shallow = "shallow" in modifiers
+        segments = name.split(".")
+        base = ""
+        for parent in segments[:-1]:
+            base = join_uri(base, f"{parent}/{{{singular(parent)}}}")
+        leaf = segments[-1]
+        param = singular(leaf.split("/")[-1]).replace("-", "_")
+        for action, methods, member in RESOURCE_ACTIONS:
+            if (only and action not in only) or action in except_:
+                continue
+            parent = "" if shallow and member else base
+            uri = join_uri(parent, leaf + (f"/{{{param}}}" if member else ""))
+            route_name = f"{context['name']}{name}.{action}"
+            for method in methods:
+                self.routes.append(make_route(method, join_uri(context["prefix"], uri), route_name,
+                                              controller, action, middleware))
+
+
+def singular(word):
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def join_uri(prefix, uri):
+    return "/".join(p.strip("/") for p in (prefix, uri) if p and p.strip("/"))
+
+
+def make_route(method, uri, name, controller, function, middleware):
+    return {
+        "method": method,
+        "uri": "/" + uri.strip("/"),
+        "name": name,
+        "controller": controller,
+        "function": function,
+        "middleware": middleware,
+        "path_params": [m.group(1) for m in _PATH_PARAM.finditer(uri)],
+        "params": [],
+    }
+
+
+def use_aliases(source):
+    aliases = {}
+    for match in re.finditer(r"^use\s+([\w\\]+)(?:\s+as\s+(\w+))?\s*;", source, re.MULTILINE):
+        full = match.group(1).lstrip("\\")
+        aliases[match.group(2) or full.rsplit("\\", 1)[-1]] = full
+    return aliases
+
+
+def parse_routes_file(path=ROUTES_FILE):
+    with open(path) as f:
+        source = f.read()
+    parser = _Parser(tokenize(source), use_aliases(source))
+    parser.block({"prefix": API_PREFIX, "middleware": list(API_MIDDLEWARE), "name": "", "controller": None})
+    return parser.routes
+
+
+def middleware_aliases(path=BOOTSTRAP_FILE):
+    """{middleware class: alias}: Laravel's defaults plus the ->alias([...]) block of bootstrap/app.php."""
+    aliases = {klass: alias for alias, klass in DEFAULT_MIDDLEWARE_ALIASES.items()}
+    aliases["Illuminate\\Routing\\Middleware\\ThrottleRequestsWithRedis"] = "throttle"
+    try:
+        with open(path) as f:
+            source = f.read()
+    except OSError:
+        return aliases
+    imports = use_aliases(source)
+    block = re.search(r"->alias\(\s*\[(.*?)\]\s*\)", source, re.S)
+    for alias, klass in re.findall(r"'([\w.]+)'\s*=>\s*\\?([\w\\]+)::class", block.group(1) if block else ""):
+        aliases[imports.get(klass, klass)] = alias
+    return aliases
+
+
+def alias_middleware(middleware, aliases):
+    """Class names as route:list reports them back to the aliases routes/api.php uses (throttle:api, ...)."""
+    named = []
+    for entry in middleware:
+        klass, colon, params = entry.partition(":")
+        alias = aliases.get(klass.lstrip("\\"))
+        named.append(alias + colon + params if alias else entry)
+    return named
+
+
+def parse_route_list(entries, aliases=None):
+    """Routes from the decoded output of `php artisan route:list --json`."""
+    aliases = middleware_aliases() if aliases is None else aliases
+    routes = []
+    for entry in entries:
+        action = entry.get("action") or ""
+        controller, _, function = action.partition("@")
+        for method in entry.get("method", "").split("|"):
+            if method == "HEAD":
+                continue
+            routes.append(make_route(method, entry["uri"], entry.get("name"),
+                                     controller if controller != "Closure" else None,
+                                     function or ("__invoke" if controller and controller != "Closure" else None),
+                                     alias_middleware(entry.get("middleware") or [], aliases)))
+    return routes
+
+
+def artisan_routes():
+    """Routes from `php artisan route:list --json`, or None when php/artisan is unavailable."""
+    artisan = os.path.join(PROJECT_ROOT, "artisan")
+    if not shutil.which("php") or not os.path.exists(artisan):
+        return None
+    try:
+        result = subprocess.run(["php", artisan, "route:list", "--json", f"--path={API_PREFIX}"],
+                                capture_output=True, text=True, timeout=120, cwd=PROJECT_ROOT)
+        entries = json.loads(result.stdout)
+    except (subprocess.SubprocessError, ValueError, OSError):
+        return None
+    return parse_route_list(entries)
+
+
+# ---------------------------------------------------------------------------
+# Controller parameter extraction
+# ---------------------------------------------------------------------------
+
+def class_file(klass):
+    if not klass or not klass.startswith("App\\"):
+        return None
+    path = os.path.join(PROJECT_ROOT, "app", *klass.split("\\")[1:]) + ".php"
+    return path if os.path.exists(path) else None
+
+
+def method_source(source, function):
+    """Signature + body of `function` in a PHP class source."""
+    match = re.search(rf"function\s+{re.escape(function)}\s*\(", source)
+    if not match:
+        return None
+    start = match.start()
+    brace = source.find("{", source.find(")", match.end()))
+    if brace < 0:
+        return None
+    depth = 0
+    for i in range(brace, len(source)):
+        if source[i] == "{":
+            depth += 1
+        elif source[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return source[start:i + 1]
+    return source[start:]
+
+
+def array_keys(text):
+    """'field' => rules pairs from a PHP array literal body."""
+    return [(m.group(1), m.group(2).strip()) for m in _RULE_KEY.finditer(text)]
+
+
+def _read_file(path, cache):
+    if path not in cache:
+        try:
+            with open(path) as f:
+                cache[path] = f.read()
+        except OSError:
+            cache[path] = ""
+    return cache[path]
+
+
+def extract_params(route, cache):
+    """Fill route['params'] with [{name, location, rules}] from the controller source."""
+    path = class_file(route["controller"])
+    if not path or not route["function"]:
+        return
+    source = _read_file(path, cache)
+    body = method_source(source, route["function"])
+    if not body:
+        return
+    aliases = use_aliases(source)
+    namespace = re.search(r"^namespace\s+([\w\\]+);", source, re.MULTILINE)
+    params = {}
+
+    def add(name, location, rules=""):
+        name = name.split(".")[0].rstrip("*") if "*" not in name.split(".")[0] else name.split(".")[0]
+        if not name or name in params and params[name]["rules"]:
+            return
+        if any(word in rules for word in ("'file'", "'image'", "'mimes", "'mimetypes", "file|", "image|")):
+            location = "file"
+        params[name] = {"name": name, "location": location, "rules": rules[:200]}
+
+    default = "query" if route["method"] in ("GET", "DELETE") else "body"
+
+    # FormRequest type-hinted in the signature
+    signature = body[:body.find("{")]
+    for hint in re.findall(r"([\w\\]+Request)\s+\$\w+", signature):
+        if hint in ("Request", "\\Illuminate\\Http\\Request"):
+            continue
+        klass = aliases.get(hint.lstrip("\\"), hint.lstrip("\\"))
+        if "\\" not in klass and namespace:
+            klass = f"{namespace.group(1)}\\{klass}"
+        request_file = class_file(klass)
+        rules = method_source(_read_file(request_file, cache), "rules") if request_file else None
+        for name, rule in array_keys(rules or ""):
+            add(name, default, rule)
+
+    # Inline validation
+    for match in re.finditer(r"(?:->validate|Validator::make)\s*\(", body):
+        for name, rule in array_keys(body[match.end():match.end() + 4000].split("]);", 1)[0]):
+            add(name, default, rule)
+
+    # Direct reads
+    for reader, name in re.findall(r"\$request->(\w+)\(\s*['\"]([\w.\-]+)['\"]", body):
+        if reader in REQUEST_READERS:
+            add(name, "file" if reader in ("file", "hasFile") else "query" if reader == "query" else default)
+    for names in re.findall(r"\$request->only\(\s*\[([^\]]*)\]", body):
+        for name in re.findall(r"['\"]([\w.\-]+)['\"]", names):
+            add(name, default)
+    for name in re.findall(r"\$request->(\w+)\b(?!\s*\()", body):
+        if name not in ("user", "route", "headers", "attributes", "server", "cookies", "files", "request", "query"):
+            add(name, default)
+
+    route["params"] = sorted(params.values(), key=lambda p: p["name"])
+
+
+# ---------------------------------------------------------------------------
+# Index building / caching
+# ---------------------------------------------------------------------------
+
+def source_stamp():
+    latest, count = 0.0, 0
+    for directory in WATCHED_DIRS:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith(".php"):
+                    latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+                    count += 1
+    return f"{INDEX_VERSION}:{PROJECT_ROOT}:{latest:.0f}:{count}"
+
+
+def build_index(source="auto"):
+    routes = artisan_routes() if source in ("auto", "artisan") else None
+    origin = "artisan" if routes is not None else "static"
+    if routes is None:
+        routes = parse_routes_file()
+    cache = {}
+    for route in routes:
+        extract_params(route, cache)
+    return {"stamp": source_stamp(), "source": origin, "routes": routes}
+
+
+def load_routes(refresh=False, source="auto", path=CACHE_PATH):
+    """The route list, from cache when routes/ and app/Http/ are unchanged."""
+    if not refresh and os.path.exists(path):
+        try:
+            with open(path) as f:
+                index = json.load(f)
+            if index.get("stamp") == source_stamp():
+                return index["routes"]
+        except (OSError, ValueError):
+            pass
+    index = build_index(source)
+    with open(path, "w") as f:
+        json.dump(index, f, indent=1)
+    return index["routes"]
+
+
+def filter_routes(routes, methods=None, grep=None, middleware=None, exclude=None):
+    selected = []
+    for route in routes:
+        if methods and route["method"] not in methods:
+            continue
+        if grep and not re.search(grep, route["uri"]):
+            continue
+        if middleware and not any(m.startswith(middleware) for m in route["middleware"]):
+            continue
+        if exclude and re.search(exclude, f"{route['method']} {route['uri']} {route['function']}"):
+            continue
+        selected.append(route)
+    return selected
+
+
+def fill_path(route, values):
+    """Concrete path (without the /api prefix) or None when a required parameter is missing."""
+    def replace(match):
+        value = values.get(match.group(1))
+        if value is None:
+            if match.group(2):
+                return ""
+            raise KeyError(match.group(1))
+        return quote(str(value), safe="")
+    try:
+        path = _PATH_PARAM.sub(replace, route["uri"]).rstrip("/")
+    except KeyError:
+        return None
+    prefix = "/" + API_PREFIX
+    return path[len(prefix):] if path.startswith(prefix) else path
+
+
+def benign_value(param):
+    """A value that should pass validation for this parameter's rules."""
+    rules, name = param["rules"], param["name"]
+    if "email" in rules or name.endswith("email"):
+        return "fuzz@example.com"
+    if "boolean" in rules or name.startswith(("is_", "has_")):
+        return True
+    if any(word in rules for word in ("integer", "numeric", "'int'")) or name.endswith(("_id", "limit", "per_page")):
+        return 1
+    if "array" in rules:
+        return []
+    if "date" in rules or name.endswith(("_at", "date", "_from", "_to")):
+        return "2026-01-01"
+    if "url" in rules or name in ("website", "url"):
+        return "https://example.com"
+    return "fuzz"
+
+
+class PathResolver:
+    """
+    Finds real values for path parameters by calling the matching list route
+    (e.g. {team} in /api/teams/{team}/projects from GET /api/teams) and taking
+    the first item's public_id/uuid/id/slug. Results are cached per resolver.
+    """
+
+    def __init__(self, routes, http, overrides=None):
+        self.lists = {r["uri"]: r for r in routes if r["method"] == "GET"}
+        self.http = http
+        self.values = dict(overrides or {})
+        self._tried = set()
+
+    async def resolve(self, route):
+        values = {}
+        segments = route["uri"].split("/")
+        for i, segment in enumerate(segments):
+            match = _PATH_PARAM.fullmatch(segment)
+            if not match:
+                continue
+            name = match.group(1)
+            if name not in self.values:
+                await self._discover(name, "/".join(segments[:i]), values)
+            if self.values.get(name) is not None:
+                values[name] = self.values[name]
+            elif not match.group(2):
+                return None
+        return values
+
+    async def _discover(self, name, list_uri, known):
+        key = (name, list_uri)
+        if key in self._tried or list_uri not in self.lists:
+            self.values.setdefault(name, None)
+            return
+        self._tried.add(key)
+        path = fill_path(self.lists[list_uri], known)
+        if path is None:
+            return
+        try:
+            response = await self.http.get(path)
+            body = response.json() if response.status == 200 else None
+        except Exception:  # discovery is best effort
+            body = None
+        items = body.get("data", body) if isinstance(body, dict) else body
+        if isinstance(items, dict):
+            items = items.get("data")
+        if isinstance(items, list) and items and isinstance(items[0], dict):
+            value = next((items[0][f] for f in ID_FIELDS if items[0].get(f) is not None), None)
+            self.values[name] = value
+        else:
+            self.values.setdefault(name, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the API route index")
+    parser.add_argument("--refresh", action="store_true", help="Rebuild even if the cache is current")
+    parser.add_argument("--source", choices=["auto", "artisan", "static"], default="auto")
+    parser.add_argument("--method", action="append", help="Only these HTTP methods")
+    parser.add_argument("--grep", help="Regex on the uri")
+    parser.add_argument("--json", action="store_true", help="Print the matching routes as JSON")
+    args = parser.parse_args()
+
+    routes = load_routes(refresh=args.refresh or args.source != "auto", source=args.source)
+    selected = filter_routes(routes, [m.upper() for m in args.method or []], args.grep)
+    if args.json:
+        json.dump(selected, sys.stdout, indent=2)
+        print()
+        return
+    for route in selected:
+        params = ",".join(f"{p['name']}:{p['location'][0]}" for p in route["params"])
+        print(f"{route['method']:<7} {route['uri']:<60} {params}")
+    with_params = sum(1 for r in selected if r["params"])
+    print(f"\n{len(selected)} routes ({with_params} with known parameters), cache: {CACHE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Server Metrics Feed
+Records the monitoring broadcasts the app streams over Reverb while a load
+phase runs and lines them up with the harness's own request timeline:
+
+  system-metrics  SystemMetricsUpdated (monitor:stream, every 5s): CPU %, memory %
+  cache-stats     CacheStatsUpdated (maintenance:stream-cache-stats, every 3s): hit
+                  rate from the keyspace hit/miss counter deltas, keys, Reverb connections
+  queue-stats     QueueStatsUpdated (after queue flush/retry): pending and failed jobs
+
+Events are stamped with time.monotonic() on arrival, the clock harness_metrics.py
+bins requests by (CLOCK_MONOTONIC is system-wide, so suites running in other
+processes share it). The report resamples both onto one-second steps, holding
+each server value until the next broadcast, prints CPU, memory, cache hit rate
+and queue depth next to the RPS and p50/p99 curves, and correlates every server
+series with p99 latency and RPS at lags of up to MAX_LAG seconds.
+
+Both stream commands are scheduled every minute (routes/console.php), so the
+scheduler has to be running for the feed to carry data.
+
+Usage:
+  python3 server_feed.py [--duration 120] [--max-lag 15]   # record while suites run under harness_metrics.py
+  python3 stability_runner.py --server-feed                # record the whole run
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from harness_metrics import LATENCY_BUCKETS, METRICS_DIR, collect_timeline
+from perf_stats import histogram_quantile, lag_correlation
+from reverb_client import REVERB_APP_KEY, REVERB_HOST, REVERB_PORT, PusherConnection, ReverbError
+
+# Configuration
+# channel -> broadcast event name (no broadcastAs(), so Laravel uses the class name)
+CHANNELS = {
+    "system-metrics": "App\\Events\\SystemMetricsUpdated",
+    "cache-stats": "App\\Events\\CacheStatsUpdated",
+    "queue-stats": "App\\Events\\QueueStatsUpdated",
+}
+
+# Test settings
+MAX_LAG = 15                  # Seconds of lead/lag tried in the correlation
+BIN_SECONDS = 5               # Rows of the printed timeline
+RECONNECT_SECONDS = 2.0
+# Server values are held until the next broadcast, but not longer than this
+# (queue stats are only sent when the queue changes, so they never go stale)
+STALE_SECONDS = {"system-metrics": 15, "cache-stats": 10, "queue-stats": None}
+SERIES = [
+    # (name, column header, channel)
+    ("cpu_percent", "CPU%", "system-metrics"),
+    ("memory_percent", "MEM%", "system-metrics"),
+    ("cache_hit_rate", "HIT%", "cache-stats"),
+    ("cache_keys", "KEYS", "cache-stats"),
+    ("reverb_connections", "WS", "cache-stats"),
+    ("queue_pending", "QUEUE", "queue-stats"),
+    ("queue_failed", "FAILED", "queue-stats"),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Correlate load with the server metrics broadcasts")
+    parser.add_argument("--duration", type=float, default=0, help="Seconds to record (0 = until Ctrl+C)")
+    parser.add_argument("--dir", default=METRICS_DIR, help="Metrics snapshot directory of the suites")
+    parser.add_argument("--suite", action="append", help="Only count requests of this suite (repeatable)")
+    parser.add_argument("--max-lag", type=int, default=MAX_LAG)
+    parser.add_argument("--bin", type=int, default=BIN_SECONDS, help="Seconds per printed timeline row")
+    parser.add_argument("--reverb-host", default=REVERB_HOST)
+    parser.add_argument("--reverb-port", type=int, default=REVERB_PORT)
+    parser.add_argument("--app-key", default=REVERB_APP_KEY)
+    return parser.parse_args()
+
+
+def count(value):
+    """Redis counters arrive number_format()ted ("12,345")."""
+    try:
+        return int(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+
+class ServerFeed(threading.Thread):
+    """Background subscriber; `events` is a list of (monotonic, channel, payload)."""
+
+    def __init__(self, host=REVERB_HOST, port=REVERB_PORT, app_key=REVERB_APP_KEY):
+        super().__init__(daemon=True, name="server-feed")
+        self.host = host
+        self.port = port
+        self.app_key = app_key
+        self.events = []
+        self.errors = []
+        self.connections = 0
+        self.started = None
+        self.stopped = None
+        self._halt = threading.Event()
+
+    def start(self):
+        self.started = time.monotonic()
+        super().start()
+        return self
+
+    def on_event(self, channel, event, data, received_at):
+        if CHANNELS.get(channel) == event and isinstance(data, dict):
+            self.events.append((received_at, channel, data.get("metrics") or data.get("stats") or data))
+
+    async def listen(self):
+        while not self._halt.is_set():
+            connection = PusherConnection(self.host, self.port, self.app_key)
+            connection.on("*", self.on_event)
+            try:
+                await connection.connect()
+                for channel in CHANNELS:
+                    await connection.subscribe(channel)
+                self.connections += 1
+                while not self._halt.is_set() and not connection.closed.is_set():
+                    await asyncio.sleep(0.2)
+            except (ReverbError, OSError, asyncio.TimeoutError) as e:
+                if len(self.errors) < 20:
+                    self.errors.append(f"{type(e).__name__}: {e}")
+            finally:
+                await connection.close()
+            if not self._halt.is_set():
+                await asyncio.sleep(RECONNECT_SECONDS)
+
+    def run(self):
+        asyncio.run(self.listen())
+
+    def stop(self):
+        self.stopped = time.monotonic()
+        self._halt.set()
+        self.join(timeout=5)
+
+
+def server_series(events):
+    """{series name: [(monotonic, value)]} from the recorded broadcasts."""
+    series = {name: [] for name, _, _ in SERIES}
+    previous = None
+    for at, channel, payload in sorted(events, key=lambda e: e[0]):
+        if channel == "system-metrics":
+            if isinstance(payload.get("cpu_load"), (int, float)):
+                series["cpu_percent"].append((at, payload["cpu_load"]))
+            memory = payload.get("memory")
+            if isinstance(memory, dict) and isinstance(memory.get("percent"), (int, float)):
+                series["memory_percent"].append((at, memory["percent"]))
+        elif channel == "cache-stats":
+            hits, misses = count(payload.get("cache_hits")), count(payload.get("cache_misses"))
+            if hits is not None and misses is not None:
+                # Counters are cumulative since the cache server started; a drop means it restarted
+                if previous is not None and hits >= previous[0] and misses >= previous[1]:
+                    lookups = (hits - previous[0]) + (misses - previous[1])
+                    if lookups:
+                        series["cache_hit_rate"].append((at, (hits - previous[0]) / lookups * 100))
+                previous = (hits, misses)
+            for name in ("cache_keys", "reverb_connections"):
+                value = count(payload.get(name, ""))
+                if value is not None:
+                    series[name].append((at, value))
+        elif channel == "queue-stats":
+            for name in ("pending", "failed"):
+                if isinstance(payload.get(name), (int, float)):
+                    series[f"queue_{name}"].append((at, payload[name]))
+    return {name: points for name, points in series.items() if points}
+
+
+def resample(points, seconds, stale=None):
+    """Value in effect at the end of each second (last broadcast so far, None if none or stale)."""
+    values, index, current = [], 0, None
+    for second in seconds:
+        while index < len(points) and points[index][0] < second + 1:
+            current = points[index]
+            index += 1
+        fresh = current is not None and (stale is None or second + 1 - current[0] <= stale)
+        values.append(current[1] if fresh else None)
+    return values
+
+
+def merge_rows(rows):
+    merged = [0] * (len(LATENCY_BUCKETS) + 3)
+    for row in rows:
+        merged = [a + b for a, b in zip(merged, row)]
+    return merged
+
+
+def curve_point(row, seconds=1):
+    """(rps, error rate, p50 ms, p99 ms) of a merged timeline row."""
+    buckets = {index: value for index, value in enumerate(row[2:]) if value}
+    p50 = histogram_quantile(buckets, 0.50, LATENCY_BUCKETS)
+    p99 = histogram_quantile(buckets, 0.99, LATENCY_BUCKETS)
+    return (row[0] / seconds, row[1] / row[0] if row[0] else None,
+            None if p50 is None else p50 * 1000, None if p99 is None else p99 * 1000)
+
+
+def build_report(events, timeline, started, stopped, suites=None, max_lag=MAX_LAG):
+    """Align the feed with the request timeline over [started, stopped] and correlate."""
+    seconds = list(range(int(started), int(stopped) + 1))
+    bins = [merge_rows(rows.get(second) for suite, rows in timeline.items()
+                       if (not suites or suite in suites) and second in rows) for second in seconds]
+    points = [curve_point(row) for row in bins]
+    curves = {"rps": [p[0] for p in points], "error_rate": [p[1] for p in points],
+              "p50_ms": [p[2] for p in points], "p99_ms": [p[3] for p in points]}
+    channels = {name: channel for name, _, channel in SERIES}
+    server = {name: resample(values, seconds, STALE_SECONDS[channels[name]])
+              for name, values in server_series(events).items()}
+
+    correlations = []
+    for name, values in server.items():
+        for target in ("p99_ms", "rps"):
+            lags = lag_correlation(values, curves[target], max_lag)
+            if not lags:
+                continue
+            at_zero = next((r for lag, r, _ in lags if lag == 0), None)
+            lag, r, pairs = max(lags, key=lambda entry: abs(entry[1]))
+            correlations.append({"series": name, "target": target,
+                                 "r_at_0": None if at_zero is None else round(at_zero, 3),
+                                 "best_lag_seconds": lag, "best_r": round(r, 3), "pairs": pairs,
+                                 "lags": [[lag, round(r, 3)] for lag, r, _ in lags]})
+
+    rows = []
+    for i, second in enumerate(seconds):
+        row = {"t": second - seconds[0], "requests": bins[i][0], "errors": bins[i][1]}
+        row.update({name: None if values[i] is None else round(values[i], 2) for name, values in curves.items()
+                    if name != "error_rate"})
+        row.update({name: None if values[i] is None else round(values[i], 2) for name, values in server.items()})
+        rows.append(row)
+    return {
+        "duration_seconds": round(stopped - started, 1),
+        "events": {channel: sum(1 for _, c, _ in events if c == channel) for channel in CHANNELS},
+        "requests": sum(row[0] for row in bins),
+        "correlations": correlations,
+        "timeline": rows,
+        "bins": bins,
+    }
+
+
+def feed_report(feed, directory=METRICS_DIR, suites=None, max_lag=MAX_LAG):
+    """Report for a stopped ServerFeed against the suites' snapshots in `directory`."""
+    report = build_report(feed.events, collect_timeline(directory), feed.started, feed.stopped or time.monotonic(),
+                          suites, max_lag)
+    report["errors"] = feed.errors
+    return report
+
+
+def cell(value, width, digits=1):
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+
+def print_report(report, bin_seconds=BIN_SECONDS):
+    print("  Feed: " + ", ".join(f"{channel} {n}" for channel, n in report["events"].items())
+          + f" events over {report['duration_seconds']}s; {report['requests']} requests")
+    if not any(report["events"].values()):
+        print("  ⚠️  No server metrics received (is the scheduler running monitor:stream and "
+              "maintenance:stream-cache-stats?)")
+        for error in report.get("errors", [])[:3]:
+            print(f"     {error}")
+        return
+    columns = [(name, header) for name, header, _ in SERIES if any(name in row for row in report["timeline"])]
+    print()
+    print(f"  {'T+s':>6} {'RPS':>8} {'P50ms':>8} {'P99ms':>8} " + " ".join(f"{header:>7}" for _, header in columns))
+    timeline, bins = report["timeline"], report["bins"]
+    for start in range(0, len(timeline), bin_seconds):
+        span = timeline[start:start + bin_seconds]
+        rps, _, p50, p99 = curve_point(merge_rows(bins[start:start + bin_seconds]), len(span))
+        server = []
+        for name, _ in columns:
+            values = [row.get(name) for row in span if row.get(name) is not None]
+            server.append(cell(values[-1] if values else None, 7))
+        print(f"  {span[0]['t']:>6} {rps:>8.1f} {cell(p50, 8)} {cell(p99, 8)} " + " ".join(server))
+    if not report["correlations"]:
+        print("\n  ℹ️  Too few overlapping seconds for lag correlation")
+        return
+    print("\n  Lag correlation (positive lag: the server series leads by that many seconds)")
+    print(f"  {'SERIES':<20} {'VS':<8} {'r(0)':>7} {'BEST LAG':>9} {'r':>7}")
+    for c in sorted(report["correlations"], key=lambda c: -abs(c["best_r"])):
+        icon = "🔗" if abs(c["best_r"]) >= 0.7 else "  "
+        print(f"{icon} {c['series']:<20} {c['target']:<8} {cell(c['r_at_0'], 7, 2)} "
+              f"{c['best_lag_seconds']:>+8}s {c['best_r']:>7.2f}")
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Server Metrics Feed")
+    print("=" * 60)
+    print(f"\nReverb:   ws://{args.reverb_host}:{args.reverb_port} ({', '.join(CHANNELS)})")
+    print(f"Requests: {args.dir}")
+    print(f"Duration: {f'{args.duration:g}s' if args.duration else 'until Ctrl+C'}\n")
+
+    feed = ServerFeed(args.reverb_host, args.reverb_port, args.app_key).start()
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    feed.stop()
+
+    report = feed_report(feed, args.dir, args.suite, args.max_lag)
+    print_report(report, args.bin)
+
+    received = any(report["events"].values())
+    print("\n" + "=" * 60)
+    print("✅ Server metrics recorded" if received else "❌ No server metrics received")
+    print("=" * 60)
+
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_feed_report.json")
+    with open(report_path, "w") as f:
+        json.dump(dict(report, timestamp=datetime.now().isoformat()), f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(0 if received else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Broadcast Latency Probe
+Measures end-to-end latency from an HTTP write to the WebSocket subscriber:
+posts chat messages / ticket comments / ticket updates carrying a nonce while
+subscribed to dm.* / group.* / tickets.* and matches the MessageCreated,
+comment.added and ticket.updated frames back to the request.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError
+from perf_stats import format_summary, raise_fd_limit, summarize
+from reverb_client import REVERB_APP_KEY, REVERB_HOST, REVERB_PORT, PusherConnection, ReverbError
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+TOKEN = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"
+# Chat sends are limited to 20/min per user, so spread writes across identities
+SENDER_TOKENS = [TOKEN]
+
+# Test settings
+SUBSCRIBER_STEPS = [1, 10, 50]   # Sockets subscribed to the target channel
+RATE_STEPS = [0.5, 1, 2]         # Writes per second
+STAGE_SECONDS = 10               # Duration of each (subscribers, rate) stage
+DELIVERY_TIMEOUT = 5.0           # Frames arriving later than this count as lost
+LATE_THRESHOLD_MS = 1000         # Deliveries slower than this count as late
+
+NONCE_RE = re.compile(r"probe-[0-9a-f]{16}")
+
+
+def _chat_text(data):
+    return (data.get("message") or {}).get("content", "")
+
+
+def _comment_text(data):
+    return (data.get("comment") or {}).get("content", "")
+
+
+def _ticket_text(data):
+    return data.get("title", "")
+
+
+# target kind -> (channel prefix, broadcast event name, nonce extractor)
+TARGETS = {
+    "chat": (None, "MessageCreated", _chat_text),
+    "ticket-comment": ("private-tickets.", "comment.added", _comment_text),
+    "ticket-update": ("private-tickets.", "ticket.updated", _ticket_text),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end broadcast latency probe")
+    parser.add_argument("--target", choices=sorted(TARGETS), action="append",
+                        help="What to write to (repeatable, default: all)")
+    parser.add_argument("--chat", help="Chat public id (default: first chat from /chat)")
+    parser.add_argument("--ticket", help="Ticket public id (default: first ticket from /tickets)")
+    parser.add_argument("--subscribers", type=int, action="append", help="Subscriber step (repeatable)")
+    parser.add_argument("--rate", type=float, action="append", help="Writes/second step (repeatable)")
+    parser.add_argument("--duration", type=float, default=STAGE_SECONDS)
+    parser.add_argument("--sender-token", action="append", help="Token used for writes (repeatable)")
+    parser.add_argument("--reverb-host", default=REVERB_HOST)
+    parser.add_argument("--reverb-port", type=int, default=REVERB_PORT)
+    parser.add_argument("--app-key", default=REVERB_APP_KEY)
+    return parser.parse_args()
+
+
+def api_headers(token):
+    return {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+
+
+async def resolve_channels(http, args):
+    """Return {target: (channel, write path)} for the requested targets."""
+    resolved = {}
+    targets = args.target or sorted(TARGETS)
+
+    if "chat" in targets:
+        chat_id, chat_type = args.chat, "dm"
+        response = await http.get("/chat")
+        chats = (response.json() or {}).get("data", []) if response.status == 200 else []
+        for chat in chats:
+            if chat_id is None or chat["public_id"] == chat_id:
+                chat_id, chat_type = chat["public_id"], chat.get("type", "dm")
+                break
+        if chat_id:
+            prefix = "dm" if chat_type == "dm" else "group"
+            resolved["chat"] = (f"private-{prefix}.{chat_id}", f"/chat/{chat_id}/send")
+        else:
+            print("  ⏭️  chat: no chat available for this user")
+
+    ticket_id = args.ticket
+    if ticket_id is None and any(t.startswith("ticket") for t in targets):
+        response = await http.get("/tickets", params={"per_page": 1})
+        tickets = (response.json() or {}).get("data", []) if response.status == 200 else []
+        if tickets:
+            ticket_id = tickets[0].get("public_id") or tickets[0].get("id")
+    for kind in ("ticket-comment", "ticket-update"):
+        if kind not in targets:
+            continue
+        if not ticket_id:
+            print(f"  ⏭️  {kind}: no ticket available for this user")
+            continue
+        path = f"/tickets/{ticket_id}/comments" if kind == "ticket-comment" else f"/tickets/{ticket_id}"
+        resolved[kind] = (f"private-tickets.{ticket_id}", path)
+
+    return resolved
+
+
+def write_request(kind, path, nonce):
+    """Return (method, path, json body) for a write that embeds `nonce`."""
+    if kind == "chat":
+        return "POST", path, {"content": f"latency {nonce}", "temp_id": nonce}
+    if kind == "ticket-comment":
+        return "POST", path, {"content": f"latency {nonce}"}
+    return "PUT", path, {"title": f"Latency probe {nonce}", "reason": "broadcast latency probe"}
+
+
+class DeliveryTracker:
+    """Matches received frames to writes through the embedded nonce."""
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self.sent_at = {}
+        self.latencies = []
+        self.deliveries = defaultdict(int)
+        self.unmatched = 0
+
+    def on_frame(self, channel, event, data, received_at):
+        text = self.extractor(data) if isinstance(data, dict) else ""
+        match = NONCE_RE.search(text or "")
+        sent = self.sent_at.get(match.group(0)) if match else None
+        if sent is None:
+            self.unmatched += 1
+            return
+        self.deliveries[match.group(0)] += 1
+        self.latencies.append(received_at - sent)
+
+
+async def open_subscribers(count, channel, event, tracker, auth_http, args):
+    sockets = []
+    for _ in range(count):
+        conn = PusherConnection(args.reverb_host, args.reverb_port, args.app_key)
+        try:
+            await conn.connect()
+            await conn.subscribe_authorized(auth_http, channel)
+        except (ReverbError, HttpError, asyncio.TimeoutError) as e:
+            print(f"  ⚠️  Subscriber failed: {e}")
+            await conn.close()
+            continue
+        conn.on(event, tracker.on_frame)
+        sockets.append(conn)
+    return sockets
+
+
+async def run_stage(kind, channel, path, subscribers, rate, args, auth_http, senders):
+    _, event, extractor = TARGETS[kind]
+    tracker = DeliveryTracker(extractor)
+    sockets = await open_subscribers(subscribers, channel, event, tracker, auth_http, args)
+    if not sockets:
+        return None
+
+    statuses = defaultdict(int)
+    http_latencies = []
+    accepted = []
+
+    async def send_one(i):
+        nonce = f"probe-{uuid.uuid4().hex[:16]}"
+        method, target, body = write_request(kind, path, nonce)
+        tracker.sent_at[nonce] = time.monotonic()
+        try:
+            response = await senders[i % len(senders)].request(method, target, json=body)
+        except HttpError:
+            statuses["error"] += 1
+            return
+        statuses[response.status] += 1
+        http_latencies.append(response.elapsed)
+        if 200 <= response.status < 300:
+            accepted.append(nonce)
+
+    # Open-loop schedule: writes go out on time regardless of how slow earlier ones are
+    total = max(1, int(rate * args.duration))
+    start = time.monotonic()
+    tasks = []
+    for i in range(total):
+        delay = start + i / rate - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send_one(i)))
+    await asyncio.gather(*tasks)
+    await asyncio.sleep(DELIVERY_TIMEOUT)
+
+    await asyncio.gather(*(s.close() for s in sockets), return_exceptions=True)
+
+    expected = len(accepted) * len(sockets)
+    delivered = sum(min(tracker.deliveries[n], len(sockets)) for n in accepted)
+    late = sum(1 for l in tracker.latencies if l * 1000 > LATE_THRESHOLD_MS)
+    return {
+        "target": kind,
+        "channel": channel,
+        "subscribers": len(sockets),
+        "rate_per_sec": rate,
+        "writes": total,
+        "http_status": {str(k): v for k, v in statuses.items()},
+        "http_latency_ms": summarize(http_latencies, 1000),
+        "broadcast_latency_ms": summarize(tracker.latencies, 1000),
+        "expected_deliveries": expected,
+        "delivered": delivered,
+        "lost": expected - delivered,
+        "late": late,
+    }
+
+
+async def run(args):
+    tokens = args.sender_token or SENDER_TOKENS
+    stages = []
+    async with AsyncHttpClient(API_BASE, headers=api_headers(TOKEN)) as auth_http:
+        senders = [AsyncHttpClient(API_BASE, headers=api_headers(t)) for t in tokens]
+        try:
+            try:
+                targets = await resolve_channels(auth_http, args)
+            except HttpError as e:
+                print(f"❌ Could not reach API: {e}")
+                return stages
+
+            for kind, (channel, path) in targets.items():
+                print(f"\n--- Target: {kind} ({channel}) ---")
+                for subscribers in args.subscribers or SUBSCRIBER_STEPS:
+                    for rate in args.rate or RATE_STEPS:
+                        result = await run_stage(kind, channel, path, subscribers, rate,
+                                                 args, auth_http, senders)
+                        if result is None:
+                            print(f"  ⚠️  {subscribers} subscribers @ {rate}/s: no subscriber could join")
+                            continue
+                        stages.append(result)
+                        icon = "✅" if result["lost"] == 0 else "❌"
+                        print(f"  {icon} {result['subscribers']:>4} subs @ {rate:>4}/s  "
+                              f"{format_summary(result['broadcast_latency_ms'])}  "
+                              f"lost={result['lost']} late={result['late']} http={result['http_status']}")
+        finally:
+            for sender in senders:
+                await sender.close()
+    return stages
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Broadcast Latency Probe")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"API:     {API_BASE}")
+    print(f"Reverb:  ws://{args.reverb_host}:{args.reverb_port}")
+    raise_fd_limit()
+
+    stages = asyncio.run(run(args))
+
+    lost = sum(s["lost"] for s in stages)
+    print("\n" + "=" * 60)
+    if not stages:
+        print("⚠️  No stage could run (check Reverb and target ids)")
+    elif lost:
+        print(f"❌ {lost} broadcast deliveries lost or later than {DELIVERY_TIMEOUT}s")
+    else:
+        print("✅ Every accepted write was delivered to every subscriber")
+    print("=" * 60)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": API_BASE,
+        "stages": stages,
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "broadcast_latency_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(0 if stages and not lost else 1)
+
+
+if __name__ == "__main__":
+    main()
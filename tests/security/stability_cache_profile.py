@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Cache Effectiveness Profiler
+Runs a steady read workload over the endpoints that sit behind Cache::remember()
+and measures what a cache flush costs:
+
+  warm      the workload against a warmed cache (after a prewarm pass): baseline
+  flush     POST /maintenance/cache/clear (what the maintenance page does)
+  cold      the first --cold-seconds after the flush
+  recovery  the rest, until the end of --recovery-seconds
+
+The workload keeps running across the flush. Every request pays
+AppSettingsService::applyToConfig() (AppServiceProvider::boot); the mix adds
+HolidayService (/holidays, /holidays/countries) and AnalyticsService
+(/maintenance/analytics/*, admin only - identities answered 403 are skipped).
+
+Per phase it reports request latency (overall and per endpoint) and the cache hit
+rate from two sources: the keyspace hit/miss counters of /maintenance/system-info,
+read at every phase boundary, and the CacheStatsUpdated broadcasts on cache-stats
+(every 3s while the scheduler runs maintenance:stream-cache-stats), which also
+give the warm-up curve. From the curve it derives how long latency and hit rate
+take to return to the warm baseline, the latency added by the flush, and the
+first-request penalty per endpoint.
+
+The counters are Redis-wide (rate limiter, sessions and Horizon reads count too),
+so the hit rate is a floor for Cache::remember() alone. cache:clear also resets
+the rate limiter windows kept in the same store.
+
+Usage:
+  python3 stability_cache_profile.py [--rate 3] [--warm-seconds 30] [--recovery-seconds 60] [--bin 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError
+from identities import auth_headers, load_identities
+from perf_stats import percentile, summarize
+from reverb_client import REVERB_HOST, REVERB_PORT
+from server_feed import ServerFeed, count
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+TOKEN = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"
+YEAR = datetime.now().year
+# (path, params, weight) - reads served through Cache::remember()
+WORKLOAD = [
+    ("/user", None, 3),                                    # only the per-request app settings read
+    ("/holidays/countries", None, 2),
+    ("/holidays", {"country": "US", "start": f"{YEAR}-01-01", "end": f"{YEAR}-12-31"}, 2),
+    ("/maintenance/analytics/overview", {"period": "7d"}, 1),
+    ("/maintenance/analytics/chart", {"period": "7d"}, 1),
+    ("/maintenance/analytics/pages", {"period": "7d"}, 1),
+    ("/maintenance/analytics/sources", {"period": "7d"}, 1),
+]
+
+# Test settings
+RATE = 3.0                    # Requests/second; the admin identity carries ~70% (api limiter: 160/min)
+CONCURRENCY = 20
+WARM_SECONDS = 30
+COLD_SECONDS = 10
+RECOVERY_SECONDS = 60         # After the flush, cold phase included
+PREWARM_ROUNDS = 2            # Requests per (identity, endpoint) before the warm phase
+BIN_SECONDS = 5               # Warm-up curve resolution
+LATENCY_TOLERANCE = 0.25      # Latency recovered once p95 stays within 25% of the warm p95 (misses
+                              # are a minority of requests, so they show in the tail first),
+HIT_RATE_TOLERANCE = 5.0      # hit rate once within 5 points of the warm hit rate,
+RECOVERY_BINS = 2             # for this many consecutive bins
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cache hit rate and flush cost profiler")
+    parser.add_argument("--rate", type=float, default=RATE, help="Requests per second")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--warm-seconds", type=float, default=WARM_SECONDS)
+    parser.add_argument("--cold-seconds", type=float, default=COLD_SECONDS)
+    parser.add_argument("--recovery-seconds", type=float, default=RECOVERY_SECONDS)
+    parser.add_argument("--bin", type=int, default=BIN_SECONDS, help="Seconds per warm-up curve row")
+    parser.add_argument("--tokens-file", help="Identities for the workload (default: seeded admin and member)")
+    parser.add_argument("--token", default=TOKEN, help="Admin token for the maintenance endpoints")
+    parser.add_argument("--no-feed", action="store_true", help="Do not subscribe to the cache-stats broadcasts")
+    parser.add_argument("--reverb-host", default=REVERB_HOST)
+    parser.add_argument("--reverb-port", type=int, default=REVERB_PORT)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def endpoint_name(path, params):
+    return path if not params else f"{path}?{'&'.join(f'{k}={v}' for k, v in params.items())}"
+
+
+async def system_cache(http):
+    """(monotonic, hits, misses, keys, memory used) from /maintenance/system-info, or None."""
+    try:
+        response = await http.get("/maintenance/system-info")
+    except HttpError:
+        return None
+    if response.status != 200:
+        return None
+    info = (response.json() or {}).get("data") or {}
+    hits, misses = count(info.get("cache_hits")), count(info.get("cache_misses"))
+    if hits is None or misses is None:
+        return None
+    return time.monotonic(), hits, misses, info.get("cache_keys"), info.get("cache_memory_used")
+
+
+def counter_hit_rate(first, last):
+    """Hit rate % between two (hits, misses) readings; None without lookups or across a counter reset."""
+    if first is None or last is None:
+        return None, 0
+    hits, misses = last[0] - first[0], last[1] - first[1]
+    if hits < 0 or misses < 0 or not hits + misses:
+        return None, 0
+    return round(hits / (hits + misses) * 100, 2), hits + misses
+
+
+def stream_counters(events):
+    """[(monotonic, hits, misses, keys)] from the recorded cache-stats broadcasts."""
+    points = []
+    for at, channel, payload in sorted(events, key=lambda e: e[0]):
+        if channel != "cache-stats":
+            continue
+        hits, misses = count(payload.get("cache_hits")), count(payload.get("cache_misses"))
+        if hits is not None and misses is not None:
+            points.append((at, hits, misses, count(payload.get("cache_keys", ""))))
+    return points
+
+
+def stream_window(points, start, end):
+    """Hit rate over [start, end) from the last broadcast before `start` to the last before `end`."""
+    before = [p for p in points if p[0] <= start]
+    inside = [p for p in points if start < p[0] <= end]
+    if not inside:
+        return None, 0, None
+    first = before[-1] if before else inside[0]
+    rate, lookups = counter_hit_rate(first[1:3], inside[-1][1:3])
+    return rate, lookups, inside[-1][3]
+
+
+class Workload:
+    """Open-loop request stream at `rate`/s; records (sent monotonic, endpoint, status, seconds)."""
+
+    def __init__(self, clients, allowed, rate, concurrency, seed):
+        self.clients = clients          # identity label -> AsyncHttpClient
+        self.allowed = allowed          # endpoint -> [labels]
+        self.rate = rate
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.random = random.Random(seed)
+        self.samples = []
+        self._turn = defaultdict(int)
+
+    def pick(self):
+        choices = [(path, params, weight) for path, params, weight in WORKLOAD
+                   if self.allowed.get(endpoint_name(path, params))]
+        path, params, _ = self.random.choices(choices, weights=[w for _, _, w in choices])[0]
+        name = endpoint_name(path, params)
+        labels = self.allowed[name]
+        self._turn[name] += 1
+        return path, params, name, labels[self._turn[name] % len(labels)]
+
+    async def send(self, path, params, name, label):
+        async with self.semaphore:
+            sent = time.monotonic()
+            try:
+                response = await self.clients[label].get(path, params=params)
+                status = response.status
+            except HttpError:
+                status = "error"
+            self.samples.append((sent, name, status, time.monotonic() - sent))
+
+    async def run(self, stop):
+        tasks = set()
+        started = time.monotonic()
+        sent = 0
+        while not stop.is_set():
+            delay = started + sent / self.rate - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(stop.wait(), delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            task = asyncio.create_task(self.send(*self.pick()))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            sent += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+async def prewarm(clients, identities):
+    """Hit every (identity, endpoint) pair; returns endpoint -> labels that got a 200, and the skips."""
+    allowed, skipped = defaultdict(list), []
+    for path, params, _ in WORKLOAD:
+        name = endpoint_name(path, params)
+        for identity in identities:
+            statuses = []
+            for _ in range(PREWARM_ROUNDS):
+                try:
+                    statuses.append((await clients[identity.label].get(path, params=params)).status)
+                except HttpError:
+                    statuses.append("error")
+            if 200 in statuses:
+                allowed[name].append(identity.label)
+            else:
+                skipped.append(f"{identity.label} {name} -> {statuses[-1]}")
+    return dict(allowed), skipped
+
+
+def phase_stats(name, samples, start, end, first, last, points):
+    """Latency and hit rate of the requests sent in [start, end)."""
+    window = [s for s in samples if start <= s[0] < end]
+    ok = [s for s in window if s[2] == 200]
+    by_endpoint = defaultdict(list)
+    for _, endpoint, _, seconds in ok:
+        by_endpoint[endpoint].append(seconds)
+    hit_rate, lookups = counter_hit_rate(first and first[1:3], last and last[1:3])
+    stream_rate, stream_lookups, _ = stream_window(points, start, end)
+    return {
+        "phase": name,
+        "seconds": round(end - start, 1),
+        "requests": len(window),
+        "rps": round(len(window) / (end - start), 2) if end > start else 0.0,
+        "throttled": sum(1 for s in window if s[2] == 429),
+        "errors": sum(1 for s in window if s[2] != 200 and s[2] != 429),
+        "latency_ms": summarize([s[3] for s in ok], 1000),
+        "endpoints": {endpoint: summarize(values, 1000) for endpoint, values in sorted(by_endpoint.items())},
+        "hit_rate": hit_rate,
+        "lookups": lookups,
+        "stream_hit_rate": stream_rate,
+        "stream_lookups": stream_lookups,
+        "keys": [first and first[3], last and last[3]],
+        "memory_used": last and last[4],
+    }
+
+
+def warmup_curve(samples, points, flush, end, bin_seconds):
+    """Rows of (t from the flush, requests, p50/p95 ms, stream hit rate, keys), starting two bins early."""
+    rows = []
+    start = flush - 2 * bin_seconds
+    while start < end:
+        stop = min(start + bin_seconds, end)
+        latencies = [s[3] * 1000 for s in samples if start <= s[0] < stop and s[2] == 200]
+        hit_rate, lookups, keys = stream_window(points, start, stop)
+        rows.append({"t": round(start - flush, 1), "requests": len(latencies),
+                     "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+                     "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+                     "hit_rate": hit_rate, "lookups": lookups, "keys": keys})
+        start = stop
+    return rows
+
+
+def recovered_at(rows, ok):
+    """Seconds after the flush from which `ok(row)` holds for RECOVERY_BINS bins in a row (None: never)."""
+    after = [row for row in rows if row["t"] >= 0]
+    for i in range(len(after) - RECOVERY_BINS + 1):
+        if all(ok(row) for row in after[i:i + RECOVERY_BINS]):
+            return after[i]["t"]
+    return None
+
+
+def flush_cost(samples, warm, flush, recovered, end):
+    """Latency the flush added: per-request excess over the warm mean, until `recovered` seconds after it."""
+    until = flush + recovered if recovered is not None else end
+    window = [s[3] * 1000 for s in samples if flush <= s[0] < until and s[2] == 200]
+    baseline = warm["latency_ms"]["mean"]
+    excess = sum(latency - baseline for latency in window)
+    return {"requests": len(window), "window_seconds": round(until - flush, 1),
+            "added_ms_total": round(excess, 1),
+            "added_ms_per_request": round(excess / len(window), 2) if window else None}
+
+
+def first_request_penalty(samples, warm, flush):
+    """Latency of each endpoint's first successful request after the flush against its warm p50."""
+    penalty = {}
+    for sent, endpoint, status, seconds in sorted(samples):
+        if sent < flush or status != 200 or endpoint in penalty:
+            continue
+        base = warm["endpoints"].get(endpoint, {}).get("p50")
+        penalty[endpoint] = {"first_ms": round(seconds * 1000, 2), "warm_p50_ms": base,
+                             "penalty_ms": None if base is None else round(seconds * 1000 - base, 2)}
+    return penalty
+
+
+async def profile(args, feed):
+    identities = load_identities(args.tokens_file)
+    clients = {identity.label: AsyncHttpClient(API_BASE, headers=auth_headers(identity.token),
+                                               limit=args.concurrency) for identity in identities}
+    admin = AsyncHttpClient(API_BASE, headers=auth_headers(args.token))
+    try:
+        if await system_cache(admin) is None:
+            print("❌ /maintenance/system-info gave no cache counters (needs system.maintenance and a "
+                  "Redis/emulator cache)")
+            return None
+        allowed, skipped = await prewarm(clients, identities)
+        for line in skipped:
+            print(f"  ⏭️  {line}")
+        if not allowed:
+            print("❌ No workload endpoint answered 200")
+            return None
+        print(f"  Workload: {len(allowed)} endpoints at {args.rate:g} req/s over {len(identities)} identities\n")
+
+        workload = Workload(clients, allowed, args.rate, args.concurrency, args.seed)
+        stop = asyncio.Event()
+        running = asyncio.create_task(workload.run(stop))
+
+        marks = {"start": time.monotonic()}
+        readings = {"start": await system_cache(admin)}
+        print(f"  🔥 warm phase ({args.warm_seconds:g}s)")
+        await asyncio.sleep(args.warm_seconds)
+        readings["flush"] = await system_cache(admin)
+        marks["flush"] = time.monotonic()
+        response = await admin.post("/maintenance/cache/clear")
+        print(f"  🧹 cache cleared ({response.status}) at T+{marks['flush'] - marks['start']:.0f}s")
+        readings["cleared"] = await system_cache(admin)
+        await asyncio.sleep(args.cold_seconds)
+        readings["cold"] = await system_cache(admin)
+        marks["cold"] = time.monotonic()
+        print(f"  🧊 cold phase done, recovering ({max(0.0, args.recovery_seconds - args.cold_seconds):g}s)")
+        await asyncio.sleep(max(0.0, args.recovery_seconds - args.cold_seconds))
+        readings["end"] = await system_cache(admin)
+        marks["end"] = time.monotonic()
+        stop.set()
+        await running
+    finally:
+        for client in list(clients.values()) + [admin]:
+            await client.close()
+
+    if feed is not None:
+        feed.stop()
+    points = stream_counters(feed.events) if feed is not None else []
+    samples = workload.samples
+    phases = [
+        phase_stats("warm", samples, marks["start"], marks["flush"], readings["start"], readings["flush"], points),
+        phase_stats("cold", samples, marks["flush"], marks["cold"], readings["cleared"], readings["cold"], points),
+        phase_stats("recovery", samples, marks["cold"], marks["end"], readings["cold"], readings["end"], points),
+    ]
+    warm = phases[0]
+    curve = warmup_curve(samples, points, marks["flush"], marks["end"], args.bin)
+    warm_p95 = warm["latency_ms"]["p95"]
+    warm_rate = warm["stream_hit_rate"] if warm["stream_hit_rate"] is not None else warm["hit_rate"]
+    latency_recovered = recovered_at(curve, lambda row: row["p95_ms"] is not None
+                                     and row["p95_ms"] <= warm_p95 * (1 + LATENCY_TOLERANCE))
+    hit_rate_recovered = None
+    if warm_rate is not None and points:
+        hit_rate_recovered = recovered_at(curve, lambda row: row["hit_rate"] is not None
+                                          and row["hit_rate"] >= warm_rate - HIT_RATE_TOLERANCE)
+    return {
+        "rate": args.rate,
+        "workload": {name: labels for name, labels in allowed.items()},
+        "skipped": skipped,
+        "stream_events": len(points),
+        "flush_status": response.status,
+        "keys_cleared": [readings["flush"] and readings["flush"][3], readings["cleared"] and readings["cleared"][3]],
+        "phases": phases,
+        "curve": curve,
+        "latency_recovered_seconds": latency_recovered,
+        "hit_rate_recovered_seconds": hit_rate_recovered,
+        # The tail keeps paying for misses until the hit rate is back too
+        "flush_cost": flush_cost(samples, warm, marks["flush"],
+                                 None if latency_recovered is None else max(latency_recovered, hit_rate_recovered or 0),
+                                 marks["end"]),
+        "first_request_penalty": first_request_penalty(samples, warm, marks["flush"]),
+        "feed_errors": feed.errors if feed is not None else [],
+    }
+
+
+def cell(value, width, digits=1):
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+
+def print_report(report, bin_seconds):
+    print(f"\n  {'PHASE':<10} {'REQ':>6} {'429':>4} {'ERR':>4} {'P50ms':>8} {'P95ms':>8} {'P99ms':>8} "
+          f"{'HIT%':>7} {'STREAM%':>8} {'KEYS':>12}")
+    for p in report["phases"]:
+        latency = p["latency_ms"]
+        keys = "->".join("-" if k is None else str(k) for k in p["keys"])
+        print(f"  {p['phase']:<10} {p['requests']:>6} {p['throttled']:>4} {p['errors']:>4} "
+              f"{cell(latency['p50'] if latency['count'] else None, 8)} "
+              f"{cell(latency['p95'] if latency['count'] else None, 8)} "
+              f"{cell(latency['p99'] if latency['count'] else None, 8)} "
+              f"{cell(p['hit_rate'], 7)} {cell(p['stream_hit_rate'], 8)} {keys:>12}")
+
+    print(f"\n  Warm-up curve ({bin_seconds}s bins, T=0 is the flush)")
+    print(f"  {'T+s':>6} {'REQ':>5} {'P50ms':>8} {'P95ms':>8} {'HIT%':>7} {'KEYS':>7}")
+    for row in report["curve"]:
+        print(f"  {row['t']:>6.0f} {row['requests']:>5} {cell(row['p50_ms'], 8)} {cell(row['p95_ms'], 8)} "
+              f"{cell(row['hit_rate'], 7)} {cell(row['keys'], 7, 0)}")
+    if not report["stream_events"]:
+        print("  ⚠️  No CacheStatsUpdated broadcasts (is the scheduler running maintenance:stream-cache-stats?)")
+
+    print("\n  First request after the flush")
+    width = max((len(endpoint) for endpoint in report["first_request_penalty"]), default=0)
+    for endpoint, p in report["first_request_penalty"].items():
+        penalty = "-" if p["penalty_ms"] is None else f"{p['penalty_ms']:+.1f}"
+        print(f"    {endpoint:<{width}} {p['first_ms']:>8.1f}ms (warm p50 {cell(p['warm_p50_ms'], 0)}ms, {penalty}ms)")
+
+
+def main():
+    args = parse_args()
+    args.cold_seconds = min(args.cold_seconds, args.recovery_seconds)
+
+    print("=" * 60)
+    print("Cache Effectiveness Profiler")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"API:     {API_BASE}")
+    print(f"Phases:  warm {args.warm_seconds:g}s, flush, cold {args.cold_seconds:g}s, "
+          f"recovery to {args.recovery_seconds:g}s\n")
+
+    feed = None if args.no_feed else ServerFeed(args.reverb_host, args.reverb_port).start()
+    report = asyncio.run(profile(args, feed))
+    if report is None:
+        if feed is not None:
+            feed.stop()
+        sys.exit(1)
+    print_report(report, args.bin)
+
+    cost = report["flush_cost"]
+    latency_recovered = report["latency_recovered_seconds"]
+    print("\n" + "=" * 60)
+    if latency_recovered is None:
+        print(f"❌ Latency did not return to the warm p95 within {args.recovery_seconds:g}s of the flush")
+    else:
+        hit = report["hit_rate_recovered_seconds"]
+        print(f"✅ Latency recovered {latency_recovered:g}s after the flush"
+              + (f", hit rate after {hit:g}s" if hit is not None else ""))
+    if cost["added_ms_per_request"] is not None:
+        print(f"   Flush cost: +{cost['added_ms_total'] / 1000:.2f}s over {cost['requests']} requests "
+              f"({cost['added_ms_per_request']:+.1f}ms each)")
+    print("=" * 60)
+
+    report["timestamp"] = datetime.now().isoformat()
+    report["target"] = API_BASE
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_profile_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(0 if latency_recovered is not None else 1)
+
+
+if __name__ == "__main__":
+    main()
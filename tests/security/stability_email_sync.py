@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Email Sync Throughput Test
+Drives the email sync pipeline against the IMAP stand-in (imap_standin.py, run
+in-process) and measures it the way a user experiences it:
+
+  initial      POST /email-accounts (custom provider, plain IMAP/SMTP on the
+               stand-in), POST /{id}/test (verifies via the SMTP responder),
+               POST /{id}/sync -> SeedEmailAccountJob (50 newest per priority
+               folder), then SyncEmailFolderJob chunks until sync_status is
+               "completed"
+  incremental  new messages are appended to the stand-in's INBOX and
+               POST /{id}/sync runs FetchNewEmailsJob (at most 50 UIDs per run,
+               so the sync is re-triggered while the count keeps lagging)
+
+Per phase it reports time to the first visible message (GET /emails, resolution
+= --poll-interval), messages/second (overall and the steady slope), time to
+completion, RSS growth of the PHP server and queue workers, row growth of the
+emails/media/email_sync_logs tables (/maintenance/database-health, which are
+information_schema estimates on MySQL) and what the stand-in served. After the
+initial sync it times the read endpoints at that mailbox size: /emails (first
+and last page), /emails/folder-counts and a body search (--read-samples each).
+The mailbox comes from mailbox_generator.py, so --folder INBOX=100000 gives a
+production-sized sync. Only the folders of the custom adapter's folder mapping
+(SYNCED_FOLDERS) are synced and counted towards the target; --folders adds
+Projects/<n> folders that the stand-in serves (LIST/STATUS load) but the sync
+never reads.
+
+The queue workers must be running and must be able to reach the stand-in at
+--imap-host (use --bind 0.0.0.0 --imap-host host.docker.internal when the app
+runs in a container). /email-accounts and /emails share the user's api limiter,
+so every call goes through a LimiterPacer. The accounts are deleted afterwards
+unless --keep is given.
+
+Usage:
+  python3 stability_email_sync.py [--folder INBOX=100000] [--folders 20] [--attachments none=60,large=40]
+                                  [--accounts 2] [--incremental 100] [--latency 5ms] [--fetch-latency exp:2] [--keep]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError, LimiterPacer
+from imap_standin import PASSWORD, ImapStandIn, MailStore
+from mailbox_generator import ATTACHMENT_MIX, build_message, format_mix, generate_mailbox, parse_folders, parse_mix
+from perf_stats import RssSampler, format_summary, linear_fit, summarize
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+TOKEN = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"
+BIND = "127.0.0.1"
+IMAP_PORT = 1143
+SMTP_PORT = 1025
+SERVER_PROCESSES = ["php-fpm", "artisan serve", "php -S", "octane", "queue:work", "horizon"]
+
+# Test settings
+MAILBOX = ["INBOX=400", "Sent=100", "Drafts=10", "Trash=40"]
+# CustomImapAdapter::getFolderMapping(): the only folders EmailSyncService reads
+SYNCED_FOLDERS = ["INBOX", "Sent", "Drafts", "Trash", "Spam", "Archive"]
+ACCOUNTS = 1
+INCREMENTAL_MESSAGES = 60
+POLL_INTERVAL = 3.0
+STATUS_EVERY = 3              # Poll sync_status every 3rd round (the limiter is shared)
+SYNC_TIMEOUT = 900            # Initial sync must complete within this
+INCREMENTAL_TIMEOUT = 300
+STALL_SECONDS = 30            # Re-trigger the incremental sync after this long without progress
+READ_SAMPLES = 5              # Requests per read endpoint after the initial sync (0 skips)
+SEARCH_TERM = "invoice"       # A word of the generated bodies
+PER_PAGE = 25
+DB_TABLES = ["emails", "media", "email_sync_logs"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Email sync throughput test against an IMAP stand-in")
+    parser.add_argument("--folder", action="append", metavar="NAME=COUNT", help="Stand-in folder size (repeatable)")
+    parser.add_argument("--attachments", default=format_mix(ATTACHMENT_MIX), metavar="KIND=WEIGHT,...")
+    parser.add_argument("--folders", type=int, default=0,
+                        help="Extra Projects/<n> folders in the mailbox (served, not synced)")
+    parser.add_argument("--format", choices=["maildir", "mbox"], default="mbox")
+    parser.add_argument("--fixtures", help="Existing/persistent fixtures directory (default: temporary)")
+    parser.add_argument("--read-samples", type=int, default=READ_SAMPLES,
+                        help="Requests per read endpoint (/emails, folder-counts, search) after the initial sync")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--accounts", type=int, default=ACCOUNTS, help="Accounts syncing the same mailbox")
+    parser.add_argument("--incremental", type=int, default=INCREMENTAL_MESSAGES,
+                        help="Messages appended for the incremental phase (0 skips it)")
+    parser.add_argument("--latency", default="0", metavar="SPEC", help="Stand-in delay per IMAP command")
+    parser.add_argument("--fetch-latency", default="0", metavar="SPEC", help="Stand-in delay per fetched message")
+    parser.add_argument("--bind", default=BIND, help="Address the stand-in listens on")
+    parser.add_argument("--imap-host", help="Address the app connects to (default: --bind)")
+    parser.add_argument("--imap-port", type=int, default=IMAP_PORT)
+    parser.add_argument("--smtp-port", type=int, default=SMTP_PORT)
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--timeout", type=float, default=SYNC_TIMEOUT)
+    parser.add_argument("--keep", action="store_true", help="Keep the accounts (and their emails) afterwards")
+    return parser.parse_args()
+
+
+def synced_total(store):
+    """Messages in the folders the sync reads; the initial phase waits for this many."""
+    return sum(len(folder.messages) for folder in (store.folder(name) for name in SYNCED_FOLDERS) if folder)
+
+
+def api_headers(token):
+    return {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+
+
+class Api:
+    """AsyncHttpClient paced by the user's api limiter; counts 429s and transport errors."""
+
+    def __init__(self, http):
+        self.http = http
+        self.pacer = LimiterPacer(reserve=1)
+        self.throttled = 0
+        self.errors = 0
+
+    async def call(self, method, path, **kwargs):
+        await self.pacer.acquire()
+        try:
+            response = await self.http.request(method, path, **kwargs)
+        except HttpError:
+            self.errors += 1
+            return None
+        self.pacer.update(response)
+        if response.status == 429:
+            self.throttled += 1
+        return response
+
+    async def data(self, path, params=None):
+        response = await self.call("GET", path, params=params)
+        if response is None or response.status != 200:
+            return None
+        return response.json() or {}
+
+
+async def visible(api, account_id):
+    """Emails of the account the API lists (all folders), or None if the call failed."""
+    body = await api.data("/emails", {"email_account_id": account_id, "folder": "all", "per_page": 1})
+    return None if body is None else (body.get("meta") or {}).get("total", len(body.get("data", [])))
+
+
+async def sync_status(api, account_id):
+    body = await api.data(f"/email-accounts/{account_id}")
+    data = (body or {}).get("data") or {}
+    return data.get("sync_status"), data.get("sync_error")
+
+
+async def table_rows(api):
+    """{table: rows} for DB_TABLES, or None without system.maintenance."""
+    body = await api.data("/maintenance/database-health", {"per_page": 200})
+    if body is None:
+        return None
+    tables = (body.get("data") or {}).get("data", [])
+    return {t["name"]: t.get("rows_count") for t in tables if t.get("name") in DB_TABLES}
+
+
+async def create_account(api, index, args):
+    body = {
+        "name": f"Sync benchmark {index}",
+        "email": f"sync-bench-{index}-{uuid.uuid4().hex[:8]}@standin.test",
+        "provider": "custom",
+        "auth_type": "password",
+        "imap_host": args.imap_host,
+        "imap_port": args.imap_port,
+        "imap_encryption": "none",
+        "smtp_host": args.imap_host,
+        "smtp_port": args.smtp_port,
+        "smtp_encryption": "none",
+        "username": f"bench{index}",
+        "password": PASSWORD,
+    }
+    response = await api.call("POST", "/email-accounts", json=body)
+    if response is None or response.status != 201:
+        detail = "unreachable" if response is None else f"{response.status} {response.text()[:200]}"
+        print(f"  ❌ Account {index}: create failed ({detail})")
+        return None
+    account_id = ((response.json() or {}).get("data") or {}).get("id")
+    response = await api.call("POST", f"/email-accounts/{account_id}/test")
+    result = (response.json() or {}) if response is not None and response.status == 200 else {}
+    icon = "✅" if result.get("success") else "⚠️ "
+    print(f"  {icon} Account {index}: {account_id} (test: {result.get('message', 'no result')})")
+    return account_id
+
+
+def rate_stats(samples, started, baseline):
+    """Throughput figures from (monotonic, visible total) samples of one account set."""
+    rising = [(t, n) for t, n in samples if n > baseline]
+    if not rising:
+        return {"first_visible_s": None, "msgs_per_sec": None, "steady_msgs_per_sec": None}
+    last_growth = next(t for t, n in reversed(samples) if n == samples[-1][1])
+    slope = None
+    if len(rising) >= 2:
+        slope, _, _ = linear_fit([t for t, _ in rising], [n for _, n in rising])
+    elapsed = max(last_growth - started, 1e-6)
+    return {
+        "first_visible_s": round(rising[0][0] - started, 2),
+        "msgs_per_sec": round((samples[-1][1] - baseline) / elapsed, 2),
+        "steady_msgs_per_sec": None if slope is None else round(slope, 2),
+    }
+
+
+def stats_delta(before, after):
+    return {key: after[key] - before.get(key, 0) for key in sorted(after) if after[key] - before.get(key, 0)}
+
+
+async def run_phase(name, api, accounts, targets, standin, args, timeout, trigger_on_stall):
+    """Trigger the sync and poll until every account shows `targets[id]` emails (and "completed")."""
+    print(f"\n📬 {name} sync")
+    before_stats = dict(standin.stats)
+    before_rows = await table_rows(api)
+    baselines = {a: await visible(api, a) or 0 for a in accounts}
+    stop = asyncio.Event()
+    sampler = RssSampler(SERVER_PROCESSES, interval=1.0)
+    sampling = asyncio.create_task(sampler.run(stop))
+
+    started = time.monotonic()
+    for account_id in accounts:
+        await api.call("POST", f"/email-accounts/{account_id}/sync")
+    samples = {a: [(started, baselines[a])] for a in accounts}
+    statuses = {a: None for a in accounts}
+    completed_at, triggers, progress_at, rounds = {}, 1, started, 0
+    while time.monotonic() - started < timeout:
+        await asyncio.sleep(args.poll_interval)
+        now = time.monotonic()
+        for account_id in accounts:
+            count = await visible(api, account_id)
+            if count is None:
+                continue
+            if count > samples[account_id][-1][1]:
+                progress_at = now
+            samples[account_id].append((now, count))
+            if rounds % STATUS_EVERY == 0 or count >= targets[account_id]:
+                statuses[account_id] = (await sync_status(api, account_id))[0] or statuses[account_id]
+            if account_id not in completed_at and count >= targets[account_id] and statuses[account_id] == "completed":
+                completed_at[account_id] = now
+        rounds += 1
+        total = sum(s[-1][1] - baselines[a] for a, s in samples.items())
+        print(f"  {now - started:>6.0f}s  +{total:<6} visible  status {', '.join(str(s) for s in statuses.values())}")
+        if len(completed_at) == len(accounts) or any(s == "failed" for s in statuses.values()):
+            break
+        if trigger_on_stall and now - progress_at >= STALL_SECONDS:
+            for account_id in accounts:
+                if account_id not in completed_at:
+                    await api.call("POST", f"/email-accounts/{account_id}/sync")
+            triggers += 1
+            progress_at = now
+    stop.set()
+    await sampling
+
+    after_rows = await table_rows(api)
+    per_account = {}
+    for account_id in accounts:
+        figures = rate_stats(samples[account_id], started, baselines[account_id])
+        finished = completed_at.get(account_id)
+        per_account[account_id] = {
+            "expected": targets[account_id] - baselines[account_id],
+            "visible": samples[account_id][-1][1] - baselines[account_id],
+            "sync_status": statuses[account_id],
+            "completed_s": None if finished is None else round(finished - started, 2),
+            **figures,
+            "curve": [[round(t - started, 1), n - baselines[account_id]] for t, n in samples[account_id]],
+        }
+    completed = len(completed_at) == len(accounts)
+    elapsed = (max(completed_at.values()) if completed else time.monotonic()) - started
+    visible_total = sum(a["visible"] for a in per_account.values())
+    firsts = [a["first_visible_s"] for a in per_account.values() if a["first_visible_s"] is not None]
+    return {
+        "phase": name,
+        "completed": completed,
+        "seconds": round(elapsed, 2),
+        "expected": sum(a["expected"] for a in per_account.values()),
+        "visible": visible_total,
+        "first_visible_s": min(firsts) if firsts else None,
+        "msgs_per_sec": round(visible_total / elapsed, 2) if elapsed > 0 else None,
+        "sync_triggers": triggers,
+        "memory": sampler.summary(),
+        "db_rows_growth": None if not before_rows or not after_rows else {
+            table: (after_rows.get(table) or 0) - (before_rows.get(table) or 0) for table in DB_TABLES},
+        "standin": stats_delta(before_stats, dict(standin.stats)),
+        "accounts": per_account,
+    }
+
+
+async def read_benchmark(api, account_id, total, samples):
+    """Latency of the mailbox read endpoints at the synced mailbox size."""
+    print(f"\n📖 Read endpoints at {total:,} messages")
+    scope = {"email_account_id": account_id, "folder": "all", "per_page": PER_PAGE}
+    queries = {
+        "list": ("/emails", scope),
+        "list_last_page": ("/emails", {**scope, "page": max(1, -(-total // PER_PAGE))}),
+        "folder_counts": ("/emails/folder-counts", None),
+        "search": ("/emails", {**scope, "search": SEARCH_TERM}),
+    }
+    results = {}
+    for name, (path, params) in queries.items():
+        timings, statuses = [], Counter()
+        for _ in range(samples):
+            response = await api.call("GET", path, params=params)
+            status = "error" if response is None else response.status
+            statuses[status] += 1
+            if status == 200:
+                timings.append(response.elapsed)
+        results[name] = {"latency_ms": summarize(timings, 1000), "status": {str(k): n for k, n in statuses.items()}}
+        icon = "✅" if timings else "❌"
+        print(f"  {icon} {name:<15} {format_summary(results[name]['latency_ms'])}")
+    return results
+
+
+def print_phase(result):
+    icon = "✅" if result["completed"] else "❌"
+    print(f"\n  {icon} {result['phase']}: {result['visible']}/{result['expected']} messages in {result['seconds']:.1f}s "
+          f"({result['msgs_per_sec'] or 0:.1f} msg/s, {result['sync_triggers']} sync trigger(s))")
+    if result["first_visible_s"] is not None:
+        print(f"     First visible message after {result['first_visible_s']:.1f}s")
+    for account_id, account in result["accounts"].items():
+        steady = account["steady_msgs_per_sec"]
+        print(f"     {account_id[:8]}  {account['visible']:>6}/{account['expected']:<6} "
+              f"status {account['sync_status']}  steady {'-' if steady is None else f'{steady:.1f}'} msg/s")
+    if result["memory"]:
+        m = result["memory"]
+        print(f"     RSS {m['before_mb']} MB -> peak {m['peak_mb']} MB -> {m['after_mb']} MB")
+    if result["db_rows_growth"]:
+        print("     DB rows " + ", ".join(f"{t} +{n}" for t, n in result["db_rows_growth"].items()))
+    served = result["standin"]
+    print(f"     Stand-in: {served.get('messages_fetched', 0)} messages fetched, "
+          f"{served.get('bytes_served', 0) / 1048576:.1f} MB served, {served.get('logins', 0)} logins")
+
+
+async def run(args, store):
+    standin = await ImapStandIn(store, PASSWORD, args.latency, args.fetch_latency).start(
+        args.bind, args.imap_port, args.smtp_port)
+    results, accounts = [], []
+    async with AsyncHttpClient(API_BASE, headers=api_headers(TOKEN)) as http:
+        api = Api(http)
+        try:
+            for index in range(1, args.accounts + 1):
+                account_id = await create_account(api, index, args)
+                if account_id:
+                    accounts.append(account_id)
+            if not accounts:
+                return results, api
+
+            size = synced_total(store)
+            initial = await run_phase("Initial", api, accounts, {a: size for a in accounts}, standin, args,
+                                      args.timeout, trigger_on_stall=False)
+            results.append(initial)
+            print_phase(initial)
+            if args.read_samples and initial["visible"]:
+                reads = await read_benchmark(api, accounts[0], initial["accounts"][accounts[0]]["visible"],
+                                             args.read_samples)
+                initial["reads"] = reads
+
+            if args.incremental and initial["completed"]:
+                inbox = store.folder("INBOX") or store.create("INBOX")
+                mix = parse_mix(args.attachments)
+                for _ in range(args.incremental):
+                    store.append("INBOX", build_message("INBOX", inbox.uidnext, args.seed, mix)[0])
+                # Targets are absolute visible counts; run_phase reads its own baselines
+                targets = {a: (await visible(api, a) or 0) + args.incremental for a in accounts}
+                incremental = await run_phase("Incremental", api, accounts, targets, standin, args,
+                                              INCREMENTAL_TIMEOUT, trigger_on_stall=True)
+                results.append(incremental)
+                print_phase(incremental)
+        finally:
+            if not args.keep:
+                for account_id in accounts:
+                    await api.call("DELETE", f"/email-accounts/{account_id}")
+            await standin.close()
+    return results, api
+
+
+def main():
+    args = parse_args()
+    args.imap_host = args.imap_host or args.bind
+    folders = parse_folders(args.folder or MAILBOX, args.folders)
+
+    print("=" * 60)
+    print("Email Sync Throughput Test")
+    print("=" * 60)
+    print(f"\nStarted:  {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"API:      {API_BASE}")
+    print(f"Stand-in: imap://{args.imap_host}:{args.imap_port}, smtp port {args.smtp_port}")
+
+    directory = args.fixtures or tempfile.mkdtemp(prefix="email-sync-")
+    try:
+        if not os.path.isdir(directory) or not os.listdir(directory):
+            started = time.monotonic()
+            generate_mailbox(directory, folders, parse_mix(args.attachments), args.seed, args.format)
+            print(f"Fixtures: generated in {time.monotonic() - started:.1f}s ({args.attachments})")
+        store = MailStore.load(directory)
+        print("Mailbox:  " + ", ".join(f"{name} {len(f.messages):,}" for name, f in store.folders.items()))
+        unsynced = [name for name in store.folders if name.upper() != "INBOX" and name not in SYNCED_FOLDERS]
+        if unsynced:
+            print(f"          {len(unsynced)} folders outside the adapter's mapping are served but not synced; "
+                  f"target {synced_total(store):,} messages")
+        print(f"Accounts: {args.accounts}, incremental +{args.incremental}\n")
+        results, api = asyncio.run(run(args, store))
+    finally:
+        if not args.fixtures:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    failed = [r["phase"] for r in results if not r["completed"]]
+    print("\n" + "=" * 60)
+    if not results:
+        print("⚠️  No sync could run (check the API and that accounts can be created)")
+    elif failed:
+        print(f"❌ {', '.join(failed)} sync did not complete (see sync_status / queue workers)")
+    else:
+        print("✅ Every sync phase completed")
+    if api.throttled:
+        print(f"⚠️  {api.throttled} requests were throttled (raise --poll-interval)")
+    print("=" * 60)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": API_BASE,
+        "mailbox": {name: len(f.messages) for name, f in store.folders.items()},
+        "attachments": args.attachments,
+        "accounts": args.accounts,
+        "latency": args.latency,
+        "fetch_latency": args.fetch_latency,
+        "poll_interval": args.poll_interval,
+        "throttled": api.throttled,
+        "phases": results,
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "email_sync_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(0 if results and not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
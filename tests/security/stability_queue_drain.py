@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Queue Drain-Rate Benchmark
+Measures how fast the queue workers (Horizon) work off bursts of job-producing
+actions, at increasing burst sizes:
+
+  ticket-status  PUT /tickets/{id}/status     TicketNotification per recipient (default queue)
+  chat           POST /chat/{id}/send         ProcessChatMessage ("chats" queue)
+  announcement   POST /admin/announcements    creates an inactive announcement; it
+                                              dispatches no job in this tree, so it
+                                              is a zero-enqueue control (deleted afterwards)
+
+While each burst runs and drains, the maintenance queue endpoints are polled:
+/queue/stats (failed count), /queue/pending (depth over all queues - stats only
+counts the default queue), /queue/completed (Horizon's recently completed jobs:
+id, name, queue, status, completed_at and runtime) and /queue/failed. Per burst
+it reports the enqueue rate, peak depth, drain rate (job completions per second
+and the slope of the depth from its peak back to the baseline), time to drain,
+job latency percentiles, job runtime percentiles and the failed-job ratio.
+
+The completed list carries no push time, so a job's latency is its completed_at
+minus the send time of the request that produced it: the burst's accepted
+requests and the new completions of the same job name are paired in queue
+order (jobs that fan out per recipient share their request's send time).
+Horizon's recent list is read 50 jobs at a time, so jobs pushed out of it before
+their completion is seen are counted as untracked rather than guessed.
+The poller and the default sender share the admin identity's api limiter
+(160/min); --sender-token spreads the burst over other identities.
+
+Usage:
+  python3 stability_queue_drain.py [--burst 10 --burst 50] [--action chat] [--poll-interval 2]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError
+from perf_stats import linear_fit, summarize
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+TOKEN = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"
+SENDER_TOKENS = [TOKEN]
+
+# Test settings
+BURST_SIZES = [5, 10, 25, 50]
+BURST_CONCURRENCY = 10
+POLL_INTERVAL = 2.0           # stats + pending; completed + failed every other poll
+IDLE_TIMEOUT = 30             # Wait at most this long for the queue to be empty before a burst
+DRAIN_TIMEOUT = 120           # A burst that has not drained after this long fails
+MAX_FAILED_RATIO = 0.01
+
+# action -> Horizon job name it produces (None: no job)
+ACTIONS = {
+    "ticket-status": "App\\Notifications\\TicketNotification",
+    "chat": "App\\Jobs\\ProcessChatMessage",
+    "announcement": None,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Queue drain-rate benchmark")
+    parser.add_argument("--burst", type=int, action="append", help="Burst size (repeatable)")
+    parser.add_argument("--action", choices=sorted(ACTIONS), action="append",
+                        help="Job-producing action (repeatable, default: all, round-robin)")
+    parser.add_argument("--chat", help="Chat public id (default: first chat from /chat)")
+    parser.add_argument("--ticket", help="Ticket public id (default: first ticket from /tickets)")
+    parser.add_argument("--concurrency", type=int, default=BURST_CONCURRENCY)
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT)
+    parser.add_argument("--sender-token", action="append", help="Token used for the actions (repeatable)")
+    return parser.parse_args()
+
+
+def api_headers(token):
+    return {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+
+
+def timestamp(value):
+    """Horizon stores times as microtime strings ("1712345678.1234")."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class QueuePoller:
+    """Polls the maintenance queue endpoints; keeps depth samples and the latest view of every job."""
+
+    def __init__(self, http, interval):
+        self.http = http
+        self.interval = interval
+        self.depth = []               # (monotonic, pending over all queues, failed count)
+        self.jobs = {}                # id -> latest Horizon record
+        self.failed_ids = set()
+        self.throttled = 0
+        self.errors = 0
+        self._round = 0
+
+    async def get(self, path, params=None):
+        try:
+            response = await self.http.get(path, params=params)
+        except HttpError:
+            self.errors += 1
+            return None
+        if response.status == 429:
+            self.throttled += 1
+            return None
+        if response.status != 200:
+            self.errors += 1
+            return None
+        return (response.json() or {}).get("data")
+
+    async def poll(self, full=True):
+        stats, pending = await asyncio.gather(self.get("/maintenance/queue/stats"),
+                                              self.get("/maintenance/queue/pending", {"per_page": 1}))
+        if stats is not None and pending is not None:
+            self.depth.append((time.monotonic(), pending.get("total", 0), stats.get("failed", 0)))
+        if full:
+            completed, failed = await asyncio.gather(self.get("/maintenance/queue/completed", {"limit": 50}),
+                                                     self.get("/maintenance/queue/failed", {"per_page": 50}))
+            for job in completed or []:
+                self.jobs[job["id"]] = job
+            for job in (failed or {}).get("data", []):
+                self.failed_ids.add(job.get("uuid") or job.get("id"))
+
+    async def run(self, stop):
+        while not stop.is_set():
+            await self.poll(full=self._round % 2 == 0)
+            self._round += 1
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def latest(self):
+        return self.depth[-1] if self.depth else None
+
+
+async def resolve_targets(http, args, actions):
+    """Return {action: path} for the actions that have a target, plus the ticket's original status."""
+    targets, original_status = {}, None
+    if "chat" in actions:
+        chat_id = args.chat
+        if chat_id is None:
+            response = await http.get("/chat")
+            chats = (response.json() or {}).get("data", []) if response.status == 200 else []
+            chat_id = chats[0]["public_id"] if chats else None
+        if chat_id:
+            targets["chat"] = f"/chat/{chat_id}/send"
+        else:
+            print("  ⏭️  chat: no chat available for this user")
+    if "ticket-status" in actions:
+        ticket_id = args.ticket
+        if ticket_id is None:
+            response = await http.get("/tickets", params={"per_page": 1})
+            tickets = (response.json() or {}).get("data", []) if response.status == 200 else []
+            ticket_id = (tickets[0].get("public_id") or tickets[0].get("id")) if tickets else None
+        if ticket_id:
+            response = await http.get(f"/tickets/{ticket_id}")
+            if response.status == 200:
+                original_status = ((response.json() or {}).get("data") or {}).get("status")
+            targets["ticket-status"] = f"/tickets/{ticket_id}/status"
+        else:
+            print("  ⏭️  ticket-status: no ticket available for this user")
+    if "announcement" in actions:
+        targets["announcement"] = "/admin/announcements"
+    return targets, original_status
+
+
+def action_request(action, path, index):
+    """(method, path, json body) for the index-th action of a burst."""
+    if action == "chat":
+        return "POST", path, {"content": f"queue drain {index}", "temp_id": f"drain-{uuid.uuid4().hex[:12]}"}
+    if action == "ticket-status":
+        return "PUT", path, {"status": "in_progress" if index % 2 == 0 else "open"}
+    return "POST", path, {"title": f"Queue drain probe {index}", "message": "Queue drain benchmark",
+                          "type": "info", "is_active": False, "is_dismissable": True}
+
+
+async def wait_until_idle(poller, timeout):
+    """Poll until the queue is empty (or stops shrinking). Returns the baseline depth sample."""
+    deadline = time.monotonic() + timeout
+    while True:
+        await poller.poll()
+        sample = poller.latest()
+        if sample is None or sample[1] == 0 or time.monotonic() >= deadline:
+            return sample
+        await asyncio.sleep(poller.interval)
+
+
+def drain_stats(depth, baseline, burst_end):
+    """(peak depth, time to drain after the burst, depth slope jobs/s) from the depth samples."""
+    if not depth:
+        return 0, None, None
+    peak_index = max(range(len(depth)), key=lambda i: depth[i][1])
+    peak = depth[peak_index][1]
+    drained_at = next((t for t, pending, _ in depth if t >= burst_end and pending <= baseline), None)
+    falling = [(t, pending) for t, pending, _ in depth[peak_index:] if drained_at is None or t <= drained_at]
+    slope = None
+    if len(falling) >= 2 and peak > baseline:
+        fitted, _, _ = linear_fit([t for t, _ in falling], [p for _, p in falling])
+        slope = -fitted
+    return peak, (None if drained_at is None else max(0.0, drained_at - burst_end)), slope
+
+
+def runtime_seconds(value):
+    """Horizon's formatted runtime ("12.34ms", or "N/A" while unknown) in seconds."""
+    if not isinstance(value, str) or not value.endswith("ms"):
+        return None
+    try:
+        return float(value[:-2].replace(",", "")) / 1000
+    except ValueError:
+        return None
+
+
+def job_stats(jobs, started_wall, known, sent):
+    """Latency/runtime summary of the Horizon jobs completed since `started_wall` and not in `known`.
+
+    `sent` maps a job name to the wall-clock times of the accepted requests that enqueue it.
+    """
+    new = [job for job_id, job in jobs.items() if job_id not in known
+           and (timestamp(job.get("completed_at")) or 0) >= started_wall]
+    latencies, runtimes, waits, completions = [], [], [], []
+    by_name = Counter()
+    statuses = Counter()
+    for job in new:
+        by_name[job.get("name", "?")] += 1
+        statuses[job.get("status", "?")] += 1
+        runtime = runtime_seconds(job.get("runtime"))
+        if runtime is not None:
+            runtimes.append(runtime)
+    for name in by_name:
+        finished = sorted(((timestamp(job.get("completed_at")), runtime_seconds(job.get("runtime")))
+                           for job in new if job.get("name", "?") == name), key=lambda item: item[0])
+        sends = sorted(sent.get(name, []))
+        completions.extend(completed for completed, _ in finished)
+        if not sends:
+            continue
+        for rank, (completed, runtime) in enumerate(finished):
+            latency = max(0.0, completed - sends[rank * len(sends) // len(finished)])
+            latencies.append(latency)
+            if runtime is not None:
+                waits.append(max(0.0, latency - runtime))
+    drain_rate = None
+    if len(completions) >= 2 and max(completions) > min(completions):
+        drain_rate = (len(completions) - 1) / (max(completions) - min(completions))
+    return {
+        "tracked": len(new),
+        "by_name": dict(by_name),
+        "status": dict(statuses),
+        "latency_ms": summarize(latencies, 1000),
+        "runtime_ms": summarize(runtimes, 1000),
+        "queue_wait_ms": summarize(waits, 1000),
+        "completion_rate_per_sec": None if drain_rate is None else round(drain_rate, 2),
+    }
+
+
+async def run_burst(size, targets, senders, poller, args):
+    baseline = await wait_until_idle(poller, IDLE_TIMEOUT)
+    baseline_depth, baseline_failed = (baseline[1], baseline[2]) if baseline else (0, 0)
+    known = set(poller.jobs)
+    known_failed = set(poller.failed_ids)
+    first_sample = len(poller.depth)
+
+    stop = asyncio.Event()
+    polling = asyncio.create_task(poller.run(stop))
+    statuses = Counter()
+    created = []
+    sent = {}
+    kinds = sorted(targets)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def act(index):
+        action = kinds[index % len(kinds)]
+        method, path, body = action_request(action, targets[action], index // len(kinds))
+        async with semaphore:
+            try:
+                response = await senders[index % len(senders)].request(method, path, json=body)
+            except HttpError:
+                statuses[(action, "error")] += 1
+                return
+        statuses[(action, response.status)] += 1
+        if ACTIONS.get(action) and 200 <= response.status < 300:
+            sent.setdefault(ACTIONS[action], []).append(time.time())
+        if action == "announcement" and response.status == 201:
+            created.append(((response.json() or {}).get("data") or {}).get("id"))
+
+    started_wall, started = time.time(), time.monotonic()
+    await asyncio.gather(*(act(i) for i in range(size)))
+    burst_end = time.monotonic()
+    burst_seconds = max(burst_end - started, 1e-6)
+
+    # Drained once the depth (which includes reserved jobs) is back at the baseline
+    deadline = burst_end + args.drain_timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(poller.interval)
+        sample = poller.latest()
+        if sample and sample[0] > burst_end and sample[1] <= baseline_depth:
+            break
+    stop.set()
+    await polling
+    await poller.poll()
+
+    accepted = sum(n for (action, status), n in statuses.items() if status != "error" and 200 <= status < 300)
+    throttled = sum(n for (action, status), n in statuses.items() if status == 429)
+    depth = poller.depth[first_sample:]
+    peak, drain_seconds, depth_rate = drain_stats(depth, baseline_depth, burst_end)
+    jobs = job_stats(poller.jobs, started_wall, known, sent)
+    failed_count = (depth[-1][2] - baseline_failed) if depth else 0
+    failed_ids = len(poller.failed_ids - known_failed)
+    failed = max(failed_count, failed_ids)
+    # Big bursts scroll out of the 50-job recent list; the depth peak is then the better lower bound
+    enqueued = max(jobs["tracked"], peak - baseline_depth)
+    return {
+        "burst": size,
+        "actions": {f"{action} {status}": n for (action, status), n in sorted(statuses.items(), key=str)},
+        "accepted": accepted,
+        "throttled": throttled,
+        "burst_seconds": round(burst_seconds, 3),
+        "enqueue_rate_per_sec": round(accepted / burst_seconds, 2),
+        "jobs": jobs,
+        "jobs_enqueued": enqueued,
+        "job_enqueue_rate_per_sec": round(enqueued / burst_seconds, 2),
+        "baseline_depth": baseline_depth,
+        "peak_depth": peak,
+        "depth_drain_rate_per_sec": None if depth_rate is None else round(depth_rate, 2),
+        "drain_seconds": None if drain_seconds is None else round(drain_seconds, 2),
+        "drained": drain_seconds is not None,
+        "failed_jobs": failed,
+        "failed_ratio": round(failed / enqueued, 4) if enqueued else 0.0,
+        "untracked_jobs": enqueued - jobs["tracked"],
+        "depth": [[round(t - started, 2), pending] for t, pending, _ in depth],
+        "announcements": [a for a in created if a is not None],
+    }
+
+
+def cell(value, width, fmt=".1f"):
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}{fmt}}"
+
+
+def print_result(r):
+    latency = r["jobs"]["latency_ms"]
+    rate = r["jobs"]["completion_rate_per_sec"] or r["depth_drain_rate_per_sec"]
+    icon = "✅" if r["drained"] and r["failed_ratio"] <= MAX_FAILED_RATIO else "❌"
+    print(f"  {icon} {r['burst']:>5} {r['accepted']:>5} {r['throttled']:>4} {r['enqueue_rate_per_sec']:>7.1f} "
+          f"{r['jobs']['tracked']:>5} {r['peak_depth']:>5} {cell(rate, 8)} {cell(r['drain_seconds'], 8)} "
+          f"{cell(latency['p50'] if latency['count'] else None, 8)} "
+          f"{cell(latency['p95'] if latency['count'] else None, 8)} "
+          f"{cell(latency['p99'] if latency['count'] else None, 8)} {r['failed_ratio'] * 100:>6.1f}")
+
+
+async def run(args):
+    actions = args.action or list(ACTIONS)
+    tokens = args.sender_token or SENDER_TOKENS
+    results = []
+    async with AsyncHttpClient(API_BASE, headers=api_headers(TOKEN)) as http:
+        senders = [AsyncHttpClient(API_BASE, headers=api_headers(t), limit=args.concurrency) for t in tokens]
+        created = []
+        try:
+            try:
+                targets, original_status = await resolve_targets(http, args, actions)
+                probe = await http.get("/maintenance/queue/stats")
+            except HttpError as e:
+                print(f"❌ Could not reach API: {e}")
+                return results
+            if probe.status != 200:
+                print(f"❌ /maintenance/queue/stats returned {probe.status} (needs system.maintenance)")
+                return results
+            if not targets:
+                return results
+            for action, path in targets.items():
+                job = ACTIONS[action] or "no job (control)"
+                print(f"  {action:<14} {path:<40} -> {job}")
+
+            poller = QueuePoller(http, args.poll_interval)
+            print(f"\n  {'BURST':>7} {'OK':>5} {'429':>4} {'ACT/s':>7} {'SEEN':>5} {'PEAK':>5} {'DRAIN/s':>8} "
+                  f"{'DRAIN s':>8} {'P50ms':>8} {'P95ms':>8} {'P99ms':>8} {'FAIL%':>6}")
+            for size in args.burst or BURST_SIZES:
+                result = await run_burst(size, targets, senders, poller, args)
+                created.extend(result.pop("announcements"))
+                results.append(result)
+                print_result(result)
+            if poller.throttled:
+                print(f"\n  ⚠️  {poller.throttled} polls were throttled (raise --poll-interval)")
+
+            if original_status and "ticket-status" in targets:
+                await senders[0].put(targets["ticket-status"], json={"status": original_status})
+        finally:
+            for announcement_id in created:
+                try:
+                    await http.delete(f"/admin/announcements/{announcement_id}")
+                except HttpError:
+                    pass
+            for sender in senders:
+                await sender.close()
+    return results
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Queue Drain-Rate Benchmark")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"API:     {API_BASE}")
+    print(f"Bursts:  {', '.join(str(b) for b in args.burst or BURST_SIZES)}\n")
+
+    results = asyncio.run(run(args))
+
+    undrained = [r["burst"] for r in results if not r["drained"]]
+    failing = [r["burst"] for r in results if r["failed_ratio"] > MAX_FAILED_RATIO]
+    print("\n" + "=" * 60)
+    if not results:
+        print("⚠️  No burst could run (check the API, permissions and target ids)")
+    elif undrained:
+        print(f"❌ Queue did not drain within {args.drain_timeout:g}s after bursts of {undrained}")
+    elif failing:
+        print(f"❌ Failed-job ratio above {MAX_FAILED_RATIO * 100:g}% for bursts of {failing}")
+    else:
+        print("✅ Every burst drained without failed jobs above the threshold")
+    print("=" * 60)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": API_BASE,
+        "poll_interval": args.poll_interval,
+        "bursts": results,
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "queue_drain_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(0 if results and not undrained and not failing else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,38 @@
 """
 Stability Test Runner
 Unified security and stability test runner with comprehensive reporting
+
+Request metrics are opt-in: --metrics-port/--metrics-file (or --gate,
+--update-baseline, --server-feed, which need them) wrap every suite in
+`harness_metrics.py run` and collect into a fresh run directory under
+HARNESS_METRICS_DIR; snapshots of earlier runs are left alone.
+
+Run on their own, not from here:
+  fuzz_engine.py, fuzz_mass_assignment.py   create records through every POST
+                                            route; point them at a disposable
+                                            environment
+  stability_email_sync.py                   needs the IMAP stand-in and a sync
+                                            worker, and runs up to 15 minutes
 """
 
+import argparse
 import subprocess
 import sys
 import json
 import os
+import tempfile
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from harness_metrics import METRICS_DIR, METRICS_PORT, REGISTRY, Exporter
+from harness_profile import PROFILE_DIR, load_summary
+from perf_gate import EFFECT_SIZE, gate
+from server_feed import ServerFeed, feed_report, print_report
+
 # Configuration
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_URL = "http://localhost:8000"
+TEST_TIMEOUT = 120            # Seconds per suite unless the suite sets its own "timeout"
 
 # Define test suites
 SECURITY_TESTS = [
@@ -26,6 +46,9 @@ SECURITY_TESTS = [
     {"name": "Security Headers", "script": "pentest_headers.py", "category": "security"},
     {"name": "File Upload", "script": "pentest_file_upload.py", "category": "security"},
     {"name": "WebSocket Security", "script": "pentest_websocket.py", "category": "security"},
+    {"name": "Security Header Audit", "script": "pentest_header_audit.py", "category": "security"},
+    {"name": "Authorization Matrix", "script": "pentest_authz_matrix.py", "category": "security", "timeout": 600},
+    {"name": "Login Timing", "script": "pentest_login_timing.py", "category": "security", "timeout": 600},
 ]
 
 STABILITY_TESTS = [
@@ -33,12 +56,54 @@ STABILITY_TESTS = [
     {"name": "Guest Rate Limiting", "script": "stress_test_guest.py", "category": "stability"},
     {"name": "Database Stability", "script": "stability_db.py", "category": "stability"},
     {"name": "Memory Leak Detection", "script": "stability_memory.py", "category": "stability"},
+    {"name": "WebSocket Load", "script": "stress_test_websocket.py", "category": "stability"},
+    {"name": "Broadcast Latency", "script": "stability_broadcast_latency.py", "category": "stability", "timeout": 300},
+    {"name": "Presence Heartbeats", "script": "stress_test_presence.py", "category": "stability", "timeout": 300},
+    {"name": "Channel Authorization", "script": "stress_test_channel_auth.py", "category": "stability"},
+    {"name": "Chat Fan-out", "script": "stress_test_chat_fanout.py", "category": "stability", "timeout": 600},
+    {"name": "Upload Throughput", "script": "stress_test_uploads.py", "category": "stability", "timeout": 600},
+    {"name": "Download Streaming", "script": "stress_test_downloads.py", "category": "stability", "timeout": 600},
+    {"name": "Queue Drain Rate", "script": "stability_queue_drain.py", "category": "stability", "timeout": 900},
+    {"name": "Cache Effectiveness", "script": "stability_cache_profile.py", "category": "stability", "timeout": 300},
 ]
 
 
-def run_test(test_info):
+def parse_args():
+    parser = argparse.ArgumentParser(description="Security & stability test runner")
+    parser.add_argument("--metrics-port", type=int, nargs="?", const=METRICS_PORT, default=0,
+                        help=f"Serve live OpenMetrics on localhost:PORT/metrics (default port {METRICS_PORT}; off "
+                             "unless given)")
+    parser.add_argument("--metrics-file", help="Also push the metrics text to this file while running")
+    parser.add_argument("--profile", nargs="?", const="sample", choices=["sample", "cprofile"],
+                        help=f"Profile each suite (default mode: sample); output in {PROFILE_DIR}")
+    parser.add_argument("--gate", action="store_true",
+                        help="Fail on significant latency/throughput regressions against perf_baseline.json")
+    parser.add_argument("--gate-effect", type=float, default=EFFECT_SIZE, help="Minimum relative slowdown")
+    parser.add_argument("--gate-method", choices=["mwu", "bootstrap"], default="mwu")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the performance baseline")
+    parser.add_argument("--server-feed", action="store_true",
+                        help="Record the system/cache/queue metrics broadcasts and correlate them with latency")
+    return parser.parse_args()
+
+
+def suite_label(test_info):
+    return os.path.splitext(test_info["script"])[0]
+
+
+def run_test(test_info, metrics_dir=None, profile=None):
     """Run a single test script and capture results."""
     script_path = os.path.join(TEST_DIR, test_info["script"])
+    command = ["python3", script_path]
+    env = None
+    if metrics_dir:
+        # Instrumented run: the suite publishes live request metrics into metrics_dir
+        command = ["python3", os.path.join(TEST_DIR, "harness_metrics.py"), "run",
+                   "--suite", suite_label(test_info), script_path]
+        env = dict(os.environ, HARNESS_METRICS_DIR=metrics_dir)
+    if profile:
+        # Profiled run: writes <PROFILE_DIR>/<suite>.collapsed and a self-time summary
+        command = ["python3", os.path.join(TEST_DIR, "harness_profile.py"), "run", "--mode", profile,
+                   "--suite", suite_label(test_info)] + command[1:]
     
     if not os.path.exists(script_path):
         return {
@@ -51,18 +116,20 @@ def run_test(test_info):
         }
     
     start_time = datetime.now()
+    timeout = test_info.get("timeout", TEST_TIMEOUT)
     
     try:
         result = subprocess.run(
-            ["python3", script_path],
+            command,
             capture_output=True,
             text=True,
-            timeout=120  # 2 minute timeout per test
+            env=env,
+            timeout=timeout
         )
         
         duration = (datetime.now() - start_time).total_seconds()
         
-        return {
+        outcome = {
             "name": test_info["name"],
             "category": test_info["category"],
             "status": "PASS" if result.returncode == 0 else "FAIL",
@@ -71,14 +138,17 @@ def run_test(test_info):
             "output": result.stdout[-2000:] if len(result.stdout) > 2000 else result.stdout,
             "errors": result.stderr[-500:] if result.stderr else ""
         }
+        if profile:
+            outcome["profile"] = load_summary(PROFILE_DIR, suite_label(test_info))
+        return outcome
         
     except subprocess.TimeoutExpired:
         return {
             "name": test_info["name"],
             "category": test_info["category"],
             "status": "TIMEOUT",
-            "message": "Test exceeded 120 second timeout",
-            "duration": 120,
+            "message": f"Test exceeded {timeout} second timeout",
+            "duration": timeout,
             "output": ""
         }
     except Exception as e:
@@ -123,9 +193,41 @@ def print_result(result):
     duration_str = f"({result['duration']}s)" if result["duration"] else ""
     
     print(f"  {icon} {result['name']:<30} {result['status']:<8} {duration_str}")
+    profile = result.get("profile")
+    if profile and profile.get("top_self_time"):
+        top = profile["top_self_time"][0]
+        print(f"      🔥 top self time: {top['function']} ({top['share'] * 100:.0f}% of busy time)")
+
+
+def record_result(test_info, result):
+    """Publish a finished suite to the runner's own metrics."""
+    labels = (("suite", suite_label(test_info)),)
+    REGISTRY.add("harness_suite_runs", labels + (("status", result["status"]),))
+    REGISTRY.set("harness_suite_duration_seconds", labels, result["duration"])
+
+
+def start_exporter(args):
+    """Start the metrics endpoint/file push; returns (exporter, snapshot dir) or (None, None)."""
+    if not (args.metrics_port or args.metrics_file or args.gate or args.update_baseline or args.server_feed):
+        return None, None
+    # A directory of its own, so the gate and the server feed see this run only
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    metrics_dir = tempfile.mkdtemp(prefix=datetime.now().strftime("run-%Y%m%d-%H%M%S-"), dir=METRICS_DIR)
+    try:
+        exporter = Exporter(metrics_dir, port=args.metrics_port, path=args.metrics_file).start()
+    except OSError as e:
+        print(f"  ⚠️  Metrics endpoint unavailable ({e}); suites still publish snapshots")
+        exporter = Exporter(metrics_dir, port=0, path=args.metrics_file).start()
+    if exporter.url:
+        print(f"  Metrics: {exporter.url}")
+    if args.metrics_file:
+        print(f"  Metrics file: {args.metrics_file}")
+    print(f"  Live view: python3 harness_dashboard.py --dir {metrics_dir}")
+    return exporter, metrics_dir
 
 
 def main():
+    args = parse_args()
     print_header("Security & Stability Test Runner")
     print(f"  Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"  Target:  {BASE_URL}")
@@ -137,22 +239,44 @@ def main():
         print("     Run: npm run start-all")
         sys.exit(1)
     print("  ✅ Server is running")
+    exporter, metrics_dir = start_exporter(args)
+    feed = ServerFeed().start() if args.server_feed else None
     
     all_results = []
     
-    # Run Security Tests
-    print_header("Security Tests")
-    for test in SECURITY_TESTS:
-        result = run_test(test)
-        all_results.append(result)
-        print_result(result)
+    try:
+        # Run Security Tests
+        print_header("Security Tests")
+        for test in SECURITY_TESTS:
+            result = run_test(test, metrics_dir, args.profile)
+            all_results.append(result)
+            record_result(test, result)
+            print_result(result)
+        
+        # Run Stability Tests
+        print_header("Stability Tests")
+        for test in STABILITY_TESTS:
+            result = run_test(test, metrics_dir, args.profile)
+            all_results.append(result)
+            record_result(test, result)
+            print_result(result)
+    finally:
+        if exporter:
+            exporter.stop()
+        if feed:
+            feed.stop()
+    
+    server_metrics = None
+    if feed:
+        print_header("Server Metrics")
+        server_metrics = feed_report(feed, metrics_dir)
+        print_report(server_metrics)
     
-    # Run Stability Tests
-    print_header("Stability Tests")
-    for test in STABILITY_TESTS:
-        result = run_test(test)
-        all_results.append(result)
-        print_result(result)
+    performance = None
+    if args.gate or args.update_baseline:
+        print_header("Performance Gate")
+        performance = gate(metrics_dir, effect=args.gate_effect, method=args.gate_method,
+                           update=args.update_baseline)
     
     # Summary
     print_header("Test Summary")
@@ -198,6 +322,10 @@ def main():
         },
         "results": all_results
     }
+    if performance is not None:
+        report["performance_gate"] = performance
+    if server_metrics is not None:
+        report["server_metrics"] = server_metrics
     
     report_path = os.path.join(TEST_DIR, "security_report.json")
     with open(report_path, "w") as f:
@@ -207,7 +335,8 @@ def main():
     print("=" * 70)
     
     # Exit with appropriate code
-    sys.exit(0 if failed == 0 and errors == 0 else 1)
+    regressed = performance is not None and not performance["passed"]
+    sys.exit(0 if failed == 0 and errors == 0 and not regressed else 1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Channel Authorization Benchmark & Fuzzer
+Generates valid and invalid channel names / socket ids from the patterns in
+routes/channels.php and fires them concurrently at /api/broadcasting/auth.
+Measures auth decisions per second and latency by channel type (each
+ChannelAuthLogger::wrap callback does DB lookups) and flags any wrong grant.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError
+from identities import auth_headers, load_identities
+from perf_stats import format_summary, summarize
+from reverb_client import CHANNEL_PATTERNS, channel_pattern
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+
+# Test settings
+REQUESTS = 2000        # Total auth decisions to request
+CONCURRENCY = 50       # In-flight requests
+DENY_STATUSES = {401, 403, 404, 422}
+
+INVALID_CHANNELS = [
+    "",
+    "invalid",
+    "private-",
+    "presence-",
+    "public-dm.x",
+    "PRIVATE-online-users",
+    "private-private-online-users",
+    "../../../etc/passwd",
+    "private-../../../etc/passwd",
+    "private-<script>alert(1)</script>",
+    "private-dm.' OR '1'='1",
+    "private-dm.*",
+    "private-dm.%00",
+    "private-dm.\u0000",
+    "private-tickets.queue.extra",
+    "private-projects..tasks",
+    "private-teams.-1.projects",
+    "private-projects.99999999999999999999.tasks",
+    "private-user.‮evil",
+    "private-" + "A" * 1000,
+]
+
+INVALID_SOCKET_IDS = [
+    "",
+    "invalid",
+    "12345",
+    "1.2.3",
+    "-1.-1",
+    "12345.67890\n",
+    " 12345.67890",
+    "9" * 200 + ".1",
+    "'; DROP TABLE users; --",
+    "<script>alert(1)</script>",
+]
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Channel authorization throughput benchmark and fuzzer")
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--tokens-file", help="Identities to fuzz as (see identities.py)")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def random_socket_id(rng):
+    return f"{rng.randint(1, 10**9)}.{rng.randint(1, 10**9)}"
+
+
+async def discover_owned_ids(http):
+    """Ids this identity legitimately owns/participates in, keyed by placeholder kind."""
+    owned = defaultdict(set)
+
+    async def fetch(path, params=None):
+        try:
+            response = await http.get(path, params=params)
+        except HttpError:
+            return None
+        return response.json() if response.status == 200 else None
+
+    body = await fetch("/user") or {}
+    user = body.get("data", body)
+    if user.get("public_id"):
+        owned["publicId"].add(user["public_id"])
+    for chat in (await fetch("/chat") or {}).get("data", []):
+        owned["dm" if chat.get("type", "dm") == "dm" else "group"].add(chat["public_id"])
+    for ticket in (await fetch("/tickets", {"per_page": 20}) or {}).get("data", []):
+        owned["ticketId"].add(ticket.get("public_id") or ticket.get("id"))
+    return owned
+
+
+def build_cases(owned, rng):
+    """
+    Yield (channel, socket_id, expect) cases. expect is True (must grant),
+    False (must deny) or None (depends on permissions - not judged).
+    """
+    cases = []
+    own_user = next(iter(owned["publicId"]), None)
+
+    for pattern in CHANNEL_PATTERNS:
+        prefix = "presence-" if pattern == "online-users" else "private-"
+        placeholders = _PLACEHOLDER.findall(pattern)
+
+        if not placeholders:
+            # online-users: any authenticated user; tickets.queue: permission based
+            cases.append((prefix + pattern, random_socket_id(rng), True if pattern == "online-users" else None))
+            continue
+
+        kind = placeholders[0]
+        if kind == "chatPublicId":
+            kind = pattern.split(".")[0]  # dm / group
+        if kind == "publicId" and pattern.startswith("email-account"):
+            kind = "emailAccount"
+
+        # Owned ids must grant
+        for value in owned.get(kind, ()):
+            name = _PLACEHOLDER.sub(value, pattern)
+            cases.append((prefix + name, random_socket_id(rng), True))
+        # The same user-scoped channels for someone else must be denied
+        if kind == "publicId" and own_user:
+            cases.append((prefix + _PLACEHOLDER.sub(str(uuid.uuid4()), pattern), random_socket_id(rng), False))
+        # Random / foreign ids: deny for participant-scoped channels, unknown for team/project
+        foreign = str(uuid.uuid4()) if kind != "teamId" and kind != "projectId" else str(rng.randint(1, 50))
+        expect = None if kind in ("teamId", "projectId") else False
+        cases.append((prefix + _PLACEHOLDER.sub(foreign, pattern), random_socket_id(rng), expect))
+        # presence- prefix on a private channel: Laravel strips the prefix before matching, so
+        # this is judged like the private- case (team/project membership of a random id is unknown)
+        cases.append(("presence-" + _PLACEHOLDER.sub(foreign, pattern), random_socket_id(rng), expect))
+
+    for channel in INVALID_CHANNELS:
+        cases.append((channel, random_socket_id(rng), False))
+
+    # Malformed socket ids on a channel that would otherwise grant
+    grantable = "presence-online-users"
+    for socket_id in INVALID_SOCKET_IDS:
+        cases.append((grantable, socket_id, False))
+
+    return cases
+
+
+class Results:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.status = defaultdict(lambda: defaultdict(int))
+        self.wrong_grants = {}
+        self.missed_grants = {}
+        self.server_errors = {}
+
+    def record(self, identity, channel, socket_id, expect, status, elapsed):
+        kind = channel_pattern(channel) if channel else "unknown"
+        self.latency[kind].append(elapsed)
+        self.status[kind][status] += 1
+        key = (identity, channel, socket_id)
+        if status == 200 and expect is False:
+            self.wrong_grants[key] = status
+        elif expect is True and status in DENY_STATUSES:
+            self.missed_grants[key] = status
+        elif isinstance(status, int) and status >= 500:
+            self.server_errors[key] = status
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    identities = load_identities(args.tokens_file)
+    results = Results()
+
+    clients = {i.label: AsyncHttpClient(API_BASE, headers=auth_headers(i.token), limit=args.concurrency)
+               for i in identities}
+    try:
+        workload = []
+        for identity in identities:
+            owned = await discover_owned_ids(clients[identity.label])
+            cases = build_cases(owned, rng)
+            print(f"  {identity.label}: {len(cases)} cases "
+                  f"({sum(1 for c in cases if c[2] is True)} must grant, "
+                  f"{sum(1 for c in cases if c[2] is False)} must deny)")
+            workload.extend((identity.label, case) for case in cases)
+        rng.shuffle(workload)
+
+        queue = itertools.islice(itertools.cycle(workload), args.requests)
+
+        async def worker():
+            for label, (channel, socket_id, expect) in queue:
+                try:
+                    response = await clients[label].post(
+                        "/broadcasting/auth", json={"socket_id": socket_id, "channel_name": channel})
+                    status, elapsed = response.status, response.elapsed
+                except HttpError:
+                    status, elapsed = "error", 0.0
+                results.record(label, channel, socket_id, expect, status, elapsed)
+
+        start = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        duration = time.monotonic() - start
+    finally:
+        for http in clients.values():
+            await http.close()
+
+    return results, duration
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Channel Authorization Benchmark & Fuzzer")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:  {API_BASE}/broadcasting/auth")
+    print(f"Requests: {args.requests}, concurrency: {args.concurrency}\n")
+
+    results, duration = asyncio.run(run(args))
+
+    total = sum(len(v) for v in results.latency.values())
+    decisions = sum(count for kind in results.status for status, count in results.status[kind].items()
+                    if status == 200 or status in DENY_STATUSES)
+    rate = decisions / duration if duration else 0
+
+    print("\n--- Latency by channel type ---")
+    for kind in sorted(results.latency):
+        statuses = {str(k): v for k, v in results.status[kind].items()}
+        print(f"  {kind:<30} {format_summary(summarize(results.latency[kind], 1000))}  {statuses}")
+
+    print(f"\n  Auth decisions: {decisions}/{total} in {duration:.2f}s ({rate:.1f}/s)")
+
+    throttled = sum(results.status[k].get(429, 0) for k in results.status)
+    if throttled:
+        print(f"  ℹ️  {throttled} requests throttled (429)")
+    if results.missed_grants:
+        print(f"  ⚠️  {len(results.missed_grants)} legitimate subscriptions were denied")
+    if results.server_errors:
+        print(f"  ⚠️  {len(results.server_errors)} server errors (5xx)")
+        for (label, channel, socket_id), status in list(results.server_errors.items())[:10]:
+            print(f"      {status} {label} channel={channel[:50]!r} socket_id={socket_id[:30]!r}")
+
+    print("\n" + "=" * 60)
+    if results.wrong_grants:
+        print(f"❌ FAILED: {len(results.wrong_grants)} wrong grants")
+        for (label, channel, socket_id), _ in list(results.wrong_grants.items())[:20]:
+            print(f"   {label} channel={channel[:60]!r} socket_id={socket_id[:30]!r}")
+    else:
+        print("✅ PASSED: No channel was granted that should have been denied")
+    print("=" * 60)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": API_BASE,
+        "requests": total,
+        "duration_seconds": round(duration, 2),
+        "decisions_per_second": round(rate, 1),
+        "latency_ms": {k: summarize(v, 1000) for k, v in results.latency.items()},
+        "status": {k: {str(s): c for s, c in v.items()} for k, v in results.status.items()},
+        "wrong_grants": [{"identity": l, "channel": c, "socket_id": s} for (l, c, s) in results.wrong_grants],
+        "missed_grants": [{"identity": l, "channel": c, "status": st}
+                          for (l, c, _), st in results.missed_grants.items()],
+        "server_errors": [{"identity": l, "channel": c, "socket_id": s, "status": st}
+                          for (l, c, s), st in results.server_errors.items()],
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "channel_auth_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(1 if results.wrong_grants else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Typing Indicator & Read Receipt Fan-out Stress Test
+Fills group chats of configurable size with simulated members who call
+/api/chat/{chat}/typing and /api/chat/{chat}/read at realistic rates while
+subscribed to group.{chat} (TypingStarted) and user.{publicId} (MessageRead).
+Measures HTTP latency, fan-out delivery latency and dropped/late events to find
+the group size where real-time features degrade.
+
+Group members need their own tokens (--tokens-file). When a step asks for more
+members than there are identities, identities are reused as extra browser tabs;
+fan-out matching is approximate in that case.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError
+from identities import auth_headers, load_identities
+from perf_stats import format_summary, raise_fd_limit, summarize
+from reverb_client import REVERB_APP_KEY, REVERB_HOST, REVERB_PORT, PusherConnection, ReverbError
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+
+# Test settings
+GROUP_SIZES = [10, 50, 100, 250, 500, 1000]
+STEP_SECONDS = 30          # Duration of each group-size step
+TYPING_INTERVAL = 3.0      # Composer re-sends typing every ~3s while typing
+TYPING_RATIO = 0.1         # Share of members typing at any moment
+READ_INTERVAL = 20.0       # Mean seconds between read receipts per member
+DELIVERY_GRACE = 5.0       # Wait after the step for in-flight events
+LATE_THRESHOLD_MS = 1000
+DROP_THRESHOLD = 0.01      # Drop ratio that counts as degraded
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Typing/read-receipt fan-out stress test")
+    parser.add_argument("--size", type=int, action="append", help="Group size step (repeatable)")
+    parser.add_argument("--duration", type=float, default=STEP_SECONDS)
+    parser.add_argument("--chat", help="Use an existing group chat (public id) instead of building one")
+    parser.add_argument("--tokens-file", help="Member identities (see identities.py)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reverb-host", default=REVERB_HOST)
+    parser.add_argument("--reverb-port", type=int, default=REVERB_PORT)
+    parser.add_argument("--app-key", default=REVERB_APP_KEY)
+    return parser.parse_args()
+
+
+class FanoutTracker:
+    """
+    Matches received frames to sends. Events carry only the sender's public id, so
+    each receiving socket consumes that sender's sends in order (Reverb delivers
+    in order per connection). Failed sends are skipped.
+    """
+
+    def __init__(self):
+        self.sends = defaultdict(list)         # sender -> [sent_at or None]
+        self.cursors = defaultdict(int)        # (socket, sender) -> next index
+        self.latencies = []
+        self.delivered = 0
+
+    def sent(self, sender):
+        self.sends[sender].append(time.monotonic())
+        return len(self.sends[sender]) - 1
+
+    def failed(self, sender, index):
+        self.sends[sender][index] = None
+
+    def received(self, socket_key, sender, received_at):
+        sends = self.sends.get(sender)
+        if not sends:
+            return
+        cursor = self.cursors[(socket_key, sender)]
+        while cursor < len(sends) and sends[cursor] is None:
+            cursor += 1
+        if cursor >= len(sends):
+            return
+        self.cursors[(socket_key, sender)] = cursor + 1
+        self.latencies.append(received_at - sends[cursor])
+        self.delivered += 1
+
+    def accepted(self, sender=None):
+        senders = [sender] if sender else self.sends
+        return sum(1 for s in senders for t in self.sends[s] if t is not None)
+
+
+class Member:
+    def __init__(self, identity, http, public_id):
+        self.identity = identity
+        self.http = http
+        self.public_id = public_id
+
+
+async def load_members(identities):
+    members = []
+    for identity in identities:
+        http = AsyncHttpClient(API_BASE, headers=auth_headers(identity.token), limit=8)
+        try:
+            response = await http.get("/user")
+            body = (response.json() or {}) if response.status == 200 else {}
+        except (HttpError, ValueError):
+            body = {}
+        user = body.get("data", body)
+        if not user.get("public_id"):
+            print(f"  ⚠️  {identity.label}: could not load /user, skipping")
+            await http.close()
+            continue
+        members.append(Member(identity, http, user["public_id"]))
+    return members
+
+
+async def build_group(owner, members, size):
+    """Create a group owned by `owner` and invite/accept up to size-1 members."""
+    response = await owner.http.post("/chat/groups", json={"name": f"Fan-out test ({size})"})
+    if response.status not in (200, 201):
+        raise RuntimeError(f"could not create group: {response.status}")
+    body = response.json() or {}
+    chat = body.get("data", body)
+    chat_id = chat.get("public_id") or chat.get("id")
+
+    joined = [owner]
+    for member in members[:size - 1]:
+        invite = await owner.http.post(f"/chat/{chat_id}/members", json={"user_public_id": member.public_id})
+        invite_id = (invite.json() or {}).get("invite_id") if invite.status == 201 else None
+        if not invite_id:
+            continue
+        accept = await member.http.post(f"/chat/invites/{invite_id}/accept", json={})
+        if accept.status in (200, 201):
+            joined.append(member)
+
+    # markRead only broadcasts when the chat has a message
+    await owner.http.post(f"/chat/{chat_id}/send", json={"content": "fan-out test"})
+    return chat_id, joined
+
+
+async def run_step(chat_id, participants, size, args, rng):
+    typing = FanoutTracker()
+    reads = FanoutTracker()
+    http_latency = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    sockets = []
+    # Sockets are simulated members; identities are reused when size > participants
+    tabs = [participants[i % len(participants)] for i in range(size)]
+
+    gate = asyncio.Semaphore(50)
+
+    async def join(index, member):
+        async with gate:
+            conn = PusherConnection(args.reverb_host, args.reverb_port, args.app_key)
+            try:
+                await conn.connect()
+                await conn.subscribe_authorized(member.http, f"private-group.{chat_id}")
+                await conn.subscribe_authorized(member.http, f"private-user.{member.public_id}")
+            except (ReverbError, HttpError, asyncio.TimeoutError, OSError) as e:
+                statuses["subscribe"][type(e).__name__] += 1
+                await conn.close()
+                return
+        conn.on("TypingStarted", lambda ch, ev, data, at:
+                typing.received(index, (data or {}).get("user_public_id"), at))
+        conn.on("MessageRead", lambda ch, ev, data, at:
+                reads.received(index, (data or {}).get("reader_public_id"), at))
+        sockets.append((index, member, conn))
+
+    await asyncio.gather(*(join(index, member) for index, member in enumerate(tabs)))
+
+    if not sockets:
+        return None
+
+    async def call(member, kind, tracker):
+        index = tracker.sent(member.public_id)
+        try:
+            response = await member.http.post(f"/chat/{chat_id}/{kind}", json={})
+        except HttpError:
+            tracker.failed(member.public_id, index)
+            statuses[kind]["error"] += 1
+            return
+        http_latency[kind].append(response.elapsed)
+        statuses[kind][response.status] += 1
+        if not 200 <= response.status < 300:
+            tracker.failed(member.public_id, index)
+
+    deadline = time.monotonic() + args.duration
+
+    async def simulate(member, member_rng):
+        await asyncio.sleep(member_rng.uniform(0, TYPING_INTERVAL))
+        next_read = time.monotonic() + member_rng.expovariate(1 / READ_INTERVAL)
+        while time.monotonic() < deadline:
+            if member_rng.random() < TYPING_RATIO:
+                await call(member, "typing", typing)
+            if time.monotonic() >= next_read:
+                await call(member, "read", reads)
+                next_read = time.monotonic() + member_rng.expovariate(1 / READ_INTERVAL)
+            await asyncio.sleep(TYPING_INTERVAL * member_rng.uniform(0.8, 1.2))
+
+    await asyncio.gather(*(simulate(m, random.Random(rng.random())) for _, m, _ in sockets))
+    await asyncio.sleep(DELIVERY_GRACE)
+    await asyncio.gather(*(c.close() for _, _, c in sockets), return_exceptions=True)
+
+    # Typing goes to every socket on group.{chat}; MessageRead goes to every other
+    # participant's user.{publicId} channel
+    socket_members = [m.public_id for _, m, _ in sockets]
+    expected_typing = typing.accepted() * len(sockets)
+    expected_reads = sum(
+        reads.accepted(sender) * sum(1 for pid in socket_members if pid != sender)
+        for sender in reads.sends
+    )
+
+    def outcome(tracker, expected):
+        late = sum(1 for l in tracker.latencies if l * 1000 > LATE_THRESHOLD_MS)
+        dropped = max(0, expected - tracker.delivered)
+        return {
+            "expected": expected,
+            "delivered": tracker.delivered,
+            "dropped": dropped,
+            "drop_ratio": round(dropped / expected, 4) if expected else 0,
+            "late": late,
+            "latency_ms": summarize(tracker.latencies, 1000),
+        }
+
+    return {
+        "group_size": size,
+        "participants": len(participants),
+        "sockets": len(sockets),
+        "http_latency_ms": {k: summarize(v, 1000) for k, v in http_latency.items()},
+        "http_status": {k: {str(s): c for s, c in v.items()} for k, v in statuses.items()},
+        "typing": outcome(typing, expected_typing),
+        "read": outcome(reads, expected_reads),
+    }
+
+
+def degraded(step):
+    return any(
+        step[kind]["drop_ratio"] > DROP_THRESHOLD or step[kind]["latency_ms"]["p99"] > LATE_THRESHOLD_MS
+        for kind in ("typing", "read")
+    )
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    members = await load_members(load_identities(args.tokens_file))
+    steps = []
+    if not members:
+        print("❌ No usable identities")
+        return steps
+    try:
+        owner, others = members[0], members[1:]
+        for size in args.size or GROUP_SIZES:
+            print(f"\n--- Group size {size} ---")
+            if args.chat:
+                chat_id, participants = args.chat, members
+            else:
+                try:
+                    chat_id, participants = await build_group(owner, others, size)
+                except (HttpError, RuntimeError) as e:
+                    print(f"  ❌ {e}")
+                    break
+            print(f"  Chat {chat_id}: {len(participants)} distinct participants, {size} simulated members")
+
+            step = await run_step(chat_id, participants, size, args, rng)
+            if step is None:
+                print("  ❌ No member could subscribe")
+                break
+            steps.append(step)
+            for kind in ("typing", "read"):
+                data = step[kind]
+                print(f"  {kind:<7} http {format_summary(step['http_latency_ms'].get(kind, summarize([])))}")
+                print(f"          fan-out {format_summary(data['latency_ms'])} "
+                      f"dropped={data['dropped']}/{data['expected']} late={data['late']}")
+            if degraded(step):
+                print(f"  ⚠️  Real-time features degrade at {size} members")
+            if args.chat:
+                break
+    finally:
+        for member in members:
+            await member.http.close()
+    return steps
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Typing & Read Receipt Fan-out Stress Test")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:  {API_BASE}")
+    raise_fd_limit()
+
+    steps = asyncio.run(run(args))
+    first_degraded = next((s["group_size"] for s in steps if degraded(s)), None)
+
+    print("\n" + "=" * 60)
+    if not steps:
+        print("⚠️  No step completed")
+    elif first_degraded:
+        print(f"⚠️  Degradation starts at group size {first_degraded}")
+    else:
+        print(f"✅ No degradation up to group size {steps[-1]['group_size']}")
+    print("=" * 60)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": API_BASE,
+        "first_degraded_size": first_degraded,
+        "steps": steps,
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_fanout_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(0 if steps and not first_degraded else 1)
+
+
+if __name__ == "__main__":
+    main()
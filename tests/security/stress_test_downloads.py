@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Streaming Download Benchmark
+Measures /api/emails/attachments/{media}/download and
+/api/emails/attachments/download-batch: time to first byte, sustained throughput
+and peak server RSS. Bodies are consumed chunk by chunk and discarded, so the
+client stays flat regardless of archive size.
+
+download-batch builds a ZIP with ZipArchive in a temp file and only then
+readfile()s it, so its first byte should arrive later the larger the archive.
+The benchmark fits first-byte latency against archive size and flags a
+size-dependent TTFB (i.e. the archive is not really streamed).
+
+Fixture media are uploaded as signature images (random-pixel PNGs, so they do
+not compress) and removed with the signature afterwards. Use --media to
+benchmark existing media ids instead.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError
+from identities import auth_headers, load_identities
+from multipart_stream import MemoryFile, MultipartStream, make_png, parse_size
+from perf_stats import RssSampler, format_summary, linear_fit, summarize
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+TOKEN = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"
+SERVER_PROCESSES = ["php-fpm", "artisan serve", "php -S", "octane"]
+
+# Test settings
+FIXTURE_SIZE = "4m"           # Size of each uploaded fixture (signature media max 5MB)
+FIXTURES = 16                 # Number of fixtures = largest batch
+BATCH_SIZES = [1, 2, 4, 8, 16]
+ROUNDS = 3                    # Downloads per single file / batch size
+CONCURRENCY = 4               # Parallel single-file downloads
+DOWNLOAD_TIMEOUT = 300
+GROWTH_CORRELATION = 0.9      # r above which first-byte latency "grows with size"
+GROWTH_MIN_MS = 200           # ...and the growth across the tested range exceeds this
+MAX_RETRY_AFTER = 60          # emails group is throttle:60,1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Streaming attachment download benchmark")
+    parser.add_argument("--fixtures", type=int, default=FIXTURES)
+    parser.add_argument("--fixture-size", default=FIXTURE_SIZE, help="e.g. 512k, 4m")
+    parser.add_argument("--batch", type=int, action="append", help="Batch size (repeatable)")
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--media", type=int, action="append",
+                        help="Existing media id to download (repeatable, skips fixture upload)")
+    parser.add_argument("--token", default=TOKEN)
+    parser.add_argument("--tokens-file", help="Use the first identity from this file")
+    return parser.parse_args()
+
+
+class Download:
+    """Sink that counts bytes and remembers when the first body byte arrived."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_byte = None
+        self.size = 0
+
+    def __call__(self, chunk):
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+        self.size += len(chunk)
+
+
+async def measure(http, method, path, **kwargs):
+    """One streamed download; waits out a 429 once. Returns a result dict."""
+    for _ in range(2):
+        sink = Download()
+        try:
+            response = await http.request(method, path, sink=sink, timeout=DOWNLOAD_TIMEOUT, **kwargs)
+        except HttpError as e:
+            return {"status": "error", "error": str(e)}
+        if response.status != 429:
+            break
+        await asyncio.sleep(min(MAX_RETRY_AFTER, int(response.header("retry-after", "5") or 5)))
+
+    result = {"status": response.status, "bytes": sink.size,
+              "ttfb_ms": round(response.ttfb * 1000, 1),
+              "elapsed_ms": round(response.elapsed * 1000, 1)}
+    if sink.first_byte is not None:
+        first_byte = sink.first_byte - sink.start
+        transfer = response.elapsed - first_byte
+        result["first_byte_ms"] = round(first_byte * 1000, 1)
+        result["throughput_mb_s"] = round(sink.size / 1048576 / transfer, 2) if transfer > 0 else None
+    return result
+
+
+async def upload_fixtures(http, count, size):
+    """Create a signature holding `count` fixture images. Returns (signature_id, [media ids])."""
+    response = await http.post("/emails/signatures", json={"name": "Download benchmark", "content": ""})
+    if response.status not in (200, 201):
+        return None, []
+    body = response.json() or {}
+    signature = body.get("data", body).get("id")
+    media = []
+    for index in range(count):
+        data = make_png(size, seed=index)
+        stream = MultipartStream(files={"file": MemoryFile(f"fixture-{index}.png", data, "image/png")})
+        response = await http.post(f"/emails/signatures/{signature}/media", data=stream)
+        if response.status in (200, 201):
+            media.append((response.json() or {}).get("id"))
+        else:
+            print(f"  ⚠️  Fixture {index} upload failed: {response.status}")
+    return signature, [m for m in media if m]
+
+
+async def sampled(coro):
+    """Run `coro` while sampling server RSS. Returns (result, rss summary)."""
+    sampler = RssSampler(SERVER_PROCESSES, interval=0.2)
+    stop = asyncio.Event()
+    task = asyncio.create_task(sampler.run(stop))
+    try:
+        result = await coro
+    finally:
+        stop.set()
+        await task
+    return result, sampler.summary()
+
+
+def summarize_runs(runs):
+    ok = [r for r in runs if r["status"] == 200]
+    return {
+        "downloads": len(runs),
+        "ok": len(ok),
+        "status": {str(s): sum(1 for r in runs if r["status"] == s) for s in {r["status"] for r in runs}},
+        "bytes": ok[0]["bytes"] if ok else 0,
+        "ttfb_ms": summarize([r["ttfb_ms"] for r in ok]),
+        "first_byte_ms": summarize([r["first_byte_ms"] for r in ok if "first_byte_ms" in r]),
+        "throughput_mb_s": summarize([r["throughput_mb_s"] for r in ok if r.get("throughput_mb_s")]),
+    }
+
+
+def size_dependence(batches, metric):
+    """Fit median `metric` against archive MB; returns the fit and whether it grows with size."""
+    points = [(b["bytes"] / 1048576, b[metric]["p50"]) for b in batches if b["ok"] and b["bytes"]]
+    if len(points) < 3:
+        return None
+    xs, ys = zip(*points)
+    slope, intercept, r = linear_fit(xs, ys)
+    growth = slope * (max(xs) - min(xs))
+    return {
+        "ms_per_mb": round(slope, 2),
+        "intercept_ms": round(intercept, 1),
+        "r": round(r, 3),
+        "growth_over_range_ms": round(growth, 1),
+        "grows_with_size": r >= GROWTH_CORRELATION and growth >= GROWTH_MIN_MS,
+    }
+
+
+async def run(args):
+    token = load_identities(args.tokens_file)[0].token if args.tokens_file else args.token
+    http = AsyncHttpClient(API_BASE, headers=auth_headers(token), limit=max(args.concurrency, 2))
+    signature = None
+    report = {}
+    try:
+        if args.media:
+            media = args.media
+        else:
+            size = parse_size(args.fixture_size)
+            print(f"\n--- Uploading {args.fixtures} fixtures of {args.fixture_size} ---")
+            signature, media = await upload_fixtures(http, args.fixtures, size)
+        if not media:
+            print("  ❌ No media to download")
+            return None
+        print(f"  Media ids: {media}")
+
+        # Single attachments: concurrent downloads of each fixture
+        print(f"\n--- Single downloads ({args.rounds} rounds, concurrency {args.concurrency}) ---")
+        gate = asyncio.Semaphore(args.concurrency)
+
+        async def single(media_id):
+            async with gate:
+                return await measure(http, "GET", f"/emails/attachments/{media_id}/download")
+
+        async def all_singles():
+            jobs = [m for m in media for _ in range(args.rounds)]
+            return await asyncio.gather(*(single(m) for m in jobs))
+
+        singles, rss = await sampled(all_singles())
+        report["single"] = {**summarize_runs(singles), "server_rss": rss}
+        data = report["single"]
+        print(f"  TTFB:       {format_summary(data['ttfb_ms'])}")
+        print(f"  Throughput: {format_summary(data['throughput_mb_s'], ' MB/s')}")
+
+        # Batches: sequential so TTFB reflects archive size rather than contention
+        print(f"\n--- Batch downloads ({args.rounds} rounds per size) ---")
+        batches = []
+        for count in args.batch or BATCH_SIZES:
+            if count > len(media):
+                print(f"  ⏭️  Batch of {count}: only {len(media)} media available")
+                continue
+            ids = media[:count]
+
+            async def rounds():
+                return [await measure(http, "POST", "/emails/attachments/download-batch", json={"ids": ids})
+                        for _ in range(args.rounds)]
+
+            runs, rss = await sampled(rounds())
+            batch = {"files": count, **summarize_runs(runs), "server_rss": rss}
+            batches.append(batch)
+            peak = f", server RSS peak {rss['peak_mb']} MB" if rss else ""
+            print(f"  {count:>3} files {batch['bytes'] / 1048576:7.1f} MB  ttfb p50={batch['ttfb_ms']['p50']}ms "
+                  f"first byte p50={batch['first_byte_ms']['p50']}ms  "
+                  f"{batch['throughput_mb_s']['p50']} MB/s{peak}  {batch['status']}")
+        report["batch"] = batches
+        report["batch_ttfb_vs_size"] = size_dependence(batches, "ttfb_ms")
+        report["batch_first_byte_vs_size"] = size_dependence(batches, "first_byte_ms")
+    finally:
+        if signature:
+            try:
+                await http.delete(f"/emails/signatures/{signature}")
+            except HttpError:
+                pass
+        await http.close()
+    return report
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Streaming Download Benchmark")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:  {API_BASE}/emails/attachments")
+
+    report = asyncio.run(run(args))
+
+    print("\n" + "=" * 60)
+    flagged = False
+    if not report:
+        print("⚠️  Benchmark did not run")
+    else:
+        for metric in ("batch_ttfb_vs_size", "batch_first_byte_vs_size"):
+            fit = report.get(metric)
+            if fit and fit["grows_with_size"]:
+                flagged = True
+                print(f"❌ download-batch {metric.split('_', 1)[1].replace('_', ' ')}: "
+                      f"+{fit['ms_per_mb']}ms per archive MB (r={fit['r']}) - archive is buffered, not streamed")
+        if not flagged:
+            print("✅ download-batch time to first byte does not grow with archive size")
+    print("=" * 60)
+
+    report = report or {}
+    report["timestamp"] = datetime.now().isoformat()
+    report["target"] = API_BASE
+    report["size_dependent_ttfb"] = flagged
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "download_stream_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(1 if flagged or "single" not in report else 0)
+
+
+if __name__ == "__main__":
+    main()
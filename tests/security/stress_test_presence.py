@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Presence Heartbeat Storm Simulator
+Simulates N browser tabs (tens of thousands, async) calling /api/presence/connect,
+/api/presence/heartbeat and /api/chat/{chat}/heartbeat with realistic jitter and tab
+churn. Measures server throughput, latency percentiles, the UserPresenceChanged
+broadcast volume on presence-online-users and the cost of a presence:prune run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError
+from identities import auth_headers, load_identities
+from perf_stats import format_summary, raise_fd_limit, summarize
+from reverb_client import REVERB_APP_KEY, REVERB_HOST, REVERB_PORT, PusherConnection, ReverbError
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+ARTISAN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "artisan")
+
+# Test settings
+CLIENTS = 1000                   # Simulated browser tabs
+DURATION = 60                    # Seconds of storm
+PRESENCE_INTERVAL = 30           # Compressed from the 9 min SLOW_SYNC_MS in usePresence.ts
+CHAT_INTERVAL = 15               # Chat heartbeat while a chat is open
+JITTER = 0.2                     # +/- fraction applied to every interval
+TAB_LIFETIME = 120               # Mean seconds before a tab closes (exponential)
+CHAT_OPEN_RATIO = 0.3            # Share of tabs with a chat open
+HTTP_POOL = 256                  # Keep-alive connections per identity
+PRODUCTION_PRESENCE_INTERVAL = 540
+LATENCY_SLO_MS = 500             # Heartbeat p99 budget used for the capacity estimate
+STEP_SECONDS = 5                 # Load step width for the capacity estimate (the storm ramps up)
+MIN_STEP_SAMPLES = 20            # Steps with fewer successful heartbeats are ignored
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Presence heartbeat storm simulator")
+    parser.add_argument("--clients", type=int, default=CLIENTS)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--presence-interval", type=float, default=PRESENCE_INTERVAL)
+    parser.add_argument("--chat-interval", type=float, default=CHAT_INTERVAL)
+    parser.add_argument("--tab-lifetime", type=float, default=TAB_LIFETIME)
+    parser.add_argument("--tokens-file", help="Identities to spread tabs across (see identities.py)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-prune", action="store_true", help="Skip the presence:prune measurement")
+    parser.add_argument("--no-broadcast", action="store_true", help="Skip the presence-online-users monitor")
+    parser.add_argument("--reverb-host", default=REVERB_HOST)
+    parser.add_argument("--reverb-port", type=int, default=REVERB_PORT)
+    parser.add_argument("--app-key", default=REVERB_APP_KEY)
+    return parser.parse_args()
+
+
+def jittered(interval, rng):
+    return interval * rng.uniform(1 - JITTER, 1 + JITTER)
+
+
+class StormStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.timeline = defaultdict(int)
+        self.heartbeats = []         # (seconds since origin, latency) of successful presence heartbeats
+        self.tabs_opened = 0
+        self.tabs_closed = 0
+
+    async def call(self, http, name, path, origin):
+        try:
+            response = await http.post(path, json={})
+        except HttpError:
+            self.statuses[name]["error"] += 1
+            return None
+        self.latencies[name].append(response.elapsed)
+        self.statuses[name][response.status] += 1
+        self.timeline[int(time.monotonic() - origin)] += 1
+        if name == "presence_heartbeat" and 200 <= response.status < 300:
+            self.heartbeats.append((time.monotonic() - origin, response.elapsed))
+        return response
+
+
+def heartbeat_capacity(heartbeats, step=STEP_SECONDS):
+    """
+    Bin successful presence heartbeats into `step`-second load steps. Returns the
+    steps [(start, ok heartbeats/s, p99 ms)] and the best step: the highest
+    heartbeat rate whose p99 stays within LATENCY_SLO_MS (None if none does).
+    """
+    bins = defaultdict(list)
+    for offset, latency in heartbeats:
+        bins[int(offset // step)].append(latency)
+    steps = [(index * step, len(values) / step, summarize(values, 1000)["p99"])
+             for index, values in sorted(bins.items()) if len(values) >= MIN_STEP_SAMPLES]
+    within = [s for s in steps if s[2] <= LATENCY_SLO_MS]
+    return steps, max(within, key=lambda s: s[1], default=None)
+
+
+async def simulate_tab(index, http, chat_id, args, rng, stats, origin, deadline):
+    # Spread tab starts over one interval so the storm ramps up like real traffic
+    await asyncio.sleep(rng.uniform(0, args.presence_interval))
+    while time.monotonic() < deadline:
+        stats.tabs_opened += 1
+        await stats.call(http, "connect", "/presence/connect", origin)
+        tab_end = min(deadline, time.monotonic() + rng.expovariate(1 / args.tab_lifetime))
+        has_chat = chat_id is not None and rng.random() < CHAT_OPEN_RATIO
+        next_presence = time.monotonic()
+        next_chat = time.monotonic() + jittered(args.chat_interval, rng) if has_chat else float("inf")
+
+        while True:
+            wake = min(next_presence, next_chat)
+            if wake >= tab_end:
+                break
+            await asyncio.sleep(max(0, wake - time.monotonic()))
+            if next_presence <= next_chat:
+                await stats.call(http, "presence_heartbeat", "/presence/heartbeat", origin)
+                next_presence = time.monotonic() + jittered(args.presence_interval, rng)
+            else:
+                await stats.call(http, "chat_heartbeat", f"/chat/{chat_id}/heartbeat", origin)
+                next_chat = time.monotonic() + jittered(args.chat_interval, rng)
+
+        await asyncio.sleep(max(0, tab_end - time.monotonic()))
+        if time.monotonic() >= deadline:
+            break
+        # Tab closes (page unload) and a new one opens a little later
+        stats.tabs_closed += 1
+        await stats.call(http, "offline", "/presence/offline", origin)
+        await asyncio.sleep(rng.uniform(0.5, 5))
+
+
+async def start_broadcast_monitor(args, http, origin, timeline):
+    conn = PusherConnection(args.reverb_host, args.reverb_port, args.app_key)
+    try:
+        await conn.connect()
+        await conn.subscribe_authorized(http, "presence-online-users")
+    except (ReverbError, HttpError, asyncio.TimeoutError, OSError) as e:
+        print(f"  ⚠️  Broadcast monitor unavailable: {e}")
+        await conn.close()
+        return None
+
+    def count(channel, event, data, received_at):
+        timeline[int(received_at - origin)] += 1
+
+    conn.on("presence.changed", count)
+    return conn
+
+
+def run_prune():
+    """Run `php artisan presence:prune` locally and time it."""
+    artisan = os.path.abspath(ARTISAN)
+    if not os.path.exists(artisan) or not shutil.which("php"):
+        return {"skipped": "php or artisan not available on this host"}
+    start = time.monotonic()
+    result = subprocess.run(["php", artisan, "presence:prune"], capture_output=True, text=True, timeout=600)
+    duration = time.monotonic() - start
+    match = re.search(r"Pruned (\d+)", result.stdout)
+    return {
+        "exit_code": result.returncode,
+        "duration_ms": round(duration * 1000, 1),
+        "pruned": int(match.group(1)) if match else None,
+        "output": (result.stdout or result.stderr).strip()[-300:],
+    }
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    identities = load_identities(args.tokens_file)
+    stats = StormStats()
+    broadcasts = defaultdict(int)
+
+    clients = [AsyncHttpClient(API_BASE, headers=auth_headers(i.token), limit=HTTP_POOL) for i in identities]
+    try:
+        # One chat per identity for chat heartbeats
+        chat_ids = []
+        for http in clients:
+            chat_id = None
+            try:
+                response = await http.get("/chat")
+                chats = (response.json() or {}).get("data", []) if response.status == 200 else []
+                chat_id = chats[0]["public_id"] if chats else None
+            except (HttpError, ValueError):
+                pass
+            chat_ids.append(chat_id)
+
+        origin = time.monotonic()
+        monitor = None if args.no_broadcast else await start_broadcast_monitor(args, clients[0], origin, broadcasts)
+
+        deadline = origin + args.duration
+        print(f"\n--- Storm: {args.clients} tabs across {len(identities)} identities for {args.duration}s ---")
+        await asyncio.gather(*(
+            simulate_tab(i, clients[i % len(clients)], chat_ids[i % len(clients)], args,
+                         random.Random(rng.random()), stats, origin, deadline)
+            for i in range(args.clients)
+        ))
+        elapsed = time.monotonic() - origin
+
+        prune = None
+        if not args.no_prune:
+            print("--- Running presence:prune ---")
+            before = sum(broadcasts.values())
+            prune = await asyncio.get_running_loop().run_in_executor(None, run_prune)
+            await asyncio.sleep(2)  # let the offline broadcasts arrive
+            prune["broadcasts"] = sum(broadcasts.values()) - before if monitor else None
+
+        monitored = monitor is not None
+        if monitored:
+            await monitor.close()
+    finally:
+        for http in clients:
+            await http.close()
+
+    total = sum(len(v) for v in stats.latencies.values())
+    ok = sum(count for name in stats.statuses for status, count in stats.statuses[name].items()
+             if isinstance(status, int) and 200 <= status < 300)
+    endpoints = {
+        name: {
+            "latency_ms": summarize(stats.latencies[name], 1000),
+            "status": {str(k): v for k, v in stats.statuses[name].items()},
+        }
+        for name in sorted(stats.statuses)
+    }
+    p99_all = summarize([l for v in stats.latencies.values() for l in v], 1000)["p99"]
+    ok_rps = ok / elapsed if elapsed else 0
+
+    # Production tabs send one presence heartbeat per PRODUCTION_PRESENCE_INTERVAL, so the
+    # sustained successful heartbeat rate within the SLO bounds the concurrent users
+    steps, best = heartbeat_capacity(stats.heartbeats)
+    capacity = int(best[1] * PRODUCTION_PRESENCE_INTERVAL) if best else None
+
+    return {
+        "clients": args.clients,
+        "identities": len(identities),
+        "duration_seconds": round(elapsed, 1),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0,
+        "ok_rps": round(ok_rps, 1),
+        "peak_rps": max(stats.timeline.values(), default=0),
+        "tabs_opened": stats.tabs_opened,
+        "tabs_closed": stats.tabs_closed,
+        "endpoints": endpoints,
+        "p99_ms": p99_all,
+        "heartbeat_steps": [{"start_s": start, "ok_rps": round(rate, 1), "p99_ms": p99} for start, rate, p99 in steps],
+        "capacity_step": None if not best else {"start_s": best[0], "ok_rps": round(best[1], 1), "p99_ms": best[2]},
+        "broadcasts": {
+            "total": sum(broadcasts.values()) if monitored else None,
+            "per_second": round(sum(broadcasts.values()) / elapsed, 2) if elapsed else 0,
+            "peak_per_second": max(broadcasts.values(), default=0),
+        },
+        "prune": prune,
+        "capacity_estimate_users": capacity,
+    }
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Presence Heartbeat Storm Simulator")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:  {API_BASE}")
+    raise_fd_limit()
+
+    report = asyncio.run(run(args))
+
+    print("\n" + "=" * 60)
+    print("Presence Storm Summary")
+    print("=" * 60)
+    print(f"  Requests:    {report['requests']} ({report['throughput_rps']} req/s, {report['ok_rps']} ok/s)")
+    print(f"  Tab churn:   {report['tabs_opened']} opened, {report['tabs_closed']} closed")
+    for name, data in report["endpoints"].items():
+        print(f"  {name:<20} {format_summary(data['latency_ms'])}  {data['status']}")
+    broadcasts = report["broadcasts"]
+    if broadcasts["total"] is not None:
+        print(f"  presence.changed: {broadcasts['total']} total, {broadcasts['per_second']}/s avg, "
+              f"{broadcasts['peak_per_second']}/s peak")
+    prune = report["prune"]
+    if prune:
+        if "skipped" in prune:
+            print(f"  presence:prune: skipped ({prune['skipped']})")
+        else:
+            print(f"  presence:prune: {prune['duration_ms']}ms, pruned {prune['pruned']}, "
+                  f"broadcasts {prune['broadcasts']}")
+
+    throttled = sum(d["status"].get("429", 0) for d in report["endpoints"].values())
+    if throttled:
+        print(f"\n  ℹ️  {throttled} requests throttled (429) - add identities with --tokens-file "
+              "to avoid per-user limits dominating the result")
+
+    print()
+    step = report["capacity_step"]
+    if report["capacity_estimate_users"]:
+        print(f"✅ Estimated presence capacity: ~{report['capacity_estimate_users']} concurrent users "
+              f"({step['ok_rps']} ok heartbeats/s at heartbeat p99 {step['p99_ms']}ms, "
+              f"{PRODUCTION_PRESENCE_INTERVAL}s production interval)")
+    elif report["heartbeat_steps"]:
+        lowest = min(s["p99_ms"] for s in report["heartbeat_steps"])
+        print(f"⚠️  Heartbeat p99 stays above the {LATENCY_SLO_MS}ms budget at every load step (best {lowest}ms)")
+    else:
+        print(f"⚠️  Too few successful heartbeats per {STEP_SECONDS}s step for a capacity estimate")
+    print("=" * 60)
+
+    report["timestamp"] = datetime.now().isoformat()
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "presence_storm_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(0 if report["capacity_estimate_users"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Media Upload Throughput Benchmark
+Fires many concurrent uploads at /api/chat/{chat}/upload, /api/user/avatar and
+/api/emails/signatures/{signature}/media with a configurable file-size mix.
+Reports MB/s, request latency percentiles, server RSS growth while uploading and
+how long it takes until the queued media conversions are visible.
+
+Uploads are real PNGs (make_png) so Spatie conversions actually run. Conversion
+completion is observed per endpoint:
+  chat       - attachment url switches to the /web conversion route
+  avatar     - the thumb/optimized conversion URLs stop returning 404
+  signature  - EmailSignature registers no conversions (reported as n/a)
+With an admin token the queue backlog (/maintenance/queue/stats) is tracked too.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from async_http import AsyncHttpClient, HttpError
+from identities import auth_headers, load_identities
+from multipart_stream import MemoryFile, MultipartStream, make_png, parse_size
+from perf_stats import RssSampler, format_summary, raise_fd_limit, summarize
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+SERVER_PROCESSES = ["php-fpm", "artisan serve", "php -S", "octane", "queue:work", "horizon"]
+
+# Test settings
+UPLOADS = 60                  # Uploads per endpoint
+CONCURRENCY = 10              # In-flight uploads per endpoint
+SIZE_MIX = "64k:50,512k:30,2m:15,4m:5"
+UPLOAD_TIMEOUT = 120
+CONVERSION_TIMEOUT = 120      # Give up waiting for conversions after this many seconds
+POLL_INTERVAL = 0.5
+
+ENDPOINTS = {
+    "chat": {"path": "/chat/{chat}/upload", "field": "files[]", "max_bytes": 5 * 1024 * 1024},
+    "avatar": {"path": "/user/avatar", "field": "avatar", "max_bytes": 2048 * 1024},
+    "signature": {"path": "/emails/signatures/{signature}/media", "field": "file",
+                  "max_bytes": 5120 * 1024},
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Media upload throughput benchmark")
+    parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS),
+                        help="Endpoint to benchmark (repeatable, default all)")
+    parser.add_argument("--uploads", type=int, default=UPLOADS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--mix", default=SIZE_MIX,
+                        help="Comma-separated size:weight pairs, sizes accept k/m suffixes")
+    parser.add_argument("--chat", help="Chat public id to upload into (default: first chat)")
+    parser.add_argument("--signature", help="Signature id to attach to (default: create one)")
+    parser.add_argument("--tokens-file", help="Identities to spread uploads across (see identities.py)")
+    parser.add_argument("--conversion-timeout", type=float, default=CONVERSION_TIMEOUT)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def parse_mix(text):
+    """'64k:50,2m:10' -> [(65536, 50.0), (2097152, 10.0)]"""
+    mix = []
+    for item in text.split(","):
+        size, _, weight = item.partition(":")
+        mix.append((parse_size(size), float(weight or 1)))
+    return mix
+
+
+class UploadStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = defaultdict(int)
+        self.bytes_ok = 0
+        self.skipped = 0
+        self.conversions = []     # seconds from upload response to conversion visible
+        self.unconverted = 0
+
+
+class ConversionWatcher:
+    """Polls for pending conversions and records how long each took to appear."""
+
+    def __init__(self, stats, timeout):
+        self.stats = stats
+        self.timeout = timeout
+        self.pending = {}         # key -> (uploaded_at, check coroutine factory)
+
+    def add(self, key, check):
+        self.pending[key] = (time.monotonic(), check)
+
+    async def run(self, stop):
+        while self.pending or not stop.is_set():
+            for key, (uploaded_at, check) in list(self.pending.items()):
+                if key not in self.pending:
+                    continue  # resolved by a neighbour's poll
+                try:
+                    done = await check()
+                except (HttpError, ValueError):
+                    done = False
+                if done:
+                    self.resolve(key)
+                elif time.monotonic() - uploaded_at > self.timeout:
+                    self.pending.pop(key)
+                    self.stats.unconverted += 1
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def resolve(self, key, at=None):
+        entry = self.pending.pop(key, None)
+        if entry:
+            self.stats.conversions.append((at or time.monotonic()) - entry[0])
+
+
+async def queue_pending(admin):
+    """Pending queue size, or None when the identity lacks system.maintenance."""
+    try:
+        response = await admin.get("/maintenance/queue/stats")
+    except HttpError:
+        return None
+    if response.status != 200:
+        return None
+    return ((response.json() or {}).get("data") or {}).get("pending")
+
+
+async def prepare_targets(http, args):
+    """Resolve {chat} and {signature}; returns (values, created_signature_id)."""
+    values = {"chat": args.chat, "signature": args.signature}
+    created = None
+    if not values["chat"]:
+        response = await http.get("/chat")
+        chats = (response.json() or {}).get("data", []) if response.status == 200 else []
+        values["chat"] = chats[0]["public_id"] if chats else None
+    if not values["signature"]:
+        response = await http.post("/emails/signatures", json={"name": "Upload benchmark", "content": ""})
+        if response.status in (200, 201):
+            body = response.json() or {}
+            created = values["signature"] = body.get("data", body).get("id")
+    return values, created
+
+
+def chat_check(http, chat_id, message_id, watcher):
+    async def check():
+        response = await http.get(f"/chat/{chat_id}/messages/around/{message_id}")
+        if response.status != 200:
+            return False
+        now = time.monotonic()
+        # The window covers neighbouring uploads too; resolve them in the same poll
+        for message in (response.json() or {}).get("data", []):
+            images = [a for a in message.get("attachments", []) if a.get("is_image")]
+            if images and all("/web" in (a.get("url") or "") for a in images):
+                if message.get("id") != message_id and ("chat", message.get("id")) in watcher.pending:
+                    watcher.resolve(("chat", message.get("id")), now)
+                if message.get("id") == message_id:
+                    return True
+        return False
+    return check
+
+
+def avatar_check(clients, urls):
+    async def check():
+        for url in urls:
+            parts = urlsplit(url)
+            origin = f"{parts.scheme}://{parts.netloc}"
+            if origin not in clients:
+                clients[origin] = AsyncHttpClient(origin, limit=4)
+            response = await clients[origin].get(url)
+            if response.status != 200:
+                return False
+        return True
+    return check
+
+
+async def run_endpoint(name, clients, targets, args, mix, rng):
+    spec = ENDPOINTS[name]
+    path = spec["path"].format(**targets)
+    stats = UploadStats()
+    watcher = ConversionWatcher(stats, args.conversion_timeout)
+    sampler = RssSampler(SERVER_PROCESSES)
+    static_clients = {}
+    latest_avatar = {}
+    images = {}
+
+    sizes, weights = zip(*mix)
+    plan = [rng.choices(sizes, weights)[0] for _ in range(args.uploads)]
+    queue = iter(enumerate(plan))
+
+    async def worker():
+        for index, size in queue:
+            label, http = clients[index % len(clients)]
+            if size not in images:
+                images[size] = make_png(size, seed=size)
+            data = images[size]
+            if len(data) > spec["max_bytes"]:
+                stats.skipped += 1
+                continue
+            body = MultipartStream(files=[(spec["field"], MemoryFile(f"upload-{index}.png", data, "image/png"))])
+            try:
+                response = await http.post(path, data=body, timeout=UPLOAD_TIMEOUT)
+            except HttpError:
+                stats.statuses["error"] += 1
+                continue
+            stats.statuses[response.status] += 1
+            if not 200 <= response.status < 300:
+                continue
+            stats.latencies.append(response.elapsed)
+            stats.bytes_ok += len(data)
+            payload = response.json() or {}
+
+            if name == "chat":
+                message_id = (payload.get("data") or {}).get("id")
+                if message_id:
+                    watcher.add(("chat", message_id), chat_check(http, targets["chat"], message_id, watcher))
+            elif name == "avatar":
+                user = payload.get("data", payload)
+                urls = [u for u in (user.get("avatar_thumb_url"), user.get("avatar_url")) if u]
+                # avatars is a singleFile collection: a newer upload replaces this one
+                previous = latest_avatar.pop(label, None)
+                watcher.pending.pop(previous, None)
+                if urls:
+                    latest_avatar[label] = ("avatar", index)
+                    watcher.add(("avatar", index), avatar_check(static_clients, urls))
+
+    stop_rss = asyncio.Event()
+    stop_watch = asyncio.Event()
+    rss_task = asyncio.create_task(sampler.run(stop_rss))
+    watch_task = asyncio.create_task(watcher.run(stop_watch))
+
+    start = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    duration = time.monotonic() - start
+
+    # Conversion phase: wait for per-upload probes and the queue backlog
+    stop_watch.set()
+    drained_after = None
+    admin = clients[0][1]
+    while time.monotonic() - start - duration < args.conversion_timeout:
+        pending = await queue_pending(admin)
+        if not watcher.pending and not pending:
+            drained_after = time.monotonic() - start - duration
+            break
+        await asyncio.sleep(POLL_INTERVAL)
+    await watch_task
+    stop_rss.set()
+    await rss_task
+    for client in static_clients.values():
+        await client.close()
+
+    ok = len(stats.latencies)
+    return {
+        "endpoint": name,
+        "path": path,
+        "uploads": args.uploads,
+        "succeeded": ok,
+        "skipped_over_limit": stats.skipped,
+        "status": {str(k): v for k, v in stats.statuses.items()},
+        "duration_seconds": round(duration, 2),
+        "megabytes": round(stats.bytes_ok / 1048576, 2),
+        "throughput_mb_s": round(stats.bytes_ok / 1048576 / duration, 2) if duration else 0,
+        "uploads_per_second": round(ok / duration, 2) if duration else 0,
+        "latency_ms": summarize(stats.latencies, 1000),
+        "server_rss": sampler.summary(),
+        "conversions": None if name == "signature" else {
+            "latency_ms": summarize(stats.conversions, 1000),
+            "timed_out": stats.unconverted,
+        },
+        "conversions_done_after_seconds": round(drained_after, 2) if drained_after is not None else None,
+    }
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    identities = load_identities(args.tokens_file)
+    clients = [(i.label, AsyncHttpClient(API_BASE, headers=auth_headers(i.token), limit=args.concurrency))
+               for i in identities]
+    results = []
+    created_signature = None
+    try:
+        targets, created_signature = await prepare_targets(clients[0][1], args)
+        for name in args.endpoint or list(ENDPOINTS):
+            if "{chat}" in ENDPOINTS[name]["path"] and not targets["chat"]:
+                print(f"  ⏭️  {name}: no chat available (use --chat)")
+                continue
+            if "{signature}" in ENDPOINTS[name]["path"] and not targets["signature"]:
+                print(f"  ⏭️  {name}: could not create a signature (use --signature)")
+                continue
+            # The chat/signature must belong to the uploader; other identities only help
+            # for the per-user avatar endpoint
+            uploaders = clients if name == "avatar" else clients[:1]
+            print(f"\n--- {name}: {args.uploads} uploads, concurrency {args.concurrency} ---")
+            result = await run_endpoint(name, uploaders, targets, args, mix, rng)
+            results.append(result)
+
+            print(f"  Throughput: {result['throughput_mb_s']} MB/s, {result['uploads_per_second']} uploads/s "
+                  f"({result['succeeded']}/{result['uploads']} ok) {result['status']}")
+            print(f"  Latency:    {format_summary(result['latency_ms'])}")
+            if result["server_rss"]:
+                rss = result["server_rss"]
+                print(f"  Server RSS: {rss['before_mb']} -> peak {rss['peak_mb']} -> {rss['after_mb']} MB "
+                      f"(growth {rss['growth_mb']} MB)")
+            if result["conversions"]:
+                print(f"  Conversions: {format_summary(result['conversions']['latency_ms'])} "
+                      f"timed out={result['conversions']['timed_out']}")
+            else:
+                print("  Conversions: n/a (no media conversions registered)")
+            if result["conversions_done_after_seconds"] is not None:
+                print(f"  All conversions done {result['conversions_done_after_seconds']}s after the last upload")
+            if result["skipped_over_limit"]:
+                print(f"  ℹ️  {result['skipped_over_limit']} uploads skipped (above the endpoint's size limit)")
+            if result["status"].get("429"):
+                print("  ℹ️  Throttled (429) - chat uploads share the 20/min send limit per user")
+    finally:
+        if created_signature:
+            try:
+                await clients[0][1].delete(f"/emails/signatures/{created_signature}")
+            except HttpError:
+                pass
+        for _, http in clients:
+            await http.close()
+    return results
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Media Upload Throughput Benchmark")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:  {API_BASE}")
+    print(f"Size mix: {args.mix}")
+    raise_fd_limit()
+
+    results = asyncio.run(run(args))
+
+    print("\n" + "=" * 60)
+    server_errors = sum(count for r in results for status, count in r["status"].items()
+                        if status.isdigit() and int(status) >= 500)
+    if not results:
+        print("⚠️  No endpoint could be benchmarked")
+    elif server_errors:
+        print(f"❌ {server_errors} uploads failed with server errors")
+    else:
+        for r in results:
+            print(f"✅ {r['endpoint']:<10} {r['throughput_mb_s']} MB/s, p99 {r['latency_ms']['p99']}ms")
+    print("=" * 60)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "target": API_BASE,
+        "size_mix": args.mix,
+        "concurrency": args.concurrency,
+        "endpoints": results,
+    }
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_throughput_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(0 if results and not server_errors else 1)
+
+
+if __name__ == "__main__":
+    main()
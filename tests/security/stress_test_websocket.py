@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+WebSocket (Reverb) Load Test
+Opens thousands of concurrent Pusher-protocol connections against Reverb, authorizes
+private/presence channels via /api/broadcasting/auth and subscribes to the channels
+defined in routes/channels.php. Reports connection setup rate, memory per connection
+and subscription latency percentiles.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from async_http import AsyncHttpClient, HttpError
+from perf_stats import find_pids, format_summary, raise_fd_limit, rss_bytes, summarize
+from reverb_client import (REVERB_APP_KEY, REVERB_HOST, REVERB_PORT, ChannelAuthError,
+                           PusherConnection, ReverbError, channel_pattern)
+
+# Configuration
+API_BASE = "http://localhost:8000/api"
+TOKEN = "1|rIChykfSoXL9rQ1eFpLzuLSSVlRqEuP42T2GYH6I77f4a980"
+HEADERS = {
+    "Authorization": f"Bearer {TOKEN}",
+    "Accept": "application/json"
+}
+
+# Test settings
+CONNECTIONS = 1000          # Concurrent WebSocket connections to open
+CONNECT_CONCURRENCY = 200   # Connections being set up at the same time
+AUTH_POOL_SIZE = 64         # Keep-alive HTTP connections for /broadcasting/auth
+MAX_CHATS = 5               # dm.*/group.* channels taken from /chat per connection
+HOLD_SECONDS = 10           # Keep everything subscribed this long to catch drops
+PROJECT_IDS = []            # Numeric project ids for projects.{id}.tasks channels (the API only exposes public ids)
+REVERB_PROCESS = "reverb:start"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Reverb WebSocket load test")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS)
+    parser.add_argument("--concurrency", type=int, default=CONNECT_CONCURRENCY)
+    parser.add_argument("--hold", type=float, default=HOLD_SECONDS)
+    parser.add_argument("--max-chats", type=int, default=MAX_CHATS)
+    parser.add_argument("--project", action="append", default=list(PROJECT_IDS),
+                        help="Numeric project id for a projects.{id}.tasks channel (repeatable)")
+    parser.add_argument("--channel", action="append", default=[],
+                        help="Explicit channel name, e.g. private-dm.<id> (repeatable, skips discovery)")
+    parser.add_argument("--reverb-host", default=REVERB_HOST)
+    parser.add_argument("--reverb-port", type=int, default=REVERB_PORT)
+    parser.add_argument("--app-key", default=REVERB_APP_KEY)
+    return parser.parse_args()
+
+
+async def discover_channels(http, max_chats, project_ids):
+    """Build the channel list from the API: own user, chats, ticket queue, presence, projects."""
+    channels = ["presence-online-users", "private-tickets.queue"]
+
+    response = await http.get("/user")
+    if response.status == 200:
+        body = response.json() or {}
+        user = body.get("data", body.get("user", body))
+        if user.get("public_id"):
+            channels.append(f"private-user.{user['public_id']}")
+
+    response = await http.get("/chat")
+    if response.status == 200:
+        for chat in (response.json() or {}).get("data", [])[:max_chats]:
+            prefix = "dm" if chat.get("type", "dm") == "dm" else "group"
+            channels.append(f"private-{prefix}.{chat['public_id']}")
+
+    # channels.php resolves the project with Project::find() on the numeric id, but
+    # /projects only returns public ids, so these channels come from --project only
+    numeric = [pid for pid in project_ids if str(pid).isdigit()]
+    if len(numeric) < len(project_ids):
+        print(f"  ⏭️  Skipping non-numeric project ids: {', '.join(str(p) for p in project_ids if p not in numeric)}")
+    channels.extend(f"private-projects.{pid}.tasks" for pid in numeric)
+
+    return channels
+
+
+async def open_client(index, args, http, channels, gate, stats, clients):
+    async with gate:
+        conn = PusherConnection(args.reverb_host, args.reverb_port, args.app_key)
+        start = time.monotonic()
+        try:
+            await conn.connect()
+        except (ReverbError, OSError, asyncio.TimeoutError) as e:
+            stats["errors"][f"connect: {type(e).__name__}"] += 1
+            await conn.close()
+            return
+        stats["connect"].append(time.monotonic() - start)
+        clients.append(conn)
+
+        for channel in channels:
+            pattern = channel_pattern(channel)
+            try:
+                auth_latency, sub_latency = await conn.subscribe_authorized(http, channel)
+            except ChannelAuthError as e:
+                stats["errors"][f"auth {e.status}: {pattern}"] += 1
+                continue
+            except (ReverbError, HttpError, asyncio.TimeoutError) as e:
+                stats["errors"][f"subscribe {type(e).__name__}: {pattern}"] += 1
+                continue
+            if auth_latency:
+                stats["auth"][pattern].append(auth_latency)
+            stats["subscribe"][pattern].append(sub_latency)
+            stats["setup"][pattern].append(auth_latency + sub_latency)
+
+
+async def run(args):
+    stats = {
+        "connect": [],
+        "auth": defaultdict(list),
+        "subscribe": defaultdict(list),
+        "setup": defaultdict(list),
+        "errors": defaultdict(int),
+    }
+    clients = []
+
+    async with AsyncHttpClient(API_BASE, headers=HEADERS, limit=AUTH_POOL_SIZE) as http:
+        if args.channel:
+            channels = args.channel
+        else:
+            try:
+                channels = await discover_channels(http, args.max_chats, args.project)
+            except HttpError as e:
+                print(f"❌ Channel discovery failed: {e}")
+                return None
+        print(f"\nChannels per connection ({len(channels)}):")
+        for channel in channels:
+            print(f"  {channel}  [{channel_pattern(channel)}]")
+
+        reverb_pids = find_pids(REVERB_PROCESS)
+        server_rss_before = sum(rss_bytes(pid) or 0 for pid in reverb_pids)
+        client_rss_before = rss_bytes()
+
+        print(f"\n--- Opening {args.connections} connections ({args.concurrency} at a time) ---")
+        gate = asyncio.Semaphore(args.concurrency)
+        ramp_start = time.monotonic()
+        await asyncio.gather(*(
+            open_client(i, args, http, channels, gate, stats, clients)
+            for i in range(args.connections)
+        ))
+        ramp_duration = time.monotonic() - ramp_start
+
+        client_rss_after = rss_bytes()
+        server_rss_after = sum(rss_bytes(pid) or 0 for pid in reverb_pids)
+
+        print(f"--- Holding {len(clients)} connections for {args.hold}s ---")
+        await asyncio.sleep(args.hold)
+        dropped = sum(1 for c in clients if c.closed.is_set())
+
+        await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+    established = len(stats["connect"])
+    per_conn = lambda before, after: round((after - before) / established) if established and before and after else None
+    return {
+        "channels": channels,
+        "connections_requested": args.connections,
+        "connections_established": established,
+        "connections_dropped": dropped,
+        "ramp_seconds": round(ramp_duration, 2),
+        "setup_rate_per_sec": round(established / ramp_duration, 1) if ramp_duration else 0,
+        "connect_latency_ms": summarize(stats["connect"], 1000),
+        "auth_latency_ms": {k: summarize(v, 1000) for k, v in stats["auth"].items()},
+        "subscribe_latency_ms": {k: summarize(v, 1000) for k, v in stats["subscribe"].items()},
+        "setup_latency_ms": {k: summarize(v, 1000) for k, v in stats["setup"].items()},
+        "errors": dict(stats["errors"]),
+        "memory": {
+            "client_bytes_per_connection": per_conn(client_rss_before, client_rss_after),
+            "server_pids": reverb_pids,
+            "server_bytes_per_connection": per_conn(server_rss_before, server_rss_after),
+        },
+    }
+
+
+def print_report(report):
+    print("\n" + "=" * 60)
+    print("WebSocket Load Test Summary")
+    print("=" * 60)
+    print(f"  Established:  {report['connections_established']}/{report['connections_requested']}")
+    print(f"  Dropped:      {report['connections_dropped']}")
+    print(f"  Setup rate:   {report['setup_rate_per_sec']} conn/s over {report['ramp_seconds']}s")
+    print(f"  Connect:      {format_summary(report['connect_latency_ms'])}")
+
+    memory = report["memory"]
+    if memory["client_bytes_per_connection"] is not None:
+        print(f"  Client mem:   {memory['client_bytes_per_connection'] / 1024:.1f} KB/connection")
+    if memory["server_bytes_per_connection"] is not None:
+        print(f"  Reverb mem:   {memory['server_bytes_per_connection'] / 1024:.1f} KB/connection")
+    else:
+        print("  Reverb mem:   n/a (Reverb process not found on this host)")
+
+    print("\n  Subscription latency (auth + subscribe) by channel:")
+    for pattern, summary in sorted(report["setup_latency_ms"].items()):
+        print(f"    {pattern:<30} {format_summary(summary)}")
+
+    if report["errors"]:
+        print("\n  Errors:")
+        for reason, count in sorted(report["errors"].items(), key=lambda kv: -kv[1]):
+            print(f"    {count:>6}  {reason}")
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("WebSocket (Reverb) Load Test")
+    print("=" * 60)
+    print(f"\nStarted: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Target:  ws://{args.reverb_host}:{args.reverb_port}/app/{args.app_key}")
+    print(f"Open files limit: {raise_fd_limit()}")
+
+    report = asyncio.run(run(args))
+    if report is None:
+        sys.exit(1)
+
+    print_report(report)
+
+    established = report["connections_established"]
+    failure_rate = 1 - established / args.connections if args.connections else 0
+    failed = failure_rate > 0.05 or report["connections_dropped"] > 0
+
+    print()
+    if failed:
+        print(f"❌ FAILED: {failure_rate:.1%} connections failed, {report['connections_dropped']} dropped")
+    else:
+        print("✅ PASSED: Reverb sustained the connection load")
+    print("=" * 60)
+
+    report["timestamp"] = datetime.now().isoformat()
+    report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "websocket_load_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved: {report_path}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Route Index Tests
+Checks that routes read from `php artisan route:list --json` carry the same
+middleware aliases as the static parse, so throttle pacing, middleware filters,
+the header audit groups and authz_policy.json patterns match either source.
+
+Usage:
+  python3 -m unittest test_route_index
+"""
+
+import json
+import unittest
+
+from async_http import throttles
+from route_index import filter_routes, middleware_aliases, parse_route_list
+
+# Two entries as `php artisan route:list --json --path=api` prints them on Laravel 11
+ROUTE_LIST_SAMPLE = r"""[
+  {"domain": null, "method": "GET|HEAD", "uri": "api/audit-logs", "name": "audit-logs.index",
+   "action": "App\\Http\\Controllers\\Api\\AuditLogController@index",
+   "middleware": ["Laravel\\Sanctum\\Http\\Middleware\\EnsureFrontendRequestsAreStateful",
+                  "Illuminate\\Routing\\Middleware\\SubstituteBindings",
+                  "App\\Http\\Middleware\\SecurityHeaders",
+                  "App\\Http\\Middleware\\CheckImpersonation",
+                  "Illuminate\\Auth\\Middleware\\Authenticate:sanctum",
+                  "App\\Http\\Middleware\\CheckUserStatus",
+                  "Illuminate\\Routing\\Middleware\\ThrottleRequests:60,1",
+                  "Spatie\\Permission\\Middleware\\PermissionMiddleware:audit.view"]},
+  {"domain": null, "method": "POST", "uri": "api/login", "name": "login",
+   "action": "App\\Http\\Controllers\\Api\\AuthController@login",
+   "middleware": ["Laravel\\Sanctum\\Http\\Middleware\\EnsureFrontendRequestsAreStateful",
+                  "Illuminate\\Routing\\Middleware\\SubstituteBindings",
+                  "Illuminate\\Auth\\Middleware\\RedirectIfAuthenticated",
+                  "Illuminate\\Routing\\Middleware\\ThrottleRequests:sensitive"]}
+]"""
+
+
+class RouteListMiddlewareTest(unittest.TestCase):
+    def setUp(self):
+        self.routes = parse_route_list(json.loads(ROUTE_LIST_SAMPLE), middleware_aliases())
+        self.by_uri = {route["uri"]: route for route in self.routes}
+
+    def test_head_is_dropped(self):
+        self.assertEqual([(r["method"], r["uri"]) for r in self.routes],
+                         [("GET", "/api/audit-logs"), ("POST", "/api/login")])
+
+    def test_class_names_become_aliases(self):
+        middleware = self.by_uri["/api/audit-logs"]["middleware"]
+        for alias in ("auth:sanctum", "check_status", "throttle:60,1", "permission:audit.view"):
+            self.assertIn(alias, middleware)
+        self.assertIn("guest", self.by_uri["/api/login"]["middleware"])
+
+    def test_unaliased_classes_are_kept(self):
+        self.assertIn("Illuminate\\Routing\\Middleware\\SubstituteBindings",
+                      self.by_uri["/api/audit-logs"]["middleware"])
+
+    def test_consumers_match(self):
+        self.assertEqual(throttles(self.by_uri["/api/login"]), ["throttle:sensitive"])
+        self.assertEqual(throttles(self.by_uri["/api/audit-logs"]), ["throttle:60,1"])
+        authed = filter_routes(self.routes, middleware="auth:")
+        self.assertEqual([r["uri"] for r in authed], ["/api/audit-logs"])
+
+    def test_controller_action(self):
+        route = self.by_uri["/api/login"]
+        self.assertEqual(route["controller"], "App\\Http\\Controllers\\Api\\AuthController")
+        self.assertEqual(route["function"], "login")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Record/Replay (VCR) Proxy
+Lets the harness run without the Laravel/Reverb/queue/DB stack. In record mode
+the proxy sits on the ports the suites talk to (8000 for the API, 9000 for
+Reverb), forwards everything to the real servers moved to other ports, and
+writes every HTTP exchange and WebSocket conversation to a cassette. In replay
+mode it serves the cassette back from memory, so changes to analysis code,
+report generation or scheduling can be checked offline in seconds - with any
+suite, including the requests-based ones, since nothing in them changes.
+
+Cassette layout (little endian, one file):
+  header    MAGIC, version u32, record count u64, index offset u64, table offset u64
+  data      zlib-compressed records, back to back: meta length u32, JSON meta, raw bodies
+  index     one ENTRY per record: offset u64, length u32, kind u8, exact/target/path keys
+            (64-bit hashes used for lookup), start time f64
+  table     JSON: ports and upstreams, record start time, totals
+
+Replay matches an HTTP request on (port, method, target, body, credentials), then
+(port, method, target, credentials), then (port, method, path); repeated requests
+walk through the recorded responses in order. The credentials are the
+Authorization, Cookie and X-XSRF-TOKEN headers, so suites that send the same
+request as different identities get each identity's own responses back; only
+the last, path-level fallback ignores who is asking. Unmatched requests get a 502 with X-VCR: miss.
+A WebSocket connection replays the recorded conversation whose first client
+message matches, answering each client frame with the server frames that
+followed it. Responses are served at memory speed unless --realtime is given.
+
+Usage:
+  # Run the app on 8001 and Reverb on 9001, then:
+  python3 vcr_proxy.py record suite.wsv [--map 8000=localhost:8001 --map 9000=localhost:9001]
+  python3 vcr_proxy.py replay suite.wsv [--realtime]
+  python3 vcr_proxy.py stats suite.wsv
+  python3 vcr_proxy.py show suite.wsv [--count 20]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import signal
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from async_http import HOP_HEADERS, AsyncHttpClient, HttpError, read_request, write_response
+from reverb_client import (OP_CLOSE, OP_CONT, OP_PING, OP_PONG, OP_TEXT, accept_websocket, encode_frame,
+                           read_frame)
+
+# Configuration
+DEFAULT_MAPS = ["8000=localhost:8001", "9000=localhost:9001"]
+
+MAGIC = b"WSVCRCAS"
+VERSION = 2
+HEADER = struct.Struct("<8sIQQQ")
+ENTRY = struct.Struct("<QIB3xQQQd")
+META_LENGTH = struct.Struct("<I")
+KIND_HTTP = 1
+KIND_WS = 2
+
+CREDENTIAL_HEADERS = ("authorization", "cookie", "x-xsrf-token")
+
+# Test settings
+COMPRESSION_LEVEL = 6
+RECORD_CACHE = 4096           # Decompressed records kept in memory during replay
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record/replay proxy for offline harness runs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    record = sub.add_parser("record", help="Forward to the real servers and record a cassette")
+    record.add_argument("cassette")
+    record.add_argument("--map", action="append", metavar="PORT=HOST:PORT",
+                        help=f"Listen port and upstream (default {' '.join(DEFAULT_MAPS)})")
+    replay = sub.add_parser("replay", help="Serve a cassette")
+    replay.add_argument("cassette")
+    replay.add_argument("--map", action="append", metavar="PORT", help="Listen ports (default: as recorded)")
+    replay.add_argument("--realtime", action="store_true", help="Reproduce recorded latencies")
+    stats = sub.add_parser("stats", help="Summarize a cassette")
+    stats.add_argument("cassette")
+    show = sub.add_parser("show", help="List recorded exchanges")
+    show.add_argument("cassette")
+    show.add_argument("--count", type=int, default=20)
+    return parser.parse_args()
+
+
+def key(*parts):
+    digest = hashlib.blake2b("\x1f".join(str(p) for p in parts).encode("utf-8", "surrogateescape"),
+                             digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def credentials(headers):
+    """Hash of the identity a request is sent as; `headers` maps lower-case names to values."""
+    parts = []
+    for name in CREDENTIAL_HEADERS:
+        value = headers.get(name, "")
+        if name == "cookie":
+            value = "; ".join(sorted(c.strip() for c in value.split(";") if c.strip()))
+        parts.append(value)
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def request_keys(port, method, target, body=b"", headers=None):
+    """(exact, target, path) lookup keys for one request; only the path key ignores the credentials."""
+    path = urlsplit(target).path
+    identity = credentials(headers or {})
+    return (key(port, method, target, hashlib.sha1(body).hexdigest(), identity),
+            key(port, method, target, identity), key(port, method, path))
+
+
+class CassetteWriter:
+    """Appends compressed records to disk as they arrive; the index is written on close()."""
+
+    def __init__(self, path, table=None):
+        self.path = path
+        self.table = dict(table or {})
+        self.started = time.monotonic()
+        self.count = 0
+        self.raw_bytes = 0
+        self._out = open(path + ".tmp", "wb")
+        self._index = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+        self._out.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        self._offset = HEADER.size
+
+    def _add(self, kind, keys, meta, blobs, started_at):
+        meta_bytes = json.dumps(meta, separators=(",", ":")).encode()
+        raw = META_LENGTH.pack(len(meta_bytes)) + meta_bytes + b"".join(blobs)
+        packed = zlib.compress(raw, COMPRESSION_LEVEL)
+        self._out.write(packed)
+        self._index.write(ENTRY.pack(self._offset, len(packed), kind, *keys, started_at - self.started))
+        self._offset += len(packed)
+        self.count += 1
+        self.raw_bytes += len(raw)
+
+    def add_http(self, port, method, target, request_headers, body, response, started_at):
+        meta = {"port": port, "method": method, "target": target, "request_headers": request_headers,
+                "status": response.status, "reason": response.reason, "headers": response.raw_headers,
+                "elapsed": response.elapsed, "blobs": [len(body), len(response.body)]}
+        headers = {name.lower(): value for name, value in request_headers}
+        self._add(KIND_HTTP, request_keys(port, method, target, body, headers), meta, [body, response.body],
+                  started_at)
+
+    def add_ws(self, port, target, response_head, frames, started_at):
+        """`frames` is a list of (direction 'c'|'s', seconds since connect, opcode, payload)."""
+        meta = {"port": port, "target": target, "response_head": response_head.decode("latin-1"),
+                "frames": [[d, round(t, 6), op, len(p)] for d, t, op, p in frames]}
+        first = next((p for d, _, _, p in frames if d == "c"), b"")
+        keys = (key(port, "WS", target, hashlib.sha1(first).hexdigest()), key(port, "WS", target),
+                key(port, "WS", urlsplit(target).path))
+        self._add(KIND_WS, keys, meta, [p for _, _, _, p in frames], started_at)
+
+    def close(self):
+        index_offset = self._offset
+        self._index.seek(0)
+        while True:
+            block = self._index.read(1 << 20)
+            if not block:
+                break
+            self._out.write(block)
+        table_offset = index_offset + self.count * ENTRY.size
+        self.table.update({"recorded_at": datetime.now().isoformat(), "raw_bytes": self.raw_bytes,
+                           "duration_seconds": round(time.monotonic() - self.started, 1)})
+        self._out.write(json.dumps(self.table).encode())
+        self._out.seek(0)
+        self._out.write(HEADER.pack(MAGIC, VERSION, self.count, index_offset, table_offset))
+        self._out.close()
+        self._index.close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+class Cassette:
+    """Read-only, mmap-backed cassette with hash indexes for replay lookups."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self._index, table_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} cassette")
+        self.table = json.loads(self._map[table_offset:])
+        self.by_key = [defaultdict(list) for _ in range(3)]
+        for i in range(self.count):
+            _, _, _, *keys, _ = self.entry(i)
+            for level, value in enumerate(keys):
+                self.by_key[level][value].append(i)
+        self._cursor = defaultdict(int)
+        self.record = lru_cache(maxsize=RECORD_CACHE)(self._record)
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+        self._map = None
+        self._file.close()
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, i):
+        """(offset, length, kind, exact key, target key, path key, start time) of record i."""
+        return ENTRY.unpack_from(self._map, self._index + i * ENTRY.size)
+
+    def _record(self, i):
+        """(meta, [blobs]) of record i."""
+        offset, length = self.entry(i)[:2]
+        raw = zlib.decompress(self._map[offset:offset + length])
+        size = META_LENGTH.unpack_from(raw)[0]
+        meta = json.loads(raw[META_LENGTH.size:META_LENGTH.size + size])
+        position = META_LENGTH.size + size
+        lengths = meta["blobs"] if "blobs" in meta else [f[3] for f in meta["frames"]]
+        blobs = []
+        for n in lengths:
+            blobs.append(raw[position:position + n])
+            position += n
+        return meta, blobs
+
+    def lookup(self, keys):
+        """Next record for the most specific matching key. Returns (index, level) or (None, None)."""
+        for level, value in enumerate(keys):
+            candidates = self.by_key[level].get(value)
+            if candidates:
+                cursor = (level, value)
+                index = candidates[self._cursor[cursor] % len(candidates)]
+                self._cursor[cursor] += 1
+                return index, level
+        return None, None
+
+
+def is_websocket(headers):
+    return headers.get("upgrade", "").lower() == "websocket"
+
+
+async def pump_frames(reader, forward, record, direction, started):
+    """Relay whole messages (fragments joined) from `reader`, recording each one."""
+    fragments, first_opcode = [], None
+    while True:
+        fin, opcode, payload = await read_frame(reader)
+        if opcode == OP_CONT and first_opcode is not None:
+            fragments.append(payload)
+        else:
+            fragments, first_opcode = [payload], opcode
+        if not fin:
+            continue
+        message = b"".join(fragments)
+        record.append((direction, time.monotonic() - started, first_opcode, message))
+        await forward(first_opcode, message)
+        if first_opcode == OP_CLOSE:
+            return
+
+
+class Recorder:
+    def __init__(self, cassette, maps):
+        self.writer = cassette
+        self.maps = maps
+        self.clients = {port: AsyncHttpClient(f"http://{upstream}", limit=256, timeout=300)
+                        for port, upstream in maps.items()}
+        self.exchanges = 0
+
+    async def handle(self, port, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, head, raw_headers, headers, body = request
+                if is_websocket(headers):
+                    await self.websocket(port, target, head, reader, writer)
+                    break
+                started = time.monotonic()
+                forward = {n: v for n, v in raw_headers if n.lower() not in HOP_HEADERS}
+                try:
+                    response = await self.clients[port].request(method, target, data=body, headers=forward)
+                except HttpError as e:
+                    write_response(writer, 502, "Bad Gateway", [], str(e).encode())
+                    await writer.drain()
+                    continue
+                self.writer.add_http(port, method, target, raw_headers, body, response, started)
+                self.exchanges += 1
+                write_response(writer, response.status, response.reason, response.raw_headers, response.body,
+                               head=method == "HEAD")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def websocket(self, port, target, head, reader, writer):
+        host, _, upstream_port = self.maps[port].rpartition(":")
+        up_reader, up_writer = await asyncio.open_connection(host, int(upstream_port))
+        up_writer.write(head)
+        await up_writer.drain()
+        response_head = await up_reader.readuntil(b"\r\n\r\n")
+        writer.write(response_head)
+        await writer.drain()
+        started = time.monotonic()
+        frames = []
+
+        async def to_upstream(opcode, payload):
+            up_writer.write(encode_frame(opcode, payload, mask=True))
+            await up_writer.drain()
+
+        async def to_client(opcode, payload):
+            writer.write(encode_frame(opcode, payload, mask=False))
+            await writer.drain()
+
+        pumps = [asyncio.create_task(pump_frames(reader, to_upstream, frames, "c", started)),
+                 asyncio.create_task(pump_frames(up_reader, to_client, frames, "s", started))]
+        try:
+            await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pumps:
+                task.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+            up_writer.close()
+            self.writer.add_ws(port, target, response_head, frames, started)
+            self.exchanges += 1
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.close()
+        self.writer.close()
+
+
+class Replayer:
+    def __init__(self, cassette, realtime=False):
+        self.cassette = cassette
+        self.realtime = realtime
+        self.hits = defaultdict(int)
+
+    async def handle(self, port, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, _, raw_headers, headers, body = request
+                if is_websocket(headers):
+                    await self.websocket(port, target, headers, reader, writer)
+                    break
+                index, level = self.cassette.lookup(request_keys(port, method, target, body, headers))
+                if index is None:
+                    self.hits["miss"] += 1
+                    write_response(writer, 502, "Bad Gateway", [("Content-Type", "application/json")],
+                                   b'{"message":"not in cassette"}', extra=[("X-VCR", "miss")])
+                else:
+                    meta, blobs = self.cassette.record(index)
+                    self.hits[("hit", "target", "path")[level]] += 1
+                    if self.realtime:
+                        await asyncio.sleep(meta["elapsed"])
+                    write_response(writer, meta["status"], meta["reason"], meta["headers"], blobs[1],
+                                   extra=[("X-VCR", ("hit", "target", "path")[level])], head=method == "HEAD")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def websocket(self, port, target, headers, reader, writer):
+        accept_websocket(writer, headers, [("X-VCR", "hit")])
+        await writer.drain()
+        # Greeting from the most general match; the conversation is chosen by the first client frame
+        index, _ = self.cassette.lookup((None, key(port, "WS", target), key(port, "WS", urlsplit(target).path)))
+        if index is None:
+            self.hits["miss"] += 1
+            writer.write(encode_frame(OP_CLOSE, b"\x03\xf3not in cassette", mask=False))
+            await writer.drain()
+            return
+        self.hits["websocket"] += 1
+        script = self.script(index)
+        position = await self.play(writer, script, 0)
+        chosen = False
+        while True:
+            try:
+                _, opcode, payload = await read_frame(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            if opcode == OP_CLOSE:
+                writer.write(encode_frame(OP_CLOSE, payload, mask=False))
+                await writer.drain()
+                return
+            if opcode == OP_PING:
+                writer.write(encode_frame(OP_PONG, payload, mask=False))
+                await writer.drain()
+                continue
+            if not chosen:
+                chosen = True
+                exact = key(port, "WS", target, hashlib.sha1(payload).hexdigest())
+                match, _ = self.cassette.lookup((exact, None, None))
+                if match is not None:
+                    script = self.script(match)
+                    position = next((i for i, f in enumerate(script) if f[0] == "c"), len(script))
+            if position < len(script) and script[position][0] == "c":
+                position = await self.play(writer, script, position + 1)
+            elif b'"pusher:ping"' in payload:
+                writer.write(encode_frame(OP_TEXT, b'{"event":"pusher:pong","data":{}}', mask=False))
+                await writer.drain()
+
+    def script(self, index):
+        meta, blobs = self.cassette.record(index)
+        return [(d, t, op, payload) for (d, t, op, _), payload in zip(meta["frames"], blobs)]
+
+    async def play(self, writer, script, position):
+        """Send server frames from `position` up to the next client frame; returns its position."""
+        previous = script[position - 1][1] if position else 0.0
+        while position < len(script) and script[position][0] == "s":
+            direction, at, opcode, payload = script[position]
+            if self.realtime and at > previous:
+                await asyncio.sleep(at - previous)
+            previous = at
+            if opcode != OP_CLOSE:
+                writer.write(encode_frame(opcode, payload, mask=False))
+            position += 1
+        await writer.drain()
+        return position
+
+
+def parse_maps(values):
+    maps = {}
+    for value in values:
+        port, _, upstream = value.partition("=")
+        maps[int(port)] = upstream
+    return maps
+
+
+async def serve(handler, ports):
+    servers = []
+    for port in ports:
+        servers.append(await asyncio.start_server(
+            lambda r, w, port=port: handler.handle(port, r, w), "0.0.0.0", port, limit=1 << 20))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+
+
+async def record(args):
+    maps = parse_maps(args.map or DEFAULT_MAPS)
+    recorder = Recorder(CassetteWriter(args.cassette, {"ports": maps}), maps)
+    print(f"Recording to {args.cassette}: " + ", ".join(f":{p} -> {u}" for p, u in maps.items()))
+    print("Press Ctrl+C to stop and write the index")
+    try:
+        await serve(recorder, maps)
+    finally:
+        await recorder.close()
+    print(f"\n✅ {recorder.exchanges} exchanges recorded")
+
+
+async def replay(args):
+    cassette = Cassette(args.cassette)
+    ports = [int(p) for p in args.map] if args.map else [int(p) for p in cassette.table["ports"]]
+    replayer = Replayer(cassette, args.realtime)
+    print(f"Replaying {args.cassette} ({len(cassette)} records) on " + ", ".join(f":{p}" for p in ports))
+    try:
+        await serve(replayer, ports)
+    finally:
+        cassette.close()
+    print(f"\nServed: {dict(replayer.hits)}")
+
+
+def stats(args):
+    cassette = Cassette(args.cassette)
+    kinds = defaultdict(int)
+    ports = defaultdict(int)
+    statuses = defaultdict(int)
+    paths = defaultdict(int)
+    for i in range(len(cassette)):
+        kind = cassette.entry(i)[2]
+        meta, _ = cassette.record(i)
+        kinds["http" if kind == KIND_HTTP else "websocket"] += 1
+        ports[meta["port"]] += 1
+        if kind == KIND_HTTP:
+            statuses[meta["status"]] += 1
+            paths[f"{meta['method']} {urlsplit(meta['target']).path}"] += 1
+    size = os.path.getsize(args.cassette)
+    raw = cassette.table.get("raw_bytes", 0)
+    print(f"{args.cassette}: {len(cassette)} records, {size / 1048576:.2f} MB on disk "
+          f"({raw / 1048576:.2f} MB raw, {raw / size if size else 0:.1f}x)")
+    print(f"  Recorded: {cassette.table.get('recorded_at')} over {cassette.table.get('duration_seconds')}s")
+    print(f"  Kinds:    {dict(kinds)}")
+    print(f"  Ports:    {dict(ports)}")
+    print(f"  Status:   {dict(sorted(statuses.items()))}")
+    print("  Top paths:")
+    for path, count in sorted(paths.items(), key=lambda item: -item[1])[:15]:
+        print(f"    {count:>7}  {path}")
+    cassette.close()
+
+
+def show(args):
+    cassette = Cassette(args.cassette)
+    for i in range(min(args.count, len(cassette))):
+        kind, started = cassette.entry(i)[2], cassette.entry(i)[6]
+        meta, blobs = cassette.record(i)
+        if kind == KIND_HTTP:
+            print(f"{i:>6} +{started:8.3f}s :{meta['port']} {meta['method']} {meta['target'][:70]} "
+                  f"-> {meta['status']} ({len(blobs[1])} B, {meta['elapsed'] * 1000:.1f}ms)")
+        else:
+            print(f"{i:>6} +{started:8.3f}s :{meta['port']} WS {meta['target'][:60]} "
+                  f"({len(meta['frames'])} frames)")
+    cassette.close()
+
+
+def main():
+    args = parse_args()
+    if args.command == "record":
+        asyncio.run(record(args))
+    elif args.command == "replay":
+        asyncio.run(replay(args))
+    elif args.command == "stats":
+        stats(args)
+    else:
+        show(args)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()